@@ -5,14 +5,13 @@ from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import Site, KeywordCluster, ContentItem, FAQ, PageView
-from tenants.models import Tenant, TenantUser
 
 class SiteViewSet(viewsets.ModelViewSet):
     serializer_class = None  # TODO: Move serializers
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        tenant_ids = TenantUser.objects.filter(user=self.request.user).values_list('tenant_id', flat=True)
+        tenant_ids = self.request.tenant_ctx.tenant_ids
         return Site.objects.filter(tenant_id__in=tenant_ids)
 
     @csrf_exempt
@@ -31,7 +30,7 @@ class KeywordClusterViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        tenant_ids = TenantUser.objects.filter(user=self.request.user).values_list('tenant_id', flat=True)
+        tenant_ids = self.request.tenant_ctx.tenant_ids
         return KeywordCluster.objects.filter(tenant_id__in=tenant_ids)
 
 class ContentItemViewSet(viewsets.ModelViewSet):
@@ -39,7 +38,7 @@ class ContentItemViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        tenant_ids = TenantUser.objects.filter(user=self.request.user).values_list('tenant_id', flat=True)
+        tenant_ids = self.request.tenant_ctx.tenant_ids
         return ContentItem.objects.filter(tenant_id__in=tenant_ids)
 
 class FAQViewSet(viewsets.ModelViewSet):
@@ -47,14 +46,13 @@ class FAQViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        tenant_ids = TenantUser.objects.filter(user=self.request.user).values_list('tenant_id', flat=True)
+        tenant_ids = self.request.tenant_ctx.tenant_ids
         return FAQ.objects.filter(tenant_id__in=tenant_ids)
 
 @login_required
 def dashboard(request):
     """Combined SEO and Analytics dashboard."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
 
@@ -73,8 +71,7 @@ def dashboard(request):
 
 @login_required
 def site_list(request):
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
     sites = Site.objects.filter(tenant=tenant)
@@ -82,8 +79,7 @@ def site_list(request):
 
 @login_required
 def site_detail(request, site_id):
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
 
@@ -106,8 +102,7 @@ def site_detail(request, site_id):
 
 @login_required
 def site_create(request):
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
 
@@ -147,8 +142,7 @@ def site_create(request):
 
 @login_required
 def site_edit(request, site_id):
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
 
@@ -190,8 +184,7 @@ def site_edit(request, site_id):
 @login_required
 def keyword_clusters(request):
     """Analytics Keyword Clusters view."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
     
@@ -205,8 +198,7 @@ def keyword_clusters(request):
 @login_required
 def content_items(request):
     """Analytics Content Items view."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
     
@@ -220,8 +212,7 @@ def content_items(request):
 @login_required
 def faqs(request):
     """Analytics FAQs view."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
     
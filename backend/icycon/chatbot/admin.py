@@ -10,7 +10,7 @@ class ConversationAdmin(admin.ModelAdmin):
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ['conversation', 'role', 'sender', 'tokens', 'created_at']
+    list_display = ['conversation', 'role', 'sender', 'tokens', 'ttfb_ms', 'created_at']
     list_filter = ['role', 'conversation__tenant', 'created_at']
     search_fields = ['content', 'conversation__title']
     date_hierarchy = 'created_at'
@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'chatbot'
\ No newline at end of file
+    name = 'chatbot'
+
+    def ready(self):
+        """Keep retrieval indexes in sync with FAQs, content and products."""
+        import chatbot.signals  # noqa: F401
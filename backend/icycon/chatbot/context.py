@@ -0,0 +1,190 @@
+"""
+Token-budgeted prompt building for the chatbot.
+
+Each turn's prompt is the system prompt, the conversation's rolling
+summary (if any), the retrieved passages and as many of the newest
+unsummarized messages as fit in the tenant's budget
+(`CHATBOT_CONTEXT_BUDGETS[tenant.plan]`). The newest message is never
+squeezed out: the summary and passages give way first. Tokens are
+counted locally: with tiktoken when it is installed, otherwise with a
+conservative estimate.
+
+Every `CHATBOT_SUMMARY_EVERY` turns, everything except the last
+`CHATBOT_SUMMARY_KEEP` messages is folded into `Conversation.summary` by a
+cheap model. The summary is updated incrementally: the old summary plus
+the new messages go in, never the whole history. Prompt size per turn stays
+bounded, and long conversations keep their thread.
+"""
+
+import logging
+import math
+import re
+
+from django.conf import settings
+
+from icycon import llm, quotas
+from .models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+# Per-message framing the chat format adds on top of the content.
+MESSAGE_OVERHEAD = 4
+REPLY_PRIMER = 3
+
+try:
+    import tiktoken
+except ImportError:  # optional: the estimate below is close enough for budgeting
+    tiktoken = None
+
+_encoding = None
+_GROUNDING = "\nRelevant information from this site (prefer it over guessing):"
+_PIECE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def count_tokens(text):
+    """Tokens in `text` (cl100k_base if tiktoken is available)."""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    # BPE splits words into ~4-character pieces; punctuation is a token each.
+    return sum(math.ceil(len(piece) / 4) for piece in _PIECE.findall(text))
+
+
+def message_tokens(message):
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def context_budget(tenant):
+    budgets = getattr(settings, "CHATBOT_CONTEXT_BUDGETS", {})
+    return budgets.get(tenant.plan, getattr(settings, "CHATBOT_CONTEXT_BUDGET", 2000))
+
+
+def _truncate(text, tokens):
+    """Keep roughly the last `tokens` tokens of `text`."""
+    if count_tokens(text) <= tokens:
+        return text
+    chars = max(tokens, 0) * 4
+    return "…" + text[-chars:] if chars else ""
+
+
+async def build_context(conv, tenant, system_content, passages=()):
+    """The messages to send for `conv`'s next reply, within the tenant budget.
+
+    The system prompt always goes in whole, and the newest message is
+    guaranteed `CHATBOT_MESSAGE_RESERVE` tokens of it. The summary, then as
+    many retrieved `passages` as fit, then older messages share the rest.
+    """
+    budget = context_budget(tenant) - REPLY_PRIMER
+    recent = Message.objects.filter(conversation=conv, id__gt=conv.summarized_until_id).order_by("-id")
+    recent = recent.only("role", "content")
+    newest = await recent.afirst()
+    if newest is not None:
+        newest = {"role": newest.role, "content": newest.content}
+    reserve = min(message_tokens(newest), getattr(settings, "CHATBOT_MESSAGE_RESERVE", 256)) if newest else 0
+    # Held back for the newest message while the head is filled.
+    remaining = budget - message_tokens({"content": system_content}) - reserve
+
+    head = [{"role": "system", "content": system_content}]
+    if conv.summary:
+        prefix = "Summary of the earlier conversation:\n"
+        # Normally already this short (it's generated with this max_tokens).
+        limit = min(
+            getattr(settings, "CHATBOT_SUMMARY_MAX_TOKENS", 300),
+            remaining - MESSAGE_OVERHEAD - count_tokens(prefix),
+        )
+        if limit > 0:
+            head.append({"role": "system", "content": prefix + _truncate(conv.summary, limit)})
+            remaining -= message_tokens(head[-1])
+
+    grounding = ""
+    for passage in passages:
+        extended = (grounding or _GROUNDING) + f"\n- {passage}"
+        cost = count_tokens(extended) - count_tokens(grounding)
+        if cost > remaining:
+            break
+        grounding = extended
+        remaining -= cost
+    head[0]["content"] += grounding
+
+    if newest is None:
+        return head
+    remaining += reserve
+    if message_tokens(newest) > remaining:
+        # The newest message always goes in, cut down to what's left.
+        newest["content"] = _truncate(newest["content"], max(remaining, reserve) - MESSAGE_OVERHEAD)
+        return head + [newest]
+    remaining -= message_tokens(newest)
+
+    history = [newest]
+    async for msg in recent[1:]:
+        entry = {"role": msg.role, "content": msg.content}
+        cost = message_tokens(entry)
+        if cost > remaining:
+            break
+        history.append(entry)
+        remaining -= cost
+    return head + history[::-1]
+
+
+def _pending_threshold():
+    return getattr(settings, "CHATBOT_SUMMARY_KEEP", 4) + 2 * getattr(settings, "CHATBOT_SUMMARY_EVERY", 4)
+
+
+async def summary_due(conv):
+    """Whether enough unsummarized messages have piled up for `refresh_summary` to fold some."""
+    pending = Message.objects.filter(conversation=conv, id__gt=conv.summarized_until_id)
+    return await pending.acount() >= _pending_threshold()
+
+
+async def refresh_summary(conv):
+    """Fold older turns into `conv.summary` once enough have piled up.
+
+    Safe to run concurrently: the update only applies if nobody else moved
+    `summarized_until_id` in the meantime.
+    """
+    keep = getattr(settings, "CHATBOT_SUMMARY_KEEP", 4)
+    pending = [
+        msg
+        async for msg in Message.objects.filter(conversation=conv, id__gt=conv.summarized_until_id)
+        .order_by("id")
+        .only("id", "role", "content")
+    ]
+    if len(pending) < _pending_threshold():
+        return False
+
+    fold = pending[: len(pending) - keep]
+    transcript = "\n".join(f"{m.role}: {m.content}" for m in fold)
+    try:
+        completion = await llm.chat_completion(
+            [
+                {
+                    "role": "system",
+                    "content": "You maintain a running summary of a support chat. Merge the new messages into the "
+                    "existing summary. Keep facts, names, decisions and open questions; drop pleasantries. "
+                    "Reply with the updated summary only.",
+                },
+                {
+                    "role": "user",
+                    "content": f"Existing summary:\n{conv.summary or '(none)'}\n\nNew messages:\n{transcript}",
+                },
+            ],
+            model=getattr(settings, "CHATBOT_SUMMARY_MODEL", "gpt-3.5-turbo"),
+            temperature=0,
+            max_tokens=getattr(settings, "CHATBOT_SUMMARY_MAX_TOKENS", 300),
+        )
+    except llm.LLMError as e:
+        # Harmless: the next turn tries again, the budget keeps prompts bounded.
+        logger.warning("Chatbot summary refresh failed for conversation %s: %s", conv.id, e)
+        return False
+
+    # Background work for the tenant: counted, but never refused.
+    quotas.record(conv.tenant_id, "chatbot", completion["total_tokens"])
+    summary = completion["content"].strip()
+    updated = await Conversation.objects.filter(id=conv.id, summarized_until_id=conv.summarized_until_id).aupdate(
+        summary=summary, summarized_until_id=fold[-1].id
+    )
+    if updated:
+        conv.summary, conv.summarized_until_id = summary, fold[-1].id
+    return bool(updated)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='ttfb_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
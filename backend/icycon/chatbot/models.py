@@ -5,6 +5,10 @@ from tenants.models import Tenant
 class Conversation(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
     title = models.CharField(max_length=200, blank=True)
+    # Rolling summary of every message up to and including summarized_until_id
+    # (see chatbot.context); later messages are sent verbatim.
+    summary = models.TextField(blank=True)
+    summarized_until_id = models.BigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -26,6 +30,8 @@ class Message(models.Model):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
     content = models.TextField()
     tokens = models.IntegerField(null=True, blank=True)
+    # Streamed replies: ms from request receipt to the first token sent.
+    ttfb_ms = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
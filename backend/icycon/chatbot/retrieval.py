@@ -0,0 +1,380 @@
+"""
+Per-tenant BM25 retrieval over the tenant's own knowledge, for grounding
+chatbot replies.
+
+Sources are `seo.FAQ` (question + answer), `seo.ContentItem.draft_html`
+(tags stripped) and published `marketplace.Product` title + description.
+They are cut into passages of about `PASSAGE_WORDS` words. Each tenant
+gets an in-memory inverted index in every worker process, of which the
+`MAX_INDEXES` most recently searched stay loaded:
+
+* Terms map to ids. Postings are parallel `array`s of passage slots and
+  term frequencies, so 100k passages cost tens of MB rather than a dict
+  entry per posting.
+* Each term keeps a cached "impact-ordered" head: its `MAX_POSTINGS`
+  best postings by BM25 term score. A query only walks those heads, so its
+  cost is bounded by the number of query terms, not the corpus size. This
+  is the usual early-termination trade-off: a document can be missed only
+  if none of its terms put it in a head.
+* Edits are incremental. Signals (see `chatbot.signals`) re-index the
+  changed source after commit. Deleted passages leave tombstones that are
+  compacted away once they pile up.
+
+With a shared API cache (Redis), workers learn about each other's writes
+through a per-tenant generation kept there. A per-process cache (local
+memory, the default without `REDIS_URL`) can't carry those, so each
+worker only sees its own writes, and an index is rebuilt once it is older
+than `CHATBOT_RETRIEVAL_MAX_AGE` seconds. Indexes are built in a background
+thread, both the first time and when stale; a stale index keeps serving
+meanwhile.
+
+Only the passage keys are held in memory. The text of the top-k hits is
+re-read from the database.
+"""
+
+import html
+import logging
+import math
+import re
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils.html import strip_tags
+
+from icycon.response_cache import get_cache, is_shared
+from marketplace.models import Product
+from seo.models import FAQ, ContentItem
+
+logger = logging.getLogger(__name__)
+
+K1 = 1.2
+B = 0.75
+PASSAGE_WORDS = 120
+MAX_POSTINGS = 1000
+MAX_INDEXES = 64
+GENERATION_PREFIX = "chatbot:retrieval-gen:"
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in into is it its me my no not of on or "
+    "our so that the their them then there these they this to was we were what when where which who why will with "
+    "you your".split()
+)
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS and len(word) < 40]
+
+
+def _faq_text(question, answer):
+    return f"Q: {question}\nA: {answer}"
+
+
+def _html_text(value):
+    return html.unescape(strip_tags(value))
+
+
+def _product_text(title, description):
+    return f"{title}\n{description}"
+
+
+# kind -> (queryset of indexable rows for a tenant, fields, text builder)
+SOURCES = {
+    "faq": (lambda tenant_id: FAQ.objects.filter(tenant_id=tenant_id), ("question", "answer"), _faq_text),
+    "content": (
+        lambda tenant_id: ContentItem.objects.filter(tenant_id=tenant_id).exclude(draft_html=""),
+        ("draft_html",),
+        _html_text,
+    ),
+    "product": (
+        lambda tenant_id: Product.objects.filter(tenant_id=tenant_id, status="published"),
+        ("title", "description"),
+        _product_text,
+    ),
+}
+
+
+def passages(text):
+    words = text.split()
+    return [" ".join(words[i:i + PASSAGE_WORDS]) for i in range(0, len(words), PASSAGE_WORDS)]
+
+
+class TenantIndex:
+    def __init__(self, tenant_id, generation):
+        self.tenant_id = tenant_id
+        self.generation = generation
+        self.built_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.term_ids = {}
+        self.post_slots = []  # term id -> array of passage slots
+        self.post_tfs = []  # term id -> array of term frequencies
+        self.doc_terms = []  # slot -> array of term ids (None once deleted)
+        self.doc_tfs = []  # slot -> array of term frequencies
+        self.doc_len = array("I")  # slot -> passage length; 0 marks a tombstone
+        self.doc_keys = []  # slot -> (kind, pk, passage number)
+        self.by_source = {}  # (kind, pk) -> [slots]
+        self.live = 0
+        self.dead = 0
+        self.total_len = 0
+        self._heads = {}  # term id -> (slots, tfs, lowest impact) best-first
+
+    def __len__(self):
+        return self.live
+
+    def _avgdl(self):
+        return self.total_len / self.live if self.live else 1.0
+
+    def _impact(self, tf, dl, avgdl):
+        return tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl / avgdl))
+
+    # Updates ----------------------------------------------------------------
+    def add_source(self, kind, pk, text):
+        with self.lock:
+            self._remove(kind, pk)
+            slots = []
+            avgdl = self._avgdl()
+            for number, passage in enumerate(passages(text)):
+                tokens = tokenize(passage)
+                if not tokens:
+                    continue
+                slot = len(self.doc_keys)
+                counts = Counter(tokens)
+                term_ids, tfs = array("I"), array("H")
+                for term, tf in counts.items():
+                    tf = min(tf, 65535)
+                    term_id = self.term_ids.get(term)
+                    if term_id is None:
+                        term_id = self.term_ids[term] = len(self.post_slots)
+                        self.post_slots.append(array("I"))
+                        self.post_tfs.append(array("H"))
+                    self.post_slots[term_id].append(slot)
+                    self.post_tfs[term_id].append(tf)
+                    term_ids.append(term_id)
+                    tfs.append(tf)
+                    head = self._heads.get(term_id)
+                    # Only a posting that would make the head invalidates it.
+                    if head and (len(head[0]) < MAX_POSTINGS or self._impact(tf, len(tokens), avgdl) > head[2]):
+                        del self._heads[term_id]
+                self.doc_terms.append(term_ids)
+                self.doc_tfs.append(tfs)
+                self.doc_len.append(len(tokens))
+                self.doc_keys.append((kind, pk, number))
+                self.live += 1
+                self.total_len += len(tokens)
+                slots.append(slot)
+            if slots:
+                self.by_source[(kind, pk)] = slots
+
+    def remove_source(self, kind, pk):
+        with self.lock:
+            self._remove(kind, pk)
+
+    def _remove(self, kind, pk):
+        for slot in self.by_source.pop((kind, pk), ()):
+            for term_id in self.doc_terms[slot]:
+                head = self._heads.get(term_id)
+                if head and slot in head[0]:
+                    del self._heads[term_id]
+            self.total_len -= self.doc_len[slot]
+            self.doc_len[slot] = 0
+            self.doc_terms[slot] = self.doc_tfs[slot] = None
+            self.live -= 1
+            self.dead += 1
+        if self.dead > 1000 and self.dead > self.live // 4:
+            self._compact()
+
+    def _compact(self):
+        """Rebuild postings without tombstones (slots keep their numbers)."""
+        self.post_slots = [array("I") for _ in self.post_slots]
+        self.post_tfs = [array("H") for _ in self.post_tfs]
+        for slot, term_ids in enumerate(self.doc_terms):
+            if term_ids is None:
+                continue
+            for term_id, tf in zip(term_ids, self.doc_tfs[slot]):
+                self.post_slots[term_id].append(slot)
+                self.post_tfs[term_id].append(tf)
+        self._heads.clear()
+        self.dead = 0
+
+    # Queries ----------------------------------------------------------------
+    def _head(self, term_id, avgdl):
+        head = self._heads.get(term_id)
+        if head is None:
+            doc_len = self.doc_len
+            ranked = sorted(
+                (
+                    (self._impact(tf, doc_len[slot], avgdl), slot, tf)
+                    for slot, tf in zip(self.post_slots[term_id], self.post_tfs[term_id])
+                    if doc_len[slot]
+                ),
+                reverse=True,
+            )[:MAX_POSTINGS]
+            head = self._heads[term_id] = (
+                array("I", (slot for _, slot, _ in ranked)),
+                array("H", (tf for _, _, tf in ranked)),
+                ranked[-1][0] if ranked else 0.0,
+            )
+        return head
+
+    def search(self, query, k=4):
+        """Top `k` passages as [(kind, pk, passage number, score)], best first."""
+        with self.lock:
+            if not self.live:
+                return []
+            avgdl = self._avgdl()
+            norm = K1 * (1 - B)
+            slope = K1 * B / avgdl
+            doc_len = self.doc_len
+            scores = {}
+            for term in set(tokenize(query)):
+                term_id = self.term_ids.get(term)
+                if term_id is None:
+                    continue
+                # Postings may still hold tombstones until the next compaction.
+                df = min(len(self.post_slots[term_id]), self.live)
+                idf = math.log(1 + (self.live - df + 0.5) / (df + 0.5))
+                slots, tfs, _ = self._head(term_id, avgdl)
+                for slot, tf in zip(slots, tfs):
+                    dl = doc_len[slot]
+                    if dl:
+                        scores[slot] = scores.get(slot, 0.0) + idf * tf * (K1 + 1) / (tf + norm + slope * dl)
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(*self.doc_keys[slot], score) for slot, score in best]
+
+
+# Process-wide registry --------------------------------------------------------
+_indexes = OrderedDict()
+_registry_lock = threading.Lock()
+_rebuilding = set()
+
+
+def _loaded(tenant_id):
+    with _registry_lock:
+        index = _indexes.get(tenant_id)
+        if index is not None:
+            _indexes.move_to_end(tenant_id)
+        return index
+
+
+def _store(tenant_id, index):
+    # Least recently searched tenants are dropped; they rebuild on next use.
+    with _registry_lock:
+        _indexes[tenant_id] = index
+        _indexes.move_to_end(tenant_id)
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+
+
+def current_generation(tenant_id):
+    cache = get_cache()
+    key = f"{GENERATION_PREFIX}{tenant_id}"
+    cache.add(key, 0, None)
+    return cache.get(key, 0)
+
+
+def bump_generation(tenant_id):
+    """Record a write to `tenant_id`'s sources; returns (old, new) generation."""
+    cache = get_cache()
+    key = f"{GENERATION_PREFIX}{tenant_id}"
+    cache.add(key, 0, None)
+    try:
+        new = cache.incr(key)
+    except ValueError:  # evicted between add() and incr()
+        cache.set(key, 1, None)
+        new = 1
+    return new - 1, new
+
+
+def build_index(tenant_id):
+    index = TenantIndex(tenant_id, current_generation(tenant_id))
+    for kind, (make_queryset, fields, to_text) in SOURCES.items():
+        for pk, *values in make_queryset(tenant_id).values_list("pk", *fields).iterator(chunk_size=2000):
+            index.add_source(kind, pk, to_text(*values))
+    return index
+
+
+def _rebuild_in_background(tenant_id):
+    with _registry_lock:
+        if tenant_id in _rebuilding:
+            return
+        _rebuilding.add(tenant_id)
+
+    def run():
+        try:
+            close_old_connections()
+            _store(tenant_id, build_index(tenant_id))
+        except Exception:
+            logger.exception("Rebuilding the retrieval index for tenant %s failed", tenant_id)
+        finally:
+            connection.close()
+            with _registry_lock:
+                _rebuilding.discard(tenant_id)
+
+    threading.Thread(target=run, name=f"retrieval-index-{tenant_id}", daemon=True).start()
+
+
+def get_index(tenant_id, wait=False):
+    """This process's index for `tenant_id`, or None while it is first built.
+
+    Builds (and, after other workers' writes, rebuilds) happen in a
+    background thread so a large tenant never stalls a chat request; a
+    stale index keeps serving meanwhile. `wait=True` builds a missing index
+    inline instead.
+    """
+    index = _loaded(tenant_id)
+    if index is None:
+        if not wait:
+            _rebuild_in_background(tenant_id)
+            return None
+        index = build_index(tenant_id)
+        _store(tenant_id, index)
+    elif _is_stale(index):
+        _rebuild_in_background(tenant_id)
+    return index
+
+
+def _is_stale(index):
+    if is_shared(get_cache()):
+        return index.generation != current_generation(index.tenant_id)
+    # Other workers' writes never reach this process: rebuild by age instead.
+    return time.monotonic() - index.built_at > getattr(settings, "CHATBOT_RETRIEVAL_MAX_AGE", 300)
+
+
+def reindex_source(tenant_id, kind, pk):
+    """Record a committed write to one source and re-index it in this
+    process, if this process's index saw every write before it."""
+    old, new = bump_generation(tenant_id)
+    index = _indexes.get(tenant_id)
+    if index is None or (is_shared(get_cache()) and index.generation != old):
+        return  # not loaded, or already stale: the next get_index() rebuilds
+    make_queryset, fields, to_text = SOURCES[kind]
+    row = make_queryset(tenant_id).filter(pk=pk).values_list(*fields).first()
+    if row is None:  # deleted, or no longer indexable (e.g. unpublished)
+        index.remove_source(kind, pk)
+    else:
+        index.add_source(kind, pk, to_text(*row))
+    index.generation = new
+
+
+def search(tenant_id, query, k=4):
+    """Top-`k` passages for `query` as [{"kind", "id", "text", "score"}]."""
+    index = get_index(tenant_id)
+    hits = index.search(query, k) if index is not None else []
+    by_kind = {}
+    for kind, pk, _, _ in hits:
+        by_kind.setdefault(kind, set()).add(pk)
+    texts = {}
+    for kind, pks in by_kind.items():
+        make_queryset, fields, to_text = SOURCES[kind]
+        for pk, *values in make_queryset(tenant_id).filter(pk__in=pks).values_list("pk", *fields):
+            texts[(kind, pk)] = passages(to_text(*values))
+    results = []
+    for kind, pk, number, score in hits:
+        chunks = texts.get((kind, pk))
+        if chunks and number < len(chunks):
+            results.append({"kind": kind, "id": pk, "text": chunks[number], "score": round(score, 4)})
+    return results
@@ -0,0 +1,23 @@
+"""Keep the chatbot retrieval indexes in step with the rows they cover."""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from marketplace.models import Product
+from seo.models import FAQ, ContentItem
+
+from . import retrieval
+
+# model -> kind in retrieval.SOURCES
+INDEXED = {FAQ: "faq", ContentItem: "content", Product: "product"}
+
+
+def _reindex(sender, instance, **kwargs):
+    kind, tenant_id, pk = INDEXED[sender], instance.tenant_id, instance.pk
+    # After commit, so no worker rebuilds from rows that may still roll back.
+    transaction.on_commit(lambda: retrieval.reindex_source(tenant_id, kind, pk))
+
+
+for model in INDEXED:
+    label = model._meta.label
+    post_save.connect(_reindex, sender=model, dispatch_uid=f"chatbot-retrieval:save:{label}")
+    post_delete.connect(_reindex, sender=model, dispatch_uid=f"chatbot-retrieval:delete:{label}")
@@ -61,10 +61,13 @@ class ChatWidget {
         this.messagesDiv.scrollTop = this.messagesDiv.scrollHeight;
 
         try {
-            const response = await fetch('/api/chatbot/send/', {
+            // Replies are streamed as Server-Sent Events; EventSource can't
+            // POST, so read the event stream off fetch() instead.
+            const response = await fetch('/api/chat/stream/', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream',
                     'X-CSRFToken': this.getCookie('csrftoken')
                 },
                 body: JSON.stringify({
@@ -74,13 +77,12 @@ class ChatWidget {
                 })
             });
 
-            const data = await response.json();
-            if (response.ok) {
-                this.conversationId = data.conversation;
-                this.addMessage(data.reply, 'assistant');
-            } else {
+            if (!response.ok) {
+                const data = await response.json();
                 this.addMessage('Sorry, I encountered an error. Please try again.', 'assistant');
                 console.error('Chat error:', data.error);
+            } else {
+                await this.readStream(response);
             }
         } catch (error) {
             console.error('Network error:', error);
@@ -91,12 +93,54 @@ class ChatWidget {
         this.typingIndicator.classList.remove('visible');
     }
 
+    async readStream(response) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let reply = null;
+
+        for (;;) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // Events are separated by a blank line; keep any partial tail.
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            for (const raw of events) {
+                let event = 'message';
+                let data = '';
+                for (const line of raw.split('\n')) {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                if (!data) continue;
+                const payload = JSON.parse(data);
+
+                if (event === 'start') {
+                    this.conversationId = payload.conversation;
+                } else if (event === 'message') {
+                    if (!reply) {
+                        this.typingIndicator.classList.remove('visible');
+                        reply = this.addMessage('', 'assistant');
+                    }
+                    reply.textContent += payload.delta;
+                    this.messagesDiv.scrollTop = this.messagesDiv.scrollHeight;
+                } else if (event === 'error') {
+                    this.addMessage('Sorry, I encountered an error. Please try again.', 'assistant');
+                    console.error('Chat error:', payload.error);
+                }
+            }
+        }
+    }
+
     addMessage(text, role) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `${role}-message chat-message`;
         messageDiv.textContent = text;
         this.messagesDiv.appendChild(messageDiv);
         this.messagesDiv.scrollTop = this.messagesDiv.scrollHeight;
+        return messageDiv;
     }
 
     getCookie(name) {
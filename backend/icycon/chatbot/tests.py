@@ -1 +1,424 @@
-from django.test import TestCase
\ No newline at end of file
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from icycon import llm, quotas
+from seo.models import FAQ
+from tenants.models import Tenant, TenantUser
+from users.authentication import issue_tokens
+from . import retrieval
+from .context import build_context, message_tokens, refresh_summary
+from .models import Conversation, Message
+
+
+class FakeOpenAI:
+    """A local OpenAI-compatible `/v1/chat/completions` server.
+
+    `latency` delays every reply, `fail_first` answers that many requests
+    with a 503 first, `token_delay` spaces out streamed (`stream: true`)
+    chunks. `requests` and `peak_concurrency` record what the gateway
+    actually sent.
+    """
+
+    def __init__(self, latency=0.0, fail_first=0, token_delay=0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.fail_first = fail_first
+        self.requests = []
+        self.active = 0
+        self.peak_concurrency = 0
+        self.lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake.lock:
+                    fake.requests.append(body)
+                    fake.active += 1
+                    fake.peak_concurrency = max(fake.peak_concurrency, fake.active)
+                    fail = len(fake.requests) <= fake.fail_first
+                try:
+                    time.sleep(fake.latency)
+                    if fail:
+                        self._reply(503, {"error": {"message": "overloaded"}})
+                        return
+                    prompt = body["messages"][-1]["content"]
+                    if body.get("stream"):
+                        self._stream(f"echo: {prompt}", len(prompt.split()) + 2)
+                        return
+                    self._reply(200, {
+                        "choices": [{"message": {"role": "assistant", "content": f"echo: {prompt}"}}],
+                        "usage": {"total_tokens": len(prompt.split()) + 2},
+                    })
+                finally:
+                    with fake.lock:
+                        fake.active -= 1
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, content, total_tokens):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for word in content.split(" "):
+                    chunk = {"choices": [{"delta": {"content": word + " "}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(fake.token_delay)
+                usage = {"choices": [], "usage": {"total_tokens": total_tokens}}
+                self.wfile.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def gateway_settings(fake, **overrides):
+    return override_settings(
+        OPENAI_API_KEY="test-key",
+        OPENAI_BASE_URL=fake.base_url,
+        LLM_BACKOFF_BASE=0.01,
+        LLM_BACKOFF_MAX=0.05,
+        EMAIL_HOST="",
+        **{"LLM_USAGE_FLUSH_SECONDS": 3600, **overrides},
+    )
+
+
+def ask(prompt):
+    return llm.chat_completion([{"role": "user", "content": prompt}], model="test-model")
+
+
+class LLMGatewayTests(TestCase):
+    async def test_identical_inflight_prompts_share_one_upstream_call(self):
+        with FakeOpenAI(latency=0.2) as fake, gateway_settings(fake):
+            results = await asyncio.gather(*(ask("same prompt") for _ in range(10)))
+        self.assertEqual(len(fake.requests), 1)
+        self.assertEqual({r["content"] for r in results}, {"echo: same prompt"})
+
+    async def test_concurrency_is_bounded(self):
+        with FakeOpenAI(latency=0.1) as fake, gateway_settings(fake, LLM_MAX_CONCURRENCY=2):
+            await asyncio.gather(*(ask(f"prompt {i}") for i in range(6)))
+        self.assertEqual(len(fake.requests), 6)
+        self.assertLessEqual(fake.peak_concurrency, 2)
+
+    async def test_transient_errors_are_retried(self):
+        with FakeOpenAI(fail_first=2) as fake, gateway_settings(fake, LLM_MAX_RETRIES=2):
+            result = await ask("hello")
+        self.assertEqual(result["content"], "echo: hello")
+        self.assertEqual(len(fake.requests), 3)
+
+    async def test_gives_up_after_retries(self):
+        with FakeOpenAI(fail_first=5) as fake, gateway_settings(fake, LLM_MAX_RETRIES=1):
+            with self.assertRaises(llm.LLMError):
+                await ask("hello")
+        self.assertEqual(len(fake.requests), 2)
+
+    async def test_slow_upstream_times_out(self):
+        with FakeOpenAI(latency=1.0) as fake, gateway_settings(fake, LLM_TIMEOUT=0.1, LLM_MAX_RETRIES=0):
+            with self.assertRaises(llm.LLMError):
+                await ask("hello")
+
+
+class LLMClientLifetimeTests(TestCase):
+    def test_client_is_closed_with_its_event_loop(self):
+        async def completion():
+            await ask("hello")
+            return (await llm._state()).client
+
+        with FakeOpenAI() as fake, gateway_settings(fake):
+            # Each WSGI request runs async views on a fresh loop like this one.
+            client = asyncio.run(completion())
+        self.assertTrue(client.is_closed)
+
+
+class SendMessageViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with override_settings(EMAIL_HOST=""):
+            cls.user = get_user_model().objects.create_user(username="chat", email="chat@example.com", password="pw")
+        cls.tenant = Tenant.objects.create(name="Acme", region="US")
+        TenantUser.objects.create(user=cls.user, tenant=cls.tenant, role="owner")
+        cls.auth = f"Bearer {issue_tokens(cls.user)['token']}"
+
+    def setUp(self):
+        quotas._buckets.clear()
+        self.addCleanup(quotas._pending.clear)
+
+    def post(self, client, message):
+        return client.post(
+            reverse("chatbot:send_message"),
+            data=json.dumps({"tenant": self.tenant.id, "message": message}),
+            content_type="application/json",
+            headers={"Authorization": self.auth},
+        )
+
+    async def test_reply_is_stored_with_token_count(self):
+        with FakeOpenAI() as fake, gateway_settings(fake):
+            response = await self.post(self.async_client, "where are my reports")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["reply"], "echo: where are my reports")
+        stored = await Message.objects.aget(pk=body["message_id"])
+        self.assertEqual((stored.role, stored.tokens), ("assistant", body["tokens"]))
+
+    async def test_unauthenticated_is_rejected(self):
+        response = await self.async_client.post(reverse("chatbot:send_message"), data={}, content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+
+    async def test_slow_completions_overlap_instead_of_queueing(self):
+        # Eight requests against a 0.3s upstream: handled one worker-slot at a
+        # time they'd take ~2.4s; on the event loop they overlap.
+        latency, n = 0.3, 8
+        limits = {"free": {"tokens_per_minute": 60000, "burst": 60000, "concurrency": n}}
+        with FakeOpenAI(latency=latency) as fake, gateway_settings(fake, LLM_PLAN_LIMITS=limits):
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(self.post(self.async_client, f"question {i}") for i in range(n)))
+            elapsed = time.perf_counter() - start
+        self.assertEqual({r.status_code for r in responses}, {200})
+        self.assertGreater(fake.peak_concurrency, 1)
+        self.assertLess(elapsed, latency * n / 2, f"{n} requests took {elapsed:.2f}s")
+
+    async def test_over_concurrency_is_refused_without_calling_the_llm(self):
+        limits = {"free": {"tokens_per_minute": 60000, "burst": 60000, "concurrency": 1}}
+        with FakeOpenAI(latency=0.3) as fake, gateway_settings(fake, LLM_PLAN_LIMITS=limits):
+            first, second = await asyncio.gather(
+                self.post(self.async_client, "first"),
+                self.post(self.async_client, "second"),
+            )
+        self.assertEqual(sorted([first.status_code, second.status_code]), [200, 429])
+        refused = first if first.status_code == 429 else second
+        self.assertGreaterEqual(int(refused["Retry-After"]), 1)
+        self.assertEqual(len(fake.requests), 1)
+
+    async def test_stream_relays_tokens_then_stores_reply(self):
+        with FakeOpenAI(latency=0.05, token_delay=0.05) as fake, gateway_settings(fake):
+            response = await self.async_client.post(
+                reverse("chatbot:stream_message"),
+                data=json.dumps({"tenant": self.tenant.id, "message": "one two three"}),
+                content_type="application/json",
+                headers={"Authorization": self.auth},
+            )
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            events = []
+            async for chunk in response.streaming_content:
+                for block in chunk.decode().strip().split("\n\n"):
+                    lines = dict(line.split(": ", 1) for line in block.split("\n"))
+                    events.append((lines.get("event", "message"), json.loads(lines["data"])))
+
+        names = [name for name, _ in events]
+        self.assertEqual((names[0], names[-1]), ("start", "done"))
+        self.assertGreater(names.count("message"), 1)
+        reply = "".join(data["delta"] for name, data in events if name == "message")
+        done = events[-1][1]
+        stored = await Message.objects.aget(pk=done["message_id"])
+        self.assertEqual(stored.content, reply)
+        self.assertEqual(stored.tokens, done["tokens"])
+        self.assertIsNotNone(stored.ttfb_ms)
+        self.assertEqual(fake.requests[0]["stream"], True)
+
+
+    async def test_unread_stream_releases_its_slot_on_close(self):
+        limits = {"free": {"tokens_per_minute": 60000, "burst": 60000, "concurrency": 1}}
+        with FakeOpenAI() as fake, gateway_settings(fake, LLM_PLAN_LIMITS=limits):
+            response = await self.async_client.post(
+                reverse("chatbot:stream_message"),
+                data=json.dumps({"tenant": self.tenant.id, "message": "hello"}),
+                content_type="application/json",
+                headers={"Authorization": self.auth},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(quotas._buckets[self.tenant.id].inflight, 1)
+            response.close()
+            self.assertEqual(quotas._buckets[self.tenant.id].inflight, 0)
+        self.assertEqual(fake.requests, [])
+
+
+class SummaryRefreshTests(TransactionTestCase):
+    def setUp(self):
+        with override_settings(EMAIL_HOST=""):
+            self.user = get_user_model().objects.create_user(username="sum", email="sum@example.com", password="pw")
+        self.tenant = Tenant.objects.create(name="Acme", region="US")
+        TenantUser.objects.create(user=self.user, tenant=self.tenant, role="owner")
+        self.conv = Conversation.objects.create(tenant=self.tenant)
+        Message.objects.bulk_create(
+            Message(conversation=self.conv, sender=self.user, role="user", content=f"message {i}") for i in range(11)
+        )
+        quotas._buckets.clear()
+        self.addCleanup(quotas._pending.clear)
+
+    def test_summary_refresh_outlives_a_wsgi_request(self):
+        # The sync test client goes through async_to_sync, as a WSGI worker does.
+        with FakeOpenAI() as fake, gateway_settings(
+            fake, CHATBOT_SUMMARY_EVERY=4, CHATBOT_SUMMARY_KEEP=4, CHATBOT_RETRIEVAL_TOP_K=0
+        ):
+            response = self.client.post(
+                reverse("chatbot:send_message"),
+                data=json.dumps({"tenant": self.tenant.id, "conversation": self.conv.id, "message": "hi"}),
+                content_type="application/json",
+                headers={"Authorization": f"Bearer {issue_tokens(self.user)['token']}"},
+            )
+            self.assertEqual(response.status_code, 200)
+            for thread in threading.enumerate():
+                if thread.name == f"chatbot-summary-{self.conv.id}":
+                    thread.join(5)
+        self.conv.refresh_from_db()
+        self.assertTrue(self.conv.summary.startswith("echo: Existing summary"))
+        self.assertEqual(len(fake.requests), 2)
+
+
+class ContextBuilderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with override_settings(EMAIL_HOST=""):
+            cls.user = get_user_model().objects.create_user(username="ctx", email="ctx@example.com", password="pw")
+        cls.tenant = Tenant.objects.create(name="Acme", region="US")
+        cls.conv = Conversation.objects.create(tenant=cls.tenant)
+        cls.msgs = [
+            Message.objects.create(
+                conversation=cls.conv,
+                sender=cls.user,
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"message {i} " + "lorem ipsum dolor " * 40,
+            )
+            for i in range(12)
+        ]
+
+    @override_settings(CHATBOT_CONTEXT_BUDGETS={"free": 600})
+    async def test_history_is_packed_newest_first_within_budget(self):
+        messages = await build_context(self.conv, self.tenant, "system prompt")
+        self.assertLessEqual(sum(message_tokens(m) for m in messages), 600)
+        self.assertEqual(messages[0]["role"], "system")
+        self.assertEqual(messages[-1]["content"], self.msgs[-1].content)
+        self.assertLess(len(messages) - 1, len(self.msgs))
+
+    @override_settings(CHATBOT_CONTEXT_BUDGETS={"free": 400}, CHATBOT_MESSAGE_RESERVE=1000)
+    async def test_summary_and_passages_give_way_to_the_newest_message(self):
+        self.conv.summary = "summary " * 400
+        passages = ["passage " * 100, "another passage " * 100]
+        messages = await build_context(self.conv, self.tenant, "system prompt " * 20, passages)
+        self.assertEqual(messages[-1]["content"], self.msgs[-1].content)
+        self.assertNotIn("passage", messages[0]["content"])
+        self.assertTrue(messages[1]["content"].startswith("Summary of the earlier conversation"))
+        self.assertEqual(len(messages), 3)
+        self.assertLessEqual(sum(message_tokens(m) for m in messages), 400)
+
+        # With room to spare the top passage goes in too.
+        with override_settings(CHATBOT_CONTEXT_BUDGETS={"free": 2000}):
+            messages = await build_context(self.conv, self.tenant, "system prompt", passages[:1])
+        self.assertIn("Relevant information from this site", messages[0]["content"])
+        self.assertIn(passages[0].strip(), messages[0]["content"])
+
+    async def test_older_turns_are_folded_into_the_summary(self):
+        self.addCleanup(quotas._pending.clear)
+        with FakeOpenAI() as fake, gateway_settings(fake, CHATBOT_SUMMARY_EVERY=4, CHATBOT_SUMMARY_KEEP=4):
+            self.assertTrue(await refresh_summary(self.conv))
+            # Nothing new since: no second call.
+            self.assertFalse(await refresh_summary(self.conv))
+        self.assertEqual(len(fake.requests), 1)
+
+        conv = await Conversation.objects.aget(pk=self.conv.pk)
+        self.assertEqual(conv.summarized_until_id, self.msgs[-5].id)
+        self.assertTrue(conv.summary.startswith("echo: Existing summary"))
+
+        messages = await build_context(conv, self.tenant, "system prompt")
+        self.assertTrue(messages[1]["content"].startswith("Summary of the earlier conversation"))
+        self.assertEqual([m["content"] for m in messages[2:]], [m.content for m in self.msgs[-4:]])
+
+
+class RetrievalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with override_settings(EMAIL_HOST=""):
+            cls.user = get_user_model().objects.create_user(username="kb", email="kb@example.com", password="pw")
+        cls.tenant = Tenant.objects.create(name="Acme", region="US")
+        TenantUser.objects.create(user=cls.user, tenant=cls.tenant, role="owner")
+        cls.auth = f"Bearer {issue_tokens(cls.user)['token']}"
+        FAQ.objects.create(tenant=cls.tenant, question="What is your refund policy?", answer="Refunds within 30 days.")
+        FAQ.objects.create(tenant=cls.tenant, question="Do you ship abroad?", answer="We ship to 40 countries.")
+        other = Tenant.objects.create(name="Other", region="US")
+        FAQ.objects.create(tenant=other, question="Refund policy?", answer="No refunds, ever.")
+
+    def setUp(self):
+        retrieval._indexes.clear()
+        self.addCleanup(quotas._pending.clear)
+
+    def test_top_passages_come_from_the_tenant_only(self):
+        retrieval.get_index(self.tenant.id, wait=True)
+        hits = retrieval.search(self.tenant.id, "how do refunds work? refund", k=2)
+        self.assertIn("Refunds within 30 days.", hits[0]["text"])
+        self.assertNotIn("No refunds, ever.", " ".join(h["text"] for h in hits))
+
+    def test_without_a_shared_cache_indexes_are_rebuilt_by_age(self):
+        index = retrieval.get_index(self.tenant.id, wait=True)
+        # Another worker's write: no signal here, and no generation it could bump.
+        retrieval.bump_generation(self.tenant.id)
+        with override_settings(CHATBOT_RETRIEVAL_MAX_AGE=300):
+            self.assertFalse(retrieval._is_stale(index))
+        index.built_at -= 301
+        with override_settings(CHATBOT_RETRIEVAL_MAX_AGE=300):
+            self.assertTrue(retrieval._is_stale(index))
+
+    def test_with_a_shared_cache_generations_mark_indexes_stale(self):
+        index = retrieval.get_index(self.tenant.id, wait=True)
+        shared = retrieval.is_shared
+        retrieval.is_shared = lambda cache: True
+        self.addCleanup(setattr, retrieval, "is_shared", shared)
+        self.assertFalse(retrieval._is_stale(index))
+        retrieval.bump_generation(self.tenant.id)
+        self.assertTrue(retrieval._is_stale(index))
+
+    def test_least_recently_searched_indexes_are_dropped(self):
+        self.addCleanup(setattr, retrieval, "MAX_INDEXES", retrieval.MAX_INDEXES)
+        retrieval.MAX_INDEXES = 2
+        tenants = [self.tenant.id, self.tenant.id + 1, self.tenant.id + 2]
+        for tenant_id in tenants[:2]:
+            retrieval.get_index(tenant_id, wait=True)
+        retrieval.get_index(tenants[0])  # now the most recent
+        retrieval.get_index(tenants[2], wait=True)
+        self.assertEqual(list(retrieval._indexes), [tenants[0], tenants[2]])
+
+    def test_index_follows_edits_after_commit(self):
+        retrieval.get_index(self.tenant.id, wait=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            faq = FAQ.objects.create(tenant=self.tenant, question="Is there a loyalty program?", answer="Yes, points.")
+        self.assertEqual(retrieval.search(self.tenant.id, "loyalty", k=1)[0]["id"], faq.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            faq.delete()
+        self.assertEqual(retrieval.search(self.tenant.id, "loyalty", k=1), [])
+
+    def test_send_message_injects_passages_into_the_prompt(self):
+        retrieval.get_index(self.tenant.id, wait=True)
+        with FakeOpenAI() as fake, gateway_settings(fake):
+            response = self.client.post(
+                reverse("chatbot:send_message"),
+                data=json.dumps({"tenant": self.tenant.id, "message": "Can I get a refund?"}),
+                content_type="application/json",
+                headers={"Authorization": self.auth},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Refunds within 30 days.", fake.requests[0]["messages"][0]["content"])
@@ -5,4 +5,5 @@ app_name = 'chatbot'
 
 urlpatterns = [
     path('send/', views.send_message, name='send_message'),
+    path('stream/', views.stream_message, name='stream_message'),
 ]
\ No newline at end of file
@@ -1,15 +1,23 @@
-import os
-import openai
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
 from django.conf import settings
-from tenants.models import Tenant, TenantUser
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.http import JsonResponse, StreamingHttpResponse
+
+from icycon import llm, quotas
+from icycon.async_api import async_api_view
+from tenants.models import Tenant
+from . import retrieval
+from .context import build_context, refresh_summary, summary_due
 from .models import Conversation, Message
 
-# Set OpenAI API key from settings
-openai.api_key = settings.OPENAI_API_KEY
+logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """
 You are an AI assistant helping users navigate the website for {{tenant_name}}.
@@ -25,91 +33,227 @@ You can help with:
 Always stay factual and if unsure, ask for clarification.
 """
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def send_message(request):
+# Same generation parameters for the blocking and the streaming endpoint.
+COMPLETION_PARAMS = {
+    'model': "gpt-4",  # or gpt-3.5-turbo for lower cost
+    'max_tokens': 512,
+    'temperature': 0.7,
+    'presence_penalty': 0.6,  # Encourage varied responses
+}
+
+
+# Strong references to in-flight summary refreshes (the loop only keeps weak ones).
+_background_tasks = set()
+
+
+async def _refresh_summary_later(request, conv):
+    """Refresh the rolling summary after the reply has gone out, if it is due.
+
+    Under ASGI the server's event loop outlives the request, so the refresh
+    is a task on it. Otherwise the view runs on a loop that async_to_sync
+    closes once the response is returned, destroying any task still
+    pending, so the refresh gets a thread of its own.
     """
-    Accept a message from a user and return an AI-generated response.
-    Requires authentication and valid tenant membership.
+    if not await summary_due(conv):
+        return
+    if isinstance(request._request, ASGIRequest):
+        task = asyncio.ensure_future(refresh_summary(conv))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    else:
+        threading.Thread(
+            target=_refresh_summary_in_thread, args=(conv,), name=f"chatbot-summary-{conv.id}", daemon=True
+        ).start()
+
+
+def _refresh_summary_in_thread(conv):
+    try:
+        async_to_sync(refresh_summary)(conv)
+    except Exception:
+        logger.exception("Chatbot summary refresh failed for conversation %s", conv.id)
+    finally:
+        connection.close()
+
+
+async def _start_turn(request):
+    """
+    Validate the request, admit it against the tenant's LLM quota, store
+    the user's message and build the prompt. Returns (conversation,
+    messages, lease, None) or (None, None, None, error response); the
+    caller must release the lease with the tokens used.
     """
-    user = request.user
     tenant_id = request.data.get('tenant')
     text = request.data.get('message', '').strip()
     conversation_id = request.data.get('conversation')
 
     # Validate inputs
     if not tenant_id or not text:
-        return Response({'error': 'Both tenant and message are required'}, status=400)
+        return None, None, None, JsonResponse({'error': 'Both tenant and message are required'}, status=400)
     if len(text) > 1000:  # Reasonable limit for message length
-        return Response({'error': 'Message too long'}, status=400)
+        return None, None, None, JsonResponse({'error': 'Message too long'}, status=400)
 
     # Verify tenant access
+    if not request.tenant_ctx.has_tenant(tenant_id):
+        return None, None, None, JsonResponse({'error': 'Invalid tenant or unauthorized'}, status=403)
+    tenant = await Tenant.objects.filter(id=tenant_id).afirst()
+    if tenant is None:
+        return None, None, None, JsonResponse({'error': 'Invalid tenant or unauthorized'}, status=403)
+
+    # Refuse over-quota tenants before doing any work for them
+    try:
+        lease = quotas.acquire(tenant.id, tenant.plan, 'chatbot')
+    except quotas.QuotaExceeded as exc:
+        return None, None, None, quotas.quota_response(exc)
     try:
-        tenant = Tenant.objects.get(id=tenant_id)
-        TenantUser.objects.get(user=user, tenant=tenant)
-    except (Tenant.DoesNotExist, TenantUser.DoesNotExist):
-        return Response({'error': 'Invalid tenant or unauthorized'}, status=403)
+        conv, messages = await _prepare_turn(request, tenant, text, conversation_id)
+    except BaseException:
+        lease.release()
+        raise
+    if conv is None:
+        lease.release()
+        return None, None, None, JsonResponse({'detail': 'Not found.'}, status=404)
+    return conv, messages, lease, None
 
+
+async def _prepare_turn(request, tenant, text, conversation_id):
+    """Store the user's message and build the prompt; (None, None) if the
+    conversation doesn't exist."""
     # Get or create conversation
     if conversation_id:
-        conv = get_object_or_404(Conversation, id=conversation_id, tenant=tenant)
+        conv = await Conversation.objects.filter(id=conversation_id, tenant=tenant).afirst()
+        if conv is None:
+            return None, None
     else:
-        conv = Conversation.objects.create(
+        conv = await Conversation.objects.acreate(
             tenant=tenant,
             title=text[:50] + ('...' if len(text) > 50 else '')
         )
 
     # Store user message
-    user_msg = Message.objects.create(
+    await Message.objects.acreate(
         conversation=conv,
-        sender=user,
+        sender_id=request.user.pk,
         role='user',
         content=text
     )
 
-    # Build context for AI (include recent history)
-    recent_msgs = Message.objects.filter(conversation=conv).order_by('-created_at')[:6]
+    # Ground the reply in the tenant's own FAQs, content and products
     system_content = SYSTEM_PROMPT.replace("{{tenant_name}}", tenant.name)
-    messages = [
-        {"role": "system", "content": system_content}
-    ] + [
-        {"role": m.role, "content": m.content}
-        for m in reversed(recent_msgs)  # Chronological order
-    ]
+    top_k = getattr(settings, 'CHATBOT_RETRIEVAL_TOP_K', 4)
+    passages = await sync_to_async(retrieval.search)(tenant.id, text, top_k) if top_k else []
+
+    # Summary, passages and as much recent history as the tenant's token budget allows
+    messages = await build_context(conv, tenant, system_content, [p['text'] for p in passages])
+    return conv, messages
+
+
+@async_api_view(['POST'])
+async def send_message(request):
+    """
+    Accept a message from a user and return an AI-generated response.
+    Requires authentication and valid tenant membership.
+    """
+    conv, messages, lease, error = await _start_turn(request)
+    if error:
+        return error
 
     try:
-        # Call OpenAI
-        response = openai.ChatCompletion.create(
-            model="gpt-4",  # or gpt-3.5-turbo for lower cost
-            messages=messages,
-            max_tokens=512,
-            temperature=0.7,
-            presence_penalty=0.6  # Encourage varied responses
+        completion = await llm.chat_completion(messages, **COMPLETION_PARAMS)
+    except llm.LLMError as e:
+        lease.release()
+        # Log the error but don't expose details to client
+        logger.error("Chatbot completion failed: %s", e)
+        return JsonResponse(
+            {'error': 'Unable to generate response. Please try again.'},
+            status=500
         )
+    except BaseException:
+        lease.release()
+        raise
+    lease.release(completion['total_tokens'])
+
+    assistant_text = completion['content']
+    tokens_used = completion['total_tokens']
+
+    # Store assistant response
+    assistant_msg = await Message.objects.acreate(
+        conversation=conv,
+        sender_id=request.user.pk,  # or create a system user
+        role='assistant',
+        content=assistant_text,
+        tokens=tokens_used
+    )
+    await _refresh_summary_later(request, conv)
+
+    return JsonResponse({
+        'conversation': conv.id,
+        'message_id': assistant_msg.id,
+        'reply': assistant_text,
+        'tokens': tokens_used
+    })
+
 
-        assistant_text = response['choices'][0]['message']['content']
-        tokens_used = response['usage']['total_tokens']
+def _sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
-        # Store assistant response
-        assistant_msg = Message.objects.create(
+
+@async_api_view(['POST'])
+async def stream_message(request):
+    """
+    Streaming variant of send_message: relays the reply as Server-Sent Events.
+
+    Events: `start` ({conversation}), then unnamed `{delta}` events as tokens
+    arrive, then `done` ({message_id, tokens, ttfb_ms}) once the assistant
+    message is stored, or `error` if the completion fails midway.
+    """
+    received = time.monotonic()
+    conv, messages, lease, error = await _start_turn(request)
+    if error:
+        return error
+    try:
+        stream = llm.stream_chat_completion(messages, **COMPLETION_PARAMS)
+    except llm.LLMError as e:
+        lease.release()
+        logger.error("Chatbot completion failed: %s", e)
+        return JsonResponse({'error': 'Unable to generate response. Please try again.'}, status=500)
+    user_id = request.user.pk
+
+    async def events():
+        yield _sse({'conversation': conv.id}, 'start')
+        parts, ttfb_ms = [], None
+        try:
+            async for delta in stream:
+                if ttfb_ms is None:
+                    ttfb_ms = int((time.monotonic() - received) * 1000)
+                parts.append(delta)
+                yield _sse({'delta': delta})
+        except llm.LLMError as e:
+            logger.error("Chatbot stream failed: %s", e)
+            yield _sse({'error': 'Unable to generate response. Please try again.'}, 'error')
+            return
+        finally:
+            # Django 4.2 doesn't notice a client leaving mid-stream (uvicorn
+            # just drops the sends), so the completion is still read, and
+            # billed, to the end before this runs.
+            lease.release(stream.total_tokens)
+
+        assistant_msg = await Message.objects.acreate(
             conversation=conv,
-            sender=user,  # or create a system user
+            sender_id=user_id,
             role='assistant',
-            content=assistant_text,
-            tokens=tokens_used
+            content=''.join(parts),
+            tokens=stream.total_tokens,
+            ttfb_ms=ttfb_ms,
         )
+        logger.info("Chatbot stream: ttfb=%sms tokens=%s conversation=%s", ttfb_ms, stream.total_tokens, conv.id)
+        await _refresh_summary_later(request, conv)
+        yield _sse({'message_id': assistant_msg.id, 'tokens': stream.total_tokens, 'ttfb_ms': ttfb_ms}, 'done')
 
-        return Response({
-            'conversation': conv.id,
-            'message_id': assistant_msg.id,
-            'reply': assistant_text,
-            'tokens': tokens_used
-        })
-
-    except Exception as e:
-        # Log the error but don't expose details to client
-        print(f"OpenAI API error: {str(e)}")
-        return Response(
-            {'error': 'Unable to generate response. Please try again.'},
-            status=500
-        )
\ No newline at end of file
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    # If the response is closed before the stream is ever iterated, the
+    # generator's finally never runs; release the slot here (a no-op after it).
+    response._resource_closers.append(lambda: lease.release(stream.total_tokens))
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let a proxy buffer the stream
+    return response
@@ -2,10 +2,18 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from .models import EmailList, Contact, EmailTemplate, EmailFlow, EmailSend
+from .models import EmailList, Contact, EmailTemplate, EmailFlow, EmailSend, ListMembership, DomainCheck, SendThrottle, Suppression, EmailDailyStats, ContactImport, FlowStep, FlowEnrollment
 
 admin.site.register(EmailList)
 admin.site.register(Contact)
 admin.site.register(EmailTemplate)
 admin.site.register(EmailFlow)
 admin.site.register(EmailSend)
+admin.site.register(ListMembership)
+admin.site.register(DomainCheck)
+admin.site.register(SendThrottle)
+admin.site.register(Suppression)
+admin.site.register(EmailDailyStats)
+admin.site.register(ContactImport)
+admin.site.register(FlowStep)
+admin.site.register(FlowEnrollment)
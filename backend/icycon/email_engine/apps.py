@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EmailEngineConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'email_engine'
+
+    def ready(self):
+        """Keep materialized segment memberships in sync with contacts."""
+        import email_engine.signals  # noqa: F401
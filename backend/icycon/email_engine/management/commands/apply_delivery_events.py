@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from email_engine.services.events import drain
+
+
+class Command(BaseCommand):
+    help = 'Apply stored bounce/complaint events (and retry failed ones), every few seconds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Apply what is due once and exit')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=getattr(settings, 'EMAIL_EVENT_FLUSH_SECONDS', 2),
+            help='Seconds between runs',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            result = drain()
+            if result['processed'] or options['once']:
+                self.stdout.write(f"Applied {result['applied']} delivery events, {result['failed']} failed")
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,83 @@
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+from django.core.management.base import BaseCommand, CommandError
+
+from email_engine.services.smtp_pool import SMTPPool
+
+
+class Command(BaseCommand):
+    help = 'Compare messages/sec for a new SMTP connection per message against the pooled transport.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500, help='Messages per mode')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent senders (and pool size)')
+        parser.add_argument('--host', help='SMTP server to send to (default: a local aiosmtpd sink)')
+        parser.add_argument('--port', type=int, default=25)
+        parser.add_argument('--user', help='SMTP username')
+        parser.add_argument('--password', help='SMTP password')
+        parser.add_argument('--tls', action='store_true', help='Use STARTTLS')
+        parser.add_argument('--max-messages', type=int, default=100, help='Messages per pooled connection')
+
+    def handle(self, *args, **options):
+        host, port = options['host'], options['port']
+        controller = None
+        if not host:
+            controller = self._start_sink()
+            host, port = controller.hostname, controller.port
+
+        message = EmailMessage()
+        message['From'] = 'bench@example.com'
+        message['Subject'] = 'SMTP benchmark'
+        message.set_content('Hello from bench_smtp.\n' * 20)
+        payload = message.as_string()
+
+        num_messages, threads = options['messages'], options['threads']
+        modes = [('connect', 1), ('pooled', options['max_messages'])]
+        results = {}
+        try:
+            for label, max_messages in modes:
+                # max_messages=1 closes every session after one message: the old per-call connect.
+                pool = SMTPPool(
+                    host,
+                    port,
+                    username=options['user'],
+                    password=options['password'],
+                    use_tls=options['tls'],
+                    size=threads,
+                    max_messages=max_messages,
+                )
+                start = time.perf_counter()
+                with ThreadPoolExecutor(threads) as executor:
+                    list(executor.map(lambda i: pool.send('bench@example.com', [f'rcpt{i}@example.com'], payload), range(num_messages)))
+                elapsed = time.perf_counter() - start
+                pool.close()
+                results[label] = num_messages / elapsed
+                self.stdout.write(
+                    f'{label:>8}: {num_messages} messages in {elapsed:.2f}s '
+                    f'({results[label]:.1f} msg/s, {pool.connects} connections)'
+                )
+        finally:
+            if controller is not None:
+                controller.stop()
+
+        self.stdout.write(self.style.SUCCESS(f"Pooled sessions are {results['pooled'] / results['connect']:.1f}x faster"))
+
+    def _start_sink(self):
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError:
+            raise CommandError('Install aiosmtpd for the local sink (pip install aiosmtpd), or pass --host/--port.')
+
+        class Sink:
+            async def handle_DATA(self, server, session, envelope):
+                return '250 Message accepted'
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        controller = Controller(Sink(), hostname='127.0.0.1', port=port)
+        controller.start()
+        return controller
@@ -0,0 +1,48 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from email_engine.services.imports import detect_format, import_contacts, read_rows
+from tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or NDJSON file of contacts into a tenant, upserting by email a batch at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file ("-" for stdin)')
+        parser.add_argument('--tenant', type=int, required=True, help='Tenant id to import into')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Default: from the file name or content')
+        parser.add_argument('--batch-size', type=int, help='Rows per upsert (default EMAIL_IMPORT_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        if not Tenant.objects.filter(id=options['tenant']).exists():
+            raise CommandError(f"Unknown tenant {options['tenant']}")
+        started = time.monotonic()
+
+        def progress(stats):
+            rate = stats['rows'] / max(time.monotonic() - started, 1e-9)
+            self.stdout.write(
+                f"{stats['rows']} rows: {stats['created']} created, {stats['updated']} updated, "
+                f"{stats['invalid']} invalid, {stats['duplicates']} duplicates ({rate:.0f} rows/s)"
+            )
+
+        if options['path'] == '-':
+            stream = sys.stdin.buffer
+        else:
+            try:
+                stream = open(options['path'], 'rb')
+            except OSError as exc:
+                raise CommandError(str(exc))
+        with stream:
+            fmt = options['format'] or detect_format(options['path'], stream.peek(64) if hasattr(stream, 'peek') else b'')
+            stats = import_contacts(
+                options['tenant'], read_rows(stream, fmt), batch_size=options['batch_size'], progress=progress
+            )
+        for error in stats['errors']:
+            self.stderr.write(f"line {error['line']}: {error['error']} ({error['email']})")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['created'] + stats['updated']} contacts from {stats['rows']} rows"
+            f" ({stats['suppressed']} suppressed addresses left unsubscribed)"
+        ))
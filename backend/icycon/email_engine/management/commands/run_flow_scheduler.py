@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from email_engine.services.flows import run_due
+
+
+class Command(BaseCommand):
+    help = 'Advance email flow enrollments that are due (sends, waits, branches), every few seconds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run a single tick and exit')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=getattr(settings, 'EMAIL_FLOW_SCHEDULER_INTERVAL', 5),
+            help='Seconds between ticks when nothing is due',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = getattr(settings, 'EMAIL_FLOW_BATCH_SIZE', 500)
+        while True:
+            close_old_connections()
+            result = run_due()
+            if result['processed'] or options['once']:
+                self.stdout.write(
+                    f"Advanced {result['processed']} enrollments: {result.get('sends', 0)} sends queued, "
+                    f"{result.get('completed', 0)} completed, {result.get('exited', 0)} exited"
+                )
+            if options['once']:
+                return
+            if result['processed'] < batch_size:
+                time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from email_engine.services.scheduler import schedule
+
+
+class Command(BaseCommand):
+    help = 'Release queued campaign sends within the per-domain and per-tenant rate limits, every few seconds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run a single tick and exit')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=getattr(settings, 'EMAIL_SCHEDULER_INTERVAL', 1),
+            help='Seconds between ticks',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            result = schedule()
+            if result['scheduled'] or options['once']:
+                self.stdout.write(f"Scheduled {result['scheduled']} sends in {result['chunks']} chunks")
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_engine', '0002_emailtemplate_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emaillist',
+            name='segment_sql',
+            field=models.TextField(blank=True, help_text='Optional segment expression, e.g. properties.plan = "pro" and subscribed = true'),
+        ),
+        migrations.CreateModel(
+            name='ListMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('added_at', models.DateTimeField(auto_now_add=True)),
+                ('contact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='list_memberships', to='email_engine.contact')),
+                ('email_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='email_engine.emaillist')),
+            ],
+            options={
+                'unique_together': {('email_list', 'contact')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0003_llmusage'),
+        ('email_engine', '0003_listmembership'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DomainCheck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=253)),
+                ('status', models.CharField(choices=[('pass', 'All records found'), ('fail', 'Missing or invalid records'), ('error', 'Lookup failed')], max_length=10)),
+                ('results', models.JSONField(default=dict)),
+                ('checked_at', models.DateTimeField()),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='domain_checks', to='tenants.tenant')),
+            ],
+            options={
+                'ordering': ['domain'],
+                'unique_together': {('tenant', 'domain')},
+            },
+        ),
+    ]
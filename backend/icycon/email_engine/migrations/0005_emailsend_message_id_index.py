@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_engine', '0004_domaincheck'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailsend',
+            name='message_id',
+            field=models.CharField(blank=True, db_index=True, max_length=300),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:04
+
+from django.db import migrations, models
+
+
+def set_recipient_domains(apps, schema_editor):
+    """Queued campaign sends need a recipient domain for the scheduler to release them."""
+    EmailSend = apps.get_model('email_engine', 'EmailSend')
+    pending = EmailSend.objects.filter(status='queued', email_list__isnull=False, recipient_domain='')
+    for send in pending.select_related('recipient').only('id', 'recipient__email').iterator():
+        EmailSend.objects.filter(pk=send.pk).update(recipient_domain=send.recipient.email.rpartition('@')[2].lower())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_engine', '0005_emailsend_message_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SendThrottle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=300, unique=True)),
+                ('rate', models.FloatField(help_text='Messages per minute')),
+                ('level', models.FloatField(help_text='Tokens available at updated_at')),
+                ('updated_at', models.DateTimeField()),
+                ('deferrals', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='emailsend',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='emailsend',
+            name='not_before',
+            field=models.DateTimeField(blank=True, help_text='Deferred until (after a 4xx reply)', null=True),
+        ),
+        migrations.AddField(
+            model_name='emailsend',
+            name='recipient_domain',
+            field=models.CharField(blank=True, max_length=253),
+        ),
+        migrations.AddIndex(
+            model_name='emailsend',
+            index=models.Index(fields=['status', 'recipient_domain'], name='emailsend_status_domain_idx'),
+        ),
+        migrations.RunPython(set_recipient_domains, migrations.RunPython.noop),
+    ]
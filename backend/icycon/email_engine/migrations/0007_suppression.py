@@ -0,0 +1,47 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill(apps, schema_editor):
+    """Suppress addresses that already unsubscribed, hard-bounced or complained."""
+    Contact = apps.get_model('email_engine', 'Contact')
+    EmailSend = apps.get_model('email_engine', 'EmailSend')
+    Suppression = apps.get_model('email_engine', 'Suppression')
+    rows = {}
+    for tenant_id, email in Contact.objects.filter(subscribed=False).values_list('tenant_id', 'email').iterator():
+        rows[(tenant_id, email.strip().lower())] = 'unsubscribe'
+    for status, reason in (('bounced', 'bounce'), ('complaint', 'complaint')):
+        for tenant_id, email in EmailSend.objects.filter(status=status).values_list('tenant_id', 'recipient__email').iterator():
+            rows[(tenant_id, email.strip().lower())] = reason
+    Suppression.objects.bulk_create(
+        [Suppression(tenant_id=tenant_id, email=email, reason=reason) for (tenant_id, email), reason in rows.items()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0003_llmusage'),
+        ('email_engine', '0006_send_scheduler'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Suppression',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.CharField(help_text='Lowercased', max_length=254)),
+                ('reason', models.CharField(choices=[('unsubscribe', 'Unsubscribed'), ('bounce', 'Hard bounce'), ('complaint', 'Complaint')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suppressions', to='tenants.tenant')),
+            ],
+            options={
+                'unique_together': {('tenant', 'email')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0003_llmusage'),
+        ('email_engine', '0007_suppression'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('list_id', models.IntegerField(default=0)),
+                ('template_id', models.IntegerField(default=0)),
+                ('queued', models.IntegerField(default=0, help_text='Queued or scheduled')),
+                ('sent', models.IntegerField(default=0)),
+                ('bounced', models.IntegerField(default=0)),
+                ('complained', models.IntegerField(default=0)),
+                ('dropped', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('bounce_events', models.IntegerField(default=0, help_text='Sum of EmailSend.bounces')),
+                ('complaint_events', models.IntegerField(default=0, help_text='Sum of EmailSend.complaints')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_stats', to='tenants.tenant')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'unique_together': {('tenant', 'day', 'list_id', 'template_id')},
+            },
+        ),
+    ]
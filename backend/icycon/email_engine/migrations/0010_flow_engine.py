@@ -0,0 +1,62 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0003_llmusage'),
+        ('email_engine', '0009_contactimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailflow',
+            name='trigger',
+            field=models.CharField(choices=[('manual', 'Enrolled through the API'), ('contact_created', 'Every new contact of the tenant')], default='manual', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='emailsend',
+            name='flow',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sends', to='email_engine.emailflow'),
+        ),
+        migrations.CreateModel(
+            name='FlowStep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('kind', models.CharField(choices=[('send', 'Send'), ('wait', 'Wait'), ('branch', 'Branch')], max_length=10)),
+                ('wait_seconds', models.PositiveIntegerField(default=0)),
+                ('condition', models.TextField(blank=True)),
+                ('engagement', models.CharField(blank=True, choices=[('', 'Any'), ('delivered', 'Last send delivered'), ('bounced', 'Last send bounced or complained'), ('converted', 'Last send attributed revenue')], max_length=10)),
+                ('else_position', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('flow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='steps', to='email_engine.emailflow')),
+                ('template', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='email_engine.emailtemplate')),
+            ],
+            options={
+                'ordering': ['flow', 'position'],
+                'unique_together': {('flow', 'position')},
+            },
+        ),
+        migrations.CreateModel(
+            name='FlowEnrollment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('status', models.CharField(choices=[('active', 'In progress'), ('completed', 'Reached the end'), ('exited', 'Left at a branch')], default='active', max_length=10)),
+                ('next_run_at', models.DateTimeField(blank=True, null=True)),
+                ('enrolled_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('contact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flow_enrollments', to='email_engine.contact')),
+                ('flow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='email_engine.emailflow')),
+                ('last_send', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='email_engine.emailsend')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tenants.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('next_run_at__isnull', False)), fields=['next_run_at'], name='flowenrollment_due_idx')],
+                'unique_together': {('flow', 'contact')},
+            },
+        ),
+    ]
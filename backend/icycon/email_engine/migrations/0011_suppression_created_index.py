@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_engine', '0010_flow_engine'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='suppression',
+            index=models.Index(fields=['tenant', 'created_at'], name='suppression_tenant_created_idx'),
+        ),
+    ]
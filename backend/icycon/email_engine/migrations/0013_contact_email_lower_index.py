@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:49
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_engine', '0012_delivery_event'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(models.F('tenant'), django.db.models.functions.text.Lower('email'), name='contact_tenant_email_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_engine', '0013_contact_email_lower_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailsend',
+            name='scheduled_at',
+            field=models.DateTimeField(blank=True, help_text='Released by the scheduler at', null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.23 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_engine', '0014_emailsend_scheduled_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryevent',
+            name='applied_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryevent',
+            name='event_id',
+            field=models.CharField(blank=True, help_text="Provider's id for the event", max_length=255, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='deliveryevent',
+            constraint=models.UniqueConstraint(fields=('event_id',), name='deliveryevent_event_id_uniq'),
+        ),
+    ]
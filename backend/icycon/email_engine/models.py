@@ -2,6 +2,8 @@ from django.db import models
 
 # Create your models here.
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 class EmailList(models.Model):
@@ -9,12 +11,25 @@ class EmailList(models.Model):
     name = models.CharField(max_length=150)
     lawful_basis = models.CharField(max_length=100, help_text="consent / legitimate_interest / contract")
     region = models.CharField(max_length=50, blank=True)
-    segment_sql = models.TextField(blank=True, help_text="Optional SQL or filter expression describing the segment")
+    segment_sql = models.TextField(
+        blank=True,
+        help_text='Optional segment expression, e.g. properties.plan = "pro" and subscribed = true',
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.name} ({self.tenant.name})"
 
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .services.segments import SegmentError, compile_segment
+
+        if self.segment_sql.strip():
+            try:
+                compile_segment(self.segment_sql)
+            except SegmentError as exc:
+                raise ValidationError({"segment_sql": str(exc)})
+
 
 class Contact(models.Model):
     email = models.EmailField()
@@ -27,11 +42,116 @@ class Contact(models.Model):
 
     class Meta:
         unique_together = ("email", "tenant")
+        # Imports match existing contacts case-insensitively (services.imports).
+        indexes = [models.Index(F("tenant"), Lower("email"), name="contact_tenant_email_lower_idx")]
 
     def __str__(self):
         return self.email
 
 
+class ContactImport(models.Model):
+    """
+    A CSV or NDJSON contact upload and its progress. `services.imports`
+    updates the counters after every batch.
+    """
+    FORMAT_CHOICES = [("csv", "CSV"), ("ndjson", "NDJSON")]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    tenant = models.ForeignKey("tenants.Tenant", on_delete=models.CASCADE, related_name="contact_imports")
+    file = models.CharField(max_length=255, help_text="Path of the upload in default storage")
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    rows = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    invalid = models.PositiveIntegerField(default=0)
+    duplicates = models.PositiveIntegerField(default=0)
+    suppressed = models.PositiveIntegerField(default=0, help_text="New contacts imported unsubscribed: on the suppression list")
+    # The first EMAIL_IMPORT_MAX_ERRORS rejected rows: [{"line", "email", "error"}]
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.file}: {self.status}"
+
+
+class Suppression(models.Model):
+    """
+    An address a tenant must not mail again on any list: it unsubscribed,
+    hard-bounced or complained. Mirrored into per-process Bloom filters
+    by `services.suppression`.
+    """
+    REASON_CHOICES = [
+        ("unsubscribe", "Unsubscribed"),
+        ("bounce", "Hard bounce"),
+        ("complaint", "Complaint"),
+    ]
+
+    tenant = models.ForeignKey("tenants.Tenant", on_delete=models.CASCADE, related_name="suppressions")
+    email = models.CharField(max_length=254, help_text="Lowercased")
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("tenant", "email")
+        # services.suppression re-reads recent rows on every sync.
+        indexes = [models.Index(fields=["tenant", "created_at"], name="suppression_tenant_created_idx")]
+
+    def __str__(self):
+        return f"{self.email} ({self.reason})"
+
+
+class ListMembership(models.Model):
+    """
+    Materialized segment membership: the contacts an `EmailList`'s
+    `segment_sql` currently matches. Maintained by `services.segments`.
+    """
+    email_list = models.ForeignKey(EmailList, on_delete=models.CASCADE, related_name="memberships")
+    contact = models.ForeignKey(Contact, on_delete=models.CASCADE, related_name="list_memberships")
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("email_list", "contact")
+
+    def __str__(self):
+        return f"{self.contact_id} in {self.email_list_id}"
+
+
+class DomainCheck(models.Model):
+    """
+    Latest DNS deliverability check (SPF, DKIM, DMARC, MX) of one of a
+    tenant's sending domains. Written by `services.deliverability`.
+    """
+    STATUS_CHOICES = [
+        ("pass", "All records found"),
+        ("fail", "Missing or invalid records"),
+        ("error", "Lookup failed"),
+    ]
+
+    tenant = models.ForeignKey("tenants.Tenant", on_delete=models.CASCADE, related_name="domain_checks")
+    domain = models.CharField(max_length=253)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    # {"spf": {...}, "dmarc": {...}, "mx": {...}, "dkim": {...}} per services.deliverability
+    results = models.JSONField(default=dict)
+    checked_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("tenant", "domain")
+        ordering = ["domain"]
+
+    def __str__(self):
+        return f"{self.domain}: {self.status}"
+
+
 class EmailTemplate(models.Model):
     tenant = models.ForeignKey("tenants.Tenant", on_delete=models.CASCADE)
     name = models.CharField(max_length=150)
@@ -39,6 +159,8 @@ class EmailTemplate(models.Model):
     body_html = models.TextField()
     body_text = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Part of the compiled-template cache key (services.rendering).
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.tenant.name})"
@@ -46,20 +168,110 @@ class EmailTemplate(models.Model):
 
 class EmailFlow(models.Model):
     """
-    A simple representation of a flow (e.g. Welcome, Activation, Nurture).
-    For full workflow logic you'd expand this into steps & conditions.
+    An automation (e.g. Welcome, Activation, Nurture): contacts are enrolled
+    and walk its `steps` in order, executed by `services.flows`. A flow
+    without steps sends `template` once.
     """
+    TRIGGER_CHOICES = [
+        ("manual", "Enrolled through the API"),
+        ("contact_created", "Every new contact of the tenant"),
+    ]
+
     tenant = models.ForeignKey("tenants.Tenant", on_delete=models.CASCADE)
     name = models.CharField(max_length=150)
     description = models.TextField(blank=True)
     template = models.ForeignKey(EmailTemplate, on_delete=models.SET_NULL, null=True, blank=True)
     enabled = models.BooleanField(default=True)
+    trigger = models.CharField(max_length=20, choices=TRIGGER_CHOICES, default="manual")
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.name} ({self.tenant.name})"
 
 
+class FlowStep(models.Model):
+    """
+    One step of an `EmailFlow`, run in `position` order:
+
+    * send: queue `template` to the contact (skipped if unsubscribed or
+      suppressed);
+    * wait: resume at the next step after `wait_seconds`;
+    * branch: continue with the next step if the contact matches
+      `condition` (a segment expression, see `services.segments`) and its
+      last send of this flow had the `engagement` outcome; otherwise jump
+      to `else_position`, or leave the flow if that is empty.
+    """
+    KIND_CHOICES = [("send", "Send"), ("wait", "Wait"), ("branch", "Branch")]
+    ENGAGEMENT_CHOICES = [
+        ("", "Any"),
+        ("delivered", "Last send delivered"),
+        ("bounced", "Last send bounced or complained"),
+        ("converted", "Last send attributed revenue"),
+    ]
+
+    flow = models.ForeignKey(EmailFlow, on_delete=models.CASCADE, related_name="steps")
+    position = models.PositiveSmallIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    template = models.ForeignKey(EmailTemplate, on_delete=models.SET_NULL, null=True, blank=True)
+    wait_seconds = models.PositiveIntegerField(default=0)
+    condition = models.TextField(blank=True)
+    engagement = models.CharField(max_length=10, choices=ENGAGEMENT_CHOICES, blank=True)
+    else_position = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("flow", "position")
+        ordering = ["flow", "position"]
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .services.segments import SegmentError, compile_segment
+
+        if self.kind == "send" and self.template_id is None:
+            raise ValidationError({"template": "A send step needs a template."})
+        if self.kind == "branch" and self.condition.strip():
+            try:
+                compile_segment(self.condition)
+            except SegmentError as exc:
+                raise ValidationError({"condition": str(exc)})
+
+    def __str__(self):
+        return f"{self.flow.name} #{self.position}: {self.kind}"
+
+
+class FlowEnrollment(models.Model):
+    """
+    A contact's progress through a flow: the step it is at and when it is
+    next due. `next_run_at` is NULL once the contact has left the flow, so
+    the due-scan index only holds enrollments still in progress.
+    """
+    STATUS_CHOICES = [
+        ("active", "In progress"),
+        ("completed", "Reached the end"),
+        ("exited", "Left at a branch"),
+    ]
+
+    flow = models.ForeignKey(EmailFlow, on_delete=models.CASCADE, related_name="enrollments")
+    contact = models.ForeignKey(Contact, on_delete=models.CASCADE, related_name="flow_enrollments")
+    tenant = models.ForeignKey("tenants.Tenant", on_delete=models.CASCADE)
+    position = models.PositiveSmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="active")
+    next_run_at = models.DateTimeField(null=True, blank=True)
+    last_send = models.ForeignKey("EmailSend", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    enrolled_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("flow", "contact")
+        indexes = [
+            models.Index(
+                fields=["next_run_at"], name="flowenrollment_due_idx", condition=models.Q(next_run_at__isnull=False)
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.contact_id} in {self.flow_id} at #{self.position}: {self.status}"
+
+
 class EmailSend(models.Model):
     """
     Records each queued/sent email for attribution & complaints tracking.
@@ -70,13 +282,100 @@ class EmailSend(models.Model):
     tenant = models.ForeignKey("tenants.Tenant", on_delete=models.CASCADE)
     sent_at = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=50, default="queued")  # queued, sent, bounced, complaint, dropped
-    message_id = models.CharField(max_length=300, blank=True)
+    # Indexed: bounce/complaint webhooks look sends up by it (services.events).
+    message_id = models.CharField(max_length=300, blank=True, db_index=True)
     bounces = models.IntegerField(default=0)
     complaints = models.IntegerField(default=0)
     revenue_attributed = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     last_error = models.TextField(blank=True)
+    # Campaign sends are released by services.scheduler, sharded by recipient domain.
+    recipient_domain = models.CharField(max_length=253, blank=True)
+    flow = models.ForeignKey(EmailFlow, on_delete=models.SET_NULL, null=True, blank=True, related_name="sends")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    not_before = models.DateTimeField(null=True, blank=True, help_text="Deferred until (after a 4xx reply)")
+    scheduled_at = models.DateTimeField(null=True, blank=True, help_text="Released by the scheduler at")
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["status", "recipient_domain"], name="emailsend_status_domain_idx")]
+
     def __str__(self):
         return f"{self.recipient.email} - {self.status}"
+
+
+class DeliveryEvent(models.Model):
+    """
+    A bounce or complaint received by the webhook (see services.events).
+    Rows without a provider `event_id` are deleted once applied. The others
+    are kept, marked `applied_at`, for `EMAIL_EVENT_DEDUP_SECONDS`, so that
+    a provider redelivering them hits the unique `event_id` and is dropped.
+    `next_attempt_at` is NULL once an event is applied or has failed too
+    often, so the due-scan index only holds events still to apply.
+    """
+    event = models.JSONField(help_text="Normalized event (services.events.parse_events)")
+    event_id = models.CharField(max_length=255, null=True, blank=True, help_text="Provider's id for the event")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    applied_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["event_id"], name="deliveryevent_event_id_uniq")]
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                name="deliveryevent_due_idx",
+                condition=models.Q(next_attempt_at__isnull=False),
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.event.get('kind')} for {', '.join(self.event.get('message_ids') or [])}"
+
+
+class EmailDailyStats(models.Model):
+    """
+    Daily rollup of `EmailSend` per tenant, list and template (0 for none),
+    by the day the send was created. Kept current by `services.metrics`;
+    `manage.py backfill_email_metrics` rebuilds it from the sends.
+    """
+    tenant = models.ForeignKey("tenants.Tenant", on_delete=models.CASCADE, related_name="email_stats")
+    day = models.DateField()
+    # Plain ids, not foreign keys. When a list or template is deleted, its rows
+    # are folded into the 0 rows, as its sends' foreign keys become NULL.
+    list_id = models.IntegerField(default=0)
+    template_id = models.IntegerField(default=0)
+    queued = models.IntegerField(default=0, help_text="Queued or scheduled")
+    sent = models.IntegerField(default=0)
+    bounced = models.IntegerField(default=0)
+    complained = models.IntegerField(default=0)
+    dropped = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    bounce_events = models.IntegerField(default=0, help_text="Sum of EmailSend.bounces")
+    complaint_events = models.IntegerField(default=0, help_text="Sum of EmailSend.complaints")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("tenant", "day", "list_id", "template_id")
+        ordering = ["-day"]
+
+    def __str__(self):
+        return f"{self.tenant_id} {self.day} list {self.list_id} template {self.template_id}"
+
+
+class SendThrottle(models.Model):
+    """
+    A token bucket of the send scheduler: one per recipient domain
+    (key "domain:gmail.com") and one per tenant (key "tenant:3").
+    Domain rates adapt to deferrals; see `services.scheduler`.
+    """
+    key = models.CharField(max_length=300, unique=True)
+    rate = models.FloatField(help_text="Messages per minute")
+    level = models.FloatField(help_text="Tokens available at updated_at")
+    updated_at = models.DateTimeField()
+    deferrals = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key}: {self.rate:.0f}/min"
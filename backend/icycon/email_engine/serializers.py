@@ -1,11 +1,20 @@
 from rest_framework import serializers
 from .models import EmailList, Contact, EmailTemplate, EmailFlow, EmailSend
+from .services.segments import SegmentError, compile_segment
 
 class EmailListSerializer(serializers.ModelSerializer):
     class Meta:
         model = EmailList
         fields = '__all__'
 
+    def validate_segment_sql(self, value):
+        if value.strip():
+            try:
+                compile_segment(value)
+            except SegmentError as exc:
+                raise serializers.ValidationError(str(exc))
+        return value
+
 class ContactSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contact
@@ -1,43 +1,283 @@
 """
-Simple placeholder for DNS-based deliverability checks.
-In real deployments you query DNS for SPF/DKIM/DMARC and parse RUA reports.
+DNS-based deliverability checks for every tenant's sending domains.
+
+A tenant's sending domains come from two sources:
+
+* `tenants.Integration.metadata`: `sending_domain`, `domain`, a
+  `domains` list, or the domain of `from_email`. An optional
+  `dkim_selectors` list names the DKIM keys to look for, on top of
+  `EMAIL_DKIM_SELECTORS`.
+* `seo.Site.domain`, with any `www.` prefix dropped.
+
+For each domain, these checks run concurrently on one asyncio resolver:
+SPF (the domain's TXT), DMARC (`_dmarc.<domain>` TXT), MX, and one TXT
+lookup per DKIM selector (`<selector>._domainkey.<domain>`). At most
+`DNS_RESOLVER_CONCURRENCY` queries are in flight at once. A name shared
+by several tenants is resolved once per run, but each tenant's result only
+covers its own DKIM selectors.
+
+Answers are cached per process for their TTL, capped at
+`DNS_CACHE_MAX_TTL`. NXDOMAIN and empty answers are cached for the zone's
+negative TTL. Timeouts and server failures are not cached. Results are
+stored in `DomainCheck`, one row per tenant and domain.
 """
 
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+import dns.asyncresolver
+import dns.exception
+import dns.rdatatype
 import dns.resolver
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 
-def check_spf_dkim_dmarc(tenant_id):
-    # Fetch tenant domain(s) from tenants.Tenant via ORM here if needed. Placeholder:
-    results = {
-        "spf": {"status": "unknown", "record": None},
-        "dkim": {"status": "unknown", "record": None},
-        "dmarc": {"status": "unknown", "record": None}
-    }
-    # Example pseudo-code; avoid crashing if no network or no dns package in env.
-    try:
-        # Assume domain = example.com (replace fetching logic)
-        domain = "example.com"
-        # SPF
+from ..models import DomainCheck
+
+DEFAULT_DKIM_SELECTORS = ("default", "google", "selector1", "selector2", "s1", "s2", "k1")
+
+_cache = {}  # (name, rdtype) -> (monotonic expiry, status, records)
+_cache_lock = threading.Lock()
+
+
+# Discovery ----------------------------------------------------------------------
+def _domain(value):
+    """The bare host name in a domain, URL or email address, or None."""
+    value = (value or "").strip().lower()
+    if "@" in value:
+        value = value.rpartition("@")[2]
+    if "//" in value:
+        value = urlparse(value).hostname or ""
+    value = value.split("/")[0].split(":")[0].rstrip(".")
+    if value.startswith("www."):
+        value = value[4:]
+    if "." not in value or len(value) > 253 or value.replace(".", "").isdigit():
+        return None
+    return value
+
+
+def _as_list(value):
+    if isinstance(value, str):
+        return [value]
+    return [v for v in value if isinstance(v, str)] if isinstance(value, (list, tuple)) else []
+
+
+def discover_domains(tenant_ids=None):
+    """{tenant_id: {domain: set of extra DKIM selectors}} for the given tenants (default: all)."""
+    from seo.models import Site
+    from tenants.models import Integration
+
+    found = {}
+    integrations = Integration.objects.all()
+    sites = Site.objects.all()
+    if tenant_ids is not None:
+        integrations = integrations.filter(tenant_id__in=tenant_ids)
+        sites = sites.filter(tenant_id__in=tenant_ids)
+
+    for tenant_id, metadata in integrations.values_list("tenant_id", "metadata"):
+        if not isinstance(metadata, dict):
+            continue
+        selectors = {s.strip() for s in _as_list(metadata.get("dkim_selectors")) if s.strip()}
+        values = (
+            _as_list(metadata.get("sending_domain"))
+            + _as_list(metadata.get("domain"))
+            + _as_list(metadata.get("domains"))
+            + _as_list(metadata.get("from_email"))
+        )
+        for value in values:
+            domain = _domain(value)
+            if domain:
+                found.setdefault(tenant_id, {}).setdefault(domain, set()).update(selectors)
+
+    for tenant_id, value in sites.values_list("tenant_id", "domain"):
+        domain = _domain(value)
+        if domain:
+            found.setdefault(tenant_id, {}).setdefault(domain, set())
+    return found
+
+
+# Resolution ---------------------------------------------------------------------
+def _resolver():
+    nameservers = getattr(settings, "DNS_RESOLVER_NAMESERVERS", [])
+    resolver = dns.asyncresolver.Resolver(configure=not nameservers)
+    if nameservers:
+        resolver.nameservers = list(nameservers)
+    resolver.port = getattr(settings, "DNS_RESOLVER_PORT", 53)
+    resolver.lifetime = getattr(settings, "DNS_RESOLVER_TIMEOUT", 3.0)
+    resolver.timeout = resolver.lifetime
+    return resolver
+
+
+def _texts(rrset, rdtype):
+    if rrset is None:
+        return []
+    if rdtype == "MX":
+        return [rdata.exchange.to_text().rstrip(".") for rdata in sorted(rrset, key=lambda r: r.preference)]
+    return [b"".join(rdata.strings).decode("utf-8", "replace") for rdata in rrset]
+
+
+def _negative_ttl(exc):
+    for response in exc.kwargs.get("responses", {}).values():
         try:
-            answers = dns.resolver.resolve(domain, 'TXT')
-            txts = [r.to_text().strip('"') for r in answers]
-            spf = [t for t in txts if t.startswith('v=spf1')]
-            results['spf']['record'] = spf[0] if spf else None
-            results['spf']['status'] = 'found' if spf else 'missing'
+            return response.resolve_chaining().minimum_ttl
         except Exception:
-            results['spf']['status'] = 'error'
+            continue
+    return getattr(settings, "DNS_NEGATIVE_TTL", 300)
+
+
+async def _lookup(resolver, semaphore, name, rdtype):
+    """(status, records) for one query: "found", "missing" or "error"."""
+    key = (name, rdtype)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1], cached[2]
 
-        # DMARC
+    async with semaphore:
         try:
-            answers = dns.resolver.resolve('_dmarc.' + domain, 'TXT')
-            txts = [r.to_text().strip('"') for r in answers]
-            dmarc = [t for t in txts if t.startswith('v=DMARC1')]
-            results['dmarc']['record'] = dmarc[0] if dmarc else None
-            results['dmarc']['status'] = 'found' if dmarc else 'missing'
-        except Exception:
-            results['dmarc']['status'] = 'error'
+            answer = await resolver.resolve(name, rdtype, raise_on_no_answer=False)
+        except dns.resolver.NXDOMAIN as exc:
+            status, records, ttl = "missing", [], _negative_ttl(exc)
+        except dns.exception.DNSException as exc:
+            return "error", [str(exc) or exc.__class__.__name__]
+        else:
+            records = _texts(answer.rrset, rdtype)
+            status = "found" if records else "missing"
+            ttl = answer.chaining_result.minimum_ttl
+
+    ttl = min(ttl, getattr(settings, "DNS_CACHE_MAX_TTL", 3600))
+    if ttl > 0:
+        with _cache_lock:
+            _cache[key] = (time.monotonic() + ttl, status, records)
+    return status, records
+
+
+def _pick(lookup, prefix):
+    """Reduce a TXT lookup to {"status", "record"} for records starting with `prefix`."""
+    status, records = lookup
+    if status == "error":
+        return {"status": "error", "record": None, "error": records[0]}
+    matching = [r for r in records if r.lower().startswith(prefix)]
+    if len(matching) > 1:
+        return {"status": "invalid", "record": matching[0], "error": f"{len(matching)} {prefix} records"}
+    return {"status": "found" if matching else "missing", "record": matching[0] if matching else None}
+
+
+def _result(domain, selectors, lookups):
+    spf = _pick(lookups[(domain, "TXT")], "v=spf1")
+    dmarc = _pick(lookups[(f"_dmarc.{domain}", "TXT")], "v=dmarc1")
+    if dmarc["record"]:
+        tags = dict(
+            part.strip().partition("=")[::2] for part in dmarc["record"].split(";") if "=" in part
+        )
+        dmarc["policy"] = tags.get("p", "").strip().lower()
+
+    mx_status, mx_hosts = lookups[(domain, "MX")]
+    mx = {"status": mx_status, "hosts": [] if mx_status == "error" else [h for h in mx_hosts if h]}
+    if mx_status == "found" and not mx["hosts"]:
+        mx["status"] = "missing"  # a null MX ("0 .") refuses mail
+
+    dkim = {}
+    for selector in selectors:
+        status, records = lookups[(f"{selector}._domainkey.{domain}", "TXT")]
+        if status == "found":
+            keys = [r for r in records if "p=" in r]
+            if keys:
+                dkim[selector] = keys[0]
+    dkim_errors = all(lookups[(f"{s}._domainkey.{domain}", "TXT")][0] == "error" for s in selectors)
+    dkim_status = "found" if dkim else ("error" if selectors and dkim_errors else "missing")
+
+    statuses = [spf["status"], dmarc["status"], mx["status"], dkim_status]
+    if "error" in statuses:
+        overall = "error"
+    elif all(status == "found" for status in statuses):
+        overall = "pass"
+    else:
+        overall = "fail"
+    return {
+        "status": overall,
+        "spf": spf,
+        "dmarc": dmarc,
+        "mx": mx,
+        "dkim": {"status": dkim_status, "selectors": sorted(selectors), "records": dkim},
+    }
+
+
+async def _check(checks):
+    resolver = _resolver()
+    semaphore = asyncio.Semaphore(getattr(settings, "DNS_RESOLVER_CONCURRENCY", 32))
+    queries = set()
+    for domain, selectors in checks.values():
+        queries.update({(domain, "TXT"), (f"_dmarc.{domain}", "TXT"), (domain, "MX")})
+        queries.update((f"{selector}._domainkey.{domain}", "TXT") for selector in selectors)
+    queries = sorted(queries)
+    answers = await asyncio.gather(*(_lookup(resolver, semaphore, name, rdtype) for name, rdtype in queries))
+    lookups = dict(zip(queries, answers))
+    return {key: _result(domain, selectors, lookups) for key, (domain, selectors) in checks.items()}
+
+
+def _run(checks):
+    """{key: (domain, DKIM selectors)} -> {key: result}, each distinct query asked once."""
+    if not checks:
+        return {}
+    try:
+        return asyncio.run(_check(checks))
+    except dns.resolver.NoResolverConfiguration as exc:
+        error = {"status": "error", "record": None, "error": str(exc)}
+        return {
+            key: {
+                "status": "error",
+                "spf": error,
+                "dmarc": error,
+                "mx": {"status": "error", "hosts": []},
+                "dkim": {"status": "error", "selectors": sorted(selectors), "records": {}},
+            }
+            for key, (domain, selectors) in checks.items()
+        }
+
+
+def check_domains(domains):
+    """Check {domain: DKIM selectors} concurrently; returns {domain: result}."""
+    return _run({domain: (domain, selectors) for domain, selectors in domains.items()})
+
+
+# Persistence --------------------------------------------------------------------
+def run_checks(tenant_ids=None):
+    """Check the sending domains of `tenant_ids` (default: every tenant) and store the results.
 
-        # DKIM is selector-specific; skipping automated check in placeholder
-        results['dkim']['status'] = 'manual_check_required'
-    except Exception as ex:
-        results['error'] = str(ex)
-    return results
+    Returns the number of `DomainCheck` rows written. Rows for domains a
+    tenant no longer uses are deleted.
+    """
+    discovered = discover_domains(tenant_ids)
+    default_selectors = set(getattr(settings, "EMAIL_DKIM_SELECTORS", DEFAULT_DKIM_SELECTORS))
+    # Tenants sharing a domain share its lookups, but each result lists only
+    # that tenant's own selectors.
+    results = _run(
+        {
+            (tenant_id, domain): (domain, default_selectors | selectors)
+            for tenant_id, tenant_domains in discovered.items()
+            for domain, selectors in tenant_domains.items()
+        }
+    )
+    now = timezone.now()
+    written = 0
+    with transaction.atomic():
+        stale = DomainCheck.objects.all()
+        if tenant_ids is not None:
+            stale = stale.filter(tenant_id__in=tenant_ids)
+        for tenant_id, tenant_domains in discovered.items():
+            stale = stale.exclude(tenant_id=tenant_id, domain__in=list(tenant_domains))
+        stale.delete()
+        for tenant_id, tenant_domains in discovered.items():
+            for domain in tenant_domains:
+                result = results[(tenant_id, domain)]
+                DomainCheck.objects.update_or_create(
+                    tenant_id=tenant_id,
+                    domain=domain,
+                    defaults={"status": result["status"], "results": result, "checked_at": now},
+                )
+                written += 1
+    return written
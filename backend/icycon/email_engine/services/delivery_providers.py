@@ -5,66 +5,54 @@ This implementation prefers sending via SMTP using Django settings
 (`EMAIL_HOST`, `EMAIL_PORT`, `EMAIL_HOST_USER`, `EMAIL_HOST_PASSWORD`,
 `EMAIL_USE_TLS`, `EMAIL_USE_SSL`, `DEFAULT_FROM_EMAIL`). If `EMAIL_HOST`
 is not configured, it falls back to a dry-run mock (keeps previous behavior).
+Messages are personalized from precompiled templates (see `rendering`) and
+SMTP sessions are pooled per worker (see `smtp_pool`).
 
-Returns: (success: bool, message_id: str|None, error: str|None)
+Returns: (success: bool, message_id: str|None, error: str|None). SMTP
+replies are reported as "<code> <text>"; see `is_temporary`.
 """
 
 from django.conf import settings
 import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 import uuid
 import logging
 
-logger = logging.getLogger(__name__)
+from .rendering import CompiledTemplate, compile_template
+from .smtp_pool import get_pool
 
+logger = logging.getLogger(__name__)
 
-def _smtp_send(from_addr, to_addr, subject, body_text, body_html=None):
-    """Send a single message via SMTP using settings; returns (ok, message_id, error)"""
-    host = getattr(settings, 'EMAIL_HOST', None)
-    if not host:
-        return False, None, 'EMAIL_HOST not configured'
 
-    port = getattr(settings, 'EMAIL_PORT', 25)
-    username = getattr(settings, 'EMAIL_HOST_USER', None)
-    password = getattr(settings, 'EMAIL_HOST_PASSWORD', None)
-    use_tls = getattr(settings, 'EMAIL_USE_TLS', False)
-    use_ssl = getattr(settings, 'EMAIL_USE_SSL', False)
+def _reply(code, text):
+    if isinstance(text, bytes):
+        text = text.decode('utf-8', 'replace')
+    return f'{code} {text}'
 
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = subject
-    msg['From'] = from_addr
-    msg['To'] = to_addr
 
-    if body_text:
-        part1 = MIMEText(body_text, 'plain', 'utf-8')
-        msg.attach(part1)
-    if body_html:
-        part2 = MIMEText(body_html, 'html', 'utf-8')
-        msg.attach(part2)
+def is_temporary(error):
+    """Whether a send error is a 4xx SMTP reply (deferral: retry later, slower)."""
+    return bool(error) and error[:1] == '4' and error[:3].isdigit()
 
-    message_id = f"{uuid.uuid4()}"
 
+def _smtp_send(from_addr, to_addr, message):
+    """Send a prebuilt message via SMTP using settings; returns (ok, error)"""
+    if not getattr(settings, 'EMAIL_HOST', None):
+        return False, 'EMAIL_HOST not configured'
     try:
-        if use_ssl:
-            smtp = smtplib.SMTP_SSL(host, port, timeout=10)
-        else:
-            smtp = smtplib.SMTP(host, port, timeout=10)
-
-        smtp.ehlo()
-        if use_tls and not use_ssl:
-            smtp.starttls()
-            smtp.ehlo()
-
-        if username and password:
-            smtp.login(username, password)
-
-        smtp.sendmail(from_addr, [to_addr], msg.as_string())
-        smtp.quit()
-        return True, message_id, None
+        # Reuses an authenticated session from this worker's pool.
+        get_pool().send(from_addr, [to_addr], message)
+        return True, None
+    except smtplib.SMTPRecipientsRefused as exc:
+        # A reply from the server about this message, not a transport failure.
+        error = _reply(*next(iter(exc.recipients.values())))
+        logger.warning('SMTP server refused message to %s: %s', to_addr, error)
+        return False, error
+    except smtplib.SMTPResponseException as exc:
+        logger.warning('SMTP server refused message to %s: %s', to_addr, exc)
+        return False, _reply(exc.smtp_code, exc.smtp_error)
     except Exception as exc:
         logger.exception('SMTP send failed')
-        return False, None, str(exc)
+        return False, str(exc)
 
 
 def send_via_provider(email_send):
@@ -81,19 +69,22 @@ def send_via_provider(email_send):
     if not to_addr:
         return False, None, 'recipient email missing'
 
-    subject = template.subject if template and getattr(template, 'subject', None) else f"Message from {email_send.tenant.name}"
-    body_text = getattr(template, 'body_text', '') if template else ''
-    body_html = getattr(template, 'body_html', None) if template else None
+    if template is not None:
+        compiled = compile_template(template)
+    else:
+        compiled = CompiledTemplate(f"Message from {email_send.tenant.name}")
+    message_id = email_send.message_id or f"{uuid.uuid4()}"
 
     # Prefer SMTP if configured
     if getattr(settings, 'EMAIL_HOST', None):
-        ok, message_id, error = _smtp_send(from_addr, to_addr, subject, body_text, body_html)
-        return ok, message_id, error
+        message = compiled.message(recipient, from_addr, message_id, tenant=email_send.tenant.name)
+        ok, error = _smtp_send(from_addr, to_addr, message)
+        return ok, message_id if ok else None, error
 
     # Fallback dry-run (previous behavior)
     try:
         logger.info(f"[DRY RUN] Sending email to %s using template %s", to_addr, getattr(template, 'name', ''))
-        message_id = f"mock-msg-{email_send.id}"
+        message_id = email_send.message_id or f"mock-msg-{email_send.id}"
         return True, message_id, None
     except Exception as ex:
         return False, None, str(ex)
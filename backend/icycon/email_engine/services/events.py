@@ -0,0 +1,315 @@
+"""
+Bounce and complaint events from delivery providers.
+
+`parse_events` turns a webhook payload into normalized events. It accepts
+SES notifications (raw or wrapped in an SNS envelope), SendGrid event
+batches (a JSON list), or a list mixing both:
+
+    {"message_ids": [...], "kind": "bounce" | "complaint", "permanent": bool,
+     "reason": str, "event_id": str | None}
+
+`message_ids` holds every id the provider reports for the message: our
+Message-ID header (SES `commonHeaders.messageId`, SendGrid `smtp-id`) and
+the provider's own id. Each is reduced to the `EmailSend.message_id`
+form, which is the local part without angle brackets or `@domain`.
+
+Webhooks arrive one event per request (SES via SNS) or in small batches.
+`ingest` stores the events as `DeliveryEvent` rows with one INSERT, so a
+202 means the events survive a crash, and queues one task once the
+request commits. Providers deliver at least once; an event whose
+`event_id` is already stored, pending or applied within the last
+`EMAIL_EVENT_DEDUP_SECONDS`, is dropped on ingest, so a redelivery is
+never counted twice. Workers apply the stored events in batches of
+`EMAIL_EVENT_BATCH_SIZE` (`drain`). They claim rows with SKIP LOCKED, so
+tasks that run at the same time share the work.
+`manage.py apply_delivery_events` runs `drain` every
+`EMAIL_EVENT_FLUSH_SECONDS`, which also picks up retries and anything
+left by a lost task.
+
+If a batch fails, its events are applied one at a time, so one bad event
+can't hold back the others. An event that still fails is retried after
+`EMAIL_EVENT_RETRY_SECONDS`, doubling on each try. After
+`EMAIL_EVENT_MAX_ATTEMPTS` tries it is kept, with its error, but no
+longer retried. `apply_events` handles one batch in a single
+transaction:
+* one indexed SELECT of the sends by `message_id`;
+* one `bulk_update` of their status and counters;
+* one UPDATE that unsubscribes the recipients of permanent bounces and
+  complaints, whose addresses are also added to the tenant's suppression
+  list (`suppression`);
+* one UPDATE per affected metrics rollup row (`metrics`).
+The counters are incremented with F() expressions, so two workers
+flushing at once can't lose an increment.
+"""
+
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from icycon.response_cache import bump_tenant_generation
+
+from ..models import Contact, DeliveryEvent, EmailSend
+from . import metrics, suppression
+from .segments import refresh_contacts
+
+logger = logging.getLogger(__name__)
+
+# A send's status only moves up this ladder ("complaint" is final).
+STATUS_RANK = {"bounced": 1, "complaint": 2}
+
+
+def _message_id(value):
+    """The `EmailSend.message_id` form of a provider-reported id."""
+    value = (value or "").strip().strip("<>")
+    return value.partition("@")[0]
+
+
+# Parsing ------------------------------------------------------------------------
+def _ses_events(notification):
+    kind = (notification.get("notificationType") or notification.get("eventType") or "").lower()
+    mail = notification.get("mail") or {}
+    ids = [mail.get("messageId"), (mail.get("commonHeaders") or {}).get("messageId")]
+    ids += [h.get("value") for h in mail.get("headers") or [] if (h.get("name") or "").lower() == "message-id"]
+    ids = sorted({_message_id(i) for i in ids if i} - {""})
+    if kind == "bounce":
+        bounce = notification.get("bounce") or {}
+        reasons = [r.get("diagnosticCode") or r.get("status") or "" for r in bounce.get("bouncedRecipients") or []]
+        return [{
+            "message_ids": ids,
+            "kind": "bounce",
+            "permanent": bounce.get("bounceType") == "Permanent",
+            "reason": "; ".join(r for r in reasons if r) or bounce.get("bounceSubType", ""),
+            "event_id": bounce.get("feedbackId"),
+        }]
+    if kind == "complaint":
+        complaint = notification.get("complaint") or {}
+        return [{
+            "message_ids": ids,
+            "kind": "complaint",
+            "permanent": True,
+            "reason": complaint.get("complaintFeedbackType") or "complaint",
+            "event_id": complaint.get("feedbackId"),
+        }]
+    return []
+
+
+def _sendgrid_event(event):
+    kind = event.get("event")
+    if kind == "spamreport":
+        kind, permanent, reason = "complaint", True, "spamreport"
+    elif kind == "bounce":
+        # type "blocked" is a temporary block by the receiving server.
+        permanent = event.get("type", "bounce") == "bounce"
+        reason = event.get("reason") or event.get("status") or ""
+    else:
+        return []  # delivered, open, click, deferred, ...
+    ids = [event.get("smtp-id"), (event.get("sg_message_id") or "").partition(".")[0]]
+    return [{
+        "message_ids": sorted({_message_id(i) for i in ids if i} - {""}),
+        "kind": kind,
+        "permanent": permanent,
+        "reason": reason,
+        "event_id": event.get("sg_event_id"),
+    }]
+
+
+def parse_events(payload):
+    """Normalized bounce/complaint events in a webhook payload (see module docstring)."""
+    items = payload if isinstance(payload, list) else [payload]
+    events = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        if item.get("Type") == "SubscriptionConfirmation":
+            logger.warning("SNS subscription for delivery events needs confirming: %s", item.get("SubscribeURL"))
+            continue
+        if item.get("Type") == "Notification":
+            try:
+                item = json.loads(item.get("Message") or "")
+            except ValueError:
+                continue
+            if not isinstance(item, dict):
+                continue
+        if "event" in item:
+            events.extend(_sendgrid_event(item))
+        else:
+            events.extend(_ses_events(item))
+    return [event for event in events if event["message_ids"]]
+
+
+# Applying -----------------------------------------------------------------------
+def apply_events(events):
+    """Apply one batch of normalized events; returns counts by outcome."""
+    seen, unique = set(), []
+    for event in events:
+        if event.get("event_id"):
+            if event["event_id"] in seen:
+                continue  # a provider retry within this batch
+            seen.add(event["event_id"])
+        unique.append(event)
+    ids = {message_id for event in unique for message_id in event["message_ids"]}
+    if not ids:
+        return {"matched": 0, "unmatched": len(unique), "suppressed": 0}
+
+    now = timezone.now()
+    with transaction.atomic():
+        sends = {}
+        for send in (
+            EmailSend.objects.select_for_update()
+            .filter(message_id__in=ids)
+            .only(
+                "id", "message_id", "status", "last_error", "recipient_id", "tenant_id",
+                "created_at", "email_list_id", "template_id",
+            )
+        ):
+            sends[send.message_id] = send
+
+        changed, suppress, reasons, matched = {}, {}, {}, 0
+        deltas = metrics.Deltas()
+        for event in unique:
+            send = next((sends[i] for i in event["message_ids"] if i in sends), None)
+            if send is None:
+                continue
+            matched += 1
+            counters = changed.setdefault(send.id, [send, 0, 0])
+            counters[1 if event["kind"] == "bounce" else 2] += 1
+            if event["permanent"]:
+                status = "complaint" if event["kind"] == "complaint" else "bounced"
+                if STATUS_RANK.get(status, 0) >= STATUS_RANK.get(send.status, 0):
+                    deltas.move(send, send.status, status)
+                    send.status = status
+                    send.last_error = event["reason"][:1000]
+                suppress.setdefault(send.tenant_id, set()).add(send.recipient_id)
+                if reasons.get(send.recipient_id) != "complaint":
+                    reasons[send.recipient_id] = event["kind"]
+            elif not send.last_error:
+                send.last_error = event["reason"][:1000]
+
+        for send, bounces, complaints in changed.values():
+            send.bounces = F("bounces") + bounces
+            send.complaints = F("complaints") + complaints
+            deltas.add(metrics.rollup_key(send), bounce_events=bounces, complaint_events=complaints)
+        if changed:
+            EmailSend.objects.bulk_update(
+                [send for send, _, _ in changed.values()], ["status", "bounces", "complaints", "last_error"]
+            )
+        deltas.apply()
+
+        suppressed = 0
+        contact_ids = set().union(*suppress.values()) if suppress else set()
+        if contact_ids:
+            suppressed = Contact.objects.filter(id__in=contact_ids, subscribed=True).update(
+                subscribed=False, unsubscribed_at=now
+            )
+            by_reason = {}
+            for contact_id, tenant_id, email in Contact.objects.filter(id__in=contact_ids).values_list(
+                "id", "tenant_id", "email"
+            ):
+                by_reason.setdefault((tenant_id, reasons[contact_id]), []).append(email)
+            for (tenant_id, reason), emails in by_reason.items():
+                suppression.suppress(tenant_id, emails, reason)
+
+    # Bulk writes skip signals: refresh segment memberships and API caches here.
+    for tenant_id, tenant_contacts in suppress.items():
+        refresh_contacts(tenant_id, tenant_contacts)
+    bump_tenant_generation(*{send.tenant_id for send, _, _ in changed.values()})
+    return {"matched": matched, "unmatched": len(unique) - matched, "suppressed": suppressed}
+
+
+# Queueing -----------------------------------------------------------------------
+def _event_id(event):
+    event_id = event.get("event_id")
+    return str(event_id)[:255] if event_id else None
+
+
+def ingest(events):
+    """Store normalized events and queue a task to apply them; returns the events accepted.
+
+    Events whose `event_id` is already stored are redeliveries and are
+    silently dropped by the unique constraint.
+    """
+    now = timezone.now()
+    rows = DeliveryEvent.objects.bulk_create(
+        (DeliveryEvent(event=event, event_id=_event_id(event), next_attempt_at=now) for event in events),
+        ignore_conflicts=True,
+    )
+    if rows:
+        from ..tasks import apply_delivery_events_task
+
+        transaction.on_commit(apply_delivery_events_task.delay)
+    return len(rows)
+
+
+def _failed(row, exc, now):
+    row.attempts += 1
+    row.last_error = f"{type(exc).__name__}: {exc}"[:1000]
+    if row.attempts >= getattr(settings, "EMAIL_EVENT_MAX_ATTEMPTS", 5):
+        row.next_attempt_at = None
+    else:
+        delay = getattr(settings, "EMAIL_EVENT_RETRY_SECONDS", 60) * 2 ** (row.attempts - 1)
+        row.next_attempt_at = now + timedelta(seconds=delay)
+
+
+def apply_due(now=None, batch_size=None):
+    """Apply one batch of stored events due at `now`; returns counts: "processed", "applied", "failed"."""
+    now = now or timezone.now()
+    batch_size = batch_size or getattr(settings, "EMAIL_EVENT_BATCH_SIZE", 1000)
+    with transaction.atomic():
+        rows = list(
+            DeliveryEvent.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        if not rows:
+            return {"processed": 0, "applied": 0, "failed": 0}
+        try:
+            with transaction.atomic():
+                apply_events([row.event for row in rows])
+            applied, failed = rows, []
+        except Exception:
+            logger.exception("Applying %s delivery events failed; applying them one at a time", len(rows))
+            applied, failed = [], []
+            for row in rows:
+                try:
+                    with transaction.atomic():
+                        apply_events([row.event])
+                except Exception as exc:
+                    _failed(row, exc, now)
+                    failed.append(row)
+                else:
+                    applied.append(row)
+        # Rows with a provider id stay behind as the record that it was applied.
+        done = DeliveryEvent.objects.filter(id__in=[row.id for row in applied])
+        done.filter(event_id__isnull=True).delete()
+        done.update(applied_at=now, next_attempt_at=None)
+        DeliveryEvent.objects.bulk_update(failed, ["attempts", "last_error", "next_attempt_at"])
+    for row in failed:
+        if row.next_attempt_at is None:
+            logger.error("Giving up on delivery event %s after %s attempts: %s", row.id, row.attempts, row.last_error)
+    return {"processed": len(rows), "applied": len(applied), "failed": len(failed)}
+
+
+def prune(now=None):
+    """Forget applied events older than `EMAIL_EVENT_DEDUP_SECONDS`; returns rows deleted."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, "EMAIL_EVENT_DEDUP_SECONDS", 3 * 24 * 3600))
+    return DeliveryEvent.objects.filter(applied_at__lt=cutoff).delete()[0]
+
+
+def drain(now=None):
+    """Apply batches until no stored event due at `now` is left; returns the summed counts."""
+    now = now or timezone.now()
+    batch_size = getattr(settings, "EMAIL_EVENT_BATCH_SIZE", 1000)
+    total = {"processed": 0, "applied": 0, "failed": 0}
+    while True:
+        result = apply_due(now, batch_size)
+        for key, value in result.items():
+            total[key] += value
+        if result["processed"] < batch_size:
+            prune(now)
+            return total
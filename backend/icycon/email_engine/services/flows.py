@@ -0,0 +1,242 @@
+"""
+Email flow execution: contacts enrolled in an `EmailFlow` walk its
+`FlowStep`s (send, wait, branch), tracked per contact in `FlowEnrollment`.
+
+Contacts are enrolled through the API (`enroll`) or, for flows triggered
+by `contact_created`, when the contact is created (`contacts_created`,
+called from the contact signal and from bulk imports). A new enrollment is
+due right away.
+
+`run_due` is one scheduler tick (`manage.py run_flow_scheduler`, and a
+drain right after each enrollment). It claims at most
+`EMAIL_FLOW_BATCH_SIZE` enrollments with `next_run_at <= now`, oldest
+first. This is a range scan of a partial index that holds only
+enrollments still in progress, so the cost of a tick depends on how many
+are due, not on how many are enrolled. The claimed enrollments advance
+together, one step position at a time:
+
+* send steps queue one `EmailSend` per contact with a single
+  `bulk_create`, released by the send scheduler like campaign sends;
+* branch steps evaluate their segment expression for the whole group in
+  one query, and their engagement test with one more;
+* wait steps set `next_run_at` and end the tick for that enrollment.
+
+An enrollment takes at most `EMAIL_FLOW_MAX_STEPS_PER_TICK` steps per
+tick, so a loop of branches without a wait can't stall the scheduler. The
+engagement test looks at the outcome of the contact's last send of the
+flow, so put a wait step between a send and a branch on engagement.
+Enrollments of a disabled flow are not advanced. They are looked at again
+every `EMAIL_FLOW_PAUSED_RECHECK_SECONDS`.
+"""
+
+import uuid
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from icycon.response_cache import bump_tenant_generation
+
+from ..models import Contact, EmailFlow, EmailSend, FlowEnrollment, FlowStep
+from . import metrics, scheduler, suppression
+from .segments import SegmentError, compile_segment
+
+# FlowStep.engagement -> test on the (status, revenue_attributed) of the last send
+ENGAGEMENT = {
+    "delivered": lambda status, revenue: status == "sent",
+    "bounced": lambda status, revenue: status in ("bounced", "complaint"),
+    "converted": lambda status, revenue: bool(revenue),
+}
+
+
+def _batch_size():
+    return getattr(settings, "EMAIL_FLOW_BATCH_SIZE", 500)
+
+
+# Enrolling ----------------------------------------------------------------------
+def enroll(flow, contacts, now=None):
+    """Enroll `contacts` (a Contact queryset, limited to the flow's tenant); returns how many were new.
+
+    Contacts already enrolled in the flow, whatever their status, are skipped.
+    """
+    now = now or timezone.now()
+    ids = contacts.filter(tenant_id=flow.tenant_id).order_by("id").values_list("id", flat=True)
+    enrolled = last_id = 0
+    while True:
+        # Keyset pages, as in campaign dispatch: a list of any size in bounded memory.
+        page = list(ids.filter(id__gt=last_id)[:_batch_size()])
+        if not page:
+            break
+        last_id = page[-1]
+        already = set(
+            FlowEnrollment.objects.filter(flow=flow, contact_id__in=page).values_list("contact_id", flat=True)
+        )
+        new = [
+            FlowEnrollment(flow=flow, contact_id=contact_id, tenant_id=flow.tenant_id, next_run_at=now)
+            for contact_id in page
+            if contact_id not in already
+        ]
+        FlowEnrollment.objects.bulk_create(new, ignore_conflicts=True)
+        enrolled += len(new)
+    if enrolled:
+        from ..tasks import run_flows_task
+
+        # bulk_create skips signals: the cached flow detail must change here.
+        bump_tenant_generation(flow.tenant_id)
+
+        transaction.on_commit(run_flows_task.delay)
+    return enrolled
+
+
+def contacts_created(tenant_id, contact_ids):
+    """Enroll new contacts in the tenant's enabled `contact_created` flows; returns enrollments made."""
+    flows = EmailFlow.objects.filter(tenant_id=tenant_id, enabled=True, trigger="contact_created")
+    return sum(enroll(flow, Contact.objects.filter(id__in=contact_ids)) for flow in flows)
+
+
+# Running ------------------------------------------------------------------------
+def _steps(flow_ids):
+    """{flow_id: {position: step}}; a flow without steps but with a template sends it once."""
+    steps = defaultdict(dict)
+    for step in FlowStep.objects.filter(flow_id__in=flow_ids):
+        steps[step.flow_id][step.position] = step
+    for flow_id, template_id in EmailFlow.objects.filter(id__in=flow_ids).values_list("id", "template_id"):
+        if not steps[flow_id] and template_id:
+            steps[flow_id][0] = FlowStep(flow_id=flow_id, position=0, kind="send", template_id=template_id)
+    return steps
+
+
+def _send(step, group, deltas):
+    """Queue `step.template` to the subscribed, unsuppressed contacts of `group`; returns sends created."""
+    tenant_id = group[0].tenant_id
+    blocked = suppression.suppressed(tenant_id, [e.contact.email for e in group if e.contact.subscribed])
+    recipients = [
+        e for e in group if e.contact.subscribed and suppression.normalize(e.contact.email) not in blocked
+    ]
+    sends = EmailSend.objects.bulk_create(
+        EmailSend(
+            flow_id=step.flow_id,
+            template_id=step.template_id,
+            recipient_id=e.contact_id,
+            tenant_id=tenant_id,
+            status="queued",
+            recipient_domain=scheduler.recipient_domain(e.contact.email),
+            message_id=str(uuid.uuid4()),
+        )
+        for e in recipients
+    )
+    for enrollment in group:
+        enrollment.last_send = None
+    for enrollment, send in zip(recipients, sends):
+        enrollment.last_send = send
+        deltas.change(None, metrics.loaded_values(send))
+    return len(sends)
+
+
+def _matching(step, group):
+    """Contact ids in `group` for which branch `step` holds."""
+    matched = {e.contact_id for e in group}
+    if step.condition.strip():
+        try:
+            q = compile_segment(step.condition)
+        except SegmentError:
+            return set()  # an invalid condition matches nobody, like an invalid segment
+        matched = set(Contact.objects.filter(id__in=matched).filter(q).values_list("id", flat=True))
+    if step.engagement:
+        test = ENGAGEMENT[step.engagement]
+        outcomes = EmailSend.objects.filter(id__in={e.last_send_id for e in group if e.last_send_id})
+        engaged = {
+            send_id for send_id, status, revenue in outcomes.values_list("id", "status", "revenue_attributed")
+            if test(status, revenue)
+        }
+        matched = {e.contact_id for e in group if e.contact_id in matched and e.last_send_id in engaged}
+    return matched
+
+
+def run_due(now=None, batch_size=None):
+    """One flow-scheduler tick; returns counts: "processed", "sends", "completed", "exited", "paused"."""
+    from ..tasks import schedule_sends_task
+
+    now = now or timezone.now()
+    batch_size = batch_size or _batch_size()
+    max_steps = getattr(settings, "EMAIL_FLOW_MAX_STEPS_PER_TICK", 20)
+    counts = Counter()
+    deltas = metrics.Deltas()
+    with transaction.atomic():
+        due = list(
+            FlowEnrollment.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(next_run_at__lte=now)
+            .select_related("flow", "contact")
+            .order_by("next_run_at")[:batch_size]
+        )
+        if not due:
+            return {"processed": 0}
+        recheck = now + timedelta(seconds=getattr(settings, "EMAIL_FLOW_PAUSED_RECHECK_SECONDS", 3600))
+        for enrollment in due:
+            enrollment.updated_at = now
+            if not enrollment.flow.enabled:
+                enrollment.next_run_at = recheck
+                counts["paused"] += 1
+        active = [e for e in due if e.flow.enabled]
+        steps = _steps({e.flow_id for e in active})
+
+        for _ in range(max_steps):
+            if not active:
+                break
+            groups = defaultdict(list)
+            for enrollment in active:
+                groups[(enrollment.flow_id, enrollment.position)].append(enrollment)
+            active = []
+            for (flow_id, position), group in groups.items():
+                step = steps[flow_id].get(position)
+                if step is None:
+                    for enrollment in group:
+                        enrollment.status, enrollment.next_run_at = "completed", None
+                    counts["completed"] += len(group)
+                elif step.kind == "wait":
+                    for enrollment in group:
+                        enrollment.position += 1
+                        # At least a second, so a loop through a zero wait still yields to the next tick.
+                        enrollment.next_run_at = now + timedelta(seconds=max(step.wait_seconds, 1))
+                elif step.kind == "send":
+                    counts["sends"] += _send(step, group, deltas)
+                    for enrollment in group:
+                        enrollment.position += 1
+                    active.extend(group)
+                else:
+                    matched = _matching(step, group)
+                    for enrollment in group:
+                        if enrollment.contact_id in matched:
+                            enrollment.position += 1
+                        elif step.else_position is None:
+                            enrollment.status, enrollment.next_run_at = "exited", None
+                            counts["exited"] += 1
+                            continue
+                        else:
+                            enrollment.position = step.else_position
+                        active.append(enrollment)
+        # Out of steps for this tick: carry on at the next one.
+        for enrollment in active:
+            enrollment.next_run_at = now + timedelta(seconds=getattr(settings, "EMAIL_FLOW_SCHEDULER_INTERVAL", 5))
+
+        FlowEnrollment.objects.bulk_update(due, ["position", "status", "next_run_at", "last_send", "updated_at"])
+        deltas.apply()
+        if counts["sends"]:
+            transaction.on_commit(schedule_sends_task.delay)
+
+    # Bulk writes skip signals: invalidate the API caches of the tenants touched.
+    bump_tenant_generation(*{e.tenant_id for e in due})
+    return {"processed": len(due), **counts}
+
+
+def drain(now=None):
+    """Run ticks until no enrollment due at `now` is left; returns the summed counts."""
+    now = now or timezone.now()
+    total = Counter()
+    while True:
+        result = run_due(now)
+        total.update(result)
+        if result["processed"] < _batch_size():
+            return dict(total)
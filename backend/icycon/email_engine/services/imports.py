@@ -0,0 +1,254 @@
+"""
+Bulk contact imports from CSV or NDJSON, streamed so memory stays flat
+whatever the file size.
+
+Rows are read one line at a time. An `email` column or key is required.
+The optional fields are:
+* `name`;
+* `subscribed` (true/false, yes/no or 1/0);
+* `properties` (NDJSON objects only).
+Any other column or key goes into `Contact.properties`.
+
+Addresses are normalized like the suppression list (trimmed and
+lowercased) and then validated. Existing contacts are matched
+case-insensitively, so a contact stored as `Ann@Example.com` is updated
+under that address rather than duplicated. Valid rows are collected into batches of
+`EMAIL_IMPORT_BATCH_SIZE` distinct addresses. A repeated address within a
+batch is merged into the earlier row, with later values winning. Each
+batch costs:
+* one SELECT of the contacts that already exist (on the `Lower("email")`
+  index);
+* one `bulk_create(update_conflicts=True)` on the (email, tenant) unique
+  constraint;
+* the segment refresh for the batch (`segments.refresh_contacts`) and the
+  enrollment of new contacts in `contact_created` flows (`flows`).
+
+An address that repeats in a later batch updates the same contact again,
+so the result is still "last row wins".
+
+Imports never resubscribe anyone. A new address that is on the tenant's
+suppression list is created unsubscribed. An existing contact keeps its
+subscription unless the row sets `subscribed` to false, which
+unsubscribes it and suppresses the address, as an unsubscribe through the
+API would.
+"""
+
+import csv
+import io
+import json
+import logging
+from pathlib import PurePath
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.validators import validate_email
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from icycon.response_cache import bump_tenant_generation
+
+from ..models import Contact, ContactImport
+from . import flows, suppression
+from .segments import refresh_contacts
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("email", "name", "subscribed", "properties")
+COUNTERS = ("rows", "created", "updated", "invalid", "duplicates", "suppressed")
+TRUE = {"1", "true", "yes", "y", "t"}
+FALSE = {"0", "false", "no", "n", "f"}
+
+
+# Reading ------------------------------------------------------------------------
+def detect_format(name, head=b""):
+    """ "csv" or "ndjson", from the file name or else its first bytes."""
+    suffix = PurePath(name or "").suffix.lower()
+    if suffix == ".csv":
+        return "csv"
+    if suffix in (".ndjson", ".jsonl", ".json"):
+        return "ndjson"
+    return "ndjson" if head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"{") else "csv"
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict or None) from a binary CSV/NDJSON stream; None marks an unreadable line."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, {key.strip(): value for key, value in row.items() if key and value not in (None, "")}
+        return
+    for number, line in enumerate(text, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def _flag(value):
+    if isinstance(value, bool) or value is None:
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE:
+        return True
+    if value in FALSE:
+        return False
+    raise ValueError(f"subscribed must be true or false, not {value!r}")
+
+
+def parse_row(row):
+    """(email, name, subscribed or None, properties) for one input row; raises ValueError."""
+    if row is None:
+        raise ValueError("unreadable line")
+    fields = {key.lower(): key for key in row if isinstance(key, str) and key.lower() in FIELDS}
+    email = suppression.normalize(str(row.get(fields.get("email"), "") or ""))
+    if not email:
+        raise ValueError("missing email")
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValueError("invalid email") from None
+    properties = row.get(fields.get("properties")) if "properties" in fields else {}
+    properties = dict(properties) if isinstance(properties, dict) else {}
+    properties.update({key: value for key, value in row.items() if key not in fields.values()})
+    name = str(row.get(fields.get("name"), "") or "").strip()[:200]
+    return email, name, _flag(row.get(fields.get("subscribed"))), properties
+
+
+# Writing ------------------------------------------------------------------------
+def _existing(tenant_id, emails, *fields):
+    """{normalized email: (stored email, *fields)} of the tenant's contacts, matched case-insensitively."""
+    rows = (
+        Contact.objects.filter(tenant_id=tenant_id)
+        .annotate(email_lower=Lower("email"))
+        .filter(email_lower__in=emails)
+        .order_by("-id")  # of contacts differing only in case, the oldest wins
+        .values_list("email_lower", "email", *fields)
+    )
+    return {email_lower: rest for email_lower, *rest in rows}
+
+
+def _write(tenant_id, batch, stats):
+    """Upsert one batch of {email: (name, subscribed, properties)}."""
+    now = timezone.now()
+    existing = _existing(tenant_id, list(batch), "name", "subscribed", "unsubscribed_at", "properties")
+    blocked = suppression.suppressed(tenant_id, [email for email in batch if email not in existing])
+    contacts, unsubscribed = [], []
+    for email, (name, subscribed, properties) in batch.items():
+        if email in existing:
+            stored_email, old_name, was_subscribed, unsubscribed_at, old_properties = existing[email]
+            keep = was_subscribed and subscribed is not False
+            if was_subscribed and not keep:
+                unsubscribed.append(email)
+                unsubscribed_at = now
+            contact = Contact(
+                tenant_id=tenant_id,
+                email=stored_email,  # the conflict target: keep the stored case
+                name=name or old_name,
+                subscribed=keep,
+                unsubscribed_at=unsubscribed_at,
+                properties={**(old_properties or {}), **properties},
+            )
+            stats["updated"] += 1
+        else:
+            keep = subscribed is not False and email not in blocked
+            if subscribed is False:
+                unsubscribed.append(email)
+            elif not keep:
+                stats["suppressed"] += 1
+            contact = Contact(
+                tenant_id=tenant_id,
+                email=email,
+                name=name,
+                subscribed=keep,
+                subscribed_at=now,
+                unsubscribed_at=None if keep else now,
+                properties=properties,
+            )
+            stats["created"] += 1
+        contacts.append(contact)
+
+    Contact.objects.bulk_create(
+        contacts,
+        update_conflicts=True,
+        unique_fields=["email", "tenant"],
+        update_fields=["name", "subscribed", "unsubscribed_at", "properties"],
+    )
+    # Bulk writes skip signals: suppress unsubscribes and refresh segments here.
+    if unsubscribed:
+        suppression.suppress(tenant_id, unsubscribed, "unsubscribe")
+    ids = {email: contact_id for email, (_, contact_id) in _existing(tenant_id, list(batch), "id").items()}
+    refresh_contacts(tenant_id, list(ids.values()))
+    flows.contacts_created(tenant_id, [contact_id for email, contact_id in ids.items() if email not in existing])
+
+
+def import_contacts(tenant_id, rows, batch_size=None, progress=None):
+    """Upsert contacts from `rows` ((line, dict) pairs, see `read_rows`); returns the counts.
+
+    `progress(stats)` is called after every batch with the counts so far,
+    plus "errors": the first `EMAIL_IMPORT_MAX_ERRORS` rejected rows.
+    """
+    batch_size = batch_size or getattr(settings, "EMAIL_IMPORT_BATCH_SIZE", 2000)
+    max_errors = getattr(settings, "EMAIL_IMPORT_MAX_ERRORS", 100)
+    stats = dict.fromkeys(COUNTERS, 0)
+    stats["errors"] = []
+    batch = {}
+    try:
+        for line, row in rows:
+            stats["rows"] += 1
+            try:
+                email, name, subscribed, properties = parse_row(row)
+            except ValueError as exc:
+                stats["invalid"] += 1
+                if len(stats["errors"]) < max_errors:
+                    stats["errors"].append({"line": line, "email": (row or {}).get("email"), "error": str(exc)})
+                continue
+            if email in batch:
+                stats["duplicates"] += 1
+                old_name, old_subscribed, old_properties = batch[email]
+                batch[email] = (
+                    name or old_name,
+                    old_subscribed if subscribed is None else subscribed,
+                    {**old_properties, **properties},
+                )
+            else:
+                batch[email] = (name, subscribed, properties)
+            if len(batch) >= batch_size:
+                _write(tenant_id, batch, stats)
+                batch = {}
+                if progress:
+                    progress(stats)
+        if batch:
+            _write(tenant_id, batch, stats)
+        if progress:
+            progress(stats)
+    finally:
+        bump_tenant_generation(tenant_id)
+    return stats
+
+
+def run_import(contact_import):
+    """Import a stored upload, recording progress on its `ContactImport`; the upload is deleted afterwards."""
+    tracked = ContactImport.objects.filter(pk=contact_import.pk)
+
+    def progress(stats):
+        tracked.update(**stats)
+
+    tracked.update(status="running")
+    try:
+        with default_storage.open(contact_import.file, "rb") as stream:
+            stats = import_contacts(
+                contact_import.tenant_id, read_rows(stream, contact_import.format), progress=progress
+            )
+    except Exception:
+        logger.exception("Contact import %s failed", contact_import.pk)
+        tracked.update(status="failed", finished_at=timezone.now())
+        raise
+    tracked.update(status="done", finished_at=timezone.now())
+    default_storage.delete(contact_import.file)
+    return stats
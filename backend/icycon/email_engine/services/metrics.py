@@ -0,0 +1,216 @@
+"""
+Email marketing metrics, rolled up per tenant, day, list and template in
+`EmailDailyStats`.
+
+Rollups are maintained with deltas. Each write to an `EmailSend`
+changes a few counters of one rollup row: a status moves from one column
+to another, or bounces, complaints or revenue grow. The row is updated
+in place with F() increments.
+
+* Single saves go through model signals (see `signals`). They compare the
+  row with the snapshot taken when it was loaded.
+* Deleted sends, whether deleted directly or along with their contact,
+  are subtracted in `pre_delete`.
+* Deleting a list or template sets its sends' foreign key to NULL
+  without signals, so its rollup rows are folded into the "none" (0)
+  rows instead (`fold`).
+* Deleting a tenant deletes its rollups too, so none of this runs then.
+* Bulk writes skip signals, so their callers (`campaigns`, `events`)
+  collect a `Deltas` and apply it once per batch.
+
+Reading a summary or a trend therefore scans rollup rows (days × lists ×
+templates), however many sends there are. `rebuild` recomputes the rows
+from the sends, for history and for repairs.
+"""
+
+from collections import Counter, defaultdict
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..models import EmailDailyStats, EmailSend
+
+# EmailSend.status -> rollup column ("scheduled" is still waiting, like "queued").
+STATUS_COLUMNS = {
+    "queued": "queued",
+    "scheduled": "queued",
+    "sent": "sent",
+    "bounced": "bounced",
+    "complaint": "complained",
+    "dropped": "dropped",
+    "failed": "failed",
+}
+COUNTERS = ("queued", "sent", "bounced", "complained", "dropped", "failed", "bounce_events", "complaint_events")
+
+
+TRACKED = ("tenant_id", "created_at", "email_list_id", "template_id", "status", "bounces", "complaints", "revenue_attributed")
+
+
+def _day(created_at):
+    return timezone.localtime(created_at).date() if created_at else timezone.localdate()
+
+
+def rollup_key(send):
+    return (send.tenant_id, _day(send.created_at), send.email_list_id or 0, send.template_id or 0)
+
+
+def loaded_values(send):
+    """The tracked fields `send` holds right now; read from __dict__ so deferred fields stay deferred."""
+    return {field: send.__dict__[field] for field in TRACKED if field in send.__dict__}
+
+
+def contribution(values):
+    """(rollup key, counters) of one send with field `values`."""
+    counters = Counter()
+    column = STATUS_COLUMNS.get(values.get("status"))
+    if column:
+        counters[column] += 1
+    counters["bounce_events"] += values.get("bounces") or 0
+    counters["complaint_events"] += values.get("complaints") or 0
+    counters["revenue"] += Decimal(str(values.get("revenue_attributed") or 0))
+    key = (
+        values.get("tenant_id"),
+        _day(values.get("created_at")),
+        values.get("email_list_id") or 0,
+        values.get("template_id") or 0,
+    )
+    return key, counters
+
+
+class Deltas:
+    """Counter changes per rollup row, applied with one UPDATE per row."""
+
+    def __init__(self):
+        self.rows = defaultdict(Counter)
+
+    def add(self, key, **changes):
+        self.rows[key].update(changes)
+
+    def move(self, send, old_status, new_status):
+        old, new = STATUS_COLUMNS.get(old_status), STATUS_COLUMNS.get(new_status)
+        if old != new:
+            key = rollup_key(send)
+            if old:
+                self.rows[key][old] -= 1
+            if new:
+                self.rows[key][new] += 1
+
+    def change(self, before, after):
+        """Add the change from field values `before` to `after` (either may be None: created, deleted)."""
+        if before is not None:
+            key, counters = contribution(before)
+            self.rows[key].subtract(counters)
+        if after is not None:
+            key, counters = contribution(after)
+            self.rows[key].update(counters)
+
+    def apply(self, create=True):
+        """Write the changes; with `create=False`, changes to rows that don't exist are dropped."""
+        rows = {}
+        for key, changes in self.rows.items():
+            changes = {field: value for field, value in changes.items() if value}
+            if changes:
+                rows[key] = changes
+        self.rows.clear()
+        missing = [key for key, changes in rows.items() if not _increment(key, changes)]
+        if missing and create:
+            # First change of the day: create the rows at zero, then increment them like the rest.
+            EmailDailyStats.objects.bulk_create(
+                [
+                    EmailDailyStats(tenant_id=tenant_id, day=day, list_id=list_id, template_id=template_id)
+                    for tenant_id, day, list_id, template_id in missing
+                ],
+                ignore_conflicts=True,
+            )
+            for key in missing:
+                _increment(key, rows[key])
+
+
+def _increment(key, changes):
+    tenant_id, day, list_id, template_id = key
+    return EmailDailyStats.objects.filter(
+        tenant_id=tenant_id, day=day, list_id=list_id, template_id=template_id
+    ).update(**{field: F(field) + value for field, value in changes.items()})
+
+
+def fold(field, value):
+    """Move the rollups of a deleted list or template (`field` "list_id" or "template_id") to its 0 rows."""
+    rows = EmailDailyStats.objects.filter(**{field: value})
+    deltas = Deltas()
+    for row in rows.values("tenant_id", "day", "list_id", "template_id", *COUNTERS, "revenue"):
+        key = [row["tenant_id"], row["day"], row["list_id"], row["template_id"]]
+        key[2 if field == "list_id" else 3] = 0
+        deltas.add(tuple(key), **{column: row[column] for column in (*COUNTERS, "revenue")})
+    rows.delete()
+    deltas.apply()
+
+
+# Rebuilding -------------------------------------------------------------------
+def rebuild(tenant_ids=None, since=None):
+    """Recompute the rollups from `EmailSend` (for `tenant_ids` / from day `since`); returns rows written."""
+    sends = EmailSend.objects.all()
+    rollups = EmailDailyStats.objects.all()
+    if tenant_ids is not None:
+        sends = sends.filter(tenant_id__in=tenant_ids)
+        rollups = rollups.filter(tenant_id__in=tenant_ids)
+    if since is not None:
+        sends = sends.filter(created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+        rollups = rollups.filter(day__gte=since)
+
+    columns = defaultdict(list)
+    for status, column in STATUS_COLUMNS.items():
+        columns[column].append(status)
+    rows = (
+        sends.annotate(day=TruncDate("created_at"))
+        .values("tenant_id", "day", "email_list_id", "template_id")
+        .annotate(
+            **{column: Count("id", filter=Q(status__in=statuses)) for column, statuses in columns.items()},
+            bounce_events=Sum("bounces"),
+            complaint_events=Sum("complaints"),
+            revenue=Sum("revenue_attributed"),
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        rollups.delete()
+        created = EmailDailyStats.objects.bulk_create(
+            (
+                EmailDailyStats(
+                    tenant_id=row["tenant_id"],
+                    day=row["day"],
+                    list_id=row["email_list_id"] or 0,
+                    template_id=row["template_id"] or 0,
+                    **{column: row[column] for column in columns},
+                    bounce_events=row["bounce_events"] or 0,
+                    complaint_events=row["complaint_events"] or 0,
+                    revenue=row["revenue"] or 0,
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=1000,
+        )
+    return len(created)
+
+
+# Reading ----------------------------------------------------------------------
+def rates(row):
+    """Add delivery, bounce and complaint rates to a dict of summed counters."""
+    attempted = row["sent"] + row["bounced"] + row["complained"]
+    row["bounce_rate"] = round(row["bounced"] / attempted, 4) if attempted else 0.0
+    row["complaint_rate"] = round(row["complained"] / attempted, 4) if attempted else 0.0
+    return row
+
+
+def sums():
+    return {**{field: Sum(field) for field in COUNTERS}, "revenue": Sum("revenue")}
+
+
+def totals(rollups):
+    """Summed counters (with rates) over a queryset of rollup rows."""
+    row = rollups.aggregate(**sums())
+    row = {field: value or 0 for field, value in row.items()}
+    return rates(row)
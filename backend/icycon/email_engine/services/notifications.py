@@ -7,6 +7,13 @@ from .delivery_providers import send_via_provider
 
 User = get_user_model()
 
+# Personalized per recipient at send time (see rendering).
+ACCOUNT_CREATED_TEMPLATE = {
+    'subject': 'Welcome to {{ site_name }} — account created',
+    'body_html': "<p>Hi {{ first_name|default:\"there\" }},</p><p>Your account for {{ tenant }} has been created. You can log in at <a href='/'>{{ site_name }}</a>.</p>",
+    'body_text': "Hi {{ first_name|default:\"there\" }},\nYour account for {{ tenant }} has been created. Visit the site to log in.",
+}
+
 
 def send_account_created_notifications(tenant, user):
     """Send notifications to the newly created user and to site admins/superusers.
@@ -25,11 +32,7 @@ def send_account_created_notifications(tenant, user):
     user_template, _ = EmailTemplate.objects.get_or_create(
         tenant=tenant,
         name='Account Created - User',
-        defaults={
-            'subject': 'Welcome to Icycon — account created',
-            'body_html': f"<p>Hi {user.first_name or user.username},</p><p>Your account for {tenant.name} has been created. You can log in at <a href='/'>{settings.SITE_NAME if hasattr(settings, 'SITE_NAME') else 'Icycon'}</a>.</p>",
-            'body_text': f"Hi {user.first_name or user.username},\nYour account for {tenant.name} has been created. Visit the site to log in.",
-        }
+        defaults=ACCOUNT_CREATED_TEMPLATE,
     )
 
     # Create EmailSend for user
@@ -0,0 +1,182 @@
+"""
+Personalized email rendering.
+
+`EmailTemplate.subject`, `body_html` and `body_text` may contain
+placeholders:
+
+    {{ first_name }}                      first word of Contact.name
+    {{ name }}, {{ email }}               the contact's own fields
+    {{ tenant }}, {{ site_name }}         the sending workspace / site
+    {{ plan }}, {{ address.city }}        keys (dotted for nesting) of Contact.properties
+    {{ first_name|default:"there" }}      fallback for a missing or empty value
+
+A template is compiled once into a list of literal chunks plus the slots
+to fill. The compiled form is cached per process under (template id,
+`updated_at`), so editing a template invalidates it. Rendering for one
+contact is then a dict lookup per placeholder and a join. Values are
+HTML-escaped in `body_html`. In the subject, both the template's own text
+and the values are flattened to one line, so a CR/LF can't start a new
+header.
+
+`CompiledTemplate.message` builds the complete MIME message as text. The
+header block, the multipart boundary and any body part without
+placeholders are encoded once per template and sender, then reused for
+every recipient of a campaign. Only personalized parts are encoded per
+message.
+"""
+
+import base64
+import html
+import re
+import threading
+from collections import OrderedDict
+from email.header import Header
+from email.utils import formatdate, parseaddr
+
+from django.conf import settings
+
+MAX_CACHED = 512
+
+_PLACEHOLDER = re.compile(r"{{\s*([A-Za-z_][\w.]*)\s*(?:\|\s*default\s*:\s*(\"[^\"]*\"|'[^']*'))?\s*}}")
+_MISSING = object()
+
+
+def _one_line(value):
+    return " ".join(value.split())
+
+
+class _CompiledText:
+    """One template field: literal chunks with placeholder slots between them."""
+
+    __slots__ = ("chunks", "slots", "escape")
+
+    def __init__(self, source, escape=str):
+        self.escape = escape
+        self.chunks = []
+        self.slots = []  # (index into chunks, path, escaped default)
+        position = 0
+        for match in _PLACEHOLDER.finditer(source):
+            self.chunks.append(source[position:match.start()])
+            default = match.group(2)
+            self.slots.append((len(self.chunks), tuple(match.group(1).split(".")), escape(default[1:-1]) if default else ""))
+            self.chunks.append("")
+            position = match.end()
+        self.chunks.append(source[position:])
+
+    @property
+    def static(self):
+        return not self.slots
+
+    def render(self, context, properties):
+        if not self.slots:
+            return self.chunks[0]
+        out = self.chunks.copy()
+        escape = self.escape
+        for index, path, default in self.slots:
+            value = context.get(path[0], _MISSING)
+            if value is _MISSING:
+                value = properties.get(path[0]) if isinstance(properties, dict) else None
+            for key in path[1:]:
+                value = value.get(key) if isinstance(value, dict) else None
+            out[index] = escape(str(value)) if value is not None and value != "" else default
+        return "".join(out)
+
+
+def _encode_part(content_type, body):
+    return (
+        f'Content-Type: {content_type}; charset="utf-8"\n'
+        "MIME-Version: 1.0\n"
+        "Content-Transfer-Encoding: base64\n\n" + base64.encodebytes(body.encode("utf-8")).decode("ascii")
+    )
+
+
+def _encode_header(value):
+    return value if value.isascii() else Header(value, "utf-8").encode()
+
+
+class CompiledTemplate:
+    def __init__(self, subject, body_html="", body_text="", key=None):
+        self.subject = _CompiledText(_one_line(subject or ""), escape=_one_line)
+        self.html = _CompiledText(body_html, escape=html.escape) if body_html else None
+        self.text = _CompiledText(body_text) if body_text else None
+        self.boundary = f"=_icycon_{abs(hash((key, subject, body_html, body_text))):x}"
+        self._prefixes = {}  # from_addr -> (shared header block, Message-ID domain)
+        self._static_parts = {}  # "plain"/"html" -> encoded part
+
+    @staticmethod
+    def context(contact, **extra):
+        name = contact.name or ""
+        return {
+            "name": name,
+            "first_name": name.split()[0] if name.strip() else "",
+            "email": contact.email,
+            "site_name": getattr(settings, "SITE_NAME", "Icycon"),
+            **extra,
+        }
+
+    def render(self, contact, **extra):
+        """(subject, html or None, text or None) for `contact`."""
+        context = self.context(contact, **extra)
+        properties = contact.properties or {}
+        return (
+            self.subject.render(context, properties),
+            self.html.render(context, properties) if self.html else None,
+            self.text.render(context, properties) if self.text else None,
+        )
+
+    def _part(self, subtype, compiled, context, properties):
+        if compiled.static:
+            part = self._static_parts.get(subtype)
+            if part is None:
+                part = self._static_parts[subtype] = _encode_part(f"text/{subtype}", compiled.chunks[0])
+            return part
+        return _encode_part(f"text/{subtype}", compiled.render(context, properties))
+
+    def message(self, contact, from_addr, message_id, **extra):
+        """The full message for `contact` as RFC 5322 text (for smtplib.sendmail)."""
+        shared = self._prefixes.get(from_addr)
+        if shared is None:
+            shared = self._prefixes[from_addr] = (
+                f'Content-Type: multipart/alternative; boundary="{self.boundary}"\n'
+                "MIME-Version: 1.0\n"
+                f"From: {from_addr}\n",
+                parseaddr(from_addr)[1].rpartition("@")[2] or "localhost",
+            )
+        prefix, domain = shared
+        context = self.context(contact, **extra)
+        properties = contact.properties or {}
+        lines = [
+            prefix,
+            f"Subject: {_encode_header(self.subject.render(context, properties))}\n",
+            f"To: {contact.email}\n",
+            f"Date: {formatdate(usegmt=True)}\n",
+            f"Message-ID: <{message_id}@{domain}>\n\n",
+        ]
+        for subtype, compiled in (("plain", self.text), ("html", self.html)):
+            if compiled is not None:
+                lines.append(f"--{self.boundary}\n")
+                lines.append(self._part(subtype, compiled, context, properties))
+        lines.append(f"--{self.boundary}--\n")
+        return "".join(lines)
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def compile_template(template):
+    """The cached compiled form of an `EmailTemplate`."""
+    key = (template.pk, template.updated_at)
+    if template.pk is None:
+        return CompiledTemplate(template.subject, template.body_html, template.body_text)
+    with _lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            return compiled
+    compiled = CompiledTemplate(template.subject, template.body_html, template.body_text, key=key)
+    with _lock:
+        _cache[key] = compiled
+        while len(_cache) > MAX_CACHED:
+            _cache.popitem(last=False)
+    return compiled
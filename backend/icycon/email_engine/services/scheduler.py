@@ -0,0 +1,204 @@
+"""
+Send scheduler: releases queued campaign sends at rates the receiving side
+accepts.
+
+Campaign and flow sends are created "queued" with their `recipient_domain`.
+`schedule` runs as a periodic tick (`manage.py run_send_scheduler`, and
+once right after each dispatch). It groups the ready sends by tenant and
+recipient domain and grants each group tokens from two buckets
+(`SendThrottle` rows):
+
+* one per recipient domain, at `EMAIL_DOMAIN_SEND_RATES[domain]` or
+  `EMAIL_DOMAIN_SEND_RATE` messages per minute;
+* one per tenant, at `EMAIL_TENANT_SEND_RATES[plan]`.
+
+Each bucket holds at most `EMAIL_SEND_BURST_SECONDS` worth of tokens.
+Domains with the fewest queued sends are served first, and one domain's
+tokens are split evenly between the tenants queued for it. A large list
+for one mailbox provider therefore never starves the long tail. The
+granted sends are marked "scheduled" (with `scheduled_at`) and handed to
+`send_campaign_chunk_task`, interleaved by domain. If the task is never
+published, or dies before it records an outcome, its sends would stay
+"scheduled" for good. Each tick therefore first puts back in the queue
+any send scheduled more than `EMAIL_SEND_SCHEDULED_TIMEOUT` seconds ago.
+
+Domain rates adapt to what the servers say (AIMD). A 4xx reply puts the
+send back in the queue with exponential backoff (`not_before`). It also
+halves that domain's rate, down to `EMAIL_DOMAIN_MIN_RATE`, and empties
+its bucket. Each chunk that gets through without deferrals raises the
+rate again by `EMAIL_DOMAIN_RATE_STEP` of the configured rate. A send
+deferred `EMAIL_SEND_MAX_ATTEMPTS` times fails.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Value, Window
+from django.db.models.functions import Greatest, Least, RowNumber
+from django.utils import timezone
+
+from ..models import EmailSend, SendThrottle
+
+DOMAIN = "domain:"
+TENANT = "tenant:"
+
+
+def recipient_domain(email):
+    return (email or "").rpartition("@")[2].strip().lower()
+
+
+def _domain_rate(domain):
+    return getattr(settings, "EMAIL_DOMAIN_SEND_RATES", {}).get(domain, getattr(settings, "EMAIL_DOMAIN_SEND_RATE", 600))
+
+
+def _tenant_rate(plan):
+    rates = getattr(settings, "EMAIL_TENANT_SEND_RATES", {})
+    return rates.get(plan, rates.get("free", 600))
+
+
+def _burst(rate):
+    return max(1.0, rate / 60 * getattr(settings, "EMAIL_SEND_BURST_SECONDS", 5))
+
+
+def retry_delay(attempts):
+    """Backoff before the next try of a send deferred `attempts` times."""
+    base = getattr(settings, "EMAIL_SEND_RETRY_SECONDS", 60)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), 6 * 3600))
+
+
+def ready_sends(now=None):
+    """Queued campaign and flow sends whose backoff (if any) is over."""
+    now = now or timezone.now()
+    return EmailSend.objects.filter(status="queued").filter(
+        Q(email_list__isnull=False) | Q(flow__isnull=False)
+    ).filter(Q(not_before__isnull=True) | Q(not_before__lte=now))
+
+
+def requeue_stale(now=None):
+    """Queue again the sends "scheduled" longer than `EMAIL_SEND_SCHEDULED_TIMEOUT` ago; returns how many."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, "EMAIL_SEND_SCHEDULED_TIMEOUT", 900))
+    return EmailSend.objects.filter(status="scheduled", scheduled_at__lt=cutoff).update(
+        status="queued", scheduled_at=None
+    )
+
+
+def _buckets(ceilings, now):
+    """Lock and refill the buckets for {key: configured rate}, creating missing ones full."""
+    SendThrottle.objects.bulk_create(
+        [SendThrottle(key=key, rate=rate, level=_burst(rate), updated_at=now) for key, rate in ceilings.items()],
+        ignore_conflicts=True,
+    )
+    buckets = {b.key: b for b in SendThrottle.objects.select_for_update().filter(key__in=ceilings)}
+    for key, bucket in buckets.items():
+        ceiling = ceilings[key]
+        # Tenant rates follow the plan; domain rates only adapt below their ceiling.
+        bucket.rate = ceiling if key.startswith(TENANT) else min(bucket.rate, ceiling)
+        elapsed = max((now - bucket.updated_at).total_seconds(), 0)
+        bucket.level = min(_burst(bucket.rate), bucket.level + elapsed * bucket.rate / 60)
+        bucket.updated_at = now
+    return buckets
+
+
+def _allocate(groups, buckets, budget):
+    """{(tenant_id, domain): sends to release} for {(tenant_id, domain): queued}."""
+    by_domain = defaultdict(dict)
+    for (tenant_id, domain), queued in groups.items():
+        by_domain[domain][tenant_id] = queued
+    grants = defaultdict(int)
+    for domain, tenants in sorted(by_domain.items(), key=lambda item: (sum(item[1].values()), item[0])):
+        domain_bucket = buckets[DOMAIN + domain]
+        wanting = dict(tenants)
+        while wanting and budget > 0 and domain_bucket.level >= 1:
+            share = max(1, int(domain_bucket.level) // len(wanting))
+            for tenant_id in list(wanting):
+                tenant_bucket = buckets[TENANT + str(tenant_id)]
+                granted = min(share, wanting[tenant_id], int(tenant_bucket.level), int(domain_bucket.level), budget)
+                if granted <= 0:
+                    del wanting[tenant_id]
+                    continue
+                grants[(tenant_id, domain)] += granted
+                tenant_bucket.level -= granted
+                domain_bucket.level -= granted
+                budget -= granted
+                wanting[tenant_id] -= granted
+                if not wanting[tenant_id]:
+                    del wanting[tenant_id]
+    return grants
+
+
+def schedule(now=None):
+    """One scheduler tick; returns {"scheduled": sends released, "chunks": tasks enqueued}.
+
+    "requeued" is added when stale scheduled sends were put back (`requeue_stale`).
+    """
+    from tenants.models import Tenant
+
+    from ..tasks import send_campaign_chunk_task
+
+    now = now or timezone.now()
+    requeued = requeue_stale(now)
+    ready = ready_sends(now)
+    groups = {
+        (tenant_id, domain): queued
+        for tenant_id, domain, queued in ready.values_list("tenant_id", "recipient_domain")
+        .annotate(queued=Count("id"))
+        .order_by()
+    }
+    if not groups:
+        return {"scheduled": 0, "chunks": 0, **({"requeued": requeued} if requeued else {})}
+    plans = dict(Tenant.objects.filter(id__in={tenant_id for tenant_id, _ in groups}).values_list("id", "plan"))
+    ceilings = {DOMAIN + domain: _domain_rate(domain) for _, domain in groups}
+    ceilings.update({TENANT + str(tenant_id): _tenant_rate(plans.get(tenant_id)) for tenant_id, _ in groups})
+
+    with transaction.atomic():
+        buckets = _buckets(ceilings, now)
+        grants = _allocate(groups, buckets, getattr(settings, "EMAIL_SCHEDULER_MAX_PER_TICK", 5000))
+        ranked = []
+        if grants:
+            rows = (
+                ready.filter(recipient_domain__in={domain for _, domain in grants})
+                .annotate(
+                    rank=Window(RowNumber(), partition_by=[F("tenant_id"), F("recipient_domain")], order_by=F("id").asc())
+                )
+                .filter(rank__lte=max(grants.values()))
+                .values_list("id", "tenant_id", "recipient_domain", "rank")
+            )
+            # Ordered by rank, so each chunk interleaves domains instead of sending one domain's block.
+            ranked = sorted(
+                (rank, domain, send_id)
+                for send_id, tenant_id, domain, rank in rows
+                if rank <= grants.get((tenant_id, domain), 0)
+            )
+        ids = [send_id for _, _, send_id in ranked]
+        chunk_size = getattr(settings, "EMAIL_CAMPAIGN_CHUNK_SIZE", 500)
+        chunks = [ids[start:start + chunk_size] for start in range(0, len(ids), chunk_size)]
+        for chunk in chunks:
+            EmailSend.objects.filter(id__in=chunk, status="queued").update(status="scheduled", scheduled_at=now)
+        SendThrottle.objects.bulk_update(buckets.values(), ["rate", "level", "updated_at"])
+
+    for chunk in chunks:
+        send_campaign_chunk_task.delay(chunk)
+    result = {"scheduled": len(ids), "chunks": len(chunks)}
+    if requeued:
+        result["requeued"] = requeued
+    return result
+
+
+def record_outcomes(outcomes):
+    """Adapt domain rates to {domain: (sent, deferred)} from one chunk."""
+    step = getattr(settings, "EMAIL_DOMAIN_RATE_STEP", 0.1)
+    floor = getattr(settings, "EMAIL_DOMAIN_MIN_RATE", 10)
+    for domain, (sent, deferred) in outcomes.items():
+        throttle = SendThrottle.objects.filter(key=DOMAIN + domain)
+        if deferred:
+            throttle.update(
+                rate=Greatest(F("rate") / 2, Value(float(floor))),
+                level=Least(F("level"), Value(0.0)),
+                deferrals=F("deferrals") + deferred,
+            )
+        elif sent:
+            ceiling = float(_domain_rate(domain))
+            throttle.update(rate=Least(F("rate") + ceiling * step, Value(ceiling)))
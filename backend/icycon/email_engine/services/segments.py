@@ -0,0 +1,280 @@
+"""
+Segment expressions for `EmailList.segment_sql`.
+
+A small filter language over `Contact`, compiled to a `Q` (never to raw
+SQL, so a segment can't reach outside the tenant's contacts):
+
+    subscribed = true and properties.plan in ["pro", "enterprise"]
+    (properties.age >= 30 or email endswith "@example.com") and not name = ""
+    properties.address.city exists
+
+Fields are `email`, `name`, `subscribed`, `subscribed_at`,
+`unsubscribed_at` and `properties.<key>[.<key>...]` (JSON keys). Operators
+are `= != < <= > >=`, `in [...]`, `contains`, `startswith` and `endswith`
+(case-insensitive), and `exists`. They combine with `and`, `or`, `not` and
+parentheses. Values are quoted strings, numbers, `true`, `false` and
+`null`.
+
+Matches are materialized in `ListMembership` (see `refresh_list` and
+`refresh_contacts`). At send time a segmented list is therefore a single
+scan of the membership index, not a re-evaluation of the expression.
+"""
+
+import logging
+import re
+
+from django.db import transaction
+from django.db.models import Count, JSONField, Q
+from django.db.models.fields.json import KeyTransform
+
+from ..models import Contact, EmailList, ListMembership
+
+FIELDS = {"email", "name", "subscribed", "subscribed_at", "unsubscribed_at"}
+COMPARISONS = {"=": "exact", "!=": "exact", "<": "lt", "<=": "lte", ">": "gt", ">=": "gte"}
+TEXT_OPERATORS = {"contains": "icontains", "startswith": "istartswith", "endswith": "iendswith"}
+# JSON keys that Django would read as lookups instead of keys.
+RESERVED_KEYS = frozenset(JSONField.get_lookups()) | frozenset(KeyTransform.get_lookups())
+MAX_LENGTH = 4000
+BATCH_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<op><=|>=|!=|=|<|>|\(|\)|\[|\]|,)
+      | (?P<word>[A-Za-z_][\w.]*)
+    )""",
+    re.VERBOSE,
+)
+
+
+class SegmentError(ValueError):
+    """An invalid segment expression."""
+
+
+def _tokenize(source):
+    tokens, position = [], 0
+    source = source.rstrip()
+    while position < len(source):
+        match = _TOKEN.match(source, position)
+        if match is None or match.end() == position:
+            raise SegmentError(f"Unexpected input at position {position}: {source[position:position + 20]!r}")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "string":
+            value = re.sub(r"\\(.)", r"\1", text[1:-1])
+        elif kind == "number":
+            value = float(text) if "." in text else int(text)
+        else:
+            value = text
+        tokens.append((kind, value, match.start(kind)))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, source):
+        self.tokens = _tokenize(source)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None, None)
+
+    def keyword(self, *words):
+        kind, value, _ = self.peek()
+        if kind == "word" and value.lower() in words:
+            self.position += 1
+            return value.lower()
+        return None
+
+    def expect(self, op):
+        kind, value, at = self.peek()
+        if kind != "op" or value != op:
+            raise SegmentError(f"Expected {op!r} at position {at}" if at is not None else f"Expected {op!r} at the end")
+        self.position += 1
+
+    def parse(self):
+        if not self.tokens:
+            raise SegmentError("Empty segment")
+        q = self.or_expr()
+        kind, value, at = self.peek()
+        if kind is not None:
+            raise SegmentError(f"Unexpected {value!r} at position {at}")
+        return q
+
+    def or_expr(self):
+        q = self.and_expr()
+        while self.keyword("or"):
+            q |= self.and_expr()
+        return q
+
+    def and_expr(self):
+        q = self.not_expr()
+        while self.keyword("and"):
+            q &= self.not_expr()
+        return q
+
+    def not_expr(self):
+        if self.keyword("not"):
+            return ~self.not_expr()
+        kind, value, _ = self.peek()
+        if kind == "op" and value == "(":
+            self.position += 1
+            q = self.or_expr()
+            self.expect(")")
+            return q
+        return self.condition()
+
+    def value(self):
+        kind, value, at = self.peek()
+        self.position += 1
+        if kind in ("string", "number"):
+            return value
+        if kind == "word" and value.lower() in ("true", "false", "null"):
+            return {"true": True, "false": False, "null": None}[value.lower()]
+        raise SegmentError(f"Expected a value at position {at}" if at is not None else "Expected a value at the end")
+
+    def condition(self):
+        kind, name, at = self.peek()
+        if kind != "word":
+            raise SegmentError(f"Expected a field at position {at}" if at is not None else "Expected a field at the end")
+        self.position += 1
+        path = _field_path(name, at)
+
+        if self.keyword("exists"):
+            if "__" in path:
+                parent, _, key = path.rpartition("__")
+                return Q(**{f"{parent}__has_key": key})
+            return Q(**{f"{path}__isnull": False})
+        if self.keyword("in"):
+            self.expect("[")
+            values = [self.value()]
+            while self.peek()[:2] == ("op", ","):
+                self.position += 1
+                values.append(self.value())
+            self.expect("]")
+            return Q(**{f"{path}__in": values})
+        operator = self.keyword(*TEXT_OPERATORS)
+        if operator:
+            value = self.value()
+            if not isinstance(value, str):
+                raise SegmentError(f"{operator} needs a string value")
+            return Q(**{f"{path}__{TEXT_OPERATORS[operator]}": value})
+
+        kind, op, at = self.peek()
+        if kind != "op" or op not in COMPARISONS:
+            raise SegmentError(f"Expected an operator after {name!r}")
+        self.position += 1
+        value = self.value()
+        if value is None:
+            q = Q(**{f"{path}__isnull": True})
+            return ~q if op == "!=" else q
+        q = Q(**{f"{path}__{COMPARISONS[op]}": value})
+        return ~q if op == "!=" else q
+
+
+def _field_path(name, at):
+    if name in FIELDS:
+        return name
+    parts = name.split(".")
+    if parts[0] == "properties" and len(parts) > 1:
+        for key in parts[1:]:
+            if not key or key in RESERVED_KEYS:
+                raise SegmentError(f"Unsupported property key {key!r} at position {at}")
+        return "__".join(parts)
+    raise SegmentError(f"Unknown field {name!r} at position {at}")
+
+
+def compile_segment(source):
+    """The `Q` over `Contact` for a segment expression; raises `SegmentError`."""
+    if len(source) > MAX_LENGTH:
+        raise SegmentError(f"Segment longer than {MAX_LENGTH} characters")
+    return _Parser(source).parse()
+
+
+def segment_queryset(email_list):
+    """The contacts `email_list`'s segment matches right now (evaluated, not materialized)."""
+    contacts = Contact.objects.filter(tenant_id=email_list.tenant_id)
+    if email_list.segment_sql.strip():
+        contacts = contacts.filter(compile_segment(email_list.segment_sql))
+    return contacts
+
+
+# Materialized membership ----------------------------------------------------------
+def refresh_list(email_list):
+    """Recompute `email_list`'s memberships in full; returns (added, removed).
+
+    An invalid segment matches nobody, so its list is emptied rather than
+    left with the members of the last valid one.
+    """
+    segment = email_list.segment_sql.strip()
+    if segment:
+        try:
+            compile_segment(segment)
+        except SegmentError as exc:
+            logger.error("Emptying email list %s: invalid segment: %s", email_list.id, exc)
+            segment = ""
+    if not segment:
+        removed, _ = ListMembership.objects.filter(email_list=email_list).delete()
+        return 0, removed
+    matching = segment_queryset(email_list).values("id")
+    removed, _ = ListMembership.objects.filter(email_list=email_list).exclude(contact_id__in=matching).delete()
+    missing = (
+        segment_queryset(email_list)
+        .exclude(list_memberships__email_list=email_list)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    added, last_id = 0, 0
+    while True:
+        contact_ids = list(missing.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not contact_ids:
+            return added, removed
+        last_id = contact_ids[-1]
+        ListMembership.objects.bulk_create(
+            [ListMembership(email_list=email_list, contact_id=contact_id) for contact_id in contact_ids],
+            ignore_conflicts=True,
+        )
+        added += len(contact_ids)
+
+
+def refresh_contacts(tenant_id, contact_ids):
+    """Re-evaluate every segmented list of `tenant_id` for these contacts.
+
+    One query evaluates all of the tenant's segments per batch of contacts
+    (a conditional count per list), then memberships are added and removed
+    in bulk. Call this after bulk writes to contacts, which skip signals.
+    """
+    lists = {}
+    for email_list in EmailList.objects.filter(tenant_id=tenant_id).exclude(segment_sql=""):
+        try:
+            lists[email_list.id] = compile_segment(email_list.segment_sql)
+        except SegmentError:
+            continue  # invalid segments match nobody; clean() reports them on save
+    contact_ids = list(contact_ids)
+    if not lists or not contact_ids:
+        return
+    for start in range(0, len(contact_ids), BATCH_SIZE // 10):
+        batch = contact_ids[start:start + BATCH_SIZE // 10]
+        rows = Contact.objects.filter(tenant_id=tenant_id, id__in=batch).values("id").annotate(
+            **{f"list_{list_id}": Count("id", filter=q) for list_id, q in lists.items()}
+        )
+        add, keep = [], set()
+        for row in rows:
+            for list_id in lists:
+                if row[f"list_{list_id}"]:
+                    add.append(ListMembership(email_list_id=list_id, contact_id=row["id"]))
+                    keep.add((list_id, row["id"]))
+        with transaction.atomic():
+            ListMembership.objects.bulk_create(add, ignore_conflicts=True)
+            stale = [
+                membership_id
+                for membership_id, list_id, contact_id in ListMembership.objects.filter(
+                    email_list_id__in=lists, contact_id__in=batch
+                ).values_list("id", "email_list_id", "contact_id")
+                if (list_id, contact_id) not in keep
+            ]
+            if stale:
+                ListMembership.objects.filter(id__in=stale).delete()
@@ -0,0 +1,232 @@
+"""
+Pooled SMTP transport.
+
+Opening an SMTP session costs a TCP connect plus EHLO, STARTTLS (a TLS
+handshake) and AUTH, which is several round trips before the first message.
+The pool keeps up to `EMAIL_SMTP_POOL_SIZE` authenticated sessions per
+worker process and reuses them across sends:
+
+* A session idle for longer than `EMAIL_SMTP_IDLE_CHECK` seconds is checked
+  with NOOP before reuse. Servers drop idle clients, and a dead session
+  must not cost a failed send.
+* If a session turns out to be dead mid-send (disconnect, 421, socket
+  error), it is discarded and the message is retried once on a fresh one.
+  Refused recipients and other permanent replies are not retried.
+* A session is closed after `EMAIL_SMTP_MAX_MESSAGES` messages, since many
+  providers cap messages per connection.
+
+Pools are per process, and are rebuilt after a fork and whenever an
+`EMAIL_*` setting changes.
+"""
+
+import atexit
+import logging
+import os
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+class _Session:
+    __slots__ = ("smtp", "sent", "last_used")
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    def __init__(
+        self,
+        host,
+        port=25,
+        username=None,
+        password=None,
+        use_tls=False,
+        use_ssl=False,
+        timeout=10,
+        size=4,
+        max_messages=100,
+        idle_check=30,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_check = idle_check
+        self.connects = 0
+        self._idle = []  # most recently used last
+        self._open = 0
+        self._cond = threading.Condition()
+
+    # Sessions ---------------------------------------------------------------
+    def _connect(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.use_tls and not self.use_ssl:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+        except BaseException:
+            _close(smtp)
+            raise
+        self.connects += 1
+        return _Session(smtp)
+
+    def _alive(self, session):
+        if time.monotonic() - session.last_used < self.idle_check:
+            return True
+        try:
+            return session.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _checkout(self, timeout):
+        with self._cond:
+            while not self._idle and self._open >= self.size:
+                if not self._cond.wait(timeout):
+                    raise TimeoutError(f"No SMTP connection to {self.host} free within {timeout}s")
+            if self._idle:
+                session = self._idle.pop()
+            else:
+                session = None
+                self._open += 1
+        if session is not None and self._alive(session):
+            return session
+        if session is not None:
+            _close(session.smtp)
+        try:
+            return self._connect()
+        except BaseException:
+            self._discard(None)
+            raise
+
+    def _checkin(self, session):
+        session.last_used = time.monotonic()
+        if session.sent >= self.max_messages:
+            _quit(session.smtp)
+            self._discard(None)
+            return
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    def _discard(self, session):
+        if session is not None:
+            _close(session.smtp)
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    # Sending ----------------------------------------------------------------
+    def send(self, from_addr, to_addrs, message):
+        """Send one message (str or bytes); raises smtplib errors on failure."""
+        for attempt in (1, 2):
+            session = self._checkout(self.timeout)
+            try:
+                session.smtp.sendmail(from_addr, to_addrs, message)
+            except smtplib.SMTPResponseException as exc:
+                if exc.smtp_code != 421:
+                    # The message was refused; the session itself is fine.
+                    session.sent += 1
+                    self._checkin(session)
+                    raise
+                error = exc  # the server is closing the channel
+            except smtplib.SMTPRecipientsRefused:
+                session.sent += 1
+                self._checkin(session)
+                raise
+            except OSError as exc:  # disconnects and socket errors (smtplib's errors are OSErrors too)
+                error = exc
+            except BaseException:
+                self._discard(session)
+                raise
+            else:
+                session.sent += 1
+                self._checkin(session)
+                return
+            self._discard(session)
+            if attempt == 2:
+                raise error
+            logger.info("SMTP session to %s died (%s); retrying on a new one", self.host, error)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for session in idle:
+            _quit(session.smtp)
+
+
+def _quit(smtp):
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        _close(smtp)
+
+
+def _close(smtp):
+    try:
+        smtp.close()
+    except OSError:
+        pass
+
+
+_pool = None
+_pool_pid = None
+_lock = threading.Lock()
+
+
+def get_pool():
+    """This process's pool for the `EMAIL_*` settings."""
+    global _pool, _pool_pid
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # A forked worker must not share its parent's sockets.
+            _pool = SMTPPool(
+                settings.EMAIL_HOST,
+                getattr(settings, "EMAIL_PORT", 25),
+                username=getattr(settings, "EMAIL_HOST_USER", None),
+                password=getattr(settings, "EMAIL_HOST_PASSWORD", None),
+                use_tls=getattr(settings, "EMAIL_USE_TLS", False),
+                use_ssl=getattr(settings, "EMAIL_USE_SSL", False),
+                size=getattr(settings, "EMAIL_SMTP_POOL_SIZE", 4),
+                max_messages=getattr(settings, "EMAIL_SMTP_MAX_MESSAGES", 100),
+                idle_check=getattr(settings, "EMAIL_SMTP_IDLE_CHECK", 30),
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None and _pool_pid == os.getpid():
+        pool.close()
+
+
+@receiver(setting_changed)
+def _reset_pool(*, setting, **kwargs):
+    if setting.startswith("EMAIL_"):
+        close_pool()
+
+
+atexit.register(close_pool)
@@ -0,0 +1,170 @@
+"""
+Per-tenant suppression list: addresses that unsubscribed, hard-bounced or
+complained are never mailed again, on any list.
+
+The `Suppression` table is the source of truth. Each process mirrors it
+into one Bloom filter per tenant, so checking a chunk of recipients
+usually costs no query: a miss in the filter is definitive. Only
+addresses the filter reports (the suppressed ones, plus about
+`EMAIL_SUPPRESSION_FALSE_POSITIVE_RATE` of the rest) are confirmed
+against the table.
+
+Filters are kept current incrementally. Before each check, one indexed
+query returns two kinds of rows: those with an id above the last one
+seen, and those created in the last `EMAIL_SUPPRESSION_SYNC_OVERLAP_SECONDS`
+before the previous sync. The overlap window catches a row that commits
+after a row with a higher id has already been read, such as a long
+events or import transaction. Without it, the filter would miss that
+address for good. As a backstop for transactions that run even longer, a
+filter is rebuilt from the table every
+`EMAIL_SUPPRESSION_REBUILD_SECONDS`. A filter is also rebuilt, at twice
+the size, once it outgrows its capacity.
+
+A Bloom filter can't forget an address. A removed suppression (a
+re-subscribe) therefore stays in the filter until it is rebuilt, and the
+exact check keeps it mailable meanwhile.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Suppression
+
+
+def normalize(email):
+    return (email or "").strip().lower()
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter over strings (double hashing on one BLAKE2b digest)."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class _TenantFilter:
+    __slots__ = ("bloom", "last_id", "synced_at", "recent", "built_at")
+
+    def __init__(self, bloom, last_id, synced_at, recent, built_at):
+        self.bloom = bloom
+        self.last_id = last_id
+        self.synced_at = synced_at  # wall clock when the last sync query started
+        self.recent = recent  # ids the last sync returned, so the overlap isn't counted twice
+        self.built_at = built_at  # monotonic
+
+
+_filters = {}  # tenant_id -> _TenantFilter
+_lock = threading.Lock()
+
+
+def _new_filter(expected):
+    capacity = max(getattr(settings, "EMAIL_SUPPRESSION_MIN_CAPACITY", 10000), expected * 2)
+    return BloomFilter(capacity, getattr(settings, "EMAIL_SUPPRESSION_FALSE_POSITIVE_RATE", 0.001))
+
+
+def _overlap():
+    return timedelta(seconds=getattr(settings, "EMAIL_SUPPRESSION_SYNC_OVERLAP_SECONDS", 300))
+
+
+def _build(tenant_id, now):
+    rows = list(Suppression.objects.filter(tenant_id=tenant_id).values_list("id", "email", "created_at"))
+    bloom = _new_filter(len(rows))
+    for _, email, _ in rows:
+        bloom.add(email)
+    window = now - _overlap()
+    return _TenantFilter(
+        bloom,
+        max((row_id for row_id, _, _ in rows), default=0),
+        now,
+        {row_id for row_id, _, created_at in rows if created_at >= window},
+        time.monotonic(),
+    )
+
+
+def _sync(tenant_id):
+    """This process's filter for `tenant_id`, with every suppression committed so far."""
+    now = timezone.now()
+    with _lock:
+        tenant_filter = _filters.get(tenant_id)
+    rebuild_after = getattr(settings, "EMAIL_SUPPRESSION_REBUILD_SECONDS", 3600)
+    if tenant_filter is None or time.monotonic() - tenant_filter.built_at >= rebuild_after:
+        tenant_filter = _build(tenant_id, now)
+    else:
+        rows = list(
+            Suppression.objects.filter(tenant_id=tenant_id)
+            .filter(Q(id__gt=tenant_filter.last_id) | Q(created_at__gte=tenant_filter.synced_at - _overlap()))
+            .values_list("id", "email")
+        )
+        new = [(row_id, email) for row_id, email in rows if row_id not in tenant_filter.recent]
+        bloom = tenant_filter.bloom
+        if bloom.count + len(new) > bloom.capacity:
+            # Outgrown: rebuild from scratch at twice the size (this also drops removed rows).
+            tenant_filter = _build(tenant_id, now)
+        else:
+            for _, email in new:
+                bloom.add(email)
+            tenant_filter = _TenantFilter(
+                bloom,
+                max([tenant_filter.last_id] + [row_id for row_id, _ in rows]),
+                now,
+                {row_id for row_id, _ in rows},
+                tenant_filter.built_at,
+            )
+    with _lock:
+        current = _filters.get(tenant_id)
+        if current is None or current.synced_at <= tenant_filter.synced_at:
+            _filters[tenant_id] = tenant_filter
+    return tenant_filter
+
+
+def suppressed(tenant_id, emails):
+    """The subset of `emails` (normalized) that `tenant_id` must not mail."""
+    bloom = _sync(tenant_id).bloom
+    candidates = {normalize(email) for email in emails}
+    candidates = [email for email in candidates if email in bloom]
+    if not candidates:
+        return set()
+    return set(Suppression.objects.filter(tenant_id=tenant_id, email__in=candidates).values_list("email", flat=True))
+
+
+def is_suppressed(tenant_id, email):
+    return bool(suppressed(tenant_id, [email]))
+
+
+def suppress(tenant_id, emails, reason):
+    """Add `emails` to `tenant_id`'s suppression list (existing entries keep their reason)."""
+    rows = [Suppression(tenant_id=tenant_id, email=normalize(email), reason=reason) for email in emails if normalize(email)]
+    if rows:
+        Suppression.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def unsuppress(tenant_id, emails, reasons=("unsubscribe",)):
+    """Remove suppressions with one of `reasons`; bounces and complaints stay by default."""
+    normalized = [normalize(email) for email in emails]
+    deleted, _ = Suppression.objects.filter(tenant_id=tenant_id, email__in=normalized, reason__in=reasons).delete()
+    return deleted
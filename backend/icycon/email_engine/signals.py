@@ -0,0 +1,105 @@
+"""
+Keep materialized segment memberships (ListMembership) in step with contacts
+and lists, the suppression list with unsubscribes, and the metrics rollups
+with saved and deleted sends (and deleted lists and templates). New contacts
+are enrolled in their tenant's `contact_created` flows.
+"""
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+
+from tenants.models import Tenant
+
+from .models import Contact, EmailList, EmailSend, EmailTemplate
+from .services import flows, metrics, suppression
+from .services.segments import refresh_contacts
+
+
+def _remember_subscribed(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred field isn't loaded just for this.
+    instance._loaded_subscribed = instance.__dict__.get("subscribed", True)
+
+
+def _contact_saved(sender, instance, created, **kwargs):
+    tenant_id, pk = instance.tenant_id, instance.pk
+    # After commit, so the segments see the row as other connections will.
+    transaction.on_commit(lambda: refresh_contacts(tenant_id, [pk]))
+    if created:
+        transaction.on_commit(lambda: flows.contacts_created(tenant_id, [pk]))
+    was_subscribed = True if created else getattr(instance, "_loaded_subscribed", True)
+    if was_subscribed and not instance.subscribed:
+        suppression.suppress(tenant_id, [instance.email], "unsubscribe")
+    elif instance.subscribed and not was_subscribed:
+        suppression.unsuppress(tenant_id, [instance.email])
+    instance._loaded_subscribed = instance.subscribed
+
+
+def _remember_segment(sender, instance, **kwargs):
+    instance._loaded_segment = instance.segment_sql
+
+
+def _list_saved(sender, instance, created, **kwargs):
+    if not created and instance.segment_sql == getattr(instance, "_loaded_segment", None):
+        return
+    instance._loaded_segment = instance.segment_sql
+    from .tasks import refresh_list_task
+
+    list_id = instance.pk
+    transaction.on_commit(lambda: refresh_list_task.delay(list_id))
+
+
+def _remember_send(sender, instance, **kwargs):
+    instance._loaded_metrics = metrics.loaded_values(instance) if instance.pk else None
+
+
+def _send_saved(sender, instance, created, **kwargs):
+    loaded = None if created else getattr(instance, "_loaded_metrics", None)
+    current = metrics.loaded_values(instance)
+    instance._loaded_metrics = current
+    if loaded is not None:
+        # A field deferred on one side was not changed by this save.
+        loaded, current = {**current, **loaded}, {**loaded, **current}
+        if loaded == current:
+            return
+        if "created_at" not in current:
+            loaded["created_at"] = current["created_at"] = instance.created_at
+    deltas = metrics.Deltas()
+    deltas.change(loaded, current)
+    deltas.apply()
+
+
+def _tenant_deleted(origin):
+    # The tenant's rollups are deleted with it: nothing to keep in step.
+    return isinstance(origin, Tenant) or (isinstance(origin, QuerySet) and origin.model is Tenant)
+
+
+def _send_deleting(sender, instance, origin=None, **kwargs):
+    if _tenant_deleted(origin):
+        return
+    missing = [field for field in metrics.TRACKED if field not in instance.__dict__]
+    if missing:
+        instance.refresh_from_db(fields=[field.removesuffix("_id") for field in missing])
+    deltas = metrics.Deltas()
+    deltas.change(metrics.loaded_values(instance), None)
+    deltas.apply(create=False)
+
+
+def _list_deleted(sender, instance, origin=None, **kwargs):
+    if not _tenant_deleted(origin):
+        metrics.fold("list_id", instance.pk)
+
+
+def _template_deleted(sender, instance, origin=None, **kwargs):
+    if not _tenant_deleted(origin):
+        metrics.fold("template_id", instance.pk)
+
+
+post_init.connect(_remember_subscribed, sender=Contact, dispatch_uid="email-suppression:contact-init")
+post_save.connect(_contact_saved, sender=Contact, dispatch_uid="email-segments:contact-saved")
+post_init.connect(_remember_segment, sender=EmailList, dispatch_uid="email-segments:list-init")
+post_save.connect(_list_saved, sender=EmailList, dispatch_uid="email-segments:list-saved")
+post_init.connect(_remember_send, sender=EmailSend, dispatch_uid="email-metrics:send-init")
+post_save.connect(_send_saved, sender=EmailSend, dispatch_uid="email-metrics:send-saved")
+pre_delete.connect(_send_deleting, sender=EmailSend, dispatch_uid="email-metrics:send-deleting")
+post_delete.connect(_list_deleted, sender=EmailList, dispatch_uid="email-metrics:list-deleted")
+post_delete.connect(_template_deleted, sender=EmailTemplate, dispatch_uid="email-metrics:template-deleted")
@@ -1,18 +1,30 @@
 from celery import shared_task
 from django.utils import timezone
-from .models import EmailSend, Contact, EmailTemplate, EmailList
+from .models import EmailSend, Contact, ContactImport, EmailTemplate, EmailList
 from .services.delivery_providers import send_via_provider
-from .services.deliverability import check_spf_dkim_dmarc
+from .services.deliverability import run_checks
+from .services.events import drain as apply_delivery_events
+from .services.campaigns import dispatch_campaign, send_chunk
+from .services.flows import drain
+from .services.imports import COUNTERS, run_import
+from .services.scheduler import schedule
+from .services.segments import refresh_list
+from .services.suppression import is_suppressed
 
 @shared_task
 def queue_email_send_task(email_send_id):
-    send = EmailSend.objects.get(id=email_send_id)
-    # Check subscription & lawful basis
+    send = EmailSend.objects.select_related("recipient", "template", "tenant").get(id=email_send_id)
+    # Check subscription & lawful basis, then the tenant-wide suppression list
     if not send.recipient.subscribed:
         send.status = "dropped"
         send.last_error = "Recipient unsubscribed."
         send.save()
         return {"status": "dropped", "reason": "unsubscribed"}
+    if is_suppressed(send.tenant_id, send.recipient.email):
+        send.status = "dropped"
+        send.last_error = "Recipient suppressed."
+        send.save()
+        return {"status": "dropped", "reason": "suppressed"}
 
     # Simple provider send
     success, message_id, error = send_via_provider(send)
@@ -27,8 +39,51 @@ def queue_email_send_task(email_send_id):
     return {"status": send.status, "message_id": message_id, "error": error}
 
 @shared_task
-def deliverability_check_task(tenant_id):
-    # runs SPF/DKIM/DMARC checks using domain records saved in tenant metadata (placeholder)
-    result = check_spf_dkim_dmarc(tenant_id)
-    # Ideally save results to a Deliverability model or log them
-    return result
+def dispatch_campaign_task(email_list_id, template_id):
+    """Create the campaign's sends in chunks and fan them out to chunk tasks."""
+    email_list = EmailList.objects.get(id=email_list_id)
+    template = EmailTemplate.objects.get(id=template_id, tenant_id=email_list.tenant_id)
+    return dispatch_campaign(email_list, template)
+
+@shared_task
+def send_campaign_chunk_task(email_send_ids):
+    # One chunk of a campaign, released by the scheduler: send, then write back outcomes in bulk.
+    return send_chunk(email_send_ids)
+
+@shared_task
+def schedule_sends_task():
+    """One send-scheduler tick: release queued campaign sends within the rate limits."""
+    return schedule()
+
+@shared_task
+def refresh_list_task(email_list_id):
+    """Rebuild a list's materialized segment membership (after its segment changed)."""
+    email_list = EmailList.objects.filter(id=email_list_id).first()
+    if email_list is None:
+        return None
+    added, removed = refresh_list(email_list)
+    return {"added": added, "removed": removed}
+
+@shared_task
+def deliverability_check_task(tenant_id=None):
+    """Check SPF/DKIM/DMARC/MX for a tenant's sending domains (every tenant's if None) and store them."""
+    return {"checked": run_checks(None if tenant_id is None else [tenant_id])}
+
+@shared_task
+def import_contacts_task(contact_import_id):
+    """Stream an uploaded contact file into the tenant's contacts (progress is kept on the ContactImport)."""
+    contact_import = ContactImport.objects.filter(id=contact_import_id, status="pending").first()
+    if contact_import is None:
+        return None
+    stats = run_import(contact_import)
+    return {key: stats[key] for key in COUNTERS}
+
+@shared_task
+def run_flows_task():
+    """Advance every flow enrollment that is due now, a batch at a time."""
+    return drain()
+
+@shared_task
+def apply_delivery_events_task():
+    """Apply every stored bounce/complaint event that is due, a batch at a time."""
+    return apply_delivery_events()
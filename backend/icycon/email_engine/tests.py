@@ -1,3 +1,1059 @@
-from django.test import TestCase
+import email
+import io
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+from seo.models import Site
+from tenants.models import Integration, Tenant, TenantUser
+from .models import (
+    Contact, ContactImport, DeliveryEvent, DomainCheck, EmailDailyStats, EmailFlow, EmailList, EmailSend, EmailTemplate,
+    FlowEnrollment, FlowStep, ListMembership, SendThrottle, Suppression,
+)
+from .services import deliverability, events, flows, imports, metrics, suppression
+from .services.campaigns import dispatch_campaign, send_chunk
+from .services.delivery_providers import send_via_provider
+from .services.rendering import compile_template
+from .services.scheduler import schedule
+from .services.segments import SegmentError, compile_segment, refresh_contacts
+from .services.smtp_pool import SMTPPool, close_pool, get_pool
+from .tasks import refresh_list_task
+
+
+class SMTPSink:
+    """A local SMTP server that accepts every message except to `reject@`.
+
+    Recipients at a domain in `defer` get a 451 (try again later). Counts
+    connections and messages, and records accepted recipients;
+    `drop_connections()` closes every client socket without a goodbye,
+    like a server timing out idle clients.
+    """
+
+    def __init__(self, defer=()):
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                sink.connections += 1
+                sink.sockets.append(self.connection)
+                self.wfile.write(b"220 sink ESMTP\r\n")
+                in_data = False
+                for raw in self.rfile:
+                    line = raw.rstrip(b"\r\n")
+                    if in_data:
+                        if line == b".":
+                            in_data = False
+                            sink.messages += 1
+                            self.wfile.write(b"250 queued\r\n")
+                        continue
+                    verb = line[:4].upper()
+                    if verb in (b"EHLO", b"HELO"):
+                        self.wfile.write(b"250-sink\r\n250 8BITMIME\r\n")
+                    elif verb == b"RCPT" and b"reject@" in line.lower():
+                        self.wfile.write(b"550 no such user\r\n")
+                    elif verb == b"RCPT" and line.lower().rstrip(b">").rpartition(b"@")[2].decode() in defer:
+                        self.wfile.write(b"451 4.7.1 Try again later\r\n")
+                    elif verb == b"RCPT":
+                        sink.recipients.append(line.partition(b":")[2].strip(b" <>").decode())
+                        self.wfile.write(b"250 ok\r\n")
+                    elif verb == b"DATA":
+                        in_data = True
+                        self.wfile.write(b"354 go ahead\r\n")
+                    elif verb == b"QUIT":
+                        self.wfile.write(b"221 bye\r\n")
+                        return
+                    else:
+                        self.wfile.write(b"250 ok\r\n")
+
+        self.connections = self.messages = 0
+        self.sockets = []
+        self.recipients = []
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def drop_connections(self):
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.drop_connections()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Rate limits high enough that one scheduler tick releases a whole campaign.
+@override_settings(
+    EMAIL_HOST="", EMAIL_CAMPAIGN_CHUNK_SIZE=100, EMAIL_DOMAIN_SEND_RATE=60000, EMAIL_TENANT_SEND_RATES={"free": 60000}
+)
+class CampaignDispatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name="Shop", region="US")
+        cls.email_list = EmailList.objects.create(tenant=cls.tenant, name="Everyone", lawful_basis="consent")
+        cls.template = EmailTemplate.objects.create(
+            tenant=cls.tenant, name="Launch", subject="We're live", body_html="<p>Hi</p>", body_text="Hi"
+        )
+        Contact.objects.bulk_create(
+            Contact(tenant=cls.tenant, email=f"c{i}@example.com", subscribed=i % 10 != 0) for i in range(250)
+        )
+
+    def test_sends_are_created_and_delivered_in_chunks(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = dispatch_campaign(self.email_list, self.template)
+        self.assertEqual(result, {"sends": 225, "chunks": 3})
+        sends = EmailSend.objects.filter(email_list=self.email_list)
+        self.assertEqual(sends.filter(status="sent").count(), 225)
+        self.assertFalse(sends.filter(recipient__subscribed=False).exists())
+        # Queries scale with chunks, not recipients (each page and chunk also updates its metrics rollup).
+        self.assertLess(len(ctx.captured_queries), 45)
+
+    def test_dispatch_resumes_without_duplicates(self):
+        dispatch_campaign(self.email_list, self.template)
+        Contact.objects.create(tenant=self.tenant, email="late@example.com")
+        self.assertEqual(dispatch_campaign(self.email_list, self.template), {"sends": 1, "chunks": 1})
+        self.assertEqual(EmailSend.objects.filter(email_list=self.email_list).count(), 226)
+
+    def test_unsubscribed_after_dispatch_is_dropped(self):
+        contact = Contact.objects.filter(tenant=self.tenant, subscribed=True).first()
+        send = EmailSend.objects.create(
+            email_list=self.email_list, template=self.template, recipient=contact, tenant=self.tenant
+        )
+        Contact.objects.filter(pk=contact.pk).update(subscribed=False)
+        self.assertEqual(send_chunk([send.id]), {"dropped": 1})
+        send.refresh_from_db()
+        self.assertEqual((send.status, send.last_error), ("dropped", "Recipient unsubscribed."))
+
+    def test_endpoint_is_tenant_scoped(self):
+        user = get_user_model().objects.create_user(username="owner", email="owner@example.com", password="pw")
+        TenantUser.objects.create(user=user, tenant=self.tenant, role="owner")
+        outsider = get_user_model().objects.create_user(username="out", email="out@example.com", password="pw")
+        cache.clear()
+        url = reverse("email-campaigns")
+        payload = {"list": self.email_list.id, "template": self.template.id}
+
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.post(url, payload).status_code, 404)
+        self.client.force_login(user)
+        self.assertEqual(self.client.post(url, payload).status_code, 202)
+        # The owner's own signup contact is a recipient too.
+        self.assertEqual(
+            EmailSend.objects.filter(email_list=self.email_list, status="sent").count(),
+            Contact.objects.filter(tenant=self.tenant, subscribed=True).count(),
+        )
+
+
+class SMTPPoolTests(TestCase):
+    def setUp(self):
+        self.addCleanup(close_pool)
+
+    def test_sessions_are_reused_up_to_the_message_cap(self):
+        with SMTPSink() as sink:
+            pool = SMTPPool("127.0.0.1", sink.port, max_messages=5)
+            for i in range(12):
+                pool.send("from@example.com", [f"to{i}@example.com"], "Subject: hi\r\n\r\nhello")
+            pool.close()
+        self.assertEqual((sink.messages, sink.connections), (12, 3))
+
+    def test_dropped_session_is_replaced_transparently(self):
+        with SMTPSink() as sink:
+            pool = SMTPPool("127.0.0.1", sink.port)
+            pool.send("from@example.com", ["a@example.com"], "hello")
+            sink.drop_connections()
+            pool.send("from@example.com", ["b@example.com"], "hello")
+            pool.close()
+        self.assertEqual((sink.messages, sink.connections), (2, 2))
+
+    def test_provider_sends_through_the_pool(self):
+        tenant = Tenant.objects.create(name="Shop", region="US")
+        template = EmailTemplate.objects.create(tenant=tenant, name="t", subject="Hi", body_html="<p>Hi</p>")
+        good = Contact.objects.create(tenant=tenant, email="good@example.com")
+        bad = Contact.objects.create(tenant=tenant, email="reject@example.com")
+        with SMTPSink() as sink, override_settings(EMAIL_HOST="127.0.0.1", EMAIL_PORT=sink.port, EMAIL_USE_TLS=False):
+            results = [
+                send_via_provider(EmailSend(tenant=tenant, template=template, recipient=contact, message_id="m1"))
+                for contact in (good, bad, good)
+            ]
+            connects = get_pool().connects
+        self.assertEqual([ok for ok, _, _ in results], [True, False, True])
+        self.assertEqual(results[0][1], "m1")
+        self.assertIn("no such user", results[1][2])
+        # A refused recipient doesn't cost the session.
+        self.assertEqual((sink.messages, connects), (2, 1))
+
+
+class TemplateRenderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name="Shop", region="US")
+        cls.template = EmailTemplate.objects.create(
+            tenant=cls.tenant,
+            name="Offer",
+            subject="{{ first_name|default:'Hi' }}, your {{ plan }} offer from {{ tenant }}",
+            body_html="<p>Hello {{ name }} from {{ address.city|default:\"your town\" }}</p>",
+            body_text="Same offer for everyone.",
+        )
+
+    def test_placeholders_come_from_contact_and_properties(self):
+        contact = Contact(email="ann@example.com", name="Ann <Lee>", properties={"plan": "pro", "address": {"city": "Oslo"}})
+        subject, html_body, text = compile_template(self.template).render(contact, tenant="Shop")
+        self.assertEqual(subject, "Ann, your pro offer from Shop")
+        self.assertEqual(html_body, "<p>Hello Ann &lt;Lee&gt; from Oslo</p>")
+        self.assertEqual(text, "Same offer for everyone.")
+
+        subject, html_body, _ = compile_template(self.template).render(Contact(email="x@example.com"))
+        self.assertEqual(subject, "Hi, your  offer from ")
+        self.assertIn("from your town", html_body)
+
+    def test_compiled_form_is_cached_until_the_template_changes(self):
+        compiled = compile_template(self.template)
+        self.assertIs(compile_template(EmailTemplate.objects.get(pk=self.template.pk)), compiled)
+        self.template.subject = "New subject"
+        self.template.save()
+        self.assertIsNot(compile_template(self.template), compiled)
+
+    def test_messages_share_static_parts(self):
+        compiled = compile_template(self.template)
+        messages = [
+            compiled.message(Contact(email=f"{name}@example.com", name=name), "Shop <news@shop.example>", f"id-{name}", tenant="Shop")
+            for name in ("Ann", "Bo")
+        ]
+        self.assertEqual(list(compiled._static_parts), ["plain"])
+        parsed = email.message_from_string(messages[1])
+        self.assertEqual(parsed["Message-ID"], "<id-Bo@shop.example>")
+        self.assertEqual(parsed["To"], "Bo@example.com")
+        plain, html_part = parsed.get_payload()
+        self.assertEqual(plain.get_payload(decode=True).decode(), "Same offer for everyone.")
+        self.assertEqual(html_part.get_payload(decode=True).decode(), "<p>Hello Bo from your town</p>")
+
+    def test_subject_cannot_inject_headers(self):
+        template = EmailTemplate(subject="Hi\r\nBcc: x@y.test\n{{ name }}", body_text="Hi")
+        message = compile_template(template).message(
+            Contact(email="ann@example.com", name="Ann\nCc: z@y.test"), "news@shop.example", "id-1"
+        )
+        parsed = email.message_from_string(message)
+        self.assertEqual(parsed["Subject"], "Hi Bcc: x@y.test Ann Cc: z@y.test")
+        self.assertIsNone(parsed["Bcc"])
+        self.assertIsNone(parsed["Cc"])
+
+
+class SegmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name="Shop", region="US")
+        cls.ann = Contact.objects.create(
+            tenant=cls.tenant, email="ann@example.com", name="Ann", properties={"plan": "pro", "age": 41, "address": {"city": "Oslo"}}
+        )
+        cls.bo = Contact.objects.create(tenant=cls.tenant, email="bo@corp.test", name="Bo", properties={"plan": "free", "age": 25})
+        cls.cy = Contact.objects.create(tenant=cls.tenant, email="cy@example.com", subscribed=False, properties={"plan": "pro"})
+
+    def matches(self, source):
+        return set(
+            Contact.objects.filter(tenant=self.tenant).filter(compile_segment(source)).values_list("name", flat=True)
+        )
+
+    def test_expressions(self):
+        self.assertEqual(self.matches('properties.plan = "pro" and subscribed = true'), {"Ann"})
+        self.assertEqual(self.matches("properties.age >= 30 or email endswith '@CORP.test'"), {"Ann", "Bo"})
+        self.assertEqual(self.matches('not (properties.plan in ["pro", "enterprise"])'), {"Bo"})
+        self.assertEqual(self.matches("properties.address.city exists"), {"Ann"})
+        self.assertEqual(self.matches('name != "" and properties.address.city startswith "os"'), {"Ann"})
+
+    def test_invalid_expressions_are_rejected(self):
+        for source in ("", "password = 'x'", "properties.plan =", "(subscribed = true", "properties.contains = 1", "email ~ 'x'"):
+            with self.subTest(source=source), self.assertRaises(SegmentError):
+                compile_segment(source)
+
+    def test_membership_follows_contact_and_list_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pro = EmailList.objects.create(
+                tenant=self.tenant, name="Pro", lawful_basis="consent", segment_sql='properties.plan = "pro"'
+            )
+        self.assertEqual(set(pro.memberships.values_list("contact__name", flat=True)), {"Ann", ""})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bo.properties["plan"] = "pro"
+            self.bo.save()
+            self.ann.properties["plan"] = "free"
+            self.ann.save()
+        self.assertEqual(set(pro.memberships.values_list("contact__name", flat=True)), {"Bo", ""})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pro.segment_sql = "properties.age < 30"
+            pro.save()
+        self.assertEqual(set(pro.memberships.values_list("contact__name", flat=True)), {"Bo"})
+
+        # Bulk writes skip signals; callers refresh explicitly.
+        Contact.objects.filter(pk=self.ann.pk).update(properties={"age": 20})
+        refresh_contacts(self.tenant.id, [self.ann.pk])
+        self.assertEqual(set(pro.memberships.values_list("contact__name", flat=True)), {"Ann", "Bo"})
+
+    def test_an_invalid_segment_empties_its_list(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pro = EmailList.objects.create(
+                tenant=self.tenant, name="Pro", lawful_basis="consent", segment_sql='properties.plan = "pro"'
+            )
+        self.assertEqual(pro.memberships.count(), 2)
+        EmailList.objects.filter(pk=pro.pk).update(segment_sql="properties.plan =")
+        with self.assertLogs("email_engine.services.segments", "ERROR"):
+            self.assertEqual(refresh_list_task(pro.id), {"added": 0, "removed": 2})
+        self.assertFalse(pro.memberships.exists())
+
+    @override_settings(EMAIL_HOST="")
+    def test_campaign_goes_to_subscribed_members_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pro = EmailList.objects.create(
+                tenant=self.tenant, name="Pro", lawful_basis="consent", segment_sql='properties.plan = "pro"'
+            )
+        template = EmailTemplate.objects.create(tenant=self.tenant, name="t", subject="Hi", body_html="<p>Hi</p>")
+        self.assertEqual(dispatch_campaign(pro, template), {"sends": 1, "chunks": 1})
+        self.assertEqual(EmailSend.objects.get(email_list=pro).recipient, self.ann)
+        self.assertEqual(ListMembership.objects.filter(email_list=pro).count(), 2)
+
+
+class DNSStub:
+    """A local UDP DNS server answering from `zone`: {(name, type): (ttl, [rdata text])}.
+
+    Names in `failing` get SERVFAIL, unknown names NXDOMAIN. Every query is
+    recorded in `queries`; `delay` seconds are slept before each answer.
+    """
+
+    def __init__(self, zone, failing=(), delay=0):
+        stub = self
+        self.zone = zone
+        self.queries = []
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                data, sock = self.request
+                query = dns.message.from_wire(data)
+                question = query.question[0]
+                name = question.name.to_text().rstrip(".").lower()
+                rdtype = dns.rdatatype.to_text(question.rdtype)
+                stub.queries.append((name, rdtype))
+                time.sleep(delay)
+                response = dns.message.make_response(query)
+                if name in failing:
+                    response.set_rcode(dns.rcode.SERVFAIL)
+                elif (name, rdtype) in stub.zone:
+                    ttl, rdatas = stub.zone[(name, rdtype)]
+                    response.answer.append(dns.rrset.from_text_list(question.name, ttl, "IN", rdtype, rdatas))
+                else:
+                    if not any(known == name for known, _ in stub.zone):
+                        response.set_rcode(dns.rcode.NXDOMAIN)
+                    apex = dns.name.from_text(".".join(name.split(".")[-2:]))
+                    response.authority.append(
+                        dns.rrset.from_text(apex, 60, "IN", "SOA", "ns.test. admin.test. 1 3600 600 86400 60")
+                    )
+                sock.sendto(response.to_wire(), self.client_address)
+
+        self.server = socketserver.ThreadingUDPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+ZONE = {
+    ("shop.test", "TXT"): (300, ['"google-site-verification=abc"', '"v=spf1 include:_spf.google.com " "~all"']),
+    ("shop.test", "MX"): (300, ["20 alt.mx.test.", "10 mx.test."]),
+    ("_dmarc.shop.test", "TXT"): (300, ['"v=DMARC1; p=reject; rua=mailto:d@shop.test"']),
+    ("google._domainkey.shop.test", "TXT"): (300, ['"v=DKIM1; k=rsa; p=MIGfMA0"']),
+    ("mail.shop.test", "TXT"): (0, ['"v=spf1 -all"', '"v=spf1 include:x.test -all"']),
+    ("em1._domainkey.mail.shop.test", "TXT"): (300, ['"k=rsa; p=MIGfMA1"']),
+}
+
+
+class DeliverabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name="Shop", region="US")
+        Integration.objects.create(
+            tenant=cls.tenant, type="sendgrid", metadata={"sending_domain": "Mail.Shop.test.", "dkim_selectors": ["em1"]}
+        )
+        cls.site = Site.objects.create(tenant=cls.tenant, domain="https://www.shop.test/")
+
+    def setUp(self):
+        deliverability._cache.clear()
+        self.addCleanup(deliverability._cache.clear)
+
+    def resolver_settings(self, stub):
+        return override_settings(
+            DNS_RESOLVER_NAMESERVERS=["127.0.0.1"], DNS_RESOLVER_PORT=stub.port, DNS_RESOLVER_TIMEOUT=1,
+            EMAIL_DKIM_SELECTORS=["google"],
+        )
+
+    def test_domains_are_checked_and_stored(self):
+        self.assertEqual(
+            deliverability.discover_domains([self.tenant.id]),
+            {self.tenant.id: {"mail.shop.test": {"em1"}, "shop.test": set()}},
+        )
+        with DNSStub(ZONE) as stub, self.resolver_settings(stub):
+            self.assertEqual(deliverability.run_checks([self.tenant.id]), 2)
+
+        shop = DomainCheck.objects.get(tenant=self.tenant, domain="shop.test")
+        self.assertEqual(shop.status, "pass")
+        self.assertEqual(shop.results["spf"], {"status": "found", "record": "v=spf1 include:_spf.google.com ~all"})
+        self.assertEqual(shop.results["dmarc"]["policy"], "reject")
+        self.assertEqual(shop.results["mx"], {"status": "found", "hosts": ["mx.test", "alt.mx.test"]})
+        self.assertEqual(shop.results["dkim"]["records"], {"google": "v=DKIM1; k=rsa; p=MIGfMA0"})
+
+        mail = DomainCheck.objects.get(tenant=self.tenant, domain="mail.shop.test")
+        self.assertEqual(mail.status, "fail")
+        self.assertEqual(mail.results["spf"]["status"], "invalid")  # two SPF records
+        self.assertEqual(mail.results["dmarc"]["status"], "missing")
+        self.assertEqual(mail.results["dkim"]["records"], {"em1": "k=rsa; p=MIGfMA1"})
+
+    def test_tenants_sharing_a_domain_keep_their_own_selectors(self):
+        other = Tenant.objects.create(name="Agency", region="US")
+        Integration.objects.create(
+            tenant=other, type="ses", metadata={"domain": "mail.shop.test", "dkim_selectors": ["em9"]}
+        )
+        with DNSStub(ZONE) as stub, self.resolver_settings(stub):
+            self.assertEqual(deliverability.run_checks([self.tenant.id, other.id]), 3)
+            self.assertEqual(stub.queries.count(("mail.shop.test", "MX")), 1)
+
+        mine = DomainCheck.objects.get(tenant=self.tenant, domain="mail.shop.test")
+        theirs = DomainCheck.objects.get(tenant=other, domain="mail.shop.test")
+        self.assertEqual(mine.results["dkim"]["selectors"], ["em1", "google"])
+        self.assertEqual(theirs.results["dkim"]["selectors"], ["em9", "google"])
+        self.assertEqual(theirs.results["dkim"]["status"], "missing")
+
+    def test_answers_are_cached_for_their_ttl(self):
+        with DNSStub(ZONE) as stub, self.resolver_settings(stub):
+            deliverability.run_checks([self.tenant.id])
+            first = len(stub.queries)
+            deliverability.run_checks([self.tenant.id])
+            # Only the TTL 0 answer is asked again; NXDOMAINs use the SOA's negative TTL.
+            self.assertEqual(stub.queries[first:], [("mail.shop.test", "TXT")])
+
+        self.site.delete()
+        with DNSStub(ZONE) as stub, self.resolver_settings(stub):
+            deliverability.run_checks([self.tenant.id])
+        self.assertEqual(list(DomainCheck.objects.values_list("domain", flat=True)), ["mail.shop.test"])
+
+    def test_lookups_run_concurrently_and_failures_are_not_cached(self):
+        with DNSStub(ZONE, failing={"_dmarc.shop.test"}, delay=0.2) as stub, self.resolver_settings(stub):
+            start = time.monotonic()
+            deliverability.run_checks([self.tenant.id])
+            elapsed = time.monotonic() - start
+            self.assertGreaterEqual(len(stub.queries), 9)
+            self.assertLess(elapsed, 1.0)  # nine serial lookups would take 1.8s
+
+            check = DomainCheck.objects.get(domain="shop.test")
+            self.assertEqual((check.status, check.results["dmarc"]["status"]), ("error", "error"))
+            stub.queries.clear()
+            deliverability.run_checks([self.tenant.id])
+            self.assertIn(("_dmarc.shop.test", "TXT"), stub.queries)
+
+    @override_settings(EMAIL_HOST="")
+    def test_endpoint_is_tenant_scoped(self):
+        user = get_user_model().objects.create_user(username="owner", email="owner@example.com", password="pw")
+        TenantUser.objects.create(user=user, tenant=self.tenant, role="owner")
+        outsider = get_user_model().objects.create_user(username="out", email="out@example.com", password="pw")
+        cache.clear()
+        url = reverse("email-deliverability")
+
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.post(url, {"tenant": self.tenant.id}).status_code, 404)
+        self.client.force_login(user)
+        with DNSStub(ZONE) as stub, self.resolver_settings(stub):
+            self.assertEqual(self.client.post(url, {"tenant": self.tenant.id}).status_code, 202)
+        data = self.client.get(url).json()
+        self.assertEqual([(r["domain"], r["status"]) for r in data["results"]], [("mail.shop.test", "fail"), ("shop.test", "pass")])
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.get(url).json()["results"], [])
+
+
+def ses_bounce(message_id, bounce_type="Permanent", feedback_id="f1"):
+    notification = {
+        "notificationType": "Bounce",
+        "bounce": {
+            "bounceType": bounce_type,
+            "bouncedRecipients": [{"emailAddress": "x@example.com", "diagnosticCode": "smtp; 550 5.1.1 user unknown"}],
+            "feedbackId": feedback_id,
+        },
+        "mail": {"messageId": "0100-ses-id", "commonHeaders": {"messageId": f"<{message_id}@shop.test>"}},
+    }
+    return {"Type": "Notification", "Message": json.dumps(notification)}
+
+
+@override_settings(EMAIL_WEBHOOK_SECRET="s3cret", EMAIL_EVENT_MAX_ATTEMPTS=2, EMAIL_EVENT_RETRY_SECONDS=60)
+class DeliveryEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name="Shop", region="US")
+        cls.contacts = Contact.objects.bulk_create(
+            Contact(tenant=cls.tenant, email=f"c{i}@example.com") for i in range(3)
+        )
+        cls.sends = EmailSend.objects.bulk_create(
+            EmailSend(tenant=cls.tenant, recipient=contact, status="sent", message_id=f"m{i}")
+            for i, contact in enumerate(cls.contacts)
+        )
+
+    def test_provider_payloads_are_normalized(self):
+        with self.assertLogs("email_engine.services.events", "WARNING"):
+            parsed = events.parse_events([
+                ses_bounce("m0"),
+                {"event": "spamreport", "smtp-id": "<m1@shop.test>", "sg_message_id": "sg1.filter0", "sg_event_id": "e1"},
+                {"event": "bounce", "type": "blocked", "smtp-id": "<m2@shop.test>", "reason": "rate limited"},
+                {"event": "delivered", "smtp-id": "<m2@shop.test>"},
+                {"Type": "SubscriptionConfirmation", "SubscribeURL": "https://sns.test/confirm"},
+            ])
+        self.assertEqual(
+            [(e["message_ids"], e["kind"], e["permanent"]) for e in parsed],
+            [(["0100-ses-id", "m0"], "bounce", True), (["m1", "sg1"], "complaint", True), (["m2"], "bounce", False)],
+        )
+        self.assertEqual(parsed[0]["reason"], "smtp; 550 5.1.1 user unknown")
+
+    def test_batch_updates_sends_and_suppresses_contacts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pro = EmailList.objects.create(tenant=self.tenant, name="Subscribed", lawful_basis="consent", segment_sql="subscribed = true")
+        batch = events.parse_events(
+            [ses_bounce("m0"), ses_bounce("m0")]  # the same feedback delivered twice
+            + [{"event": "spamreport", "smtp-id": "<m1@shop.test>", "sg_event_id": f"s{i}"} for i in range(50)]
+            + [{"event": "bounce", "type": "blocked", "smtp-id": "<m2@shop.test>", "reason": "try later"}]
+            + [{"event": "bounce", "smtp-id": "<unknown@shop.test>"}]
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            result = events.apply_events(batch)
+        self.assertEqual(result, {"matched": 52, "unmatched": 1, "suppressed": 2})
+        self.assertLess(len(ctx.captured_queries), 18)
+
+        rows = {s.message_id: (s.status, s.bounces, s.complaints) for s in EmailSend.objects.all()}
+        self.assertEqual(rows, {"m0": ("bounced", 1, 0), "m1": ("complaint", 0, 50), "m2": ("sent", 1, 0)})
+        self.assertEqual(list(Contact.objects.filter(subscribed=True)), [self.contacts[2]])
+        self.assertEqual(list(pro.memberships.values_list("contact_id", flat=True)), [self.contacts[2].id])
+
+        # A complaint is final: a later bounce only counts.
+        events.apply_events(events.parse_events([ses_bounce("m1", feedback_id="f2")]))
+        self.assertEqual(EmailSend.objects.filter(message_id="m1").values_list("status", "bounces").get(), ("complaint", 1))
+
+    def test_webhook_stores_events_before_accepting_them(self):
+        url = reverse("email-events")
+        body = json.dumps(ses_bounce("m0"))
+        self.assertEqual(self.client.post(url, body, content_type="text/plain").status_code, 403)
+        self.assertEqual(
+            self.client.post(url, body, content_type="text/plain", HTTP_X_WEBHOOK_TOKEN="wrong").status_code, 403
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(f"{url}?token=s3cret", body, content_type="text/plain")
+        self.assertEqual((response.status_code, response.json()), (202, {"accepted": 1}))
+        self.assertEqual(DeliveryEvent.objects.count(), 1)
+        self.assertEqual(EmailSend.objects.get(message_id="m0").status, "sent")
+
+        # The task queued on commit applies the stored event.
+        for callback in callbacks:
+            callback()
+        self.assertIsNotNone(DeliveryEvent.objects.get().applied_at)
+        self.assertEqual(EmailSend.objects.get(message_id="m0").status, "bounced")
+        self.assertFalse(Contact.objects.get(pk=self.contacts[0].pk).subscribed)
+
+    def test_redelivered_events_are_counted_once(self):
+        for _ in range(2):
+            events.ingest(events.parse_events([ses_bounce("m0"), {"event": "bounce", "smtp-id": "<m1@shop.test>"}]))
+            events.drain()
+        send = EmailSend.objects.get(message_id="m0")
+        self.assertEqual((send.status, send.bounces), ("bounced", 1))
+        # Without a provider id there is nothing to match a redelivery against.
+        self.assertEqual(EmailSend.objects.get(message_id="m1").bounces, 2)
+        stats = EmailDailyStats.objects.get(tenant=self.tenant)
+        self.assertEqual(stats.bounce_events, 3)
+
+        # Once forgotten, the id can be stored again.
+        with override_settings(EMAIL_EVENT_DEDUP_SECONDS=60):
+            events.drain(timezone.now() + timedelta(seconds=61))
+        self.assertFalse(DeliveryEvent.objects.exists())
+
+    def test_failing_events_are_retried_a_bounded_number_of_times(self):
+        broken = {"message_ids": ["m1"], "kind": "bounce", "permanent": True, "reason": None}
+        events.ingest([broken] + events.parse_events([ses_bounce("m0")]))
+        start = timezone.now()
+        with self.assertLogs("email_engine.services.events", "ERROR"):
+            # The batch fails, so its events are applied one by one: the good one isn't held back.
+            self.assertEqual(events.drain(start), {"processed": 2, "applied": 1, "failed": 1})
+        self.assertEqual(EmailSend.objects.get(message_id="m0").status, "bounced")
+        row = DeliveryEvent.objects.get(applied_at=None)
+        self.assertEqual((row.attempts, row.next_attempt_at), (1, start + timedelta(seconds=60)))
+        self.assertTrue(row.last_error.startswith("TypeError"))
+
+        self.assertEqual(events.drain(start + timedelta(seconds=30))["processed"], 0)  # backing off
+        with self.assertLogs("email_engine.services.events", "ERROR") as logs:
+            self.assertEqual(events.drain(start + timedelta(seconds=60))["failed"], 1)
+        self.assertIn("Giving up", logs.output[-1])
+        # Kept for inspection, but no longer due.
+        self.assertEqual(DeliveryEvent.objects.get(applied_at=None).attempts, 2)
+        self.assertEqual(events.drain(start + timedelta(days=1))["processed"], 0)
+
+
+@override_settings(EMAIL_DOMAIN_SEND_RATE=120, EMAIL_SEND_BURST_SECONDS=5, EMAIL_TENANT_SEND_RATES={"free": 60, "pro": 6000})
+class SendSchedulerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name="Shop", region="US", plan="pro")
+        cls.email_list = EmailList.objects.create(tenant=cls.tenant, name="Everyone", lawful_basis="consent")
+        cls.template = EmailTemplate.objects.create(tenant=cls.tenant, name="t", subject="Hi", body_html="<p>Hi</p>")
+
+    def setUp(self):
+        self.addCleanup(close_pool)
+
+    def queue(self, tenant, email_list, domain, count):
+        contacts = Contact.objects.bulk_create(
+            Contact(tenant=tenant, email=f"{tenant.id}-{i}@{domain}") for i in range(count)
+        )
+        EmailSend.objects.bulk_create(
+            EmailSend(tenant=tenant, email_list=email_list, recipient=contact, recipient_domain=domain)
+            for contact in contacts
+        )
+
+    def released(self, domain):
+        return EmailSend.objects.filter(recipient_domain=domain).exclude(status="queued").count()
+
+    @override_settings(EMAIL_SEND_MAX_ATTEMPTS=2, EMAIL_SEND_RETRY_SECONDS=60)
+    def test_domains_get_their_own_rate_and_back_off_on_deferrals(self):
+        self.queue(self.tenant, self.email_list, "big.test", 40)
+        self.queue(self.tenant, self.email_list, "small.test", 5)
+        self.queue(self.tenant, self.email_list, "slow.test", 5)
+        start = timezone.now()
+        with (
+            SMTPSink(defer={"slow.test"}) as sink,
+            override_settings(EMAIL_HOST="127.0.0.1", EMAIL_PORT=sink.port, EMAIL_USE_TLS=False),
+            self.assertLogs("email_engine.services.delivery_providers", "WARNING"),
+        ):
+            # 120/min with a 5s burst: 10 per domain at once.
+            self.assertEqual(schedule(start), {"scheduled": 20, "chunks": 1})
+            self.assertEqual(sum(r.endswith("@big.test") for r in sink.recipients), 10)
+            self.assertEqual(sum(r.endswith("@small.test") for r in sink.recipients), 5)
+            slow = EmailSend.objects.filter(recipient_domain="slow.test")
+            self.assertEqual(set(slow.values_list("status", "attempts")), {("queued", 1)})
+            self.assertTrue(slow.first().last_error.startswith("451 4.7.1"))
+            self.assertEqual(
+                dict(SendThrottle.objects.values_list("key", "rate")),
+                {"domain:big.test": 120, "domain:small.test": 120, "domain:slow.test": 60, f"tenant:{self.tenant.id}": 6000},
+            )
+
+            # Five seconds later the big domain's bucket is full again; slow.test is still backing off.
+            self.assertEqual(schedule(start + timedelta(seconds=5))["scheduled"], 10)
+            self.assertEqual(self.released("big.test"), 20)
+
+            # After the backoff, slow.test is retried at its halved rate; a second 451 is final here.
+            schedule(start + timedelta(seconds=120))
+            self.assertEqual(set(slow.values_list("status", flat=True)), {"failed"})
+        self.assertEqual(self.released("big.test"), 30)
+        self.assertEqual(sink.messages, 30 + 5)
+
+    @override_settings(EMAIL_HOST="", EMAIL_DOMAIN_SEND_RATE=240)
+    def test_tenants_share_a_domain_within_their_own_limits(self):
+        free = Tenant.objects.create(name="Free", region="US", plan="free")
+        free_list = EmailList.objects.create(tenant=free, name="All", lawful_basis="consent")
+        self.queue(free, free_list, "mail.test", 20)
+        self.queue(self.tenant, self.email_list, "mail.test", 20)
+        # 20 domain tokens: the free tenant's 5 (60/min), the rest to the other tenant.
+        self.assertEqual(schedule()["scheduled"], 20)
+        released = EmailSend.objects.filter(status="sent")
+        self.assertEqual((released.filter(tenant=free).count(), released.filter(tenant=self.tenant).count()), (5, 15))
+
+    @override_settings(EMAIL_HOST="", EMAIL_SEND_SCHEDULED_TIMEOUT=600)
+    def test_sends_stranded_as_scheduled_are_queued_again(self):
+        self.queue(self.tenant, self.email_list, "mail.test", 3)
+        start = timezone.now()
+        # Marked scheduled, but the chunk task was never published.
+        EmailSend.objects.update(status="scheduled", scheduled_at=start)
+        self.assertEqual(schedule(start + timedelta(seconds=599)), {"scheduled": 0, "chunks": 0})
+        self.assertEqual(schedule(start + timedelta(seconds=601)), {"scheduled": 3, "chunks": 1, "requeued": 3})
+        self.assertEqual(set(EmailSend.objects.values_list("status", flat=True)), {"sent"})
+
+
+@override_settings(EMAIL_HOST="", EMAIL_DOMAIN_SEND_RATE=60000, EMAIL_TENANT_SEND_RATES={"free": 60000})
+class SuppressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name="Shop", region="US")
+        cls.email_list = EmailList.objects.create(tenant=cls.tenant, name="Everyone", lawful_basis="consent")
+        cls.template = EmailTemplate.objects.create(tenant=cls.tenant, name="t", subject="Hi", body_html="<p>Hi</p>")
+
+    def setUp(self):
+        suppression._filters.clear()
+        self.addCleanup(suppression._filters.clear)
+
+    def test_bloom_filter_has_no_false_negatives_and_few_false_positives(self):
+        bloom = suppression.BloomFilter(10000, 0.001)
+        for i in range(10000):
+            bloom.add(f"user{i}@example.com")
+        self.assertTrue(all(f"user{i}@example.com" in bloom for i in range(10000)))
+        false_positives = sum(f"other{i}@example.com" in bloom for i in range(10000))
+        self.assertLess(false_positives, 50)
+
+    def test_unsubscribes_and_bounces_are_suppressed(self):
+        contact = Contact.objects.create(tenant=self.tenant, email="Ann@Example.com")
+        contact.subscribed = False
+        contact.save()
+        self.assertTrue(suppression.is_suppressed(self.tenant.id, "ann@example.com"))
+        contact.subscribed = True
+        contact.save()
+        self.assertFalse(suppression.is_suppressed(self.tenant.id, "ann@example.com"))  # still in the filter; the table decides
+
+        EmailSend.objects.create(tenant=self.tenant, recipient=contact, status="sent", message_id="m1")
+        events.apply_events(events.parse_events([{"event": "spamreport", "smtp-id": "<m1@shop.test>"}]))
+        self.assertEqual(Suppression.objects.get(email="ann@example.com").reason, "complaint")
+        # Re-subscribing doesn't lift a complaint.
+        contact = Contact.objects.get(pk=contact.pk)
+        contact.subscribed = True
+        contact.save()
+        self.assertTrue(suppression.is_suppressed(self.tenant.id, "ann@example.com"))
+
+    def test_campaigns_skip_suppressed_addresses_in_bulk(self):
+        Contact.objects.bulk_create(Contact(tenant=self.tenant, email=f"c{i}@example.com") for i in range(20))
+        # Added by another process: picked up incrementally on the next check.
+        Suppression.objects.bulk_create(
+            Suppression(tenant=self.tenant, email=f"c{i}@example.com", reason="bounce") for i in range(5)
+        )
+        self.assertEqual(dispatch_campaign(self.email_list, self.template), {"sends": 15, "chunks": 1, "suppressed": 5})
+        self.assertEqual(EmailSend.objects.filter(status="sent").count(), 15)
+
+        # Checking a chunk with no suppressed address is one (incremental sync) query.
+        with self.assertNumQueries(1):
+            self.assertEqual(suppression.suppressed(self.tenant.id, [f"c{i}@example.com" for i in range(5, 20)]), set())
+
+        # Suppressed after dispatch: dropped before a message is built.
+        send = EmailSend.objects.create(
+            tenant=self.tenant, email_list=self.email_list, recipient=Contact.objects.get(email="c10@example.com")
+        )
+        suppression.suppress(self.tenant.id, ["C10@example.com"], "bounce")
+        self.assertEqual(send_chunk([send.id]), {"dropped": 1})
+        send.refresh_from_db()
+        self.assertEqual(send.last_error, "Recipient suppressed.")
+
+    def test_rows_committed_out_of_id_order_still_reach_the_filter(self):
+        Suppression.objects.create(id=1000, tenant=self.tenant, email="late-id@example.com", reason="bounce")
+        self.assertEqual(suppression.suppressed(self.tenant.id, ["late-id@example.com"]), {"late-id@example.com"})
+        # A lower id committed after id 1000 was read (a longer transaction): the overlap re-read finds it.
+        Suppression.objects.create(id=10, tenant=self.tenant, email="early-id@example.com", reason="bounce")
+        self.assertEqual(suppression.suppressed(self.tenant.id, ["early-id@example.com"]), {"early-id@example.com"})
+        self.assertEqual(suppression._filters[self.tenant.id].bloom.count, 2)
+
+        # Older than the overlap window: picked up by the periodic rebuild.
+        old = timezone.now() - timedelta(days=1)
+        Suppression.objects.create(id=6, tenant=self.tenant, email="older@example.com", reason="bounce")
+        Suppression.objects.filter(id=6).update(created_at=old)
+        self.assertEqual(suppression.suppressed(self.tenant.id, ["older@example.com"]), set())
+        with override_settings(EMAIL_SUPPRESSION_REBUILD_SECONDS=0):
+            self.assertEqual(suppression.suppressed(self.tenant.id, ["older@example.com"]), {"older@example.com"})
+
+
+@override_settings(EMAIL_HOST="", EMAIL_DOMAIN_SEND_RATE=60000, EMAIL_TENANT_SEND_RATES={"free": 60000})
+class EmailMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name="Shop", region="US")
+        cls.email_list = EmailList.objects.create(tenant=cls.tenant, name="Everyone", lawful_basis="consent")
+        cls.template = EmailTemplate.objects.create(tenant=cls.tenant, name="t", subject="Hi", body_html="<p>Hi</p>")
+        Contact.objects.bulk_create(Contact(tenant=cls.tenant, email=f"c{i}@example.com") for i in range(20))
+
+    def setUp(self):
+        suppression._filters.clear()
+        self.addCleanup(suppression._filters.clear)
+
+    def rollups(self):
+        return sorted(
+            EmailDailyStats.objects.exclude(
+                queued=0, sent=0, bounced=0, complained=0, dropped=0, failed=0,
+                bounce_events=0, complaint_events=0, revenue=0,
+            ).values_list(
+                "tenant_id", "day", "list_id", "template_id", "queued", "sent", "bounced", "complained",
+                "dropped", "failed", "bounce_events", "complaint_events", "revenue",
+            )
+        )
+
+    def test_rollups_follow_sends_and_match_a_rebuild(self):
+        self.assertEqual(dispatch_campaign(self.email_list, self.template), {"sends": 20, "chunks": 1})
+        sends = list(EmailSend.objects.order_by("id"))
+        events.apply_events(events.parse_events(
+            [ses_bounce(sends[0].message_id), ses_bounce(sends[1].message_id, "Transient", "f2")]
+            + [{"event": "spamreport", "smtp-id": f"<{sends[2].message_id}@shop.test>"}]
+        ))
+        send = EmailSend.objects.get(pk=sends[3].pk)
+        send.revenue_attributed = "12.50"
+        send.save()
+        EmailSend.objects.only("id", "status").get(pk=sends[4].pk).save(update_fields=["status"])  # no change
+        EmailSend.objects.create(tenant=self.tenant, recipient=sends[5].recipient, status="failed")
+
+        list_row = EmailDailyStats.objects.get(list_id=self.email_list.id, template_id=self.template.id)
+        self.assertEqual(
+            (list_row.queued, list_row.sent, list_row.bounced, list_row.complained, list_row.bounce_events,
+             list_row.complaint_events, list_row.revenue),
+            (0, 18, 1, 1, 2, 1, 12.5),
+        )
+        self.assertEqual(EmailDailyStats.objects.get(list_id=0).failed, 1)
+
+        incremental = self.rollups()
+        self.assertEqual(metrics.rebuild([self.tenant.id]), 2)
+        self.assertEqual(self.rollups(), incremental)
+        call_command("backfill_email_metrics", days=1, stdout=io.StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_deletes_keep_the_rollups_in_step(self):
+        dispatch_campaign(self.email_list, self.template)
+        send = EmailSend.objects.order_by("id").first()
+        send.delete()
+        Contact.objects.filter(email__in=["c1@example.com", "c2@example.com"]).delete()  # cascades to their sends
+        self.assertEqual(EmailDailyStats.objects.get(list_id=self.email_list.id).sent, 17)
+
+        self.template.delete()
+        self.email_list.delete()
+        self.assertFalse(EmailDailyStats.objects.exclude(list_id=0, template_id=0).exists())
+        incremental = self.rollups()
+        metrics.rebuild([self.tenant.id])
+        self.assertEqual(self.rollups(), incremental)
+
+        other = Tenant.objects.create(name="Gone", region="US")
+        gone = EmailList.objects.create(tenant=other, name="All", lawful_basis="consent")
+        contact = Contact.objects.create(tenant=other, email="x@example.com")
+        EmailSend.objects.create(tenant=other, email_list=gone, recipient=contact, status="sent")
+        other_id = other.id
+        self.assertTrue(EmailDailyStats.objects.filter(tenant_id=other_id).exists())
+        other.delete()
+        self.assertFalse(EmailDailyStats.objects.filter(tenant_id=other_id).exists())
+
+    def test_summary_and_trend_read_the_rollups(self):
+        user = get_user_model().objects.create_user(username="owner", email="owner@example.com", password="pw")
+        TenantUser.objects.create(user=user, tenant=self.tenant, role="owner")
+        EmailDailyStats.objects.all().delete()  # the welcome email
+        today = timezone.localdate()
+        EmailDailyStats.objects.bulk_create([
+            EmailDailyStats(tenant=self.tenant, day=today, list_id=1, sent=90, bounced=8, complained=2, revenue=40),
+            EmailDailyStats(tenant=self.tenant, day=today, list_id=2, sent=10, queued=5),
+            EmailDailyStats(tenant=self.tenant, day=today - timedelta(days=40), sent=1000),
+        ])
+        cache.clear()
+        self.client.force_login(user)
+
+        summary = self.client.get(reverse("email-marketing-summary")).json()
+        self.assertEqual(summary["sends_count"], 1115)
+        trend = self.client.get(reverse("email-metrics"), {"days": 7}).json()
+        self.assertEqual(len(trend["daily"]), 1)
+        self.assertEqual(
+            {key: trend["totals"][key] for key in ("sent", "queued", "bounce_rate", "complaint_rate")},
+            {"sent": 100, "queued": 5, "bounce_rate": 0.0727, "complaint_rate": 0.0182},
+        )
+        trend = self.client.get(reverse("email-metrics"), {"days": 7, "list": 2}).json()
+        self.assertEqual(trend["totals"]["bounced"], 0)
+        self.assertEqual(self.client.get(reverse("email-metrics"), {"days": "x"}).status_code, 400)
+
+
+@override_settings(EMAIL_HOST="")
+class ContactImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name="Shop", region="US")
+        cls.pro = EmailList.objects.create(
+            tenant=cls.tenant, name="Pro", lawful_basis="consent", segment_sql='properties.plan = "pro"'
+        )
+        Contact.objects.create(tenant=cls.tenant, email="old@example.com", name="Old", properties={"plan": "free", "x": 1})
+        Contact.objects.create(tenant=cls.tenant, email="gone@example.com", subscribed=False)
+
+    def setUp(self):
+        suppression._filters.clear()
+        self.addCleanup(suppression._filters.clear)
+
+    def import_text(self, text, fmt, **kwargs):
+        return imports.import_contacts(self.tenant.id, imports.read_rows(io.BytesIO(text.encode()), fmt), **kwargs)
+
+    def test_rows_are_validated_deduped_and_upserted(self):
+        suppression.suppress(self.tenant.id, ["blocked@example.com"], "bounce")
+        stats = self.import_text(
+            "\n".join([
+                json.dumps({"email": " Old@Example.com ", "properties": {"plan": "pro"}}),
+                json.dumps({"email": "new@example.com", "name": "New", "plan": "pro"}),
+                json.dumps({"email": "NEW@example.com", "city": "Oslo"}),
+                json.dumps({"email": "gone@example.com", "subscribed": True}),
+                json.dumps({"email": "blocked@example.com"}),
+                json.dumps({"email": "leaver@example.com", "subscribed": "no"}),
+                json.dumps({"email": "not-an-email"}),
+                "{broken",
+                "",
+            ]),
+            "ndjson",
+        )
+        self.assertEqual(
+            {key: stats[key] for key in imports.COUNTERS},
+            {"rows": 8, "created": 3, "updated": 2, "invalid": 2, "duplicates": 1, "suppressed": 1},
+        )
+        self.assertEqual([(e["line"], e["error"]) for e in stats["errors"]], [(7, "invalid email"), (8, "unreadable line")])
+
+        contacts = {c.email: c for c in Contact.objects.filter(tenant=self.tenant)}
+        self.assertEqual(len(contacts), 5)
+        self.assertEqual((contacts["old@example.com"].name, contacts["old@example.com"].properties), ("Old", {"plan": "pro", "x": 1}))
+        self.assertEqual((contacts["new@example.com"].name, contacts["new@example.com"].properties), ("New", {"plan": "pro", "city": "Oslo"}))
+        # Imports never resubscribe, and suppressed or opted-out addresses stay unmailable.
+        self.assertEqual(
+            {email for email, c in contacts.items() if not c.subscribed},
+            {"gone@example.com", "blocked@example.com", "leaver@example.com"},
+        )
+        self.assertTrue(suppression.is_suppressed(self.tenant.id, "leaver@example.com"))
+        self.assertEqual(
+            set(self.pro.memberships.values_list("contact__email", flat=True)), {"old@example.com", "new@example.com"}
+        )
+
+    def test_existing_addresses_match_whatever_their_case(self):
+        mixed = Contact.objects.create(tenant=self.tenant, email="Ann.Lee@Example.com", name="Ann")
+        stats = self.import_text("email,plan\nann.lee@example.com,pro\nANN.LEE@EXAMPLE.COM,pro\n", "csv")
+        self.assertEqual((stats["created"], stats["updated"]), (0, 1))
+        self.assertEqual(Contact.objects.filter(tenant=self.tenant, email__iexact="ann.lee@example.com").count(), 1)
+        mixed.refresh_from_db()
+        self.assertEqual((mixed.email, mixed.name, mixed.properties), ("Ann.Lee@Example.com", "Ann", {"plan": "pro"}))
+        self.assertTrue(self.pro.memberships.filter(contact=mixed).exists())
+
+    def test_queries_scale_with_batches_not_rows(self):
+        text = "email,name,plan\n" + "".join(f"c{i}@example.com,C {i},pro\n" for i in range(200))
+        with CaptureQueriesContext(connection) as ctx:
+            stats = self.import_text(text, "csv", batch_size=100)
+        self.assertEqual((stats["rows"], stats["created"]), (200, 200))
+        self.assertLess(len(ctx.captured_queries), 30)
+        self.assertEqual(self.pro.memberships.count(), 200)
+        self.assertEqual(Contact.objects.get(email="c7@example.com").properties, {"plan": "pro"})
+
+    def test_upload_endpoint_and_command(self):
+        user = get_user_model().objects.create_user(username="owner", email="owner@example.com", password="pw")
+        TenantUser.objects.create(user=user, tenant=self.tenant, role="owner")
+        self.client.force_login(user)
+        url = reverse("email-contact-imports")
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            upload = SimpleUploadedFile("contacts.txt", b"Email,Name\na@example.com,A\nbad,B\n")
+            data = self.client.post(url, {"file": upload, "tenant": self.tenant.id}).json()
+            self.assertEqual((data["format"], data["status"], data["created"], data["invalid"]), ("csv", "done", 1, 1))
+            self.assertTrue(ContactImport.objects.get().file.startswith("contact-imports/"))
+            self.assertFalse(any(os.scandir(os.path.join(media, "contact-imports"))))
+        self.assertEqual(self.client.get(url, {"id": data["id"]}).json()["status"], "done")
+        self.assertEqual(self.client.post(url, {}).status_code, 400)
+
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as source:
+            source.write(json.dumps({"email": "b@example.com"}) + "\n")
+            source.flush()
+            out = io.StringIO()
+            call_command("import_contacts", source.name, tenant=self.tenant.id, stdout=out)
+        self.assertIn("1 rows: 1 created", out.getvalue())
+        self.assertTrue(Contact.objects.filter(email="b@example.com").exists())
+
+
+@override_settings(EMAIL_HOST="", EMAIL_DOMAIN_SEND_RATE=60000, EMAIL_TENANT_SEND_RATES={"free": 60000})
+class FlowEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name="Shop", region="US")
+        cls.welcome, cls.upgrade = (
+            EmailTemplate.objects.create(tenant=cls.tenant, name=name, subject=name, body_html=f"<p>{name}</p>")
+            for name in ("Welcome", "Upgrade")
+        )
+
+    def setUp(self):
+        suppression._filters.clear()
+        self.addCleanup(suppression._filters.clear)
+
+    def test_enrollments_walk_sends_waits_and_branches(self):
+        flow = EmailFlow.objects.create(tenant=self.tenant, name="Onboarding")
+        FlowStep.objects.bulk_create([
+            FlowStep(flow=flow, position=0, kind="send", template=self.welcome),
+            FlowStep(flow=flow, position=1, kind="wait", wait_seconds=86400),
+            FlowStep(flow=flow, position=2, kind="branch", engagement="delivered"),
+            FlowStep(flow=flow, position=3, kind="branch", condition='properties.plan = "free"', else_position=5),
+            FlowStep(flow=flow, position=4, kind="send", template=self.upgrade),
+        ])
+        contacts = {
+            name: Contact.objects.create(tenant=self.tenant, email=f"{name}@example.com", properties={"plan": plan})
+            for name, plan in (("pro", "pro"), ("free", "free"), ("bounced", "pro"), ("gone", "pro"))
+        }
+        now = timezone.now()
+        self.assertEqual(flows.enroll(flow, Contact.objects.filter(tenant=self.tenant), now), 4)
+        self.assertEqual(flows.enroll(flow, Contact.objects.filter(tenant=self.tenant), now), 0)
+        Contact.objects.filter(pk=contacts["gone"].pk).update(subscribed=False)
+
+        self.assertEqual(flows.run_due(now), {"processed": 4, "sends": 3})
+        self.assertEqual(flows.run_due(now + timedelta(hours=1)), {"processed": 0})  # waiting: nothing due
+        EmailSend.objects.filter(recipient=contacts["bounced"]).update(status="bounced")
+        EmailSend.objects.exclude(recipient=contacts["bounced"]).update(status="sent")
+
+        later = now + timedelta(days=1, seconds=1)
+        self.assertEqual(flows.run_due(later), {"processed": 4, "sends": 1, "completed": 2, "exited": 2})
+        self.assertEqual(
+            dict(FlowEnrollment.objects.values_list("contact__email", "status")),
+            {"pro@example.com": "completed", "free@example.com": "completed",
+             "bounced@example.com": "exited", "gone@example.com": "exited"},
+        )
+        self.assertFalse(FlowEnrollment.objects.filter(next_run_at__isnull=False).exists())
+        self.assertEqual(
+            sorted(EmailSend.objects.filter(flow=flow).values_list("recipient__email", "template__name")),
+            [("bounced@example.com", "Welcome"), ("free@example.com", "Upgrade"), ("free@example.com", "Welcome"),
+             ("pro@example.com", "Welcome")],
+        )
+
+    def test_new_contacts_enter_triggered_flows_and_get_delivered(self):
+        flow = EmailFlow.objects.create(tenant=self.tenant, name="Welcome", template=self.welcome, trigger="contact_created")
+        with self.captureOnCommitCallbacks(execute=True):
+            contact = Contact.objects.create(tenant=self.tenant, email="new@example.com")
+        enrollment = FlowEnrollment.objects.get(flow=flow, contact=contact)
+        self.assertEqual(enrollment.status, "completed")
+        self.assertEqual(EmailSend.objects.get(flow=flow, recipient=contact).status, "sent")
+
+        # A disabled flow holds its enrollments without rescanning them every tick.
+        flow.enabled = False
+        flow.save()
+        Contact.objects.filter(pk=contact.pk).update(properties={"x": 1})
+        other = Contact.objects.bulk_create([Contact(tenant=self.tenant, email="late@example.com")])[0]
+        now = timezone.now()
+        flows.enroll(flow, Contact.objects.filter(pk=other.pk), now)
+        self.assertEqual(flows.run_due(now), {"processed": 1, "paused": 1})
+        self.assertEqual(flows.run_due(now), {"processed": 0})
+
+    def test_flow_endpoints(self):
+        user = get_user_model().objects.create_user(username="owner", email="owner@example.com", password="pw")
+        TenantUser.objects.create(user=user, tenant=self.tenant, role="owner")
+        self.client.force_login(user)
+        flow = EmailFlow.objects.create(tenant=self.tenant, name="Nurture")
+        FlowStep.objects.create(flow=flow, position=0, kind="wait", wait_seconds=3600)
+        email_list = EmailList.objects.create(tenant=self.tenant, name="Everyone", lawful_basis="consent")
+        Contact.objects.bulk_create(Contact(tenant=self.tenant, email=f"c{i}@example.com") for i in range(3))
+
+        url = reverse("email-flow-enroll", args=[flow.id])
+        self.assertEqual(self.client.post(url, {"contacts": "x"}, content_type="application/json").status_code, 400)
+        response = self.client.post(url, {"list": email_list.id}, content_type="application/json")
+        self.assertEqual((response.status_code, response.json()["enrolled"]), (202, 3))
+        flows.run_due()
+        cache.clear()
+        data = self.client.get(reverse("email-flow-detail", args=[flow.id])).json()
+        self.assertEqual(data["enrollments"], {"active": 3, "completed": 0, "exited": 0})
+        self.assertEqual([(s["kind"], s["active"]) for s in data["steps"]], [("wait", 0)])
@@ -4,9 +4,10 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import EmailList, Contact, EmailTemplate, EmailFlow, EmailSend
+from .models import EmailList, Contact, EmailTemplate, EmailFlow, EmailSend, DomainCheck
 from .serializers import (EmailListSerializer, ContactSerializer,
                           EmailTemplateSerializer, EmailFlowSerializer, EmailSendSerializer)
+from .tasks import deliverability_check_task
 # DRY RUN: Task imports removed
 
 class EmailListViewSet(viewsets.ModelViewSet):
@@ -57,14 +58,15 @@ class EmailSendViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["post"])
     def deliverability_check(self, request):
+        """Queue a re-check of the tenant's sending domains; returns the latest stored results."""
         tenant_id = request.data.get("tenant_id")
-        # DRY RUN: Return dummy deliverability data
+        if not request.tenant_ctx.has_tenant(tenant_id):
+            return Response({"error": "Unknown tenant."}, status=status.HTTP_404_NOT_FOUND)
+        deliverability_check_task.delay(int(tenant_id))
+        checks = DomainCheck.objects.filter(tenant_id=tenant_id)
         return Response({
-            "message": "[DRY RUN] Deliverability check simulated",
-            "dummy_results": {
-                "spf": "pass",
-                "dkim": "pass",
-                "dmarc": "pass",
-                "mx_records": ["dummy.mail.protection.outlook.com"]
-            }
+            "results": [
+                {"domain": c.domain, "status": c.status, "checked_at": c.checked_at, **c.results}
+                for c in checks
+            ]
         })
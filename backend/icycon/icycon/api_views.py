@@ -1,13 +1,35 @@
-from django.db.models import Q
+import hmac
+import json
+import uuid
+from datetime import timedelta
+
+import httpx
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django.conf import settings
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.decorators import (
+    api_view, authentication_classes, parser_classes, permission_classes, renderer_classes,
+)
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.response import Response
 
 from analytics.models import Site, ContentItem, PageView
 from aso.models import App as ASOApp, AppKeyword, AppListing
-from email_engine.models import Contact, EmailFlow, EmailList, EmailSend, EmailTemplate
+from email_engine.models import (
+    Contact, ContactImport, DomainCheck, EmailDailyStats, EmailFlow, EmailList, EmailSend, EmailTemplate, FlowEnrollment,
+)
+from email_engine.services import events as delivery_events
+from email_engine.services import flows as email_flow_engine
+from email_engine.services import imports as contact_imports
+from email_engine.services import metrics as email_metrics
+from email_engine.services.campaigns import list_recipients
+from email_engine.tasks import deliverability_check_task, dispatch_campaign_task, import_contacts_task
 from marketplace.models import (
     Conversation as MarketplaceConversation,
     Message as MarketplaceMessage,
@@ -16,6 +38,8 @@ from marketplace.models import (
     Review,
     SavedProduct,
 )
+from multilingual import memory as translation_memory
+from seo.models import Backlink as SEOBacklink
 from seo.models import FAQ as SEOFAQ
 from seo.models import ContentItem as SEOContentItem
 from seo.models import Directory as SEODirectory
@@ -29,14 +53,21 @@ from social_media.models import (
     Post,
     SocialAccount,
 )
-from tenants.models import Tenant, TenantUser
+from tenants.context import get_tenant_context
+from tenants.models import LLMUsage, Tenant
+
+from . import geocoder, llm, quotas
+from .async_api import async_api_view
+from .exports import EXPORTS, CSVRenderer, NDJSONRenderer, stream_export
+from .pagination import KeysetPagination
+from .response_cache import cache_response, cached_for_tenants, conditional_response
 
 FEATURES_INDEX = [
     # Platform / global
     {"key": "dashboard", "slug": "seo", "name": "Dashboard", "path": "/api/dashboard/", "description": "User overview and counts"},
     # AEO
     {"key": "aeo_readiness", "slug": "aeo", "name": "AEO Readiness", "path": "/api/aeo/readiness/", "description": "AEO/LLM structured data readiness checklist"},
-    {"key": "translation_llm", "slug": "aeo", "name": "Translation & LLM", "path": "/api/translate/", "description": "Translate supplied text (stubbed LLM)"},
+    {"key": "translation_llm", "slug": "aeo", "name": "Translation & LLM", "path": "/api/translate/", "description": "Translate supplied text via LLM with translation memory"},
     # Social
     {"key": "social_accounts", "slug": "social", "name": "Social Accounts", "path": "/api/social/accounts/", "description": "Connected social accounts"},
     {"key": "social_posts", "slug": "social", "name": "Social Posts", "path": "/api/social/posts/", "description": "Posts across platforms"},
@@ -48,9 +79,12 @@ FEATURES_INDEX = [
     {"key": "email_lists", "slug": "email", "name": "Email Lists", "path": "/api/email/lists/", "description": "Subscriber lists"},
     {"key": "email_templates", "slug": "email", "name": "Email Templates", "path": "/api/email/templates/", "description": "Email templates"},
     {"key": "email_flows", "slug": "email", "name": "Email Flows", "path": "/api/email/flows/", "description": "Automation flows"},
+    {"key": "email_flow_detail", "slug": "email", "name": "Email Flow Detail", "path": "/api/email/flows/<flow_id>/", "description": "Flow steps and enrollment progress"},
     {"key": "email_contacts", "slug": "email", "name": "Email Contacts", "path": "/api/email/contacts/", "description": "Contacts"},
     {"key": "email_sends", "slug": "email", "name": "Email Sends", "path": "/api/email/sends/", "description": "Send history"},
     {"key": "email_marketing_summary", "slug": "email", "name": "Email Marketing", "path": "/api/email/marketing/", "description": "Email marketing overview"},
+    {"key": "email_contact_imports", "slug": "email", "name": "Contact Imports", "path": "/api/email/contacts/import/", "description": "Bulk CSV/NDJSON contact uploads and their progress"},
+    {"key": "email_metrics_trend", "slug": "email", "name": "Email Metrics", "path": "/api/email/metrics/?days=30", "description": "Daily sends, bounces, complaints and revenue"},
     # Multilingual
     {"key": "multilingual_summary", "slug": "multilingual", "name": "Multilingual Summary", "path": "/api/multilingual/summary/", "description": "Content locales summary"},
     # Backlinks & directories
@@ -84,8 +118,11 @@ FEATURES_INDEX = [
     {"key": "seo_keyword_clusters", "slug": "content", "name": "SEO Keyword Clusters", "path": "/api/seo/keywords/", "description": "Keyword clusters"},
     {"key": "seo_content_items", "slug": "content", "name": "SEO Content", "path": "/api/seo/content/", "description": "Content items"},
     {"key": "seo_faqs", "slug": "aeo", "name": "SEO FAQs", "path": "/api/seo/faqs/", "description": "FAQ entries"},
+    # Bulk export
+    {"key": "export", "slug": "seo", "name": "Data Export", "path": "/api/export/<resource>/?format=ndjson|csv", "description": "Stream contacts, sends, pageviews, backlinks or orders"},
     # Geo helper
-    {"key": "geo_lookup", "slug": "seo", "name": "Geo Lookup", "path": "/api/geo/lookup/", "description": "Geocode an address (stub with optional OpenAI)"},
+    {"key": "geo_lookup", "slug": "seo", "name": "Geo Lookup", "path": "/api/geo/lookup/", "description": "Geocode an address against the offline GeoNames gazetteer"},
+    {"key": "geo_batch", "slug": "seo", "name": "Geo Batch", "path": "/api/geo/batch/", "description": "Forward/reverse geocode many addresses or points at once"},
 ]
 
 
@@ -94,11 +131,8 @@ def iso(dt):
 
 
 def get_user_tenant_ids(user):
-    # Gracefully handle cases where tenant tables aren't present (e.g., before migrations)
-    try:
-        return list(TenantUser.objects.filter(user=user).values_list("tenant_id", flat=True))
-    except Exception:
-        return []
+    # Views should prefer request.tenant_ctx; this stays for callers without a request.
+    return list(get_tenant_context(user).tenant_ids)
 
 
 @api_view(["GET"])
@@ -112,7 +146,9 @@ def api_home(request):
             "auth": {
                 "login": f"{base}/api/auth/login",
                 "signup": f"{base}/api/auth/signup",
-                "type": "basic or session",
+                "logout": f"{base}/api/auth/logout",
+                "type": "bearer token, basic or session",
+                "token_example": "Authorization: Bearer <token from login/signup>",
                 "basic_example": 'Authorization: Basic base64(email:password)',
             },
             "navigation": {
@@ -127,13 +163,22 @@ def api_home(request):
 @permission_classes([IsAuthenticated])
 def dashboard(request):
     user = request.user
-    tenant_ids = get_user_tenant_ids(user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     def safe_count(qs):
         try:
             return qs.count()
         except Exception:
             return 0
 
+    # The user block is per-user; only the tenant-wide counts are cached.
+    counts = cached_for_tenants(
+        request,
+        "dashboard",
+        lambda: {
+            "aso_apps_count": safe_count(ASOApp.objects.filter(tenant_id__in=tenant_ids)) if tenant_ids else 0,
+            "marketplace_products_count": safe_count(Product.objects.filter(tenant_id__in=tenant_ids)) if tenant_ids else 0,
+        },
+    )
     return Response(
         {
             "user": {
@@ -144,8 +189,7 @@ def dashboard(request):
                 "last_name": user.last_name,
                 "avatar": user.avatar.url if getattr(user, "avatar", None) else None,
             },
-            "aso_apps_count": safe_count(ASOApp.objects.filter(tenant_id__in=tenant_ids)) if tenant_ids else 0,
-            "marketplace_products_count": safe_count(Product.objects.filter(tenant_id__in=tenant_ids)) if tenant_ids else 0,
+            **counts,
             "recent_activities": [],
         }
     )
@@ -154,8 +198,9 @@ def dashboard(request):
 # ASO ----------------------------------------------------------------------
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def aso_apps(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         name = request.data.get("name") or "New App"
         platform = request.data.get("platform") or "ios"
@@ -176,7 +221,10 @@ def aso_apps(request):
             status=201,
         )
 
-    apps = ASOApp.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination()
+    apps = paginator.paginate_queryset(
+        ASOApp.objects.filter(tenant_id__in=tenant_ids).annotate(keywords_total=Count("keywords")), request
+    )
     data = [
         {
             "id": app.id,
@@ -189,17 +237,18 @@ def aso_apps(request):
             "category": app.category,
             "icon_url": app.icon_url,
             "status": app.status,
-            "keywords_count": app.keywords.count(),
+            "keywords_count": app.keywords_total,
         }
         for app in apps
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def aso_app_detail(request, app_id):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     app = get_object_or_404(ASOApp, pk=app_id, tenant_id__in=tenant_ids)
     return Response(
         {
@@ -225,51 +274,64 @@ def aso_app_detail(request, app_id):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def aso_keywords(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    keywords = AppKeyword.objects.filter(app__tenant_id__in=tenant_ids)
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination(ordering=("-added_at", "-id"))
+    keywords = paginator.paginate_queryset(
+        AppKeyword.objects.filter(app__tenant_id__in=tenant_ids).values(
+            "id", "app_id", "app__name", "keyword", "position", "search_volume", "tracking", "added_at"
+        ),
+        request,
+    )
     data = [
         {
-            "id": k.id,
-            "app_id": k.app.id,
-            "app_name": k.app.name,
-            "keyword": k.keyword,
-            "position": k.position,
-            "search_volume": getattr(k, "search_volume", 0),
-            "tracking": getattr(k, "tracking", False),
+            "id": k["id"],
+            "app_id": k["app_id"],
+            "app_name": k["app__name"],
+            "keyword": k["keyword"],
+            "position": k["position"],
+            "search_volume": k["search_volume"],
+            "tracking": k["tracking"],
         }
         for k in keywords
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def aso_listings(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    listings = AppListing.objects.filter(app__tenant_id__in=tenant_ids)
-    if not listings.exists():
-        return Response({})
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination()
+    listings = paginator.paginate_queryset(
+        AppListing.objects.filter(app__tenant_id__in=tenant_ids).values(
+            "id", "app_id", "app__name", "locale", "title", "subtitle", "description", "created_at"
+        ),
+        request,
+    )
     data = [
         {
-            "id": l.id,
-            "app_id": l.app.id,
-            "app_name": l.app.name,
-            "locale": getattr(l, "locale", "en"),
-            "title": getattr(l, "title", "N/A"),
-            "subtitle": getattr(l, "subtitle", ""),
-            "description": (getattr(l, "description", "") or "")[:100] + "...",
+            "id": l["id"],
+            "app_id": l["app_id"],
+            "app_name": l["app__name"],
+            "locale": l["locale"],
+            "title": l["title"],
+            "subtitle": l["subtitle"],
+            "description": (l["description"] or "")[:100] + "...",
         }
         for l in listings
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 # Marketplace --------------------------------------------------------------
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def marketplace_products(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         title = request.data.get("title") or "Untitled Product"
         price = request.data.get("price", 0)
@@ -289,7 +351,8 @@ def marketplace_products(request):
             status=201,
         )
 
-    products = Product.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination()
+    products = paginator.paginate_queryset(Product.objects.filter(tenant_id__in=tenant_ids), request)
     data = [
         {
             "id": product.id,
@@ -305,15 +368,16 @@ def marketplace_products(request):
         }
         for product in products
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def marketplace_product_detail(request, product_id):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     product = get_object_or_404(Product, pk=product_id, tenant_id__in=tenant_ids)
-    reviews = product.reviews.all()
+    reviews = product.reviews.select_related("reviewer")
     return Response(
         {
             "id": product.id,
@@ -347,13 +411,17 @@ def marketplace_product_detail(request, product_id):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def marketplace_reviews(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    reviews = Review.objects.filter(tenant_id__in=tenant_ids)
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination()
+    reviews = paginator.paginate_queryset(
+        Review.objects.filter(tenant_id__in=tenant_ids).select_related("product", "reviewer"), request
+    )
     data = [
         {
             "id": r.id,
-            "product_id": r.product.id,
+            "product_id": r.product_id,
             "product_title": r.product.title,
             "rating": r.rating,
             "title": r.title,
@@ -365,18 +433,19 @@ def marketplace_reviews(request):
         }
         for r in reviews
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def marketplace_review_detail(request, review_id):
-    tenant_ids = get_user_tenant_ids(request.user)
-    review = get_object_or_404(Review, pk=review_id, tenant_id__in=tenant_ids)
+    tenant_ids = request.tenant_ctx.tenant_ids
+    review = get_object_or_404(Review.objects.select_related("product", "reviewer"), pk=review_id, tenant_id__in=tenant_ids)
     return Response(
         {
             "id": review.id,
-            "product_id": review.product.id,
+            "product_id": review.product_id,
             "product_title": review.product.title,
             "rating": review.rating,
             "title": review.title,
@@ -392,16 +461,23 @@ def marketplace_review_detail(request, review_id):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def marketplace_orders(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    orders = Order.objects.filter(Q(buyer_id__in=tenant_ids) | Q(seller_id__in=tenant_ids)).distinct()
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination()
+    orders = paginator.paginate_queryset(
+        Order.objects.filter(Q(buyer_tenant_id__in=tenant_ids) | Q(product__tenant_id__in=tenant_ids)).select_related(
+            "product__tenant", "buyer_tenant"
+        ),
+        request,
+    )
     data = [
         {
             "id": o.id,
             "order_number": o.order_number,
             "product_title": o.product.title,
-            "buyer": o.buyer.name,
-            "seller": o.seller.name,
+            "buyer": o.buyer_tenant.name,
+            "seller": o.product.tenant.name,
             "total_price": float(o.total_price) if o.total_price else 0,
             "status": o.status,
             "quantity": o.quantity,
@@ -409,72 +485,90 @@ def marketplace_orders(request):
         }
         for o in orders
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response(vary_on_user=True)
 def marketplace_saved_products(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    saved = SavedProduct.objects.filter(tenant_id__in=tenant_ids)
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination(ordering=("-saved_at", "-id"))
+    saved = paginator.paginate_queryset(SavedProduct.objects.filter(user_id=request.user.pk).select_related("product"), request)
     data = [
         {
             "id": s.id,
-            "product_id": s.product.id,
+            "product_id": s.product_id,
             "product_title": s.product.title,
             "product_price": float(s.product.price) if s.product.price else 0,
             "product_image": s.product.featured_image,
             "category": s.product.category,
             "rating": float(s.product.rating),
-            "saved_at": iso(s.created_at),
+            "saved_at": iso(s.saved_at),
         }
         for s in saved
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def marketplace_conversations(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    conversations = MarketplaceConversation.objects.filter(tenant_id__in=tenant_ids)
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination()
+    conversations = paginator.paginate_queryset(
+        MarketplaceConversation.objects.filter(Q(buyer_tenant_id__in=tenant_ids) | Q(seller_tenant_id__in=tenant_ids))
+        .select_related("product", "buyer_tenant", "seller_tenant")
+        .annotate(message_count=Count("messages"), last_message_at=Max("messages__created_at")),
+        request,
+    )
     data = [
         {
             "id": c.id,
-            "buyer": c.buyer.name if c.buyer else "Unknown",
-            "seller": c.seller.name if c.seller else "Unknown",
-            "product_title": c.product.title if c.product else "N/A",
-            "message_count": c.marketplacemessage_set.count() if hasattr(c, "marketplacemessage_set") else 0,
-            "last_message": iso(c.last_message_at) if hasattr(c, "last_message_at") else None,
+            "buyer": c.buyer_tenant.name,
+            "seller": c.seller_tenant.name,
+            "product_title": c.product.title,
+            "message_count": c.message_count,
+            "last_message": iso(c.last_message_at),
             "created_at": iso(c.created_at),
         }
         for c in conversations
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def marketplace_messages(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    messages = MarketplaceMessage.objects.filter(conversation__tenant_id__in=tenant_ids)[:100]
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination()
+    messages = paginator.paginate_queryset(
+        MarketplaceMessage.objects.filter(
+            Q(conversation__buyer_tenant_id__in=tenant_ids) | Q(conversation__seller_tenant_id__in=tenant_ids)
+        ).select_related("sender"),
+        request,
+    )
     data = [
         {
             "id": m.id,
-            "conversation_id": m.conversation.id,
-            "sender": m.sender.username if m.sender else "Unknown",
+            "conversation_id": m.conversation_id,
+            "sender": m.sender.username,
             "content": m.content[:200] + "..." if len(m.content) > 200 else m.content,
             "is_read": m.is_read,
             "created_at": iso(m.created_at),
         }
         for m in messages
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 # Analytics & SEO ----------------------------------------------------------
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
+@cache_response
 def feature_index(request):
     """Return a static list of available feature endpoints and what they provide."""
     base = request.build_absolute_uri("/")
@@ -496,8 +590,9 @@ def feature_index(request):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def analytics_sites(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         domain = request.data.get("domain") or "example.com"
         locale = request.data.get("default_locale", "en")
@@ -512,24 +607,28 @@ def analytics_sites(request):
             status=201,
         )
 
-    sites = Site.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination()
+    sites = paginator.paginate_queryset(
+        Site.objects.filter(tenant_id__in=tenant_ids).annotate(pageview_total=Count("pageview")), request
+    )
     data = [
         {
             "id": site.id,
             "domain": site.domain,
             "default_locale": site.default_locale,
             "created_at": iso(site.created_at),
-            "pageview_count": site.pageview_set.count(),
+            "pageview_count": site.pageview_total,
         }
         for site in sites
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def analytics_site_detail(request, site_id):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     site = get_object_or_404(Site, pk=site_id, tenant_id__in=tenant_ids)
     pageviews = site.pageview_set.all()[:50]
     return Response(
@@ -551,29 +650,38 @@ def analytics_site_detail(request, site_id):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def analytics_pageviews(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    pageviews = PageView.objects.filter(site__tenant_id__in=tenant_ids)[:100]
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination(ordering=("-timestamp", "-id"))
+    pageviews = paginator.paginate_queryset(
+        PageView.objects.filter(site__tenant_id__in=tenant_ids).values(
+            "id", "site__domain", "url", "visitor_id", "duration", "bounce", "referrer", "timestamp"
+        ),
+        request,
+    )
     data = [
         {
-            "id": pv.id,
-            "site_domain": pv.site.domain,
-            "url": pv.url,
-            "visitor_id": pv.visitor_id,
-            "duration": pv.duration,
-            "bounce": pv.bounce,
-            "referrer": pv.referrer or "Direct",
-            "timestamp": iso(pv.timestamp),
+            "id": pv["id"],
+            "site_domain": pv["site__domain"],
+            "url": pv["url"],
+            "visitor_id": pv["visitor_id"],
+            "duration": pv["duration"],
+            "bounce": pv["bounce"],
+            "referrer": pv["referrer"] or "Direct",
+            "timestamp": iso(pv["timestamp"]),
         }
         for pv in pageviews
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
+@cache_response
 def multilingual_summary(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     content_items = ContentItem.objects.filter(tenant_id__in=tenant_ids)
     locales = set(content_items.values_list("locale", flat=True))
     return Response(
@@ -592,8 +700,9 @@ def multilingual_summary(request):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def tenant_summary(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     tenants = Tenant.objects.filter(id__in=tenant_ids)
     return Response(
         {
@@ -614,7 +723,7 @@ def tenant_summary(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def tenant_members(request, tenant_id):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     tenant = get_object_or_404(Tenant, id=tenant_id, id__in=tenant_ids)
     members = [request.user]
     return Response(
@@ -628,11 +737,13 @@ def tenant_members(request, tenant_id):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def tenant_integrations(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     from tenants.models import Integration
 
-    integrations = Integration.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination(ordering=("-connected_at", "-id"))
+    integrations = paginator.paginate_queryset(Integration.objects.filter(tenant_id__in=tenant_ids), request)
     data = [
         {
             "id": i.id,
@@ -643,14 +754,18 @@ def tenant_integrations(request):
         }
         for i in integrations
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def seo_sites(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    sites = SEOSite.objects.filter(tenant_id__in=tenant_ids)
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination()
+    sites = paginator.paginate_queryset(
+        SEOSite.objects.filter(tenant_id__in=tenant_ids).annotate(backlink_total=Count("backlinks")), request
+    )
     data = [
         {
             "id": s.id,
@@ -658,20 +773,21 @@ def seo_sites(request):
             "sitemaps_url": s.sitemaps_url,
             "default_locale": s.default_locale,
             "domain_authority": 0,
-            "backlink_count": s.backlinks.count() if hasattr(s, "backlinks") else 0,
+            "backlink_count": s.backlink_total,
             "indexed_pages": 0,
             "last_crawled": iso(getattr(s, "created_at", None)),
             "created_at": iso(getattr(s, "created_at", None)),
         }
         for s in sites
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def seo_site_detail(request, site_id):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     site = get_object_or_404(SEOSite, pk=site_id, tenant_id__in=tenant_ids)
     return Response(
         {
@@ -681,7 +797,7 @@ def seo_site_detail(request, site_id):
             "default_locale": site.default_locale,
             "robots_txt": site.robots_txt,
             "domain_authority": 0,
-            "backlink_count": site.backlinks.count() if hasattr(site, "backlinks") else 0,
+            "backlink_count": site.backlinks.count(),
             "indexed_pages": 0,
         }
     )
@@ -689,8 +805,9 @@ def seo_site_detail(request, site_id):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def seo_keyword_clusters(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         intent = request.data.get("intent") or request.data.get("keyword")
         terms = request.data.get("terms") or []
@@ -718,7 +835,8 @@ def seo_keyword_clusters(request):
             status=201,
         )
 
-    clusters = SEOKeywordCluster.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination()
+    clusters = paginator.paginate_queryset(SEOKeywordCluster.objects.filter(tenant_id__in=tenant_ids), request)
     data = []
     for c in clusters:
         keyword_val = None
@@ -741,13 +859,14 @@ def seo_keyword_clusters(request):
                 "created_at": iso(getattr(c, "created_at", None)),
             }
         )
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def seo_content_items(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         url = request.data.get("url") or "https://example.com"
         return Response(
@@ -762,18 +881,20 @@ def seo_content_items(request):
             status=201,
         )
 
-    items = SEOContentItem.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination()
+    items = paginator.paginate_queryset(SEOContentItem.objects.filter(tenant_id__in=tenant_ids), request)
     data = [
         {"id": i.id, "type": i.type, "url": i.url, "status": i.status, "locale": i.locale, "created_at": iso(i.created_at)}
         for i in items
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def seo_faqs(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         question = request.data.get("question") or "New FAQ?"
         answer = request.data.get("answer") or ""
@@ -787,7 +908,8 @@ def seo_faqs(request):
             status=201,
         )
 
-    faqs = SEOFAQ.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination()
+    faqs = paginator.paginate_queryset(SEOFAQ.objects.filter(tenant_id__in=tenant_ids), request)
     data = [
         {
             "id": f.id,
@@ -797,13 +919,14 @@ def seo_faqs(request):
         }
         for f in faqs
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def seo_backlinks(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         return Response(
             {
@@ -820,32 +943,32 @@ def seo_backlinks(request):
             status=201,
         )
 
-    if not hasattr(SEOSite, "backlinks"):
-        return Response([])
-    sites = SEOSite.objects.filter(tenant_id__in=tenant_ids).prefetch_related("backlinks")
-    backlinks = []
-    for site in sites:
-        for b in getattr(site, "backlinks").all():
-            backlinks.append(
-                {
-                    "id": b.id,
-                    "site_id": site.id,
-                    "domain": site.domain,
-                    "source_url": b.source_url,
-                    "target_url": b.target_url,
-                    "anchor_text": b.anchor_text,
-                    "status": getattr(b, "status", "active"),
-                    "domain_rating": getattr(b, "domain_rating", 0),
-                    "created_at": iso(getattr(b, "first_seen", None)),
-                }
-            )
-    return Response(backlinks)
+    paginator = KeysetPagination(ordering=("-first_seen", "-id"))
+    backlinks = paginator.paginate_queryset(
+        SEOBacklink.objects.filter(site__tenant_id__in=tenant_ids).select_related("site"), request
+    )
+    data = [
+        {
+            "id": b.id,
+            "site_id": b.site_id,
+            "domain": b.site.domain,
+            "source_url": b.source_url,
+            "target_url": b.target_url,
+            "anchor_text": b.anchor_text,
+            "status": b.status,
+            "domain_rating": b.domain_rating,
+            "created_at": iso(b.first_seen),
+        }
+        for b in backlinks
+    ]
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def seo_directories(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         name = request.data.get("name")
         url = request.data.get("url")
@@ -871,7 +994,8 @@ def seo_directories(request):
             status=201,
         )
 
-    directories = SEODirectory.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination()
+    directories = paginator.paginate_queryset(SEODirectory.objects.filter(tenant_id__in=tenant_ids), request)
     data = [
         {
             "id": d.id,
@@ -882,15 +1006,23 @@ def seo_directories(request):
         }
         for d in directories
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 # Social -------------------------------------------------------------------
+def _social_conversation_ids(tenant_ids):
+    # A subquery rather than a participants join, so a conversation shared by
+    # two of the user's tenants is neither duplicated nor double-counted.
+    return SocialConversation.participants.through.objects.filter(tenant_id__in=tenant_ids).values("conversation_id")
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def social_accounts(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    accounts = SocialAccount.objects.filter(tenant_id__in=tenant_ids)
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination(ordering=("-connected_at", "-id"))
+    accounts = paginator.paginate_queryset(SocialAccount.objects.filter(tenant_id__in=tenant_ids), request)
     data = [
         {
             "id": a.id,
@@ -903,13 +1035,14 @@ def social_accounts(request):
         }
         for a in accounts
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def social_posts(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         content = request.data.get("content") or ""
         return Response(
@@ -927,7 +1060,10 @@ def social_posts(request):
             status=201,
         )
 
-    posts = Post.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination()
+    posts = paginator.paginate_queryset(
+        Post.objects.filter(tenant_id__in=tenant_ids).annotate(comment_total=Count("comments")), request
+    )
     data = [
         {
             "id": p.id,
@@ -937,41 +1073,54 @@ def social_posts(request):
             "created_at": iso(p.created_at),
             "posted_date": iso(p.published_at),
             "like_count": 0,
-            "comment_count": p.comments.count(),
+            "comment_count": p.comment_total,
             "share_count": 0,
         }
         for p in posts
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def social_conversations(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    conversations = SocialConversation.objects.filter(account__tenant_id__in=tenant_ids)
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination()
+    latest = SocialMessage.objects.filter(conversation=OuterRef("pk")).order_by("-sent_at", "-id")
+    conversations = paginator.paginate_queryset(
+        SocialConversation.objects.filter(id__in=_social_conversation_ids(tenant_ids)).annotate(
+            last_message=Subquery(latest.values("content")[:1]),
+            unread=Count("messages", filter=Q(messages__is_read=False)),
+        ),
+        request,
+    )
     data = [
         {
             "id": c.id,
             "participant_name": c.subject or "Group Conversation",
-            "last_message": c.messages.first().content[:100] + "..." if c.messages.exists() else "No messages",
-            "unread": c.messages.filter(is_read=False).count(),
+            "last_message": c.last_message[:100] + "..." if c.last_message is not None else "No messages",
+            "unread": c.unread,
             "updated_at": iso(c.updated_at),
         }
         for c in conversations
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def social_comments(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    comments = Comment.objects.filter(post__tenant_id__in=tenant_ids)
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination()
+    comments = paginator.paginate_queryset(
+        Comment.objects.filter(post__tenant_id__in=tenant_ids).select_related("post", "author"), request
+    )
     data = [
         {
             "id": c.id,
-            "post_id": c.post.id,
+            "post_id": c.post_id,
             "post_title": c.post.title,
             "author": c.author.username,
             "content": c.content[:150] + "..." if len(c.content) > 150 else c.content,
@@ -980,18 +1129,22 @@ def social_comments(request):
         }
         for c in comments
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def social_engagement(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    engagements = Engagement.objects.filter(post__tenant_id__in=tenant_ids)
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination(ordering=("-timestamp", "-id"))
+    engagements = paginator.paginate_queryset(
+        Engagement.objects.filter(post__tenant_id__in=tenant_ids).select_related("post"), request
+    )
     data = [
         {
             "id": e.id,
-            "post_id": e.post.id,
+            "post_id": e.post_id,
             "post_title": e.post.title,
             "platform": e.platform,
             "likes": e.likes,
@@ -1004,32 +1157,37 @@ def social_engagement(request):
         }
         for e in engagements
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def social_messages(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    messages = SocialMessage.objects.filter(conversation__account__tenant_id__in=tenant_ids)[:100]
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination(ordering=("-sent_at", "-id"))
+    messages = paginator.paginate_queryset(
+        SocialMessage.objects.filter(conversation_id__in=_social_conversation_ids(tenant_ids)), request
+    )
     data = [
         {
             "id": m.id,
-            "conversation_id": m.conversation.id,
+            "conversation_id": m.conversation_id,
             "sender_id": m.sender_id,
             "content": m.content[:200] + "..." if len(m.content) > 200 else m.content,
-            "timestamp": iso(m.timestamp),
+            "timestamp": iso(m.sent_at),
         }
         for m in messages
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 # Email --------------------------------------------------------------------
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def email_lists(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         name = request.data.get("name") or "New List"
         return Response(
@@ -1045,12 +1203,20 @@ def email_lists(request):
             status=201,
         )
 
-    lists = EmailList.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination()
+    lists = paginator.paginate_queryset(
+        EmailList.objects.filter(tenant_id__in=tenant_ids).annotate(
+            subscriber_total=Count(
+                "emailsend__recipient", filter=Q(emailsend__recipient__subscribed=True), distinct=True
+            )
+        ),
+        request,
+    )
     data = [
         {
             "id": l.id,
             "name": l.name,
-            "subscriber_count": l.contact_set.filter(subscribed=True).count(),
+            "subscriber_count": l.subscriber_total,
             "is_active": True,
             "open_rate": "0%",
             "created_at": iso(l.created_at),
@@ -1058,13 +1224,14 @@ def email_lists(request):
         }
         for l in lists
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def email_templates(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         name = request.data.get("name") or "New Template"
         subject = request.data.get("subject") or "Subject"
@@ -1080,7 +1247,8 @@ def email_templates(request):
             status=201,
         )
 
-    templates = EmailTemplate.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination()
+    templates = paginator.paginate_queryset(EmailTemplate.objects.filter(tenant_id__in=tenant_ids), request)
     data = [
         {
             "id": t.id,
@@ -1092,13 +1260,14 @@ def email_templates(request):
         }
         for t in templates
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def email_flows(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         name = request.data.get("name") or "New Flow"
         return Response(
@@ -1112,7 +1281,8 @@ def email_flows(request):
             status=201,
         )
 
-    flows = EmailFlow.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination()
+    flows = paginator.paginate_queryset(EmailFlow.objects.filter(tenant_id__in=tenant_ids), request)
     data = [
         {
             "id": f.id,
@@ -1123,13 +1293,70 @@ def email_flows(request):
         }
         for f in flows
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@conditional_response
+@cache_response
+def email_flow_detail(request, flow_id):
+    """A flow's steps and how many contacts are at each step or have left."""
+    flow = get_object_or_404(EmailFlow, id=flow_id, tenant_id__in=request.tenant_ctx.tenant_ids)
+    enrollments = FlowEnrollment.objects.filter(flow=flow)
+    by_status = dict(enrollments.values_list("status").annotate(n=Count("id")).order_by())
+    at_step = dict(enrollments.filter(status="active").values_list("position").annotate(n=Count("id")).order_by())
+    return Response(
+        {
+            "id": flow.id,
+            "name": flow.name,
+            "is_active": flow.enabled,
+            "trigger": flow.trigger,
+            "steps": [
+                {
+                    "position": step.position,
+                    "kind": step.kind,
+                    "template": step.template_id,
+                    "wait_seconds": step.wait_seconds,
+                    "condition": step.condition,
+                    "engagement": step.engagement,
+                    "else_position": step.else_position,
+                    "active": at_step.get(step.position, 0),
+                }
+                for step in flow.steps.all()
+            ],
+            "enrollments": {status: by_status.get(status, 0) for status, _ in FlowEnrollment.STATUS_CHOICES},
+        }
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def email_flow_enroll(request, flow_id):
+    """
+    Enroll the subscribed recipients of list `list`, or the contacts with
+    ids `contacts`, in a flow. Contacts already enrolled are skipped. The
+    flow scheduler advances them from there.
+    """
+    flow = get_object_or_404(EmailFlow, id=flow_id, tenant_id__in=request.tenant_ctx.tenant_ids)
+    if request.data.get("list") is not None:
+        email_list = EmailList.objects.filter(tenant_id=flow.tenant_id, id=request.data.get("list")).first()
+        if email_list is None:
+            return Response({"error": "Unknown email list for this flow's tenant"}, status=404)
+        contacts = list_recipients(email_list)
+    else:
+        ids = request.data.get("contacts")
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return Response({"error": "Pass `list` or a `contacts` list of ids"}, status=400)
+        contacts = Contact.objects.filter(id__in=ids)
+    return Response({"flow": flow.id, "enrolled": email_flow_engine.enroll(flow, contacts)}, status=202)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def email_contacts(request):
-    tenant_ids = get_user_tenant_ids(request.user)
+    tenant_ids = request.tenant_ctx.tenant_ids
     if request.method == "POST":
         email_val = request.data.get("email") or ""
         return Response(
@@ -1144,7 +1371,8 @@ def email_contacts(request):
             status=201,
         )
 
-    contacts = Contact.objects.filter(tenant_id__in=tenant_ids)
+    paginator = KeysetPagination()
+    contacts = paginator.paginate_queryset(Contact.objects.filter(tenant_id__in=tenant_ids), request)
     data = [
         {
             "id": c.id,
@@ -1156,14 +1384,67 @@ def email_contacts(request):
         }
         for c in contacts
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
+
+
+def _contact_import(i):
+    return {
+        "id": i.id,
+        "tenant": i.tenant_id,
+        "format": i.format,
+        "status": i.status,
+        **{key: getattr(i, key) for key in contact_imports.COUNTERS},
+        "errors": i.errors,
+        "created_at": iso(i.created_at),
+        "finished_at": iso(i.finished_at),
+    }
+
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser, FormParser, JSONParser])
+def email_contact_imports(request):
+    """
+    POST: upload a CSV or NDJSON `file` of contacts for `tenant` (default:
+    the user's primary tenant), optionally with `format`. It is imported
+    in the background, a batch at a time.
+    GET: recent imports and their progress (`?id=` for one).
+    """
+    if request.method == "POST":
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"error": "file is required"}, status=400)
+        tenant_id = request.data.get("tenant") or request.tenant_ctx.primary_tenant_id
+        if tenant_id is None or not request.tenant_ctx.has_tenant(tenant_id):
+            return Response({"error": "Unknown tenant"}, status=404)
+        fmt = request.data.get("format") or contact_imports.detect_format(upload.name, upload.read(64))
+        if fmt not in dict(ContactImport.FORMAT_CHOICES):
+            return Response({"error": "format must be csv or ndjson"}, status=400)
+        upload.seek(0)
+        path = default_storage.save(f"contact-imports/{uuid.uuid4().hex}.{fmt}", upload)
+        contact_import = ContactImport.objects.create(tenant_id=int(tenant_id), file=path, format=fmt)
+        import_contacts_task.delay(contact_import.id)
+        contact_import.refresh_from_db()
+        return Response(_contact_import(contact_import), status=202)
+
+    imports = ContactImport.objects.filter(tenant_id__in=request.tenant_ctx.tenant_ids)
+    if request.query_params.get("id"):
+        contact_import = imports.filter(id=request.query_params["id"]).first()
+        if contact_import is None:
+            return Response({"error": "Unknown import"}, status=404)
+        return Response(_contact_import(contact_import))
+    return Response({"results": [_contact_import(i) for i in imports[:50]]})
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
 def email_sends(request):
-    tenant_ids = get_user_tenant_ids(request.user)
-    sends = EmailSend.objects.filter(tenant_id__in=tenant_ids)
+    tenant_ids = request.tenant_ctx.tenant_ids
+    paginator = KeysetPagination()
+    sends = paginator.paginate_queryset(
+        EmailSend.objects.filter(tenant_id__in=tenant_ids).select_related("recipient", "template"), request
+    )
     data = [
         {
             "id": s.id,
@@ -1177,19 +1458,97 @@ def email_sends(request):
         }
         for s in sends
     ]
-    return Response(data)
+    return paginator.get_paginated_response(data)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def email_campaigns(request):
+    """
+    Send template `template` to every subscribed contact of list `list`.
+    Sends are created and delivered in chunks by background tasks; poll
+    /api/email/sends/ for their status.
+    """
+    tenant_ids = request.tenant_ctx.tenant_ids
+    email_list = EmailList.objects.filter(tenant_id__in=tenant_ids, id=request.data.get("list")).first()
+    if email_list is None:
+        return Response({"error": "Unknown email list"}, status=404)
+    template = EmailTemplate.objects.filter(tenant_id=email_list.tenant_id, id=request.data.get("template")).first()
+    if template is None:
+        return Response({"error": "Unknown template for this list's tenant"}, status=404)
+    result = dispatch_campaign_task.delay(email_list.id, template.id)
+    return Response({"task_id": result.id, "list": email_list.id, "template": template.id}, status=202)
+
+
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def email_events(request):
+    """
+    Bounce and complaint webhook for SES (via SNS) and SendGrid. Requires
+    the `EMAIL_WEBHOOK_SECRET` token in `X-Webhook-Token` or `?token=`.
+    Events are stored, then applied in batches by a worker, so the response
+    only acknowledges receipt.
+    """
+    secret = getattr(settings, "EMAIL_WEBHOOK_SECRET", "")
+    token = request.headers.get("X-Webhook-Token") or request.query_params.get("token") or ""
+    if not secret or not hmac.compare_digest(token.encode(), secret.encode()):
+        return Response({"error": "Invalid webhook token"}, status=403)
+    try:
+        # SNS posts JSON as text/plain, so the body is parsed here rather than by DRF.
+        payload = json.loads(request.body or b"null")
+    except ValueError:
+        return Response({"error": "Body must be JSON"}, status=400)
+    events = delivery_events.parse_events(payload)
+    accepted = delivery_events.ingest(events)
+    return Response({"accepted": accepted}, status=202)
+
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated])
+@conditional_response
+def email_deliverability(request):
+    """
+    GET: the latest SPF/DKIM/DMARC/MX check of each sending domain.
+    POST: re-check the domains of `tenant` (default: all of the user's
+    tenants) in the background.
+    """
+    tenant_ids = request.tenant_ctx.tenant_ids
+    if request.method == "POST":
+        tenant_id = request.data.get("tenant")
+        if tenant_id is not None and not request.tenant_ctx.has_tenant(tenant_id):
+            return Response({"error": "Unknown tenant"}, status=404)
+        targets = [int(tenant_id)] if tenant_id is not None else tenant_ids
+        task_ids = [deliverability_check_task.delay(target).id for target in targets]
+        return Response({"task_ids": task_ids, "tenants": targets}, status=202)
+
+    checks = DomainCheck.objects.filter(tenant_id__in=tenant_ids)
+    data = [
+        {
+            "tenant": c.tenant_id,
+            "domain": c.domain,
+            "status": c.status,
+            "checked_at": iso(c.checked_at),
+            **c.results,
+        }
+        for c in checks
+    ]
+    return Response({"results": data, "count": len(data)})
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_response
+@cache_response
 def email_marketing_summary(request):
-    """Aggregate overview for email marketing."""
-    tenant_ids = get_user_tenant_ids(request.user)
+    """Aggregate overview for email marketing; send totals come from the daily rollups."""
+    tenant_ids = request.tenant_ctx.tenant_ids
     lists_count = EmailList.objects.filter(tenant_id__in=tenant_ids).count()
     contacts_count = Contact.objects.filter(tenant_id__in=tenant_ids).count()
     templates_count = EmailTemplate.objects.filter(tenant_id__in=tenant_ids).count()
     flows_count = EmailFlow.objects.filter(tenant_id__in=tenant_ids).count()
-    sends_count = EmailSend.objects.filter(tenant_id__in=tenant_ids).count()
+    totals = email_metrics.totals(EmailDailyStats.objects.filter(tenant_id__in=tenant_ids))
+    sends_count = sum(totals[column] for column in set(email_metrics.STATUS_COLUMNS.values()))
 
     return Response(
         {
@@ -1198,139 +1557,268 @@ def email_marketing_summary(request):
             "templates_count": templates_count,
             "flows_count": flows_count,
             "sends_count": sends_count,
+            "sends": totals,
         }
     )
 
 
-# Translation / LLM (stubbed) ----------------------------------------------
-@api_view(["POST"])
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@conditional_response
+@cache_response
+def email_metrics_trend(request):
+    """
+    Sends by outcome, bounce/complaint events and attributed revenue per day
+    over the last `days` (default 30, max 365), optionally for one `list` or
+    `template`. Read from the daily rollups, so the cost doesn't grow with
+    the number of sends.
+    """
+    try:
+        days = min(max(int(request.query_params.get("days", 30)), 1), 365)
+        list_id = int(request.query_params.get("list", 0))
+        template_id = int(request.query_params.get("template", 0))
+    except ValueError:
+        return Response({"error": "days, list and template must be integers"}, status=400)
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = EmailDailyStats.objects.filter(tenant_id__in=request.tenant_ctx.tenant_ids, day__gte=since)
+    if list_id:
+        rows = rows.filter(list_id=list_id)
+    if template_id:
+        rows = rows.filter(template_id=template_id)
+    daily = [
+        email_metrics.rates(row)
+        for row in rows.values("day").annotate(**email_metrics.sums()).order_by("day")
+    ]
+    return Response({"since": since, "totals": email_metrics.totals(rows), "daily": daily})
+
+
+# Export -------------------------------------------------------------------
+@api_view(["GET"])
 @permission_classes([IsAuthenticated])
-def translate_text(request):
+@renderer_classes([NDJSONRenderer, CSVRenderer])
+def export_resource(request, resource):
+    """Stream every row of `resource` for the user's tenants as NDJSON (default) or CSV."""
+    if resource not in EXPORTS:
+        raise NotFound(f"Unknown export '{resource}'. Choose one of: {', '.join(EXPORTS)}.")
+    return stream_export(
+        resource,
+        request.tenant_ctx.tenant_ids,
+        request.accepted_renderer.format,
+        asynchronous=isinstance(request._request, ASGIRequest),
+    )
+
+
+# Translation / LLM (stubbed) ----------------------------------------------
+@async_api_view(["POST"])
+async def translate_text(request):
     """
-    Stub translation endpoint. Accepts `text` and optional `target_lang`.
-    If `url` is provided, we respond with an error because external fetch is disabled.
+    Translate `text` (or the page at `url`) to optional `target_lang`
+    (from optional `source_lang`). Goes through the translation memory and
+    the LLM gateway when OpenAI is configured, otherwise returns a stub.
+    Counted against the LLM quota of optional `tenant` (default: the
+    user's primary tenant).
     """
+    tenant_id = request.data.get("tenant") or request.tenant_ctx.primary_tenant_id
+    if tenant_id is None or not request.tenant_ctx.has_tenant(tenant_id):
+        return JsonResponse({"error": "Invalid tenant or unauthorized"}, status=403)
     text = request.data.get("text", "")
     url = request.data.get("url")
     target_lang = request.data.get("target_lang", "en")
+    source_lang = request.data.get("source_lang", "auto")
+    for name, locale in (("target_lang", target_lang), ("source_lang", source_lang)):
+        if not translation_memory.valid_locale(locale):
+            return JsonResponse(
+                {"error": f"{name} must be a language code of at most {translation_memory.LOCALE_MAX_LENGTH} characters"},
+                status=400,
+            )
     fetched_from = None
 
     # Optional: fetch content from URL if provided
     if url and not text:
         try:
-            import requests
-
-            resp = requests.get(url, timeout=10)
+            async with httpx.AsyncClient(timeout=10, follow_redirects=True) as client:
+                resp = await client.get(url)
             resp.raise_for_status()
             text = resp.text[:5000]  # basic limit to avoid huge payloads
             fetched_from = url
-        except Exception as exc:
-            return Response({"error": f"Failed to fetch URL: {exc}"}, status=400)
+        except httpx.HTTPError as exc:
+            return JsonResponse({"error": f"Failed to fetch URL: {exc}"}, status=400)
 
     if not text:
-        return Response({"error": "text is required"}, status=400)
+        return JsonResponse({"error": "text is required"}, status=400)
 
-    # Try OpenAI if configured; otherwise stub
-    api_key = getattr(settings, "OPENAI_API_KEY", None)
-    if api_key:
-        try:
-            import openai
-
-            openai.api_key = api_key
-            prompt_text = text[:3500]  # keep prompt reasonable
-            completion = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                temperature=0.2,
-                messages=[
-                    {"role": "system", "content": f"You are a translation engine. Translate to {target_lang} preserving meaning and tone."},
-                    {"role": "user", "content": prompt_text},
-                ],
-            )
-            translated = completion["choices"][0]["message"]["content"].strip()
-            return Response(
-                {
-                    "source": "openai",
-                    "original": text,
-                    "translated": translated,
-                    "target_lang": target_lang,
-                    "fetched_from": fetched_from,
-                }
-            )
-        except Exception as exc:
-            # Fallback to stub if OpenAI fails
-            fallback = f"[{target_lang}] {text}"
-            return Response(
-                {
-                    "source": "stub",
-                    "original": text,
-                    "translated": fallback,
-                    "target_lang": target_lang,
-                    "fetched_from": fetched_from,
-                    "error": str(exc),
-                },
-                status=200,
-            )
+    plan = await Tenant.objects.filter(id=tenant_id).values_list("plan", flat=True).afirst()
+    try:
+        lease = quotas.acquire(int(tenant_id), plan, "translate")
+    except quotas.QuotaExceeded as exc:
+        return quotas.quota_response(exc)
+
+    # Segments already in the translation memory never reach the LLM.
+    try:
+        result = await translation_memory.translate(text[:3500], target_locale=target_lang, source_locale=source_lang)
+    except llm.LLMError as exc:
+        lease.release()
+        # No API key, or the LLM failed on an unseen segment: stub translation.
+        payload = {
+            "source": "stub",
+            "original": text,
+            "translated": f"[{target_lang}] {text}",
+            "target_lang": target_lang,
+            "fetched_from": fetched_from,
+        }
+        if llm.is_configured():
+            payload["error"] = str(exc)
+        return JsonResponse(payload)
+    except BaseException:
+        lease.release()
+        raise
+    lease.release(result["tokens"])
+
+    return JsonResponse(
+        {
+            "source": "openai" if result["misses"] else "memory",
+            "original": text,
+            "translated": result["translated"],
+            "target_lang": target_lang,
+            "fetched_from": fetched_from,
+            "memory": {key: result[key] for key in ("segments", "hits", "misses", "tokens")},
+        }
+    )
 
-    # No API key: stub translation
-    translated = f"[{target_lang}] {text}"
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def translation_memory_stats(request):
+    """
+    Translation memory hit rate and the LLM tokens/latency it has saved.
+    Staff only: the memory is shared by every tenant.
+    """
+    return Response(translation_memory.memory_stats())
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def llm_usage(request):
+    """
+    LLM requests, tokens and quota rejections per day and feature for the
+    user's tenants over the last `days` (default 30, max 365). Not cached:
+    usage is written in batches by icycon.quotas, which skips signals.
+    """
+    try:
+        days = min(max(int(request.query_params.get("days", 30)), 1), 365)
+    except ValueError:
+        return Response({"error": "days must be an integer"}, status=400)
+    since = timezone.now().date() - timedelta(days=days - 1)
+    rows = LLMUsage.objects.filter(tenant_id__in=request.tenant_ctx.tenant_ids, day__gte=since)
+    totals = {
+        row["feature"]: {key: row[key] for key in ("requests", "tokens", "rejected")}
+        for row in rows.values("feature").annotate(
+            requests=Sum("requests"), tokens=Sum("tokens"), rejected=Sum("rejected")
+        ).order_by("feature")
+    }
     return Response(
-        {"source": "stub", "original": text, "translated": translated, "target_lang": target_lang, "fetched_from": fetched_from}
+        {
+            "since": since,
+            "totals": totals,
+            "daily": list(
+                rows.order_by("-day", "tenant_id", "feature").values(
+                    "tenant_id", "day", "feature", "requests", "tokens", "rejected"
+                )
+            ),
+        }
     )
 
 
 # Geo ----------------------------------------------------------------------
+def _gazetteer_or_503():
+    try:
+        return geocoder.get_gazetteer(), None
+    except geocoder.GazetteerUnavailable as exc:
+        return None, Response({"error": str(exc)}, status=503)
+
+
+def _geocode(gazetteer, item):
+    """Forward-geocode an address dict/string, or reverse-geocode a lat/lng dict."""
+    if isinstance(item, str):
+        item = {"address": item}
+    if not isinstance(item, dict):
+        return {"error": "expected an address string or object"}
+    if item.get("lat") is not None and item.get("lng") is not None:
+        try:
+            lat, lng = float(item["lat"]), float(item["lng"])
+        except (TypeError, ValueError):
+            return {"error": "lat and lng must be numbers"}
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return {"error": "lat/lng out of range"}
+        if not len(gazetteer):
+            return {"error": "no match"}
+        row, distance = gazetteer.nearest(lat, lng)[0]
+        return {"source": "geonames", **gazetteer.place(row, distance)}
+
+    hints = {key: item.get(key) for key in ("address", "city", "state", "country")}
+    if any(value is not None and not isinstance(value, str) for value in hints.values()):
+        return {"error": "address, city, state and country must be strings"}
+    if not hints["address"]:
+        return {"error": "address is required"}
+    full = ", ".join([x for x in [hints["address"], hints["city"]] if x])
+    row = gazetteer.search(full, country=hints["country"], admin1=hints["state"])
+    if row is None:
+        return {"error": "no match", "query": full}
+    return {"source": "geonames", "query": full, **gazetteer.place(row)}
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def geo_lookup(request):
     """
-    Geocode an address. Uses OpenAI if configured, otherwise returns a stub.
+    Geocode an address against the offline GeoNames gazetteer.
     Accepts: address (string), optional city/state/country for hints.
     """
-    address = request.data.get("address", "")
-    city = request.data.get("city")
-    state = request.data.get("state")
-    country = request.data.get("country")
+    gazetteer, error = _gazetteer_or_503()
+    if error:
+        return error
+    result = _geocode(gazetteer, {key: request.data.get(key) for key in ("address", "city", "state", "country")})
+    if "error" in result:
+        return Response(result, status=400 if result["error"] != "no match" else 404)
+    return Response(result)
 
-    if not address:
-        return Response({"error": "address is required"}, status=400)
 
-    full = ", ".join([x for x in [address, city, state, country] if x])
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def geo_reverse(request):
+    """Nearest places to `lat`/`lng` (`k` of them, default 1, max 50)."""
+    gazetteer, error = _gazetteer_or_503()
+    if error:
+        return error
+    try:
+        lat, lng = float(request.query_params["lat"]), float(request.query_params["lng"])
+        k = min(max(int(request.query_params.get("k", 1)), 1), 50)
+    except (KeyError, ValueError):
+        return Response({"error": "lat and lng are required numbers"}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return Response({"error": "lat/lng out of range"}, status=400)
+    return Response({"results": [gazetteer.place(row, distance) for row, distance in gazetteer.nearest(lat, lng, k)]})
 
-    api_key = getattr(settings, "OPENAI_API_KEY", None)
-    if api_key:
-        try:
-            import openai
 
-            openai.api_key = api_key
-            prompt = (
-                "You are a geocoding assistant. Given an address, return a JSON object with "
-                "'lat' and 'lng' numeric fields. If uncertain, approximate.\n"
-                f"Address: {full}"
-            )
-            completion = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                temperature=0,
-                messages=[
-                    {"role": "system", "content": "Return only JSON with lat and lng keys."},
-                    {"role": "user", "content": prompt},
-                ],
-            )
-            content = completion["choices"][0]["message"]["content"].strip()
-            # Best effort parse
-            import json
-
-            coords = json.loads(content)
-            lat = coords.get("lat")
-            lng = coords.get("lng")
-            if lat is None or lng is None:
-                raise ValueError("lat/lng not found")
-            return Response({"source": "openai", "lat": lat, "lng": lng, "query": full})
-        except Exception as exc:
-            # Fall back to stub
-            pass
-
-    # Stubbed coords (0,0) when no API or failure
-    return Response({"source": "stub", "lat": 0.0, "lng": 0.0, "query": full})
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def geo_batch(request):
+    """
+    Geocode many items in one call: `{"items": [...]}` where each item is an
+    address string, an object like geo_lookup's body, or `{"lat", "lng"}`
+    for a reverse lookup. Results come back in order; misses carry `error`.
+    """
+    items = request.data.get("items")
+    if not isinstance(items, list):
+        return Response({"error": "items must be a list"}, status=400)
+    limit = settings.GEOCODER_BATCH_LIMIT
+    if len(items) > limit:
+        return Response({"error": f"at most {limit} items per request"}, status=400)
+    gazetteer, error = _gazetteer_or_503()
+    if error:
+        return error
+    results = [_geocode(gazetteer, item) for item in items]
+    return Response({"count": len(results), "matched": sum("error" not in r for r in results), "results": results})
 
 
 # AEO ----------------------------------------------------------------------
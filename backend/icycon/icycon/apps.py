@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class IcyconConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'icycon'
+
+    def ready(self):
+        """Import signal handlers when the app is ready."""
+        import icycon.signals  # noqa: F401
@@ -1,5 +1,9 @@
 """
 ASGI config for icycon project.
+
+The LLM-backed endpoints (chat, translate, geo lookup) are native async views;
+serve this application (e.g. gunicorn -k uvicorn.workers.UvicornWorker) so a
+slow completion only parks a coroutine instead of a whole worker.
 """
 
 import os
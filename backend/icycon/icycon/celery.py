@@ -0,0 +1,16 @@
+"""Celery app for background work (`email_engine.tasks` and friends).
+
+Configured from Django settings under the `CELERY_` prefix. Without a
+broker (`CELERY_BROKER_URL`, defaulting to `REDIS_URL`) tasks run inline,
+which keeps development and tests free of a worker process.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "icycon.settings")
+
+app = Celery("icycon")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
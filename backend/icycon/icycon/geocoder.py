@@ -0,0 +1,267 @@
+"""
+Offline geocoder over a GeoNames gazetteer.
+
+`Gazetteer` loads a GeoNames dump (`cities15000.zip`, `cities500.txt`,
+`allCountries.zip` etc., zipped or not) into parallel `array`s: one slot per
+place, no per-place objects. Forward lookups go through a dict from
+normalized name to row ids, sorted by population. Reverse lookups use a
+static KD-tree over unit-sphere coordinates. The tree is a single
+permutation array whose median splits are implicit in the index ranges, so
+distances are true great-circle distances, with no special case at the
+antimeridian or the poles.
+
+The gazetteer is loaded once per process on first use (`get_gazetteer`).
+`python manage.py fetch_gazetteer` downloads the files that `GEONAMES_PATH`
+and `GEONAMES_COUNTRIES` point at.
+"""
+
+import heapq
+import io
+import math
+import re
+import sys
+import threading
+import unicodedata
+import zipfile
+from array import array
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+EARTH_RADIUS_KM = 6371.0088
+LEAF_SIZE = 8
+
+# Country spellings GeoNames' countryInfo.txt doesn't carry.
+COUNTRY_ALIASES = {"uk": "GB", "usa": "US", "united states of america": "US", "england": "GB", "scotland": "GB", "wales": "GB"}
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+class GazetteerUnavailable(Exception):
+    """No gazetteer file at `GEONAMES_PATH`."""
+
+
+def normalize_name(value):
+    """Accent-, case- and punctuation-insensitive key ("Zürich" -> "zurich")."""
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", stripped.casefold()).strip()
+
+
+def _unit_vector(lat, lng):
+    phi, lam = math.radians(lat), math.radians(lng)
+    cos_phi = math.cos(phi)
+    return cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi)
+
+
+def _chord_to_km(chord_sq):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord_sq) / 2))
+
+
+def _open_text(path):
+    path = Path(path)
+    if path.suffix == ".zip":
+        archive = zipfile.ZipFile(path)
+        member = next(name for name in archive.namelist() if name.endswith(".txt") and "readme" not in name.lower())
+        return io.TextIOWrapper(archive.open(member), encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+class Gazetteer:
+    def __init__(self, rows, countries=None, alternate_names=False):
+        """Build from GeoNames rows (lists of the 19 tab-separated columns)."""
+        self.geonameid = array("q")
+        self.lat = array("d")
+        self.lng = array("d")
+        self.population = array("q")
+        self.name = []
+        self.country = []
+        self.admin1 = []
+        intern = sys.intern
+        by_name = {}
+
+        for row in rows:
+            index = len(self.name)
+            self.geonameid.append(int(row[0]))
+            self.name.append(row[1])
+            self.lat.append(float(row[4]))
+            self.lng.append(float(row[5]))
+            self.country.append(intern(row[8]))
+            self.admin1.append(intern(row[10]))
+            self.population.append(int(row[14] or 0))
+            names = {row[1], row[2]}
+            if alternate_names and row[3]:
+                names.update(row[3].split(","))
+            for name in names:
+                key = normalize_name(name)
+                if key:
+                    by_name.setdefault(key, []).append(index)
+
+        population = self.population
+        self._by_name = {
+            key: array("I", sorted(ids, key=population.__getitem__, reverse=True)) for key, ids in by_name.items()
+        }
+        self._countries = {}
+        for code, names in (countries or {}).items():
+            self._countries[code.lower()] = code
+            for name in names:
+                self._countries[normalize_name(name)] = code
+        self._countries.update(COUNTRY_ALIASES)
+        self._build_tree()
+
+    @classmethod
+    def load(cls, path, countries_path=None, alternate_names=False):
+        with _open_text(path) as handle:
+            rows = (line.rstrip("\n").split("\t") for line in handle if line.strip())
+            rows = (row for row in rows if len(row) >= 15)
+            countries = cls._load_countries(countries_path) if countries_path and Path(countries_path).exists() else None
+            return cls(rows, countries=countries, alternate_names=alternate_names)
+
+    @staticmethod
+    def _load_countries(path):
+        """`countryInfo.txt` -> {ISO code: [ISO3, country name]}."""
+        countries = {}
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                if line.startswith("#") or not line.strip():
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                countries[cols[0]] = [cols[1], cols[4]]
+        return countries
+
+    def __len__(self):
+        return len(self.name)
+
+    # Reverse ----------------------------------------------------------------
+    def _build_tree(self):
+        n = len(self.name)
+        self._xyz = [array("d", bytes(8 * n)) for _ in range(3)]
+        for i in range(n):
+            x, y, z = _unit_vector(self.lat[i], self.lng[i])
+            self._xyz[0][i], self._xyz[1][i], self._xyz[2][i] = x, y, z
+        order = list(range(n))
+        stack = [(0, n, 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                continue
+            coord = self._xyz[depth % 3]
+            order[lo:hi] = sorted(order[lo:hi], key=coord.__getitem__)
+            mid = (lo + hi) // 2
+            stack.append((lo, mid, depth + 1))
+            stack.append((mid + 1, hi, depth + 1))
+        self._tree = array("I", order)
+
+    def nearest(self, lat, lng, k=1):
+        """The `k` places closest to (lat, lng) as [(row, distance_km)], nearest first."""
+        target = _unit_vector(lat, lng)
+        tx, ty, tz = target
+        tree, xyz = self._tree, self._xyz
+        xs, ys, zs = xyz
+        best = []  # max-heap of (-chord², row)
+        worst = math.inf  # chord² of the k-th best so far
+
+        # (lo, hi, depth, per-axis squared offsets from the target to the
+        # range's cell); their sum is a lower bound on any chord² inside it.
+        stack = [(0, len(tree), 0, (0.0, 0.0, 0.0))]
+        while stack:
+            lo, hi, depth, offsets = stack.pop()
+            if offsets[0] + offsets[1] + offsets[2] >= worst:
+                continue
+            if hi - lo <= LEAF_SIZE:
+                mid = None
+                rows = tree[lo:hi]
+            else:
+                mid = (lo + hi) // 2
+                rows = (tree[mid],)
+            for row in rows:
+                d = (xs[row] - tx) ** 2 + (ys[row] - ty) ** 2 + (zs[row] - tz) ** 2
+                if d < worst:
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, row))
+                    else:
+                        heapq.heapreplace(best, (-d, row))
+                    if len(best) == k:
+                        worst = -best[0][0]
+            if mid is None:
+                continue
+            axis = depth % 3
+            diff = target[axis] - xyz[axis][tree[mid]]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            # Far side first so the near side is searched first; by the time the
+            # far side is popped the bound usually rules it out.
+            far_offsets = list(offsets)
+            far_offsets[axis] = diff * diff
+            stack.append((*far, depth + 1, tuple(far_offsets)))
+            stack.append((*near, depth + 1, offsets))
+        return [(row, _chord_to_km(-neg)) for neg, row in sorted(best, reverse=True)]
+
+    # Forward ----------------------------------------------------------------
+    def country_code(self, value):
+        return self._countries.get(normalize_name(value)) if value else None
+
+    def search(self, query, country=None, admin1=None):
+        """Best row for a free-form address, or None.
+
+        Comma-separated parts are tried left to right (street lines simply
+        don't match). A trailing part naming a country, or the `country` and
+        `admin1` hints, restrict the candidates. Ties go to the most populous
+        place.
+        """
+        parts = [part for part in (normalize_name(p) for p in query.split(",")) if part]
+        country = self.country_code(country) or (country.upper() if country and len(country) == 2 else None)
+        if country is None and len(parts) > 1 and parts[-1] in self._countries:
+            country = self._countries[parts.pop()]
+        admin1 = admin1.upper() if admin1 else None
+        for part in parts:
+            for row in self._by_name.get(part, ()):
+                if country and self.country[row] != country:
+                    continue
+                if admin1 and self.admin1[row].upper() != admin1:
+                    continue
+                return row
+        return None
+
+    def place(self, row, distance_km=None):
+        result = {
+            "geonameid": self.geonameid[row],
+            "name": self.name[row],
+            "country": self.country[row],
+            "admin1": self.admin1[row],
+            "lat": self.lat[row],
+            "lng": self.lng[row],
+            "population": self.population[row],
+        }
+        if distance_km is not None:
+            result["distance_km"] = round(distance_km, 3)
+        return result
+
+
+_gazetteer = None
+_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """The process-wide gazetteer, loaded on first call."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _lock:
+            if _gazetteer is None:
+                path = Path(settings.GEONAMES_PATH)
+                if not path.exists():
+                    raise GazetteerUnavailable(f"No gazetteer at {path}; run `manage.py fetch_gazetteer`.")
+                _gazetteer = Gazetteer.load(
+                    path,
+                    countries_path=getattr(settings, "GEONAMES_COUNTRIES", None),
+                    alternate_names=getattr(settings, "GEONAMES_ALTERNATE_NAMES", False),
+                )
+    return _gazetteer
+
+
+@receiver(setting_changed)
+def _reset_gazetteer(*, setting, **kwargs):
+    global _gazetteer
+    if setting.startswith("GEONAMES_"):
+        _gazetteer = None
@@ -0,0 +1,224 @@
+"""
+Async gateway to an OpenAI-compatible chat completions API.
+
+Shared by the chatbot, translation and geocoding endpoints. Per event loop
+(i.e. per ASGI worker) it keeps:
+
+* one pooled `httpx.AsyncClient`, so connections are reused, closed when
+  the loop shuts down (under WSGI, when each request's loop ends);
+* a semaphore capping in-flight upstream calls at `LLM_MAX_CONCURRENCY`;
+* a map of in-flight requests, so identical concurrent prompts share a
+  single upstream call instead of paying for it N times.
+
+Each attempt is bounded by `LLM_TIMEOUT`, the whole call (queueing and
+retries included) by `LLM_TOTAL_TIMEOUT`. Timeouts, transport errors, 429s
+and 5xx are retried up to `LLM_MAX_RETRIES` times with full-jitter
+exponential backoff. Anything that still fails raises `LLMError`.
+
+`stream_chat_completion` is the token-by-token variant. It shares the
+client and the concurrency cap, but it is never coalesced, and it only
+retries until the first token has arrived.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import weakref
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """The completion could not be produced."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def is_configured():
+    return bool(_setting("OPENAI_API_KEY", None))
+
+
+class _Retryable(Exception):
+    def __init__(self, response):
+        super().__init__(f"upstream returned {response.status_code}")
+        self.response = response
+
+
+class _LoopState:
+    def __init__(self):
+        concurrency = _setting("LLM_MAX_CONCURRENCY", 8)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.inflight = {}
+        self.client = httpx.AsyncClient(
+            base_url=_setting("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/") + "/",
+            headers={"Authorization": f"Bearer {_setting('OPENAI_API_KEY', '')}"},
+            timeout=httpx.Timeout(_setting("LLM_TIMEOUT", 30), connect=5),
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+
+_states = weakref.WeakKeyDictionary()
+
+
+async def _close_with_loop(client):
+    # Parked at its yield, this generator is finalized by the loop's
+    # shutdown_asyncgens(), which asyncio.run (and so async_to_sync) calls
+    # before closing the loop; the client's connections go with it.
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+async def _state():
+    loop = asyncio.get_running_loop()
+    state = _states.get(loop)
+    if state is None:
+        state = _states[loop] = _LoopState()
+        # The loop only holds its async generators weakly: the state keeps it alive.
+        state.closer = _close_with_loop(state.client)
+        await state.closer.__anext__()
+    return state
+
+
+def _backoff(attempt, response=None):
+    delay = random.uniform(0, min(_setting("LLM_BACKOFF_MAX", 8), _setting("LLM_BACKOFF_BASE", 0.5) * 2**attempt))
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+async def _post(state, payload):
+    attempts = _setting("LLM_MAX_RETRIES", 2) + 1
+    for attempt in range(attempts):
+        response = None
+        try:
+            async with state.semaphore:
+                response = await state.client.post("chat/completions", json=payload)
+            if response.status_code in RETRY_STATUSES:
+                raise _Retryable(response)
+            response.raise_for_status()
+            body = response.json()
+            return {
+                "content": body["choices"][0]["message"]["content"],
+                "total_tokens": (body.get("usage") or {}).get("total_tokens"),
+            }
+        except (httpx.TimeoutException, httpx.TransportError, _Retryable) as exc:
+            if attempt == attempts - 1:
+                raise LLMError(f"LLM request failed after {attempts} attempts: {exc}") from exc
+            logger.warning("LLM attempt %s failed (%s); retrying", attempt + 1, exc)
+            await asyncio.sleep(_backoff(attempt, getattr(exc, "response", response)))
+        except (httpx.HTTPStatusError, KeyError, IndexError, TypeError, ValueError) as exc:
+            raise LLMError(f"Unusable LLM response: {exc}") from exc
+
+
+async def chat_completion(messages, *, model, temperature=0.7, max_tokens=None, **params):
+    """Return `{"content", "total_tokens"}` for a chat completion request.
+
+    Identical concurrent requests (same model, messages and parameters) are
+    coalesced into one upstream call.
+    """
+    if not is_configured():
+        raise LLMError("OPENAI_API_KEY is not configured")
+
+    payload = {"model": model, "messages": messages, "temperature": temperature, **params}
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
+    key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    state = await _state()
+    task = state.inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(
+            asyncio.wait_for(_post(state, payload), _setting("LLM_TOTAL_TIMEOUT", 60))
+        )
+        state.inflight[key] = task
+        task.add_done_callback(lambda _: state.inflight.pop(key, None))
+    try:
+        # shield: one caller disconnecting must not cancel the others' call.
+        return await asyncio.shield(task)
+    except asyncio.TimeoutError as exc:
+        raise LLMError("LLM request timed out") from exc
+
+
+class ChatStream:
+    """Async iterator over the content deltas of a streamed completion.
+
+    `total_tokens` is filled in from the final usage chunk once iteration
+    finishes (None if the upstream doesn't report usage).
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.total_tokens = None
+
+    def __aiter__(self):
+        return self._deltas()
+
+    async def _deltas(self):
+        state = await _state()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + _setting("LLM_TOTAL_TIMEOUT", 60)
+        attempts = _setting("LLM_MAX_RETRIES", 2) + 1
+        for attempt in range(attempts):
+            started = False
+            try:
+                async with state.semaphore, state.client.stream("POST", "chat/completions", json=self.payload) as response:
+                    if response.status_code in RETRY_STATUSES:
+                        raise _Retryable(response)
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if loop.time() > deadline:
+                            raise LLMError("LLM stream timed out")
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        chunk = json.loads(data)
+                        if chunk.get("usage"):
+                            self.total_tokens = chunk["usage"].get("total_tokens")
+                        for choice in chunk.get("choices") or ():
+                            delta = (choice.get("delta") or {}).get("content")
+                            if delta:
+                                started = True
+                                yield delta
+                return
+            except (httpx.TimeoutException, httpx.TransportError, _Retryable) as exc:
+                # Once tokens have been relayed a retry would repeat them.
+                if started or attempt == attempts - 1 or loop.time() > deadline:
+                    raise LLMError(f"LLM stream failed: {exc}") from exc
+                logger.warning("LLM stream attempt %s failed (%s); retrying", attempt + 1, exc)
+                await asyncio.sleep(_backoff(attempt, getattr(exc, "response", None)))
+            except (httpx.HTTPStatusError, AttributeError, TypeError, ValueError) as exc:
+                raise LLMError(f"Unusable LLM stream: {exc}") from exc
+
+
+def stream_chat_completion(messages, *, model, temperature=0.7, max_tokens=None, **params):
+    """Start a streamed chat completion; iterate the result for text deltas."""
+    if not is_configured():
+        raise LLMError("OPENAI_API_KEY is not configured")
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+        **params,
+    }
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
+    return ChatStream(payload)
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+GEONAMES_DUMP = 'https://download.geonames.org/export/dump/'
+
+
+class Command(BaseCommand):
+    help = 'Download the GeoNames gazetteer and countryInfo.txt used by the offline geocoder.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Download even if the files already exist')
+
+    def handle(self, *args, **options):
+        targets = [Path(settings.GEONAMES_PATH)]
+        if settings.GEONAMES_COUNTRIES:
+            targets.append(Path(settings.GEONAMES_COUNTRIES))
+
+        for target in targets:
+            if target.exists() and not options['force']:
+                self.stdout.write(f'{target} already exists, skipping')
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            partial = target.with_name(target.name + '.part')
+            url = GEONAMES_DUMP + target.name
+            try:
+                with httpx.stream('GET', url, timeout=60, follow_redirects=True) as response:
+                    response.raise_for_status()
+                    with open(partial, 'wb') as handle:
+                        for chunk in response.iter_bytes():
+                            handle.write(chunk)
+            except httpx.HTTPError as exc:
+                partial.unlink(missing_ok=True)
+                raise CommandError(f'Failed to download {url}: {exc}')
+            partial.replace(target)
+            self.stdout.write(self.style.SUCCESS(f'Downloaded {url} -> {target}'))
@@ -0,0 +1,149 @@
+"""
+Keyset (cursor) pagination shared by `api_views` and the DRF viewsets.
+
+Pages are addressed by the sort key of the last row seen rather than by an
+offset, so fetching page N costs one indexed range scan whatever N is.
+Responses look like::
+
+    {"next": "<url with ?cursor=...>", "prev": null, "results": [...]}
+
+Clients pass `limit` (capped at `MAX_PAGE_SIZE`) and follow the opaque
+`next`/`prev` URLs.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+DEFAULT_ORDERING = ("-created_at", "-id")
+MAX_PAGE_SIZE = 500
+
+
+def _flip(ordering):
+    return tuple(key[1:] if key.startswith("-") else f"-{key}" for key in ordering)
+
+
+def _field_name(key):
+    return key.lstrip("-")
+
+
+def keyset_filter(ordering, values):
+    """Rows strictly after `values` in `ordering`, as a single Q object."""
+    condition = Q()
+    for i, key in enumerate(ordering):
+        lookup = "lt" if key.startswith("-") else "gt"
+        step = Q(**{f"{_field_name(key)}__{lookup}": values[i]})
+        for prev_key, prev_value in zip(ordering[:i], values[:i]):
+            step &= Q(**{_field_name(prev_key): prev_value})
+        condition |= step
+    # Redundant bound on the leading column lets the DB use a range scan.
+    lead = "lte" if ordering[0].startswith("-") else "gte"
+    return Q(**{f"{_field_name(ordering[0])}__{lead}": values[0]}) & condition
+
+
+def default_ordering_for(model):
+    try:
+        model._meta.get_field("created_at")
+    except FieldDoesNotExist:
+        return ("-id",)
+    return DEFAULT_ORDERING
+
+
+class KeysetPagination(BasePagination):
+    page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    max_page_size = MAX_PAGE_SIZE
+
+    def __init__(self, ordering=None):
+        self.ordering = tuple(ordering) if ordering else None
+        self.page_size = api_settings.PAGE_SIZE or 50
+
+    # Cursor encoding -----------------------------------------------------
+    def encode_cursor(self, row, reverse):
+        values = []
+        for key in self.ordering:
+            name = _field_name(key)
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        payload = json.dumps({"v": values, "r": reverse}, separators=(",", ":"))
+        token = base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            values = payload["v"]
+            if len(values) != len(self.ordering):
+                raise ValueError("cursor does not match ordering")
+            values = [
+                model._meta.get_field(_field_name(key)).to_python(value)
+                for key, value in zip(self.ordering, values)
+            ]
+            return values, bool(payload.get("r"))
+        except (binascii.Error, KeyError, TypeError, ValueError, ValidationError, FieldDoesNotExist):
+            raise ParseError("Invalid cursor")
+
+    # Pagination ----------------------------------------------------------
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.ordering is None:
+            self.ordering = getattr(view, "keyset_ordering", None) or default_ordering_for(queryset.model)
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.cursor_query_param)
+        limit = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = _flip(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(ordering, values))
+
+        rows = list(queryset[: limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if reverse:
+            rows.reverse()
+
+        self.next_url = self.prev_url = None
+        if rows:
+            if has_more or reverse:
+                self.next_url = self.encode_cursor(rows[-1], reverse=False)
+            if (values is not None and not reverse) or (reverse and has_more):
+                self.prev_url = self.encode_cursor(rows[0], reverse=True)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.next_url, "prev": self.prev_url, "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "prev": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,189 @@
+"""
+Per-tenant admission control and usage accounting for LLM-backed features.
+
+Every tenant has a token bucket sized by its plan (`LLM_PLAN_LIMITS`). It
+refills at `tokens_per_minute` up to `burst`, and is debited with the
+tokens each completion actually used. A tenant also has a cap on
+concurrent requests. A request is admitted while the bucket is positive
+and the tenant is under its cap; otherwise `QuotaExceeded` is raised
+straight away, before any database or LLM work, and the view answers 429
+with Retry-After. One tenant can therefore use at most its own share of
+the gateway's `LLM_MAX_CONCURRENCY`.
+
+Buckets live in process memory, so the limits apply per worker. Usage
+(requests, tokens, rejections per tenant/day/feature) is also counted in
+memory. It is flushed to `tenants.LLMUsage` by a background thread every
+`LLM_USAGE_FLUSH_SECONDS` (or sooner once many keys are pending), so
+accounting never adds a write to the request path.
+"""
+
+import atexit
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.http import JsonResponse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {"tokens_per_minute": 20000, "burst": 40000, "concurrency": 2}
+MAX_PENDING_KEYS = 500
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"LLM quota exceeded; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _limits(plan):
+    plans = getattr(settings, "LLM_PLAN_LIMITS", {})
+    return {**DEFAULT_LIMITS, **plans.get(plan, plans.get("free", {}))}
+
+
+class _Bucket:
+    __slots__ = ("level", "updated", "inflight")
+
+    def __init__(self, burst):
+        self.level = float(burst)
+        self.updated = time.monotonic()
+        self.inflight = 0
+
+
+_buckets = {}
+_lock = threading.Lock()
+
+
+class Lease:
+    """An admitted request; `release(tokens)` when the LLM work is done."""
+
+    def __init__(self, tenant_id, feature, bucket):
+        self.tenant_id = tenant_id
+        self.feature = feature
+        self._bucket = bucket
+        self._released = False
+
+    def release(self, tokens=0):
+        if self._released:
+            return
+        self._released = True
+        tokens = tokens or 0
+        with _lock:
+            self._bucket.inflight -= 1
+            self._bucket.level -= tokens
+        record(self.tenant_id, self.feature, tokens)
+
+
+def acquire(tenant_id, plan, feature):
+    """Admit one `feature` request for `tenant_id` or raise `QuotaExceeded`."""
+    limits = _limits(plan)
+    rate = limits["tokens_per_minute"] / 60
+    now = time.monotonic()
+    with _lock:
+        bucket = _buckets.get(tenant_id)
+        if bucket is None:
+            bucket = _buckets[tenant_id] = _Bucket(limits["burst"])
+        bucket.level = min(limits["burst"], bucket.level + (now - bucket.updated) * rate)
+        bucket.updated = now
+        if bucket.level <= 0 or bucket.inflight >= limits["concurrency"]:
+            retry_after = max(1, math.ceil(-bucket.level / rate)) if rate else 60
+            rejected = True
+        else:
+            bucket.inflight += 1
+            rejected = False
+    if rejected:
+        record(tenant_id, feature, 0, rejected=True)
+        raise QuotaExceeded(retry_after)
+    return Lease(tenant_id, feature, bucket)
+
+
+def quota_response(exc):
+    """The 429 a view returns for `QuotaExceeded`."""
+    response = JsonResponse(
+        {"error": "LLM quota exceeded for this workspace. Please retry later.", "retry_after": exc.retry_after},
+        status=429,
+    )
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+# Usage accounting -------------------------------------------------------------
+_pending = defaultdict(lambda: [0, 0, 0])  # (tenant_id, day, feature) -> [requests, tokens, rejected]
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+_flushing = threading.Lock()
+
+
+def record(tenant_id, feature, tokens, rejected=False):
+    """Count one request (or rejection) in memory; flushed in batches."""
+    global _last_flush
+    key = (tenant_id, timezone.now().date(), feature)
+    with _pending_lock:
+        counters = _pending[key]
+        if rejected:
+            counters[2] += 1
+        else:
+            counters[0] += 1
+            counters[1] += tokens
+        due = (
+            len(_pending) >= MAX_PENDING_KEYS
+            or time.monotonic() - _last_flush >= getattr(settings, "LLM_USAGE_FLUSH_SECONDS", 10)
+        )
+        if due:
+            _last_flush = time.monotonic()
+    if due and not _flushing.locked():
+        threading.Thread(target=_flush_in_thread, name="llm-usage-flush", daemon=True).start()
+
+
+def _flush_in_thread():
+    close_old_connections()
+    try:
+        flush()
+    finally:
+        connection.close()
+
+
+def flush():
+    """Write pending counters to `tenants.LLMUsage`; returns the rows touched."""
+    from tenants.models import LLMUsage
+
+    with _flushing:
+        with _pending_lock:
+            batch = dict(_pending)
+            _pending.clear()
+        try:
+            # All or nothing: a failed batch is retried whole, so none of it may stick.
+            with transaction.atomic():
+                for (tenant_id, day, feature), (requests, tokens, rejected) in batch.items():
+                    _upsert(LLMUsage, tenant_id, day, feature, requests, tokens, rejected)
+        except Exception:
+            logger.exception("Flushing LLM usage failed; %s counters kept for the next flush", len(batch))
+            with _pending_lock:
+                for key, counters in batch.items():
+                    pending = _pending[key]
+                    for i, value in enumerate(counters):
+                        pending[i] += value
+            return 0
+        return len(batch)
+
+
+def _upsert(model, tenant_id, day, feature, requests, tokens, rejected):
+    increments = {"requests": F("requests") + requests, "tokens": F("tokens") + tokens, "rejected": F("rejected") + rejected}
+    lookup = {"tenant_id": tenant_id, "day": day, "feature": feature}
+    if model.objects.filter(**lookup).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, requests=requests, tokens=tokens, rejected=rejected)
+    except IntegrityError:
+        # Another worker created the row first.
+        model.objects.filter(**lookup).update(**increments)
+
+
+atexit.register(flush)
@@ -0,0 +1,201 @@
+"""
+Tenant-scoped response cache for `api_views`.
+
+Entries are keyed by endpoint, the requesting user's tenant set, the current
+generation of each of those tenants and the request's host + query string.
+Writes never delete entries: `icycon.signals` bumps the generation of every
+tenant a saved/deleted row belongs to, which changes the key, so a stale entry
+can never be read again and simply ages out of the backend.
+
+The same generations double as HTTP validators: `conditional_response` turns
+them into an ETag/Last-Modified pair and answers `If-None-Match` /
+`If-Modified-Since` with a 304 before the view runs a single query.
+
+The backend is whatever `API_CACHE_ALIAS` names in `CACHES`. Generations must
+be seen by every worker, or a worker that missed a bump keeps serving old data
+and 304s, so both features are off unless `API_CACHE_ENABLED` is set, which
+defaults to on when `REDIS_URL` is. A system check refuses to start with them
+enabled on a per-process backend (local memory).
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+KEY_PREFIX = "api:resp:"
+GENERATION_PREFIX = "api:tenant-gen:"
+
+
+# Backends whose entries other worker processes can't see.
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def get_cache():
+    return caches[getattr(settings, "API_CACHE_ALIAS", "default")]
+
+
+def is_shared(cache):
+    """Whether every worker process sees the same entries in `cache`."""
+    return not isinstance(cache, PROCESS_LOCAL_BACKENDS)
+
+
+def enabled():
+    return getattr(settings, "API_CACHE_ENABLED", False)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs=None, **kwargs):
+    if enabled() and not is_shared(get_cache()):
+        return [
+            checks.Error(
+                "API_CACHE_ENABLED needs a cache shared by every worker, not per-process local memory.",
+                hint="Set REDIS_URL (or point API_CACHE_ALIAS at a shared cache), or set API_CACHE_ENABLED=False.",
+                id="icycon.E001",
+            )
+        ]
+    return []
+
+
+def _cache_timeout():
+    return getattr(settings, "API_CACHE_TIMEOUT", 60)
+
+
+def tenant_generations(tenant_ids):
+    """Current generation for each tenant, seeding missing ones from the clock."""
+    cache = get_cache()
+    keys = {GENERATION_PREFIX + str(tenant_id): tenant_id for tenant_id in tenant_ids}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump_tenant_generation(*tenant_ids):
+    """Invalidate every cached response that covers any of `tenant_ids`.
+
+    Generations are nanosecond timestamps of the last write, so they also
+    serve as Last-Modified. Concurrent bumps may race, but every one of them
+    moves the value away from what readers last saw, which is all that counts.
+    """
+    if not enabled():
+        return
+    cache = get_cache()
+    keys = [GENERATION_PREFIX + str(t) for t in {t for t in tenant_ids if t is not None}]
+    if not keys:
+        return
+    current = cache.get_many(keys)
+    now = time.time_ns()
+    cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, None)
+
+
+def _validator(name, request, vary_on_user, extra=()):
+    """(sha1 digest, newest generation) for this endpoint, tenant set and URL."""
+    tenant_ids = sorted(request.tenant_ctx.tenant_ids)
+    generations = tenant_generations(tenant_ids)
+    parts = [
+        name,
+        ",".join(map(str, tenant_ids)),
+        ",".join(map(str, generations)),
+        request.get_host(),
+        request.get_full_path(),
+        *extra,
+    ]
+    if vary_on_user:
+        parts.append(str(request.user.pk))
+    return hashlib.sha1("|".join(parts).encode()).hexdigest(), max(generations, default=None)
+
+
+def _cache_key(name, request, vary_on_user):
+    digest, _ = _validator(name, request, vary_on_user)
+    return f"{KEY_PREFIX}{name}:{digest}"
+
+
+def cached_for_tenants(request, name, build, vary_on_user=False):
+    """Return `build()`'s (picklable) result, cached for the request's tenant set."""
+    if not enabled():
+        return build()
+    cache = get_cache()
+    key = _cache_key(name, request, vary_on_user)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, _cache_timeout())
+    return data
+
+
+def cache_response(view_func=None, *, vary_on_user=False):
+    """Cache a GET api_view's `Response.data` per tenant set and query string.
+
+    Only 200 responses are stored; anything else passes through untouched.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or not enabled():
+                return func(request, *args, **kwargs)
+
+            cache = get_cache()
+            key = _cache_key(func.__name__, request, vary_on_user)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            response = func(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, _cache_timeout())
+            return response
+
+        return wrapper
+
+    return decorator(view_func) if view_func else decorator
+
+
+def conditional_response(view_func=None, *, vary_on_user=False):
+    """ETag/Last-Modified for a GET api_view, derived from tenant generations.
+
+    A matching `If-None-Match` (or a fresh `If-Modified-Since`) gets a 304
+    without calling the view. Last-Modified is only sent once it is at least
+    a second old, so a write later in the same second can't hide behind the
+    one-second resolution of HTTP dates.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or not enabled():
+                return func(request, *args, **kwargs)
+
+            # The rendered body differs per negotiated format (JSON vs browsable API).
+            digest, newest = _validator(func.__name__, request, vary_on_user, extra=[request.META.get("HTTP_ACCEPT", "")])
+            etag = quote_etag(digest)
+            last_modified = None
+            if newest is not None and newest // 10**9 < int(time.time()):
+                last_modified = newest // 10**9
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = func(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response["ETag"] = etag
+                if last_modified is not None:
+                    response["Last-Modified"] = http_date(last_modified)
+                # Let clients keep a copy but always revalidate it.
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ("Accept", "Authorization", "Cookie"))
+            return response
+
+        return wrapper
+
+    return decorator(view_func) if view_func else decorator
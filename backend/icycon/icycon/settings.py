@@ -49,12 +49,15 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     # WhiteNoise middleware serves static files in production without NGINX
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # (async-capable subclass, so ASGI requests stay on the event loop)
+    'icycon.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Resolves request.tenant_ctx (tenant IDs/roles) once per request, cached per user
+    'tenants.middleware.TenantContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,6 +81,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'icycon.wsgi.application'
+# Serve with an ASGI server (see render.yaml) so the async LLM views don't hold a worker.
+ASGI_APPLICATION = 'icycon.asgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -94,6 +99,27 @@ DATABASES = {
         }
     }
 
+# Cache: per-process local memory unless REDIS_URL is set, in which case all
+# workers share one Redis (needed for token revocation and the API response
+# cache to be consistent across processes; the response cache stays off
+# without it, see API_CACHE_ENABLED).
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'icycon',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'icycon',
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',},
@@ -157,12 +183,18 @@ if DEBUG:
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        # Signed bearer tokens issued by /api/auth/login and /api/auth/signup;
+        # verified without a DB hit. Basic auth stays for existing clients.
+        'users.authentication.StatelessTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',  # Fallback for admin
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Keyset pagination on (created_at, id): ?limit=N plus opaque next/prev cursors
+    'DEFAULT_PAGINATION_CLASS': 'icycon.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
 # JWT settings (sensible defaults; override via env if needed)
@@ -173,10 +205,83 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': False,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_REFRESH_SERIALIZER': 'users.auth_serializers.DenylistTokenRefreshSerializer',
 }
 
+# Seconds a bearer token's "user is active" lookup is cached (deactivating a
+# user with save() revokes their tokens immediately).
+AUTH_ACTIVE_CACHE_SECONDS = int(os.getenv('AUTH_ACTIVE_CACHE_SECONDS', 30))
+
+# Seconds a user's cached tenant membership map stays valid; TenantUser
+# changes invalidate it immediately via signals. Caching it needs a cache shared
+# by all workers, so it is off without Redis.
+TENANT_CONTEXT_CACHE_ENABLED = os.getenv('TENANT_CONTEXT_CACHE_ENABLED', str(bool(REDIS_URL))).lower() == 'true'
+TENANT_CONTEXT_CACHE_TIMEOUT = int(os.getenv('TENANT_CONTEXT_CACHE_TIMEOUT', 300))
+
+# Cached api_views responses and their ETags (see icycon.response_cache). Writes
+# to tenant data invalidate entries through signals; the timeout only bounds
+# memory. Needs a cache shared by all workers, so it is off without Redis.
+API_CACHE_ENABLED = os.getenv('API_CACHE_ENABLED', str(bool(REDIS_URL))).lower() == 'true'
+API_CACHE_ALIAS = os.getenv('API_CACHE_ALIAS', 'default')
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 300))
+
+# Rows fetched per database round trip by /api/export/<resource>/ streams.
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+
 # OpenAI settings
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+
+# LLM gateway (icycon.llm): per-worker concurrency cap, per-attempt and total
+# timeouts in seconds, and retries with jittered exponential backoff.
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 30))
+LLM_TOTAL_TIMEOUT = float(os.getenv('LLM_TOTAL_TIMEOUT', 60))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', 0.5))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', 8))
+# Per-tenant LLM admission (icycon.quotas), per worker: a token bucket that
+# refills at tokens_per_minute up to burst, and a cap on concurrent requests.
+# Over-quota requests get 429 + Retry-After. Usage is written to
+# tenants.LLMUsage every LLM_USAGE_FLUSH_SECONDS.
+LLM_PLAN_LIMITS = {
+    'free': {'tokens_per_minute': int(os.getenv('LLM_FREE_TOKENS_PER_MINUTE', 20000)), 'burst': 40000, 'concurrency': 2},
+    'pro': {'tokens_per_minute': 100000, 'burst': 200000, 'concurrency': 4},
+    'enterprise': {'tokens_per_minute': 400000, 'burst': 800000, 'concurrency': 8},
+}
+LLM_USAGE_FLUSH_SECONDS = float(os.getenv('LLM_USAGE_FLUSH_SECONDS', 10))
+
+# Chatbot prompt budget (chatbot.context): prompt tokens per turn by tenant
+# plan, and a rolling summary of all but the last CHATBOT_SUMMARY_KEEP
+# messages, refreshed every CHATBOT_SUMMARY_EVERY turns.
+CHATBOT_CONTEXT_BUDGET = int(os.getenv('CHATBOT_CONTEXT_BUDGET', 2000))
+CHATBOT_CONTEXT_BUDGETS = {'free': CHATBOT_CONTEXT_BUDGET, 'pro': 6000, 'enterprise': 12000}
+# Tokens of the newest message that always fit, even if the summary and
+# retrieved passages have to be cut for them.
+CHATBOT_MESSAGE_RESERVE = int(os.getenv('CHATBOT_MESSAGE_RESERVE', 256))
+CHATBOT_SUMMARY_EVERY = int(os.getenv('CHATBOT_SUMMARY_EVERY', 4))
+CHATBOT_SUMMARY_KEEP = int(os.getenv('CHATBOT_SUMMARY_KEEP', 4))
+CHATBOT_SUMMARY_MODEL = os.getenv('CHATBOT_SUMMARY_MODEL', 'gpt-3.5-turbo')
+CHATBOT_SUMMARY_MAX_TOKENS = int(os.getenv('CHATBOT_SUMMARY_MAX_TOKENS', 300))
+# Passages from the tenant's FAQs/content/products (chatbot.retrieval) added
+# to the system prompt; 0 disables retrieval.
+CHATBOT_RETRIEVAL_TOP_K = int(os.getenv('CHATBOT_RETRIEVAL_TOP_K', 4))
+# Without a shared cache (REDIS_URL) workers can't see each other's writes to
+# those sources, so each rebuilds a tenant's index once it is this old (seconds).
+CHATBOT_RETRIEVAL_MAX_AGE = int(os.getenv('CHATBOT_RETRIEVAL_MAX_AGE', 300))
+
+# Offline geocoder (icycon.geocoder): a GeoNames dump, zipped or not, plus the
+# optional countryInfo.txt for country-name hints. `manage.py fetch_gazetteer`
+# downloads both. Alternate names improve recall but cost a lot of memory.
+GEONAMES_PATH = os.getenv('GEONAMES_PATH', str(BASE_DIR / 'data' / 'cities15000.zip'))
+GEONAMES_COUNTRIES = os.getenv('GEONAMES_COUNTRIES', str(BASE_DIR / 'data' / 'countryInfo.txt'))
+GEONAMES_ALTERNATE_NAMES = os.getenv('GEONAMES_ALTERNATE_NAMES', 'False').lower() == 'true'
+GEOCODER_BATCH_LIMIT = int(os.getenv('GEOCODER_BATCH_LIMIT', 5000))
+
+# Celery (icycon/celery.py). With no broker, tasks run inline in the caller.
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL or '')
+CELERY_TASK_ALWAYS_EAGER = not CELERY_BROKER_URL
+CELERY_TASK_ACKS_LATE = True
 
 # Email settings
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
@@ -185,3 +290,73 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() == 'true'
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'no-reply@localhost')
+# Pooled SMTP sessions per worker (email_engine.services.smtp_pool): at most
+# EMAIL_SMTP_POOL_SIZE open, each closed after EMAIL_SMTP_MAX_MESSAGES, and
+# NOOP-checked before reuse once idle for EMAIL_SMTP_IDLE_CHECK seconds.
+EMAIL_SMTP_POOL_SIZE = int(os.getenv('EMAIL_SMTP_POOL_SIZE', 4))
+EMAIL_SMTP_MAX_MESSAGES = int(os.getenv('EMAIL_SMTP_MAX_MESSAGES', 100))
+EMAIL_SMTP_IDLE_CHECK = float(os.getenv('EMAIL_SMTP_IDLE_CHECK', 30))
+# Campaign sends (email_engine.services.campaigns): EmailSend rows per
+# bulk_create and per Celery chunk task.
+EMAIL_CAMPAIGN_CHUNK_SIZE = int(os.getenv('EMAIL_CAMPAIGN_CHUNK_SIZE', 500))
+# Send scheduler (email_engine.services.scheduler, `manage.py run_send_scheduler`):
+# token buckets per recipient domain and per tenant plan, in messages/minute,
+# holding EMAIL_SEND_BURST_SECONDS worth of tokens. Domain rates halve on 4xx
+# deferrals (not below EMAIL_DOMAIN_MIN_RATE) and climb back by
+# EMAIL_DOMAIN_RATE_STEP of their configured rate per clean chunk.
+EMAIL_SCHEDULER_INTERVAL = float(os.getenv('EMAIL_SCHEDULER_INTERVAL', 1))
+EMAIL_SCHEDULER_MAX_PER_TICK = int(os.getenv('EMAIL_SCHEDULER_MAX_PER_TICK', 5000))
+EMAIL_DOMAIN_SEND_RATE = float(os.getenv('EMAIL_DOMAIN_SEND_RATE', 600))
+EMAIL_DOMAIN_SEND_RATES = {}  # e.g. {'gmail.com': 3000}
+EMAIL_DOMAIN_MIN_RATE = float(os.getenv('EMAIL_DOMAIN_MIN_RATE', 10))
+EMAIL_DOMAIN_RATE_STEP = 0.1
+EMAIL_TENANT_SEND_RATES = {'free': 600, 'pro': 3000, 'enterprise': 12000}
+EMAIL_SEND_BURST_SECONDS = float(os.getenv('EMAIL_SEND_BURST_SECONDS', 5))
+EMAIL_SEND_MAX_ATTEMPTS = int(os.getenv('EMAIL_SEND_MAX_ATTEMPTS', 5))
+EMAIL_SEND_RETRY_SECONDS = float(os.getenv('EMAIL_SEND_RETRY_SECONDS', 60))
+# Sends "scheduled" for longer than this (a lost or crashed chunk task) are queued again.
+EMAIL_SEND_SCHEDULED_TIMEOUT = int(os.getenv('EMAIL_SEND_SCHEDULED_TIMEOUT', 900))
+# Suppression list (email_engine.services.suppression): per-tenant Bloom
+# filters sized for at least EMAIL_SUPPRESSION_MIN_CAPACITY addresses.
+EMAIL_SUPPRESSION_MIN_CAPACITY = int(os.getenv('EMAIL_SUPPRESSION_MIN_CAPACITY', 10000))
+EMAIL_SUPPRESSION_FALSE_POSITIVE_RATE = float(os.getenv('EMAIL_SUPPRESSION_FALSE_POSITIVE_RATE', 0.001))
+# Each sync re-reads rows created this long before the previous one (rows
+# committed out of id order); filters are rebuilt from the table this often.
+EMAIL_SUPPRESSION_SYNC_OVERLAP_SECONDS = int(os.getenv('EMAIL_SUPPRESSION_SYNC_OVERLAP_SECONDS', 300))
+EMAIL_SUPPRESSION_REBUILD_SECONDS = int(os.getenv('EMAIL_SUPPRESSION_REBUILD_SECONDS', 3600))
+# Email flows (email_engine.services.flows): run `manage.py run_flow_scheduler`.
+# Each tick advances up to EMAIL_FLOW_BATCH_SIZE due enrollments.
+EMAIL_FLOW_BATCH_SIZE = int(os.getenv('EMAIL_FLOW_BATCH_SIZE', 500))
+EMAIL_FLOW_MAX_STEPS_PER_TICK = int(os.getenv('EMAIL_FLOW_MAX_STEPS_PER_TICK', 20))
+EMAIL_FLOW_PAUSED_RECHECK_SECONDS = int(os.getenv('EMAIL_FLOW_PAUSED_RECHECK_SECONDS', 3600))
+EMAIL_FLOW_SCHEDULER_INTERVAL = float(os.getenv('EMAIL_FLOW_SCHEDULER_INTERVAL', 5))
+# Contact imports (email_engine.services.imports): uploads are streamed and
+# upserted EMAIL_IMPORT_BATCH_SIZE rows at a time.
+EMAIL_IMPORT_BATCH_SIZE = int(os.getenv('EMAIL_IMPORT_BATCH_SIZE', 2000))
+EMAIL_IMPORT_MAX_ERRORS = int(os.getenv('EMAIL_IMPORT_MAX_ERRORS', 100))
+# Bounce/complaint webhooks (email_engine.services.events): POST to
+# /api/email/events/ with X-Webhook-Token: EMAIL_WEBHOOK_SECRET (or ?token=).
+# Events are stored before the 202 and applied EMAIL_EVENT_BATCH_SIZE at a
+# time by a task per request, and by `manage.py apply_delivery_events` every
+# EMAIL_EVENT_FLUSH_SECONDS. A failing event is retried after
+# EMAIL_EVENT_RETRY_SECONDS (doubling), at most EMAIL_EVENT_MAX_ATTEMPTS times.
+EMAIL_WEBHOOK_SECRET = os.getenv('EMAIL_WEBHOOK_SECRET', '')
+EMAIL_EVENT_BATCH_SIZE = int(os.getenv('EMAIL_EVENT_BATCH_SIZE', 1000))
+EMAIL_EVENT_FLUSH_SECONDS = float(os.getenv('EMAIL_EVENT_FLUSH_SECONDS', 2))
+EMAIL_EVENT_RETRY_SECONDS = int(os.getenv('EMAIL_EVENT_RETRY_SECONDS', 60))
+EMAIL_EVENT_MAX_ATTEMPTS = int(os.getenv('EMAIL_EVENT_MAX_ATTEMPTS', 5))
+# Applied events are remembered this long (seconds) so provider redeliveries
+# of the same event id are dropped instead of counted again.
+EMAIL_EVENT_DEDUP_SECONDS = int(os.getenv('EMAIL_EVENT_DEDUP_SECONDS', 3 * 24 * 3600))
+# Deliverability checks (email_engine.services.deliverability). An empty
+# DNS_RESOLVER_NAMESERVERS uses the system resolver. Answers are cached for
+# their TTL, at most DNS_CACHE_MAX_TTL seconds.
+DNS_RESOLVER_NAMESERVERS = [ns.strip() for ns in os.getenv('DNS_RESOLVER_NAMESERVERS', '').split(',') if ns.strip()]
+DNS_RESOLVER_PORT = int(os.getenv('DNS_RESOLVER_PORT', 53))
+DNS_RESOLVER_TIMEOUT = float(os.getenv('DNS_RESOLVER_TIMEOUT', 3))
+DNS_RESOLVER_CONCURRENCY = int(os.getenv('DNS_RESOLVER_CONCURRENCY', 32))
+DNS_CACHE_MAX_TTL = int(os.getenv('DNS_CACHE_MAX_TTL', 3600))
+DNS_NEGATIVE_TTL = int(os.getenv('DNS_NEGATIVE_TTL', 300))
+EMAIL_DKIM_SELECTORS = [
+    s.strip() for s in os.getenv('EMAIL_DKIM_SELECTORS', 'default,google,selector1,selector2,s1,s2,k1').split(',') if s.strip()
+]
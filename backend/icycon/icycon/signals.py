@@ -0,0 +1,115 @@
+"""Invalidate cached API responses when tenant-scoped rows change."""
+from django.apps import apps
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+
+from .response_cache import bump_tenant_generation
+
+# Model -> attribute paths (``fk__attr``) leading to the owning tenant id(s).
+TENANT_PATHS = {
+    "analytics.Site": ("tenant_id",),
+    "analytics.ContentItem": ("tenant_id",),
+    "analytics.KeywordCluster": ("tenant_id",),
+    "analytics.FAQ": ("tenant_id",),
+    "analytics.PageView": ("site__tenant_id",),
+    "aso.App": ("tenant_id",),
+    "aso.AppKeyword": ("app__tenant_id",),
+    "aso.AppListing": ("app__tenant_id",),
+    "email_engine.EmailList": ("tenant_id",),
+    "email_engine.Contact": ("tenant_id",),
+    "email_engine.EmailTemplate": ("tenant_id",),
+    "email_engine.EmailFlow": ("tenant_id",),
+    "email_engine.FlowStep": ("flow__tenant_id",),
+    "email_engine.FlowEnrollment": ("tenant_id",),
+    "email_engine.EmailSend": ("tenant_id",),
+    "email_engine.DomainCheck": ("tenant_id",),
+    "marketplace.Product": ("tenant_id",),
+    "marketplace.Review": ("tenant_id",),
+    "marketplace.Order": ("buyer_tenant_id", "product__tenant_id"),
+    "marketplace.SavedProduct": ("product__tenant_id",),
+    "marketplace.Conversation": ("buyer_tenant_id", "seller_tenant_id"),
+    "marketplace.Message": ("conversation__buyer_tenant_id", "conversation__seller_tenant_id"),
+    "seo.Site": ("tenant_id",),
+    "seo.KeywordCluster": ("tenant_id",),
+    "seo.ContentItem": ("tenant_id",),
+    "seo.FAQ": ("tenant_id",),
+    "seo.Directory": ("tenant_id",),
+    "seo.Backlink": ("site__tenant_id",),
+    "social_media.SocialAccount": ("tenant_id",),
+    "social_media.Post": ("tenant_id",),
+    "social_media.Comment": ("post__tenant_id",),
+    "social_media.Engagement": ("post__tenant_id",),
+    "tenants.Tenant": ("id",),
+    "tenants.Integration": ("tenant_id",),
+}
+
+
+def _resolve(instance, path):
+    *hops, attr = path.split("__")
+    obj = instance
+    try:
+        for hop in hops:
+            obj = getattr(obj, hop)
+    except ObjectDoesNotExist:
+        # Parent already gone (cascade); its own signal covers the tenant.
+        return None
+    return getattr(obj, attr, None) if obj is not None else None
+
+
+def _bump_for(paths):
+    def handler(sender, instance, **kwargs):
+        bump_tenant_generation(*(_resolve(instance, path) for path in paths))
+
+    return handler
+
+
+def _bump_saver_tenants(sender, instance, **kwargs):
+    # Saved products are listed per user, under the user's own tenants.
+    bump_tenant_generation(*TenantUser.objects.filter(user_id=instance.user_id).values_list("tenant_id", flat=True))
+
+
+def _bump_participants(conversation):
+    bump_tenant_generation(*conversation.participants.values_list("id", flat=True))
+
+
+def _bump_social_conversation(sender, instance, **kwargs):
+    # pre_delete: the participant rows are gone by post_delete.
+    _bump_participants(instance)
+
+
+def _bump_social_message(sender, instance, **kwargs):
+    try:
+        _bump_participants(instance.conversation)
+    except ObjectDoesNotExist:
+        pass
+
+
+def _bump_social_participants(sender, instance, action, pk_set=None, **kwargs):
+    if action in ("post_add", "post_remove"):
+        bump_tenant_generation(*pk_set)
+    elif action == "pre_clear":
+        _bump_participants(instance)
+
+
+for label, paths in TENANT_PATHS.items():
+    model = apps.get_model(label)
+    handler = _bump_for(paths)
+    post_save.connect(handler, sender=model, weak=False, dispatch_uid=f"api-cache:save:{label}")
+    post_delete.connect(handler, sender=model, weak=False, dispatch_uid=f"api-cache:delete:{label}")
+
+TenantUser = apps.get_model("tenants.TenantUser")
+SavedProduct = apps.get_model("marketplace.SavedProduct")
+post_save.connect(_bump_saver_tenants, sender=SavedProduct, dispatch_uid="api-cache:save:marketplace.SavedProduct:user")
+post_delete.connect(_bump_saver_tenants, sender=SavedProduct, dispatch_uid="api-cache:delete:marketplace.SavedProduct:user")
+
+SocialConversation = apps.get_model("social_media.Conversation")
+SocialMessage = apps.get_model("social_media.Message")
+post_save.connect(_bump_social_conversation, sender=SocialConversation, dispatch_uid="api-cache:save:social_media.Conversation")
+pre_delete.connect(_bump_social_conversation, sender=SocialConversation, dispatch_uid="api-cache:delete:social_media.Conversation")
+post_save.connect(_bump_social_message, sender=SocialMessage, dispatch_uid="api-cache:save:social_media.Message")
+post_delete.connect(_bump_social_message, sender=SocialMessage, dispatch_uid="api-cache:delete:social_media.Message")
+m2m_changed.connect(
+    _bump_social_participants,
+    sender=SocialConversation.participants.through,
+    dispatch_uid="api-cache:m2m:social_media.Conversation.participants",
+)
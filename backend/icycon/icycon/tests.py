@@ -0,0 +1,561 @@
+import base64
+import csv
+import io
+import json
+import random
+import tempfile
+from itertools import count
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from icycon import geocoder, quotas, response_cache
+
+from analytics.models import ContentItem, PageView, Site
+from aso.models import App as ASOApp, AppKeyword, AppListing
+from email_engine.models import Contact, EmailFlow, EmailList, EmailSend, EmailTemplate, FlowStep
+from email_engine.services import flows as email_flows
+from marketplace.models import (
+    Conversation as MarketplaceConversation,
+    Message as MarketplaceMessage,
+    Order,
+    Product,
+    Review,
+    SavedProduct,
+)
+from seo.models import FAQ as SEOFAQ
+from seo.models import Backlink as SEOBacklink
+from seo.models import ContentItem as SEOContentItem
+from seo.models import Directory as SEODirectory
+from seo.models import KeywordCluster as SEOKeywordCluster
+from seo.models import Site as SEOSite
+from social_media.models import (
+    Comment,
+    Conversation as SocialConversation,
+    Engagement,
+    Message as SocialMessage,
+    Post,
+    SocialAccount,
+)
+from tenants.models import Integration, LLMUsage, Tenant, TenantUser
+
+LIST_ROUTES = [
+    "aso-apps",
+    "aso-keywords",
+    "aso-listings",
+    "marketplace-products",
+    "marketplace-reviews",
+    "marketplace-orders",
+    "marketplace-saved",
+    "marketplace-conversations",
+    "marketplace-messages",
+    "analytics-sites",
+    "analytics-pageviews",
+    "multilingual-summary",
+    "tenants-summary",
+    "tenant-integrations",
+    "seo-sites",
+    "seo-keywords",
+    "seo-content",
+    "seo-faqs",
+    "seo-backlinks",
+    "seo-directories",
+    "social-accounts",
+    "social-posts",
+    "social-conversations",
+    "social-comments",
+    "social-engagement",
+    "social-messages",
+    "email-lists",
+    "email-templates",
+    "email-flows",
+    "email-contacts",
+    "email-sends",
+    "email-marketing-summary",
+    "dashboard",
+]
+
+
+@override_settings(EMAIL_HOST="")
+class ApiQueryCountTests(TestCase):
+    """Seeds N rows per model and fails if any route's query count grows with N."""
+
+    SMALL, LARGE = 2, 8
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(username="owner", email="owner@example.com", password="pw")
+        cls.other_user = User.objects.create_user(username="buyer", email="buyer@example.com", password="pw")
+        cls.tenant = Tenant.objects.create(name="Seller", region="US")
+        cls.other_tenant = Tenant.objects.create(name="Buyer", region="EU")
+        TenantUser.objects.create(user=cls.user, tenant=cls.tenant, role="owner")
+        cls.seq = count()
+
+    def setUp(self):
+        cache.clear()
+
+    def seed(self, n):
+        tenant, other, user = self.tenant, self.other_tenant, self.user
+        for _ in range(n):
+            i = next(self.seq)
+            app = ASOApp.objects.create(
+                tenant=tenant, name=f"App {i}", bundle_id=f"com.example.app{i}", platform="ios",
+                developer_name="Dev", description="An app",
+            )
+            AppKeyword.objects.create(app=app, keyword=f"kw{i}")
+            AppListing.objects.create(app=app, title=f"Listing {i}", description="Listing", keywords_string="a,b")
+
+            product = Product.objects.create(
+                tenant=tenant, created_by=user, title=f"Product {i}", description="A product", category="software",
+                price=10,
+            )
+            Review.objects.create(product=product, reviewer=self.other_user, tenant=tenant, rating=5, title="Good", comment="ok")
+            Order.objects.create(
+                order_number=f"ORD-{i}", product=product, buyer_tenant=other, buyer_user=self.other_user,
+                unit_price=10, total_price=10, customer_email="buyer@example.com",
+            )
+            SavedProduct.objects.create(user=user, product=product)
+            conversation = MarketplaceConversation.objects.create(product=product, buyer_tenant=other, seller_tenant=tenant)
+            MarketplaceMessage.objects.create(conversation=conversation, sender=self.other_user, content="Hi")
+
+            site = Site.objects.create(tenant=tenant, domain=f"https://a{i}.example.com")
+            PageView.objects.create(site=site, url=f"https://a{i}.example.com/", visitor_id=f"v{i}")
+
+            seo_site = SEOSite.objects.create(tenant=tenant, domain=f"https://s{i}.example.com")
+            SEOBacklink.objects.create(site=seo_site, source_url=f"https://ref{i}.example.org", target_url=seo_site.domain)
+            SEOKeywordCluster.objects.create(tenant=tenant, intent=f"intent {i}", terms=[f"term{i}"])
+            SEOContentItem.objects.create(tenant=tenant, type="blog", url=f"https://s{i}.example.com/post")
+            SEOFAQ.objects.create(tenant=tenant, question=f"Q{i}?", answer="A")
+            SEODirectory.objects.create(tenant=tenant, name=f"Dir {i}", url=f"https://dir{i}.example.com")
+            Integration.objects.create(tenant=tenant, type="custom")
+
+            SocialAccount.objects.create(tenant=tenant, platform="x", handle=f"handle{i}")
+            post = Post.objects.create(tenant=tenant, author=user, title=f"Post {i}", content="Content", platforms=["x"])
+            Comment.objects.create(post=post, author=self.other_user, content="Nice")
+            Engagement.objects.create(post=post, platform="x", likes=i)
+            social_conversation = SocialConversation.objects.create(subject=f"Thread {i}")
+            social_conversation.participants.add(tenant, other)
+            SocialMessage.objects.create(conversation=social_conversation, sender=other, author=self.other_user, content="Hey")
+
+            email_list = EmailList.objects.create(tenant=tenant, name=f"List {i}", lawful_basis="consent")
+            contact = Contact.objects.create(tenant=tenant, email=f"c{i}@example.com", name=f"Contact {i}")
+            template = EmailTemplate.objects.create(tenant=tenant, name=f"Template {i}", subject="Hi", body_html="<p>Hi</p>")
+            EmailFlow.objects.create(tenant=tenant, name=f"Flow {i}", template=template)
+            EmailSend.objects.create(email_list=email_list, template=template, recipient=contact, tenant=tenant)
+
+    def count_queries(self, url):
+        # Measure cold: a cached response would hide per-row queries.
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, f"{url}: {response.content[:200]}")
+        return len(ctx.captured_queries), response
+
+    def test_list_routes_do_not_scale_with_rows(self):
+        self.client.force_login(self.user)
+        self.seed(self.SMALL)
+        small = {name: self.count_queries(reverse(name))[0] for name in LIST_ROUTES}
+
+        self.seed(self.LARGE - self.SMALL)
+        for name in LIST_ROUTES:
+            with self.subTest(route=name):
+                queries, _ = self.count_queries(reverse(name))
+                self.assertEqual(queries, small[name], f"{name} ran {small[name]} queries for {self.SMALL} rows, {queries} for {self.LARGE}")
+
+    def test_list_routes_return_seeded_rows(self):
+        self.client.force_login(self.user)
+        self.seed(self.SMALL)
+        _, response = self.count_queries(reverse("marketplace-conversations"))
+        rows = response.json()["results"]
+        self.assertEqual(len(rows), self.SMALL)
+        self.assertEqual(rows[0]["message_count"], 1)
+        _, response = self.count_queries(reverse("social-conversations"))
+        self.assertEqual([row["unread"] for row in response.json()["results"]], [1] * self.SMALL)
+
+
+@override_settings(EMAIL_HOST="", API_CACHE_ENABLED=True)
+class ApiResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="owner", email="owner@example.com", password="pw")
+        cls.tenant = Tenant.objects.create(name="Seller", region="US")
+        TenantUser.objects.create(user=cls.user, tenant=cls.tenant, role="owner")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_repeat_reads_are_served_from_cache(self):
+        url = reverse("email-marketing-summary")
+        first = self.client.get(url).json()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.json(), first)
+        tables = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertNotIn("email_engine_contact", tables)
+
+    def test_writes_invalidate_the_tenant_entries(self):
+        url = reverse("email-marketing-summary")
+        # The welcome-email signal may already have created a contact.
+        before = self.client.get(url).json()["contacts_count"]
+        contact = Contact.objects.create(tenant=self.tenant, email="new@example.com")
+        self.assertEqual(self.client.get(url).json()["contacts_count"], before + 1)
+        contact.delete()
+        self.assertEqual(self.client.get(url).json()["contacts_count"], before)
+
+    def test_flow_steps_and_enrollments_invalidate_the_flow_detail(self):
+        flow = EmailFlow.objects.create(tenant=self.tenant, name="Welcome")
+        url = reverse("email-flow-detail", args=[flow.id])
+        self.assertEqual(self.client.get(url).json()["steps"], [])
+        FlowStep.objects.create(flow=flow, position=0, kind="wait", wait_seconds=60)
+        self.assertEqual([step["kind"] for step in self.client.get(url).json()["steps"]], ["wait"])
+
+        contact = Contact.objects.create(tenant=self.tenant, email="new@example.com")
+        self.assertEqual(self.client.get(url).json()["enrollments"]["active"], 0)
+        self.assertEqual(email_flows.enroll(flow, Contact.objects.filter(id=contact.id)), 1)
+        self.assertEqual(self.client.get(url).json()["enrollments"]["active"], 1)
+
+    def test_entries_are_not_shared_between_tenant_sets(self):
+        url = reverse("multilingual-summary")
+        self.client.get(url)
+        other = get_user_model().objects.create_user(username="other", email="other@example.com", password="pw")
+        other_tenant = Tenant.objects.create(name="Other", region="EU")
+        TenantUser.objects.create(user=other, tenant=other_tenant, role="owner")
+        ContentItem.objects.create(tenant=other_tenant, type="blog", url="https://other.example.com")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).json()["content_count"], 1)
+
+    def test_needs_a_cache_shared_between_workers(self):
+        self.assertEqual([error.id for error in response_cache.check_shared_cache()], ["icycon.E001"])
+        with override_settings(API_CACHE_ENABLED=False):
+            self.assertEqual(response_cache.check_shared_cache(), [])
+            # Off: every read is fresh, and no ETag is offered.
+            url = reverse("email-marketing-summary")
+            before = self.client.get(url).json()["contacts_count"]
+            Contact.objects.bulk_create([Contact(tenant=self.tenant, email="bulk@example.com")])  # no signal
+            response = self.client.get(url)
+            self.assertEqual(response.json()["contacts_count"], before + 1)
+            self.assertNotIn("ETag", self.client.get(reverse("seo-faqs")))
+
+
+@override_settings(EMAIL_HOST="", EXPORT_CHUNK_SIZE=3)
+class ExportStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="owner", email="owner@example.com", password="pw")
+        cls.tenant = Tenant.objects.create(name="Seller", region="US")
+        other = Tenant.objects.create(name="Other", region="EU")
+        TenantUser.objects.create(user=cls.user, tenant=cls.tenant, role="owner")
+        Contact.objects.bulk_create(
+            [Contact(tenant=cls.tenant, email=f"c{i}@example.com", name=f"Contact {i}") for i in range(7)]
+            + [Contact(tenant=other, email="hidden@example.com")]
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def export(self, query):
+        response = self.client.get(reverse("export-resource", args=["contacts"]) + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_ndjson_is_the_default(self):
+        response, body = self.export("")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.splitlines()]
+        emails = {row["email"] for row in rows}
+        self.assertIn("c6@example.com", emails)
+        self.assertNotIn("hidden@example.com", emails)
+        self.assertEqual(set(rows[0]), {"id", "email", "name", "subscribed", "subscribed_at", "unsubscribed_at"})
+
+    def test_csv_has_header_and_every_row(self):
+        response, body = self.export("?format=csv")
+        self.assertTrue(response["Content-Type"].startswith("text/csv"))
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0][:2], ["id", "email"])
+        # Includes the contact the signup signal adds to the personal workspace.
+        self.assertEqual(len(rows) - 1, Contact.objects.filter(tenant__tenantuser__user=self.user).count())
+
+    def test_unknown_resource_is_404(self):
+        response = self.client.get(reverse("export-resource", args=["passwords"]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_asgi_streams_keyset_chunks_from_an_async_iterator(self):
+        response = await self.async_client.get(reverse("export-resource", args=["contacts"]) + "?format=csv")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+        self.assertEqual(rows[0][:2], ["id", "email"])
+        expected = await Contact.objects.filter(tenant__tenantuser__user=self.user).acount()
+        self.assertEqual(len(rows) - 1, expected)
+        self.assertEqual([int(row[0]) for row in rows[1:]], sorted(int(row[0]) for row in rows[1:]))
+        # The header, then one chunk per page of EXPORT_CHUNK_SIZE rows.
+        self.assertEqual(len(chunks), 1 + -(-expected // 3))
+
+
+@override_settings(EMAIL_HOST="", API_CACHE_ENABLED=True)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="owner", email="owner@example.com", password="pw")
+        cls.tenant = Tenant.objects.create(name="Seller", region="US")
+        TenantUser.objects.create(user=cls.user, tenant=cls.tenant, role="owner")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_matching_etag_gets_304_without_querying_data(self):
+        url = reverse("seo-faqs")
+        etag = self.client.get(url)["ETag"]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertFalse(any("seo_faq" in q["sql"] for q in ctx.captured_queries))
+
+    def test_write_changes_the_etag(self):
+        url = reverse("seo-faqs")
+        etag = self.client.get(url)["ETag"]
+        SEOFAQ.objects.create(tenant=self.tenant, question="New?", answer="Yes")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()["results"]), 1)
+
+    def test_query_string_is_part_of_the_validator(self):
+        url = reverse("seo-faqs")
+        self.assertNotEqual(self.client.get(url)["ETag"], self.client.get(url + "?limit=1")["ETag"])
+
+
+@override_settings(
+    EMAIL_HOST="",
+    LLM_PLAN_LIMITS={"free": {"tokens_per_minute": 600, "burst": 1000, "concurrency": 2}},
+    LLM_USAGE_FLUSH_SECONDS=3600,
+)
+class LLMQuotaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="owner", email="owner@example.com", password="pw")
+        cls.tenant = Tenant.objects.create(name="Seller", region="US")
+        TenantUser.objects.create(user=cls.user, tenant=cls.tenant, role="owner")
+
+    def setUp(self):
+        quotas._buckets.clear()
+        quotas._pending.clear()
+        self.addCleanup(quotas._pending.clear)
+
+    def test_spent_bucket_refuses_with_retry_after(self):
+        quotas.acquire(self.tenant.id, "free", "chatbot").release(1500)
+        with self.assertRaises(quotas.QuotaExceeded) as ctx:
+            quotas.acquire(self.tenant.id, "free", "chatbot")
+        # 500 tokens in debt at 10 tokens/s.
+        self.assertGreaterEqual(ctx.exception.retry_after, 49)
+
+    def test_concurrency_cap_is_per_tenant(self):
+        leases = [quotas.acquire(self.tenant.id, "free", "chatbot") for _ in range(2)]
+        with self.assertRaises(quotas.QuotaExceeded):
+            quotas.acquire(self.tenant.id, "free", "chatbot")
+        quotas.acquire(self.tenant.id + 1, "free", "chatbot").release()
+        leases[0].release(10)
+        quotas.acquire(self.tenant.id, "free", "chatbot").release()
+
+    def test_flush_accumulates_usage_rows(self):
+        for tokens in (100, 50):
+            quotas.acquire(self.tenant.id, "free", "translate").release(tokens)
+        self.assertEqual(quotas.flush(), 1)
+        quotas.acquire(self.tenant.id, "free", "translate").release(25)
+        quotas.record(self.tenant.id, "translate", 0, rejected=True)
+        quotas.flush()
+        usage = LLMUsage.objects.get(tenant=self.tenant, feature="translate")
+        self.assertEqual((usage.requests, usage.tokens, usage.rejected), (3, 175, 1))
+
+        self.client.force_login(self.user)
+        body = self.client.get(reverse("llm-usage")).json()
+        self.assertEqual(body["totals"]["translate"], {"requests": 3, "tokens": 175, "rejected": 1})
+        self.assertEqual(len(body["daily"]), 1)
+
+    def test_failed_flush_writes_nothing_and_retries_everything(self):
+        quotas.acquire(self.tenant.id, "free", "translate").release(100)
+        quotas.acquire(self.tenant.id, "free", "chatbot").release(50)
+        upsert, calls = quotas._upsert, []
+
+        def flaky(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise DatabaseError("connection lost")
+            return upsert(*args)
+
+        quotas._upsert = flaky
+        self.addCleanup(setattr, quotas, "_upsert", upsert)
+        with self.assertLogs("icycon.quotas", "ERROR"):
+            self.assertEqual(quotas.flush(), 0)
+        self.assertFalse(LLMUsage.objects.exists())
+
+        self.assertEqual(quotas.flush(), 2)
+        self.assertEqual(
+            dict(LLMUsage.objects.values_list("feature", "tokens")), {"translate": 100, "chatbot": 50}
+        )
+
+
+def _geonames_row(geonameid, name, lat, lng, country, admin1="", population=0, alternate=""):
+    return [str(geonameid), name, name, alternate, str(lat), str(lng), "P", "PPL", country, "", admin1, "", "", "",
+            str(population), "", "", "", ""]
+
+
+GEONAMES_ROWS = [
+    _geonames_row(1, "Springfield", 39.8017, -89.6437, "US", "IL", 114394),
+    _geonames_row(2, "Springfield", 37.2153, -93.2982, "US", "MO", 169176),
+    _geonames_row(3, "Zürich", 47.3667, 8.55, "CH", "25", 341730),
+    _geonames_row(4, "Suva", -18.1416, 178.4415, "FJ", "C", 77366),
+    _geonames_row(5, "Apia", -13.8333, -171.7667, "WS", "11", 40407),
+    _geonames_row(6, "Paris", 48.8534, 2.3488, "FR", "11", 2138551),
+]
+
+
+class GeocoderTests(TestCase):
+    def test_nearest_matches_a_brute_force_scan(self):
+        rng = random.Random(7)
+        rows = [
+            _geonames_row(i, f"p{i}", rng.uniform(-90, 90), rng.uniform(-180, 180), "XX") for i in range(500)
+        ]
+        gazetteer = geocoder.Gazetteer(rows)
+        for _ in range(50):
+            lat, lng = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            expected = sorted(
+                range(len(gazetteer)),
+                key=lambda row: geocoder._chord_to_km(
+                    sum((a - b) ** 2 for a, b in zip(
+                        geocoder._unit_vector(lat, lng),
+                        geocoder._unit_vector(gazetteer.lat[row], gazetteer.lng[row]),
+                    ))
+                ),
+            )[:5]
+            self.assertEqual([row for row, _ in gazetteer.nearest(lat, lng, k=5)], expected)
+
+    def test_nearest_wraps_the_antimeridian(self):
+        gazetteer = geocoder.Gazetteer(GEONAMES_ROWS)
+        (row, distance), = gazetteer.nearest(-17.0, -179.9)
+        self.assertEqual(gazetteer.name[row], "Suva")
+        self.assertLess(distance, 250)
+
+    def test_search_uses_hints_and_population(self):
+        gazetteer = geocoder.Gazetteer(GEONAMES_ROWS, countries={"CH": ["CHE", "Switzerland"]})
+        self.assertEqual(gazetteer.admin1[gazetteer.search("Springfield")], "MO")
+        self.assertEqual(gazetteer.admin1[gazetteer.search("Springfield", admin1="il")], "IL")
+        self.assertEqual(gazetteer.name[gazetteer.search("1 Main St, zurich, Switzerland")], "Zürich")
+        self.assertIsNone(gazetteer.search("Paris, Switzerland"))
+        self.assertIsNone(gazetteer.search("Springfield", country="FR"))
+
+
+class GeoEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="ann", password="pw")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / "cities.txt"
+        path.write_text("".join("\t".join(row) + "\n" for row in GEONAMES_ROWS), encoding="utf-8")
+        settings = override_settings(GEONAMES_PATH=str(path), GEONAMES_COUNTRIES=str(path.with_name("none.txt")))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(self.user)
+
+    def post(self, name, payload):
+        return self.client.post(reverse(name), payload, content_type="application/json")
+
+    def test_lookup(self):
+        response = self.post("geo-lookup", {"address": "Springfield", "state": "IL"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["geonameid"], 1)
+        self.assertEqual(self.post("geo-lookup", {"address": "Atlantis"}).status_code, 404)
+        self.assertEqual(self.post("geo-lookup", {"address": ["Paris"]}).status_code, 400)
+
+    def test_reverse(self):
+        response = self.client.get(reverse("geo-reverse"), {"lat": 48.85, "lng": 2.35, "k": 2})
+        self.assertEqual([place["name"] for place in response.json()["results"]], ["Paris", "Zürich"])
+        self.assertEqual(self.client.get(reverse("geo-reverse"), {"lat": 91, "lng": 0}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("geo-reverse"), {"lat": "x"}).status_code, 400)
+
+    def test_batch_reports_errors_per_item(self):
+        response = self.post(
+            "geo-batch",
+            {"items": ["Paris", {"lat": -13.8, "lng": -171.7}, {"address": "Paris", "city": 5}, 42, "Atlantis"]},
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["count"], body["matched"]), (5, 2))
+        self.assertEqual(body["results"][1]["name"], "Apia")
+        self.assertEqual(
+            [result.get("error") for result in body["results"][2:]],
+            ["address, city, state and country must be strings", "expected an address string or object", "no match"],
+        )
+
+    def test_missing_gazetteer_is_503(self):
+        with override_settings(GEONAMES_PATH="/nonexistent/cities.txt"):
+            self.assertEqual(self.post("geo-lookup", {"address": "Paris"}).status_code, 503)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="ann", password="pw")
+        tenant = Tenant.objects.create(name="Seller", region="US")
+        TenantUser.objects.create(user=cls.user, tenant=tenant, role="owner")
+        cls.faqs = [SEOFAQ.objects.create(tenant=tenant, question=f"Q{i}?", answer="A") for i in range(5)]
+        # Same sort key everywhere: only the id tie-breaker orders them.
+        SEOFAQ.objects.update(created_at=cls.faqs[0].created_at)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        return [faq["id"] for faq in body["results"]], body["next"], body["prev"]
+
+    def test_next_and_prev_walk_every_row_once(self):
+        ids, next_url, prev_url = self.page(reverse("seo-faqs") + "?limit=2")
+        self.assertIsNone(prev_url)
+        pages = [ids]
+        while next_url:
+            ids, next_url, prev_url = self.page(next_url)
+            self.assertIsNotNone(prev_url)
+            pages.append(ids)
+        expected = [faq.id for faq in reversed(self.faqs)]
+        self.assertEqual([len(ids) for ids in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+        # Back from the last page.
+        ids, next_url, prev_url = self.page(prev_url)
+        self.assertEqual(ids, pages[1])
+        ids, next_url, prev_url = self.page(prev_url)
+        self.assertEqual(ids, pages[0])
+        self.assertIsNone(prev_url)
+        self.assertEqual(self.page(next_url)[0], pages[1])
+
+    def test_invalid_cursors_are_400(self):
+        def token(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+        for cursor in (
+            "not a cursor!",
+            token([1, 2]),
+            token({"v": [1]}),
+            token({"v": ["yesterday", 1]}),
+            token({"v": [{"a": 1}, "x"]}),
+        ):
+            response = self.client.get(reverse("seo-faqs"), {"cursor": cursor})
+            self.assertEqual(response.status_code, 400, cursor)
@@ -62,11 +62,23 @@ urlpatterns = [
     path("api/email/lists/", views.email_lists, name="email-lists"),
     path("api/email/templates/", views.email_templates, name="email-templates"),
     path("api/email/flows/", views.email_flows, name="email-flows"),
+    path("api/email/flows/<int:flow_id>/", views.email_flow_detail, name="email-flow-detail"),
+    path("api/email/flows/<int:flow_id>/enroll/", views.email_flow_enroll, name="email-flow-enroll"),
     path("api/email/contacts/", views.email_contacts, name="email-contacts"),
+    path("api/email/contacts/import/", views.email_contact_imports, name="email-contact-imports"),
     path("api/email/sends/", views.email_sends, name="email-sends"),
+    path("api/email/campaigns/", views.email_campaigns, name="email-campaigns"),
+    path("api/email/events/", views.email_events, name="email-events"),
+    path("api/email/deliverability/", views.email_deliverability, name="email-deliverability"),
     path("api/email/marketing/", views.email_marketing_summary, name="email-marketing-summary"),
+    path("api/email/metrics/", views.email_metrics_trend, name="email-metrics"),
+    path("api/export/<slug:resource>/", views.export_resource, name="export-resource"),
     path("api/translate/", views.translate_text, name="translate-text"),
+    path("api/translate/memory/", views.translation_memory_stats, name="translation-memory-stats"),
+    path("api/usage/llm/", views.llm_usage, name="llm-usage"),
     path("api/geo/lookup/", views.geo_lookup, name="geo-lookup"),
+    path("api/geo/reverse/", views.geo_reverse, name="geo-reverse"),
+    path("api/geo/batch/", views.geo_batch, name="geo-batch"),
     path('api/chat/', include('chatbot.urls')),
     path('', include('users.urls')),
 ]
@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import TranslationMemory
+
+
+@admin.register(TranslationMemory)
+class TranslationMemoryAdmin(admin.ModelAdmin):
+    list_display = ("source_locale", "target_locale", "model", "source_text", "hits", "last_hit_at")
+    list_filter = ("target_locale", "model")
+    search_fields = ("source_text", "translated_text")
@@ -0,0 +1,163 @@
+"""
+Segment-level translation memory in front of the LLM gateway.
+
+Text is split at line breaks into segments. Each segment is normalized
+(Unicode NFC, whitespace collapsed) and addressed by
+sha256(model, source locale, target locale, segment). Only segments the
+store has never seen are sent to the LLM, one call each, concurrently.
+Repeated boilerplate such as footers, CTAs and legal lines comes back
+from the database.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+import unicodedata
+
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from icycon import llm
+
+from .models import TranslationMemory
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+LOCALE_MAX_LENGTH = TranslationMemory._meta.get_field("target_locale").max_length
+
+# Separators are kept (capturing group) so the layout survives reassembly.
+_BREAK = re.compile(r"(\s*\n\s*)")
+
+
+def normalize(segment):
+    return unicodedata.normalize("NFC", " ".join(segment.split()))
+
+
+def segment_key(normalized, source_locale, target_locale, model):
+    raw = "\x00".join((model, source_locale, target_locale, normalized))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def valid_locale(locale):
+    """True if `locale` is a non-empty string the store can hold."""
+    return isinstance(locale, str) and 0 < len(locale) <= LOCALE_MAX_LENGTH
+
+
+def _translatable(segment):
+    # Numbers, prices, punctuation and blank lines pass through untouched.
+    return any(ch.isalpha() for ch in segment)
+
+
+async def _complete(normalized, source_locale, target_locale, model):
+    source = "" if source_locale == "auto" else f" from {source_locale}"
+    started = time.perf_counter()
+    completion = await llm.chat_completion(
+        [
+            {
+                "role": "system",
+                "content": f"You are a translation engine. Translate{source} to {target_locale} preserving meaning and tone. "
+                "Reply with the translation only.",
+            },
+            {"role": "user", "content": normalized},
+        ],
+        model=model,
+        temperature=0.2,
+    )
+    return completion, int((time.perf_counter() - started) * 1000)
+
+
+async def translate(text, *, target_locale, source_locale="auto", model=DEFAULT_MODEL):
+    """Translate `text`, reusing stored segments.
+
+    Returns `{"translated", "segments", "hits", "misses", "tokens"}`, where
+    `hits` counts segments served from memory and `tokens` is what the
+    misses cost. Raises `llm.LLMError` if an unseen segment can't be
+    translated (including when no API key is configured).
+    """
+    parts = _BREAK.split(text)
+    keys = {}  # part index -> key
+    normalized = {}  # key -> normalized segment
+    for index in range(0, len(parts), 2):
+        if _translatable(parts[index]):
+            segment = normalize(parts[index])
+            key = segment_key(segment, source_locale, target_locale, model)
+            keys[index] = key
+            normalized[key] = segment
+
+    stored = {
+        key: translated
+        async for key, translated in TranslationMemory.objects.filter(key__in=list(normalized)).values_list(
+            "key", "translated_text"
+        )
+    }
+    misses = [key for key in normalized if key not in stored]
+
+    tokens = 0
+    if misses:
+        if not llm.is_configured():
+            raise llm.LLMError("OPENAI_API_KEY is not configured")
+        results = await asyncio.gather(
+            *(_complete(normalized[key], source_locale, target_locale, model) for key in misses)
+        )
+        entries = []
+        for key, (completion, latency_ms) in zip(misses, results):
+            stored[key] = completion["content"].strip()
+            tokens += completion["total_tokens"] or 0
+            entries.append(
+                TranslationMemory(
+                    key=key,
+                    source_locale=source_locale,
+                    target_locale=target_locale,
+                    model=model,
+                    source_text=normalized[key],
+                    translated_text=stored[key],
+                    tokens=completion["total_tokens"] or 0,
+                    latency_ms=latency_ms,
+                )
+            )
+        # A concurrent request may have stored the same segment meanwhile.
+        await TranslationMemory.objects.abulk_create(entries, ignore_conflicts=True)
+
+    reused = [key for key in normalized if key not in misses]
+    if reused:
+        await TranslationMemory.objects.filter(key__in=reused).aupdate(hits=F("hits") + 1, last_hit_at=timezone.now())
+
+    for index, key in keys.items():
+        segment = parts[index]
+        lead = segment[: len(segment) - len(segment.lstrip())]
+        trail = segment[len(segment.rstrip()):]
+        parts[index] = f"{lead}{stored[key]}{trail}"
+
+    return {
+        "translated": "".join(parts),
+        "segments": len(keys),
+        "hits": len(keys) - len(misses),
+        "misses": len(misses),
+        "tokens": tokens,
+    }
+
+
+def memory_stats():
+    """Store-wide hit counters and the LLM spend/latency they avoided.
+
+    Every stored segment was one miss; every reuse since is a hit. The
+    store is shared across tenants, so these are for staff only.
+    """
+    totals = TranslationMemory.objects.aggregate(
+        segments=Count("id"),
+        total_hits=Sum("hits"),
+        tokens_spent=Sum("tokens"),
+        tokens_saved=Sum(F("hits") * F("tokens")),
+        latency_saved_ms=Sum(F("hits") * F("latency_ms")),
+    )
+    segments, hits = totals["segments"], totals["total_hits"] or 0
+    lookups = hits + segments
+    return {
+        "segments": segments,
+        "hits": hits,
+        "misses": segments,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "tokens_spent": totals["tokens_spent"] or 0,
+        "tokens_saved": totals["tokens_saved"] or 0,
+        "latency_saved_ms": totals["latency_saved_ms"] or 0,
+    }
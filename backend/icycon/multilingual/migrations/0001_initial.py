@@ -0,0 +1,34 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationMemory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('source_locale', models.CharField(max_length=16)),
+                ('target_locale', models.CharField(max_length=16)),
+                ('model', models.CharField(max_length=64)),
+                ('source_text', models.TextField()),
+                ('translated_text', models.TextField()),
+                ('tokens', models.PositiveIntegerField(default=0)),
+                ('latency_ms', models.PositiveIntegerField(default=0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['target_locale', 'model'], name='multilingua_target__ca1c82_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,29 @@
 from django.db import models
 
-# Create your models here.
+
+class TranslationMemory(models.Model):
+    """
+    One translated segment, content-addressed by `key`: the SHA-256 of the
+    normalized source text, source locale, target locale and model. Shared
+    across tenants, since the same input always yields the same output.
+
+    `tokens` and `latency_ms` record what the original completion cost, so
+    `hits` times those is the spend and wait each reuse avoided.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    source_locale = models.CharField(max_length=16)
+    target_locale = models.CharField(max_length=16)
+    model = models.CharField(max_length=64)
+    source_text = models.TextField()
+    translated_text = models.TextField()
+    tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["target_locale", "model"])]
+
+    def __str__(self):
+        return f"{self.source_locale}->{self.target_locale}: {self.source_text[:50]}"
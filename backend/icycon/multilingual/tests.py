@@ -1,3 +1,79 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from chatbot.tests import FakeOpenAI, gateway_settings
+from tenants.models import Tenant, TenantUser
+
+from . import memory
+from .models import TranslationMemory
+
+
+class TranslationMemoryTests(TestCase):
+    async def test_only_unseen_segments_reach_the_llm(self):
+        with FakeOpenAI() as fake, gateway_settings(fake):
+            first = await memory.translate("Hello there\n\nUnsubscribe here", target_locale="de")
+            self.assertEqual((first["segments"], first["hits"], first["misses"]), (2, 0, 2))
+            self.assertEqual(first["translated"], "echo: Hello there\n\necho: Unsubscribe here")
+            self.assertEqual(len(fake.requests), 2)
+
+            # Whitespace differences normalize to the same stored segment.
+            second = await memory.translate("New offer\n  Unsubscribe   here ", target_locale="de")
+            self.assertEqual((second["hits"], second["misses"]), (1, 1))
+            self.assertEqual(second["translated"], "echo: New offer\n  echo: Unsubscribe here ")
+            self.assertEqual(fake.requests[-1]["messages"][-1]["content"], "New offer")
+
+            # Another target locale is a different segment.
+            third = await memory.translate("Unsubscribe here", target_locale="fr")
+            self.assertEqual((third["hits"], third["misses"], third["tokens"]), (0, 1, 4))
+            self.assertEqual(len(fake.requests), 4)
+
+        footer = await TranslationMemory.objects.aget(target_locale="de", source_text="Unsubscribe here")
+        self.assertEqual(footer.hits, 1)
+
+    async def test_a_full_hit_needs_no_api_key(self):
+        with FakeOpenAI() as fake, gateway_settings(fake):
+            await memory.translate("Thanks for your order", target_locale="es")
+        result = await memory.translate("Thanks for your order\n42", target_locale="es")
+        self.assertEqual((result["hits"], result["misses"], result["tokens"]), (1, 0, 0))
+        self.assertEqual(result["translated"], "echo: Thanks for your order\n42")
+
+    def test_stats_count_every_stored_segment_as_a_miss(self):
+        TranslationMemory.objects.create(
+            key="a", source_locale="auto", target_locale="de", model="m",
+            source_text="a", translated_text="a", tokens=10, latency_ms=200, hits=3,
+        )
+        TranslationMemory.objects.create(
+            key="b", source_locale="auto", target_locale="de", model="m",
+            source_text="b", translated_text="b", tokens=6, latency_ms=100,
+        )
+        stats = memory.memory_stats()
+        self.assertEqual((stats["segments"], stats["hits"], stats["misses"]), (2, 3, 2))
+        self.assertEqual(stats["hit_rate"], 0.6)
+        self.assertEqual((stats["tokens_spent"], stats["tokens_saved"], stats["latency_saved_ms"]), (16, 30, 600))
+
+
+class TranslateViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # No email, so the welcome signal doesn't add a personal workspace.
+        cls.user = get_user_model().objects.create_user(username="ann", password="pw")
+        TenantUser.objects.create(user=cls.user, tenant=Tenant.objects.create(name="Shop", region="US"), role="owner")
+
+    def test_locales_the_store_cannot_hold_are_refused(self):
+        self.client.force_login(self.user)
+        for payload in ({"target_lang": "x" * 17}, {"source_lang": ["en"]}, {"target_lang": ""}):
+            response = self.client.post(
+                reverse("translate-text"), {"text": "Hello", **payload}, content_type="application/json"
+            )
+            self.assertEqual(response.status_code, 400, payload)
+        self.assertFalse(TranslationMemory.objects.exists())
+
+    def test_memory_stats_are_for_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("translation-memory-stats")).status_code, 403)
+        staff = get_user_model().objects.create_user(username="ops", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse("translation-memory-stats"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["segments"], 0)
@@ -8,7 +8,6 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import Site, KeywordCluster, ContentItem, FAQ
 from .serializers import SiteSerializer, KeywordClusterSerializer, ContentItemSerializer, FAQSerializer
-from tenants.models import Tenant, TenantUser
 
 class SiteViewSet(viewsets.ModelViewSet):
     queryset = Site.objects.all()  # Base queryset, will be filtered in get_queryset
@@ -19,10 +18,10 @@ class SiteViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Get sites for the user's primary tenant."""
-        tenant = Tenant.objects.filter(tenantuser__user=self.request.user).first()
-        if not tenant:
+        tenant_id = self.request.tenant_ctx.primary_tenant_id
+        if tenant_id is None:
             return Site.objects.none()
-        return Site.objects.filter(tenant=tenant)
+        return Site.objects.filter(tenant_id=tenant_id)
 
     @csrf_exempt
     @action(detail=True, methods=["post"])
@@ -47,10 +46,10 @@ class KeywordClusterViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Get keyword clusters for the user's primary tenant."""
-        tenant = Tenant.objects.filter(tenantuser__user=self.request.user).first()
-        if not tenant:
+        tenant_id = self.request.tenant_ctx.primary_tenant_id
+        if tenant_id is None:
             return KeywordCluster.objects.none()
-        return KeywordCluster.objects.filter(tenant=tenant)
+        return KeywordCluster.objects.filter(tenant_id=tenant_id)
 
 
 class ContentItemViewSet(viewsets.ModelViewSet):
@@ -64,10 +63,10 @@ class ContentItemViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Get content items for the user's primary tenant."""
-        tenant = Tenant.objects.filter(tenantuser__user=self.request.user).first()
-        if not tenant:
+        tenant_id = self.request.tenant_ctx.primary_tenant_id
+        if tenant_id is None:
             return ContentItem.objects.none()
-        return ContentItem.objects.filter(tenant=tenant)
+        return ContentItem.objects.filter(tenant_id=tenant_id)
 
 
 class FAQViewSet(viewsets.ModelViewSet):
@@ -79,10 +78,10 @@ class FAQViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Get FAQs for the user's primary tenant."""
-        tenant = Tenant.objects.filter(tenantuser__user=self.request.user).first()
-        if not tenant:
+        tenant_id = self.request.tenant_ctx.primary_tenant_id
+        if tenant_id is None:
             return FAQ.objects.none()
-        return FAQ.objects.filter(tenant=tenant)
+        return FAQ.objects.filter(tenant_id=tenant_id)
 
 
 # Server-rendered tenant-facing SEO pages
@@ -93,8 +92,7 @@ def seo_dashboard(request):
     Picks the first tenant the user belongs to and displays basic site
     statistics and quick actions.
     """
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
@@ -115,8 +113,7 @@ def seo_dashboard(request):
 
 @login_required
 def seo_sites_list(request):
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
     sites = Site.objects.filter(tenant=tenant)
@@ -125,8 +122,7 @@ def seo_sites_list(request):
 
 @login_required
 def seo_site_detail(request, site_id):
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
@@ -158,8 +154,7 @@ def seo_site_detail(request, site_id):
 @login_required
 def seo_site_create(request):
     """Create a new Site for the user's first tenant."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
@@ -202,8 +197,7 @@ def seo_site_create(request):
 @login_required
 def seo_site_edit(request, site_id):
     """Edit an existing Site belonging to the user's tenant."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
@@ -246,8 +240,7 @@ def seo_site_edit(request, site_id):
 @login_required
 def seo_keyword_clusters(request):
     """SEO Keyword Clusters view."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
     
@@ -261,8 +254,7 @@ def seo_keyword_clusters(request):
 @login_required
 def seo_content_items(request):
     """SEO Content Items view."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
     
@@ -276,8 +268,7 @@ def seo_content_items(request):
 @login_required
 def seo_faqs(request):
     """SEO FAQs view."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
     
@@ -293,8 +284,7 @@ def seo_faqs(request):
 @login_required
 def seo_backlinks_dashboard(request):
     """Backlinks Dashboard - Overview of backlink profile and opportunities."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
@@ -308,8 +298,7 @@ def seo_backlinks_dashboard(request):
 @login_required
 def seo_backlinks_analysis(request):
     """Backlinks Analysis - Detailed analysis of backlinks for a site."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
@@ -329,8 +318,7 @@ def seo_backlinks_analysis(request):
 @login_required
 def seo_backlinks_competitors(request):
     """Competitors - Compare backlinks with competitors."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
@@ -350,8 +338,7 @@ def seo_backlinks_competitors(request):
 @login_required
 def seo_backlinks_outreach(request):
     """Outreach - Manage link outreach and opportunities."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
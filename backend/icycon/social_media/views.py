@@ -9,7 +9,7 @@ from .serializers import ConversationSerializer, MessageSerializer
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from tenants.models import Tenant, TenantUser
+from tenants.models import Tenant
 from django.views.decorators.http import require_http_methods
 
 class SocialAccountViewSet(viewsets.ModelViewSet):
@@ -19,7 +19,7 @@ class SocialAccountViewSet(viewsets.ModelViewSet):
     search_fields = ['handle', 'platform']
 
     def get_queryset(self):
-        tenant_ids = TenantUser.objects.filter(user=self.request.user).values_list('tenant_id', flat=True)
+        tenant_ids = self.request.tenant_ctx.tenant_ids
         return SocialAccount.objects.filter(tenant_id__in=tenant_ids)
 
 class PostViewSet(viewsets.ModelViewSet):
@@ -31,7 +31,7 @@ class PostViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
     def get_queryset(self):
-        tenant_ids = TenantUser.objects.filter(user=self.request.user).values_list('tenant_id', flat=True)
+        tenant_ids = self.request.tenant_ctx.tenant_ids
         return Post.objects.filter(tenant_id__in=tenant_ids)
 
     def perform_create(self, serializer):
@@ -50,7 +50,7 @@ class CommentViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        tenant_ids = TenantUser.objects.filter(user=self.request.user).values_list('tenant_id', flat=True)
+        tenant_ids = self.request.tenant_ctx.tenant_ids
         return Comment.objects.filter(post__tenant_id__in=tenant_ids)
 
     def perform_create(self, serializer):
@@ -61,7 +61,7 @@ class EngagementViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        tenant_ids = TenantUser.objects.filter(user=self.request.user).values_list('tenant_id', flat=True)
+        tenant_ids = self.request.tenant_ctx.tenant_ids
         return Engagement.objects.filter(post__tenant_id__in=tenant_ids)
 
 
@@ -70,7 +70,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        tenant_ids = TenantUser.objects.filter(user=self.request.user).values_list('tenant_id', flat=True)
+        tenant_ids = self.request.tenant_ctx.tenant_ids
         return Conversation.objects.filter(participants__id__in=tenant_ids).distinct()
 
     def perform_create(self, serializer):
@@ -87,7 +87,7 @@ class MessageViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        tenant_ids = TenantUser.objects.filter(user=self.request.user).values_list('tenant_id', flat=True)
+        tenant_ids = self.request.tenant_ctx.tenant_ids
         return Message.objects.filter(conversation__participants__id__in=tenant_ids).distinct()
 
     def perform_create(self, serializer):
@@ -103,7 +103,7 @@ def create_post_view(request):
     Shows a simple form and creates a Post with the authenticated user as author.
     """
     # Get tenants the user belongs to
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
+    tenant_qs = request.tenant_ctx.tenants()
 
     if request.method == 'POST':
         tenant_id = request.POST.get('tenant')
@@ -142,8 +142,7 @@ def create_post_view(request):
 @login_required
 def social_channels_view(request):
     """Display connected social media channels for tenant's org promotion."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'social_media/no_tenant.html')
     
@@ -163,8 +162,7 @@ def social_channels_view(request):
 @login_required
 def social_posts_view(request):
     """Display all posts for tenant's social media content."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'social_media/no_tenant.html')
     
@@ -184,8 +182,7 @@ def social_posts_view(request):
 @login_required
 def conversations_view(request):
     """Display conversations/messages for org communication and promotion."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'social_media/no_tenant.html')
     
@@ -200,8 +197,7 @@ def conversations_view(request):
 @login_required
 def conversation_detail_view(request, conversation_id):
     """Display messages within a specific conversation."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return render(request, 'social_media/no_tenant.html')
     
@@ -228,8 +224,7 @@ def send_message_view(request, conversation_id):
     if request.method != 'POST':
         return redirect('social_media:conversations')
     
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant_ctx.primary_tenant
     if not tenant:
         return redirect('social_media:conversations')
     
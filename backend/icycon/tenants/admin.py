@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Tenant, TenantUser, Integration
+from .models import Tenant, TenantUser, Integration, LLMUsage
 
 @admin.register(Tenant)
 class TenantAdmin(admin.ModelAdmin):
@@ -52,3 +52,11 @@ class IntegrationAdmin(admin.ModelAdmin):
     def get_name(self, obj):
         return f"{obj.tenant.name} - {obj.type}"
     get_name.short_description = 'Integration Name'
+
+
+@admin.register(LLMUsage)
+class LLMUsageAdmin(admin.ModelAdmin):
+    list_display = ('tenant', 'day', 'feature', 'requests', 'tokens', 'rejected')
+    list_filter = ('feature', 'day')
+    search_fields = ('tenant__name',)
+    date_hierarchy = 'day'
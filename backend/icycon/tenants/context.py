@@ -0,0 +1,136 @@
+"""
+Per-user tenant membership context.
+
+Resolves the tenants a user belongs to (and their role in each) once and keeps
+the result in the Django cache. Entries are versioned per user: saving or
+deleting a `TenantUser` row bumps the version so the next lookup rebuilds the
+context instead of serving a stale membership map.
+
+The bump has to reach every worker, or a removed member keeps access through
+another worker's copy until it expires. Caching is therefore off unless
+`TENANT_CONTEXT_CACHE_ENABLED` is set (the default when `REDIS_URL` is), and
+a system check refuses to start with it enabled on a per-process cache.
+Without it, the context is one indexed query per request.
+"""
+
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+
+from icycon.response_cache import is_shared
+
+from .models import Tenant, TenantUser
+
+ADMIN_ROLES = ("owner", "admin")
+
+
+def _version_key(user_id):
+    return f"tenant_ctx:version:{user_id}"
+
+
+def _context_key(user_id, version):
+    return f"tenant_ctx:{user_id}:{version}"
+
+
+def _cache_timeout():
+    return getattr(settings, "TENANT_CONTEXT_CACHE_TIMEOUT", 300)
+
+
+def cache_enabled():
+    return getattr(settings, "TENANT_CONTEXT_CACHE_ENABLED", False)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs=None, **kwargs):
+    if cache_enabled() and not is_shared(caches[DEFAULT_CACHE_ALIAS]):
+        return [
+            checks.Error(
+                "TENANT_CONTEXT_CACHE_ENABLED needs a cache shared by every worker, not per-process local memory.",
+                hint="Set REDIS_URL, or set TENANT_CONTEXT_CACHE_ENABLED=False.",
+                id="tenants.E001",
+            )
+        ]
+    return []
+
+
+def get_membership_version(user_id):
+    # Seed missing versions from the clock so an evicted counter never
+    # falls back to a number that was already used for an older entry.
+    return cache.get_or_set(_version_key(user_id), time.time_ns, None)
+
+
+def bump_membership_version(user_id):
+    """Invalidate the cached tenant context for `user_id`."""
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+class TenantContext:
+    """Tenant IDs, roles and primary tenant for a single user."""
+
+    def __init__(self, roles=None):
+        # roles: {tenant_id: role}, ordered by tenant id
+        self.roles = dict(roles or {})
+        self.tenant_ids = list(self.roles)
+        self.primary_tenant_id = self.tenant_ids[0] if self.tenant_ids else None
+        self._primary_tenant = None
+
+    def __bool__(self):
+        return bool(self.tenant_ids)
+
+    def has_tenant(self, tenant_id):
+        try:
+            return int(tenant_id) in self.roles
+        except (TypeError, ValueError):
+            return False
+
+    def role_for(self, tenant_id):
+        try:
+            return self.roles.get(int(tenant_id))
+        except (TypeError, ValueError):
+            return None
+
+    def is_admin(self, tenant_id):
+        return self.role_for(tenant_id) in ADMIN_ROLES
+
+    @property
+    def primary_tenant(self):
+        """The user's first tenant (matches the old `.first()` lookups)."""
+        if self._primary_tenant is None and self.primary_tenant_id is not None:
+            self._primary_tenant = Tenant.objects.filter(pk=self.primary_tenant_id).first()
+        return self._primary_tenant
+
+    def tenants(self):
+        return Tenant.objects.filter(id__in=self.tenant_ids)
+
+
+EMPTY_CONTEXT = TenantContext()
+
+
+def _load_roles(user_id):
+    # Gracefully handle cases where tenant tables aren't present (e.g., before migrations)
+    try:
+        rows = TenantUser.objects.filter(user_id=user_id).order_by("tenant_id").values_list("tenant_id", "role")
+        return dict(rows)
+    except Exception:
+        return {}
+
+
+def get_tenant_context(user):
+    """Return the (cached) `TenantContext` for `user`."""
+    if user is None or not getattr(user, "is_authenticated", False):
+        return EMPTY_CONTEXT
+    if not cache_enabled():
+        return TenantContext(_load_roles(user.pk))
+
+    version = get_membership_version(user.pk)
+    key = _context_key(user.pk, version)
+    roles = cache.get(key)
+    if roles is None:
+        roles = _load_roles(user.pk)
+        cache.set(key, roles, _cache_timeout())
+    return TenantContext(roles)
@@ -0,0 +1,28 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from .context import get_tenant_context
+
+
+class TenantContextMiddleware:
+    """Expose the user's tenant memberships as `request.tenant_ctx`.
+
+    The context is resolved lazily on first access, so DRF views that
+    authenticate inside the view (Basic/token auth) still see the
+    authenticated user rather than the anonymous session user.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Nothing here touches the DB, so the same code serves both modes:
+        # under ASGI this returns get_response's coroutine for the caller to
+        # await, and async views resolve the context in a thread.
+        request.tenant_ctx = SimpleLazyObject(lambda: get_tenant_context(request.user))
+        return self.get_response(request)
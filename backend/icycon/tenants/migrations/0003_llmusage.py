@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_fix_tenantuser_fk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('feature', models.CharField(max_length=32)),
+                ('requests', models.PositiveIntegerField(default=0)),
+                ('tokens', models.PositiveBigIntegerField(default=0)),
+                ('rejected', models.PositiveIntegerField(default=0, help_text='Requests refused with 429 (over quota)')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='llm_usage', to='tenants.tenant')),
+            ],
+            options={
+                'ordering': ['-day', 'feature'],
+                'unique_together': {('tenant', 'day', 'feature')},
+            },
+        ),
+    ]
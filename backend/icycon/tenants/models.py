@@ -59,3 +59,21 @@ class Integration(models.Model):
 
     def __str__(self):
         return f"{self.tenant.name} - {self.type}"
+
+
+class LLMUsage(models.Model):
+    """Daily LLM usage per tenant and feature, written in batches by `icycon.quotas`."""
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="llm_usage")
+    day = models.DateField()
+    feature = models.CharField(max_length=32)
+    requests = models.PositiveIntegerField(default=0)
+    tokens = models.PositiveBigIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0, help_text="Requests refused with 429 (over quota)")
+
+    class Meta:
+        unique_together = ("tenant", "day", "feature")
+        ordering = ["-day", "feature"]
+
+    def __str__(self):
+        return f"{self.tenant_id} {self.day} {self.feature}: {self.tokens} tokens"
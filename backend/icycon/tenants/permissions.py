@@ -3,5 +3,8 @@ from rest_framework import permissions
 
 class IsTenantAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
+        tenant_ctx = getattr(request, 'tenant_ctx', None)
+        if tenant_ctx is not None:
+            return tenant_ctx.is_admin(obj.pk)
         tenant_user = obj.tenantuser_set.filter(user=request.user).first()
         return tenant_user and tenant_user.role in ['owner', 'admin']
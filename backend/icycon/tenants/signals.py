@@ -0,0 +1,13 @@
+"""Signal handlers for tenant membership changes."""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .context import bump_membership_version
+from .models import TenantUser
+
+
+@receiver(post_save, sender=TenantUser)
+@receiver(post_delete, sender=TenantUser)
+def invalidate_tenant_context(sender, instance, **kwargs):
+    """Drop the cached tenant context of the affected user."""
+    bump_membership_version(instance.user_id)
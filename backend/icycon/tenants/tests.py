@@ -1,3 +1,93 @@
-from django.test import TestCase
+import asyncio
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from .context import check_shared_cache, get_tenant_context
+from .middleware import TenantContextMiddleware
+from .models import Tenant, TenantUser
+from .permissions import IsTenantAdmin
+
+
+class TenantContextTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # No email, so the welcome signal doesn't add a personal workspace.
+        cls.user = get_user_model().objects.create_user(username="ann", password="pw")
+        cls.shop = Tenant.objects.create(name="Shop", region="US")
+        cls.blog = Tenant.objects.create(name="Blog", region="EU")
+        TenantUser.objects.create(user=cls.user, tenant=cls.shop, role="owner")
+        cls.membership = TenantUser.objects.create(user=cls.user, tenant=cls.blog, role="viewer")
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_middleware_resolves_the_context_lazily(self):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        seen = []
+        middleware = TenantContextMiddleware(lambda request: seen.append(request) or HttpResponse())
+        with self.assertNumQueries(0):
+            middleware(request)
+        # Authenticated later, as DRF token auth does inside the view.
+        request.user = self.user
+        self.assertEqual(seen[0].tenant_ctx.tenant_ids, [self.shop.id, self.blog.id])
+        self.assertEqual(request.tenant_ctx.primary_tenant, self.shop)
+        self.assertFalse(get_tenant_context(AnonymousUser()))
+
+    def test_middleware_passes_async_responses_through(self):
+        async def get_response(request):
+            return HttpResponse("ok")
+
+        middleware = TenantContextMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        self.assertEqual(asyncio.run(middleware(request)).content, b"ok")
+        self.assertEqual(request.tenant_ctx.tenant_ids, [])
+
+    @override_settings(TENANT_CONTEXT_CACHE_ENABLED=True)
+    def test_membership_changes_invalidate_the_cached_context(self):
+        self.assertEqual(get_tenant_context(self.user).role_for(self.blog.id), "viewer")
+        with self.assertNumQueries(0):
+            get_tenant_context(self.user)
+
+        self.membership.role = "admin"
+        self.membership.save()
+        self.assertTrue(get_tenant_context(self.user).is_admin(self.blog.id))
+
+        self.membership.delete()
+        context = get_tenant_context(self.user)
+        self.assertFalse(context.has_tenant(self.blog.id))
+        self.assertEqual(context.tenant_ids, [self.shop.id])
+
+    def test_without_a_shared_cache_every_request_reads_the_table(self):
+        self.assertEqual(check_shared_cache(), [])
+        with override_settings(TENANT_CONTEXT_CACHE_ENABLED=True):
+            self.assertEqual([error.id for error in check_shared_cache()], ["tenants.E001"])
+
+        get_tenant_context(self.user)
+        # No signal fires for update(): only an uncached lookup sees it right away.
+        TenantUser.objects.filter(pk=self.membership.pk).update(role="admin")
+        with self.assertNumQueries(1):
+            self.assertTrue(get_tenant_context(self.user).is_admin(self.blog.id))
+
+    def test_is_tenant_admin(self):
+        permission = IsTenantAdmin()
+        request = RequestFactory().get("/")
+        request.user = self.user
+        request.tenant_ctx = get_tenant_context(self.user)
+        self.assertTrue(permission.has_object_permission(request, None, self.shop))
+        self.assertFalse(permission.has_object_permission(request, None, self.blog))
+        outsider = Tenant.objects.create(name="Other", region="UK")
+        self.assertFalse(permission.has_object_permission(request, None, outsider))
+
+        # Without the middleware it falls back to the membership row.
+        del request.tenant_ctx
+        self.assertTrue(permission.has_object_permission(request, None, self.shop))
+        self.assertFalse(permission.has_object_permission(request, None, self.blog))
+        self.assertFalse(permission.has_object_permission(request, None, outsider))
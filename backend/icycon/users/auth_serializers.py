@@ -1,7 +1,12 @@
 from django.contrib.auth import get_user_model, authenticate
 from rest_framework import serializers
 from rest_framework.reverse import reverse
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from icycon.api_views import FEATURES_INDEX
+from .authentication import issue_tokens, is_token_revoked, is_user_active
 
 User = get_user_model()
 
@@ -29,6 +34,11 @@ class SignupSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data, password=password)
         return user
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update(issue_tokens(instance))
+        return data
+
     def get_features(self, obj):
         request = self.context.get('request')
         base = request.build_absolute_uri("/") if request else ""
@@ -64,9 +74,17 @@ class LoginSerializer(serializers.Serializer):
         if not user.check_password(password):
             raise serializers.ValidationError({'password': 'Invalid email or password.'})
 
+        if not user.is_active:
+            raise serializers.ValidationError({'email': 'This account is disabled.'})
+
         data['user'] = user
         return data
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update(issue_tokens(instance['user']))
+        return data
+
     def get_user(self, obj):
         """Return user info."""
         user = obj.get('user')
@@ -102,3 +120,15 @@ class LoginSerializer(serializers.Serializer):
             }
             for item in FEATURES_INDEX
         ]
+
+
+class DenylistTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuse to mint access tokens from a revoked refresh token or for an inactive user."""
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        if is_token_revoked(refresh):
+            raise InvalidToken('Token has been revoked')
+        if not is_user_active(refresh.get(api_settings.USER_ID_CLAIM)):
+            raise InvalidToken('User is inactive')
+        return super().validate(attrs)
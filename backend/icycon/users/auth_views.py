@@ -1,9 +1,12 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
 from django.core.mail import send_mail
 from django.conf import settings
 from .auth_serializers import SignupSerializer, LoginSerializer
+from .authentication import revoke_token
 
 
 class SignupView(generics.CreateAPIView):
@@ -22,8 +25,12 @@ class SignupView(generics.CreateAPIView):
     {
         "email": "user@example.com",
         "username": "username",
-        "token": "token-string"
+        "token": "access-token",
+        "refresh": "refresh-token"
     }
+
+    Send the token as `Authorization: Bearer <token>` on later API calls;
+    renew it via POST /api/token/refresh/ with the refresh token.
     """
     serializer_class = SignupSerializer
     permission_classes = [AllowAny]
@@ -58,7 +65,8 @@ class LoginView(generics.GenericAPIView):
     
     Returns:
     {
-        "token": "token-string",
+        "token": "access-token",
+        "refresh": "refresh-token",
         "user": {
             "id": 1,
             "email": "user@example.com",
@@ -75,3 +83,26 @@ class LoginView(generics.GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class LogoutView(generics.GenericAPIView):
+    """
+    Revoke the bearer token used for this request.
+
+    POST /api/auth/logout
+    {
+        "refresh": "refresh-token"   (optional, revoked as well)
+    }
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        if request.auth is not None and hasattr(request.auth, 'payload'):
+            revoke_token(request.auth)
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                revoke_token(RefreshToken(refresh))
+            except TokenError:
+                return Response({'error': 'Invalid refresh token.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,138 @@
+"""
+Stateless bearer-token authentication for the API.
+
+Tokens are the SimpleJWT access tokens configured in `SIMPLE_JWT`. Verifying
+one checks the signature, the expiry, a small cached denylist and whether
+the user is still active, so a request no longer pays for a PBKDF2 password
+hash (Basic auth). The active flag is cached for `AUTH_ACTIVE_CACHE_SECONDS`.
+Deactivating a user through `save()` also denies their tokens at once
+(`users.signals`), so the cache only delays an `update()` that skips signals.
+The denylist and the active flags live in the default cache, so they only
+hold across processes when that cache is shared (`REDIS_URL`); `users.W001`
+warns otherwise.
+The user row is loaded lazily, the first time a view needs more than the
+user's id.
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.utils.functional import SimpleLazyObject
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from icycon.response_cache import is_shared
+
+DENYLIST_PREFIX = "auth:denied-jti:"
+NOT_BEFORE_PREFIX = "auth:not-before:"
+ACTIVE_PREFIX = "auth:active:"
+
+
+def issue_tokens(user):
+    """Return a fresh `{"token", "refresh"}` pair for `user`."""
+    refresh = RefreshToken.for_user(user)
+    return {"token": str(refresh.access_token), "refresh": str(refresh)}
+
+
+def _seconds_left(token):
+    return max(int(token.get("exp", 0) - time.time()), 1)
+
+
+def revoke_token(token):
+    """Deny a single token (by jti) until it would have expired anyway."""
+    jti = token.get(api_settings.JTI_CLAIM)
+    if jti:
+        cache.set(DENYLIST_PREFIX + jti, True, _seconds_left(token))
+
+
+def revoke_user_tokens(user):
+    """Deny every token issued to `user` before now (e.g. after a password change)."""
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+    cache.set(NOT_BEFORE_PREFIX + str(user.pk), int(time.time()), int(lifetime))
+
+
+def is_token_revoked(token):
+    jti_key = DENYLIST_PREFIX + str(token.get(api_settings.JTI_CLAIM))
+    not_before_key = NOT_BEFORE_PREFIX + str(token.get(api_settings.USER_ID_CLAIM))
+    found = cache.get_many([jti_key, not_before_key])
+    if jti_key in found:
+        return True
+    not_before = found.get(not_before_key)
+    # `iat` has whole-second resolution, so a token minted in the same second
+    # as the revocation is refused too.
+    return not_before is not None and token.get("iat", 0) <= not_before
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs=None, **kwargs):
+    if not is_shared(caches[DEFAULT_CACHE_ALIAS]):
+        return [checks.Warning(
+            "Token revocation is kept in a per-process cache, so a revoked token "
+            "or deactivated user is still accepted by the other workers.",
+            hint="Set REDIS_URL, or point CACHES['default'] at a shared backend.",
+            id="users.W001",
+        )]
+    return []
+
+
+def is_user_active(user_id):
+    """Whether `user_id` exists and is active; cached for `AUTH_ACTIVE_CACHE_SECONDS`."""
+    key = ACTIVE_PREFIX + str(user_id)
+    active = cache.get(key)
+    if active is None:
+        active = get_user_model().objects.filter(pk=user_id, is_active=True).exists()
+        cache.set(key, active, getattr(settings, "AUTH_ACTIVE_CACHE_SECONDS", 30))
+    return active
+
+
+def forget_user_active(user_id):
+    cache.delete(ACTIVE_PREFIX + str(user_id))
+
+
+class LazyTokenUser(SimpleLazyObject):
+    """The token's user, fetched from the DB only when a view needs it.
+
+    `pk`/`id` and the authentication flags answer without a query, which is
+    all the permission checks and `request.tenant_ctx` need. Only tokens of
+    active users get this far (see `StatelessTokenAuthentication`).
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id):
+        def load():
+            user = get_user_model().objects.filter(pk=user_id, is_active=True).first()
+            if user is None:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            return user
+
+        super().__init__(load)
+        self.__dict__["pk"] = self.__dict__["id"] = user_id
+
+    def __bool__(self):
+        # `request.user and request.user.is_authenticated` must not load the row.
+        return True
+
+
+class StatelessTokenAuthentication(JWTAuthentication):
+    """Accept `Authorization: Bearer <token>` for active users (a cached lookup)."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken("Token contained no recognizable user identification") from exc
+
+        if is_token_revoked(validated_token):
+            raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+
+        user_id = self.user_model._meta.pk.to_python(user_id)
+        if not is_user_active(user_id):
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return LazyTokenUser(user_id)
@@ -0,0 +1,55 @@
+import base64
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from users.authentication import issue_tokens
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare API requests/sec for Basic auth (PBKDF2 per request) against bearer tokens.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default='demo@example.com', help='Email of an existing user (see seed_demo_data)')
+        parser.add_argument('--password', default='demo1234', help='Password of that user')
+        parser.add_argument('--requests', type=int, default=100, help='Requests per auth mode')
+        parser.add_argument('--path', default='/api/features/', help='Authenticated endpoint to call')
+
+    def handle(self, *args, **options):
+        email = options['email']
+        password = options['password']
+        num_requests = options['requests']
+        path = options['path']
+
+        user = User.objects.filter(email=email).first()
+        if not user or not user.check_password(password):
+            raise CommandError(f'No user {email} with that password; run seed_demo_data first or pass --email/--password.')
+
+        credentials = base64.b64encode(f'{user.get_username()}:{password}'.encode()).decode()
+        modes = [
+            ('basic', f'Basic {credentials}'),
+            ('token', f"Bearer {issue_tokens(user)['token']}"),
+        ]
+
+        client = Client(HTTP_HOST='localhost')
+        results = {}
+        for label, header in modes:
+            response = client.get(path, HTTP_AUTHORIZATION=header)
+            if response.status_code != 200:
+                raise CommandError(f'{label}: {path} returned {response.status_code}')
+
+            start = time.perf_counter()
+            for _ in range(num_requests):
+                client.get(path, HTTP_AUTHORIZATION=header)
+            elapsed = time.perf_counter() - start
+            results[label] = num_requests / elapsed
+            self.stdout.write(
+                f'{label:>6}: {num_requests} requests in {elapsed:.2f}s '
+                f'({results[label]:.1f} req/s, {elapsed / num_requests * 1000:.2f} ms/req)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Token auth is {results['token'] / results['basic']:.1f}x faster than Basic auth"))
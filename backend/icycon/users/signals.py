@@ -5,6 +5,8 @@ from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.utils import timezone
 
+from .authentication import forget_user_active, revoke_user_tokens
+
 User = get_user_model()
 
 try:
@@ -15,6 +17,37 @@ try:
 except ImportError:
     EMAIL_AVAILABLE = False
 
+# Personalized per recipient at send time (email_engine.services.rendering).
+WELCOME_TEMPLATE = {
+    'subject': 'Welcome to {{ site_name }}!',
+    'body_html': """
+        <p>Hi {{ first_name|default:"there" }},</p>
+        <p>Welcome to {{ site_name }}! Your account has been created successfully.</p>
+        <p>You can now log in and start exploring all the features available to you.</p>
+        <p>If you have any questions, feel free to reach out to our support team.</p>
+        <p>Happy exploring!</p>
+    """,
+    'body_text': """
+        Hi {{ first_name|default:"there" }},
+
+        Welcome to {{ site_name }}! Your account has been created successfully.
+
+        You can now log in and start exploring all the features available to you.
+
+        If you have any questions, feel free to reach out to our support team.
+
+        Happy exploring!
+    """,
+}
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_deactivation(sender, instance, created, **kwargs):
+    """Deny a deactivated user's tokens at once rather than when the active-flag cache expires."""
+    forget_user_active(instance.pk)
+    if not created and not instance.is_active:
+        revoke_user_tokens(instance)
+
 
 @receiver(post_save, sender=User)
 def send_welcome_email_on_user_created(sender, instance, created, **kwargs):
@@ -53,27 +86,7 @@ def send_welcome_email_on_user_created(sender, instance, created, **kwargs):
         welcome_template, _ = EmailTemplate.objects.get_or_create(
             tenant=tenant,
             name='Welcome Email - New User',
-            defaults={
-                'subject': f'Welcome to {settings.SITE_NAME if hasattr(settings, "SITE_NAME") else "Icycon"}!',
-                'body_html': f"""
-                    <p>Hi {instance.first_name or instance.username},</p>
-                    <p>Welcome to {settings.SITE_NAME if hasattr(settings, "SITE_NAME") else "Icycon"}! Your account has been created successfully.</p>
-                    <p>You can now log in and start exploring all the features available to you.</p>
-                    <p>If you have any questions, feel free to reach out to our support team.</p>
-                    <p>Happy exploring!</p>
-                """,
-                'body_text': f"""
-                    Hi {instance.first_name or instance.username},
-                    
-                    Welcome to {settings.SITE_NAME if hasattr(settings, "SITE_NAME") else "Icycon"}! Your account has been created successfully.
-                    
-                    You can now log in and start exploring all the features available to you.
-                    
-                    If you have any questions, feel free to reach out to our support team.
-                    
-                    Happy exploring!
-                """,
-            }
+            defaults=WELCOME_TEMPLATE,
         )
         
         # Create email send record
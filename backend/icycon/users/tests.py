@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import (
+    NOT_BEFORE_PREFIX, check_shared_cache, forget_user_active, is_token_revoked, revoke_user_tokens,
+)
+
+
+@override_settings(EMAIL_HOST="")
+class TokenAuthTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="ann", email="ann@example.com", password="pw-123456")
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def login(self):
+        response = self.client.post(
+            reverse("login"), {"email": "ann@example.com", "password": "pw-123456"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get(self, token):
+        return self.client.get(reverse("feature-index"), HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def refresh(self, refresh):
+        return self.client.post(reverse("token_refresh"), {"refresh": refresh}, content_type="application/json")
+
+    def test_login_issues_a_bearer_token_and_a_refresh_token(self):
+        tokens = self.login()
+        self.assertEqual(tokens["user"]["email"], "ann@example.com")
+        self.assertEqual(self.get(tokens["token"]).status_code, 200)
+        self.assertEqual(self.get("not-a-token").status_code, 401)
+
+        response = self.refresh(tokens["refresh"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get(response.json()["access"]).status_code, 200)
+
+        bad = self.client.post(
+            reverse("login"), {"email": "ann@example.com", "password": "wrong"}, content_type="application/json"
+        )
+        self.assertEqual(bad.status_code, 400)
+
+    def test_logout_revokes_the_access_and_refresh_tokens(self):
+        tokens = self.login()
+        response = self.client.post(
+            reverse("logout"),
+            {"refresh": tokens["refresh"]},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {tokens['token']}",
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get(tokens["token"]).status_code, 401)
+        self.assertEqual(self.refresh(tokens["refresh"]).status_code, 401)
+
+    def test_deactivating_a_user_revokes_their_tokens(self):
+        tokens = self.login()
+        self.assertEqual(self.get(tokens["token"]).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get(tokens["token"]).status_code, 401)
+        self.assertEqual(self.refresh(tokens["refresh"]).status_code, 401)
+        self.assertEqual(
+            self.client.post(
+                reverse("login"), {"email": "ann@example.com", "password": "pw-123456"}, content_type="application/json"
+            ).status_code,
+            400,
+        )
+
+    def test_inactive_users_are_refused_once_the_cached_flag_expires(self):
+        tokens = self.login()
+        self.assertEqual(self.get(tokens["token"]).status_code, 200)
+        # update() skips signals, so only the short-lived cache stands between it and the next request.
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        forget_user_active(self.user.pk)
+        response = self.get(tokens["token"])
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "user_inactive")
+
+    def test_tokens_minted_in_the_revoking_second_are_refused(self):
+        revoke_user_tokens(self.user)
+        not_before = cache.get(NOT_BEFORE_PREFIX + str(self.user.pk))
+        token = AccessToken.for_user(self.user)
+        token["iat"] = not_before
+        self.assertTrue(is_token_revoked(token))
+        token["iat"] = not_before + 1
+        self.assertFalse(is_token_revoked(token))
+
+    def test_warns_when_revocation_is_not_shared_between_workers(self):
+        self.assertEqual([warning.id for warning in check_shared_cache()], ["users.W001"])
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}):
+            self.assertEqual(check_shared_cache(), [])
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
-from .auth_views import SignupView, LoginView
+from .auth_views import SignupView, LoginView, LogoutView
 
 router = DefaultRouter()
 router.register(r'profile', views.UserProfileViewSet, basename='profile')
@@ -11,6 +11,7 @@ urlpatterns = [
     # Authentication API endpoints
     path('api/auth/signup', SignupView.as_view(), name='signup'),
     path('api/auth/login', LoginView.as_view(), name='login'),
+    path('api/auth/logout', LogoutView.as_view(), name='logout'),
     
     # API endpoints
     path('api/', include(router.urls)),
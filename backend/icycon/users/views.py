@@ -6,6 +6,7 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
 from .serializers import UserProfileSerializer, ChangePasswordSerializer, OrganizationMembershipSerializer
 from .models import OrganizationMembership
+from .authentication import revoke_user_tokens
 
 User = get_user_model()
 
@@ -54,6 +55,7 @@ class UserProfileViewSet(viewsets.ModelViewSet):
             
             user.set_password(serializer.data.get('new_password'))
             user.save()
+            revoke_user_tokens(user)
             update_session_auth_hash(request, user)  # Keep user logged in
             return Response({'message': 'Password updated successfully.'})
             
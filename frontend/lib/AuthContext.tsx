@@ -1,5 +1,5 @@
 import React, { createContext, useContext, useEffect, useState, ReactNode } from 'react';
-import { fetchFeatures, fetchProfile } from './api';
+import { fetchFeatures, fetchProfile, logout, setAuthHeaderListener } from './api';
 
 type AuthState = {
   authHeader: string | null;
@@ -40,6 +40,8 @@ export function AuthProvider({ children }: { children: ReactNode }) {
   }, []);
 
   const setAuthHeader = (header: string | null, nextUser?: AuthState['user']) => {
+    // Logging out: revoke the tokens server-side too.
+    if (!header && authHeader) logout(authHeader).catch(() => undefined);
     setAuthHeaderState(header);
     if (header) {
       localStorage.setItem('authHeader', header);
@@ -56,6 +58,22 @@ export function AuthProvider({ children }: { children: ReactNode }) {
     }
   };
 
+  useEffect(() => {
+    // A refreshed access token replaces the stored header; a failed refresh logs out.
+    setAuthHeaderListener((header) => {
+      setAuthHeaderState(header);
+      if (header) {
+        localStorage.setItem('authHeader', header);
+      } else {
+        localStorage.removeItem('authHeader');
+        localStorage.removeItem('user');
+        setFeatures(null);
+        setUser(null);
+      }
+    });
+    return () => setAuthHeaderListener(null);
+  }, []);
+
   return (
     <AuthContext.Provider value={{ authHeader, user, features, setAuthHeader }}>
       {children}
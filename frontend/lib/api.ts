@@ -12,6 +12,58 @@ export function buildBasicAuth(email: string, password: string) {
   return `Basic ${btoa(`${email}:${password}`)}`;
 }
 
+export function buildBearerAuth(token: string) {
+  return `Bearer ${token}`;
+}
+
+// Access tokens are short-lived; the refresh token renews them (POST /api/token/refresh/).
+const REFRESH_KEY = 'refreshToken';
+let authHeaderListener: ((header: string | null) => void) | null = null;
+let refreshing: Promise<string | null> | null = null;
+
+/** Called with the new header after a refresh, or null once the session can't be renewed. */
+export function setAuthHeaderListener(listener: ((header: string | null) => void) | null) {
+  authHeaderListener = listener;
+}
+
+function storeRefreshToken(refresh?: string | null) {
+  if (refresh) localStorage.setItem(REFRESH_KEY, refresh);
+  else localStorage.removeItem(REFRESH_KEY);
+}
+
+export function refreshAuthHeader(): Promise<string | null> {
+  const refresh = localStorage.getItem(REFRESH_KEY);
+  if (!refresh) return Promise.resolve(null);
+  // Requests that fail together share one refresh.
+  if (!refreshing) {
+    refreshing = fetch(`${API_BASE}/api/token/refresh/`, {
+      method: 'POST',
+      headers: jsonHeaders(),
+      body: JSON.stringify({ refresh }),
+    })
+      .then(async (res) => (res.ok ? (await res.json())?.access : null))
+      .catch(() => null)
+      .then((access: string | null) => {
+        const header = access ? buildBearerAuth(access) : null;
+        if (!header) storeRefreshToken(null);
+        authHeaderListener?.(header);
+        return header;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+}
+
+/** fetch() with `authHeader`; on a 401 for a bearer token, refresh it once and retry. */
+async function authFetch(authHeader: string, url: string, init: (auth: string) => RequestInit) {
+  const res = await fetch(url, init(authHeader));
+  if (res.status !== 401 || !authHeader.startsWith('Bearer ')) return res;
+  const renewed = await refreshAuthHeader();
+  return renewed ? fetch(url, init(renewed)) : res;
+}
+
 export async function login(email: string, password: string) {
   const res = await fetch(`${API_BASE}/api/auth/login`, {
     method: 'POST',
@@ -23,7 +75,8 @@ export async function login(email: string, password: string) {
     throw new Error(err?.detail || err?.error || 'Login failed');
   }
   const data = await res.json();
-  const authHeader = buildBasicAuth(email, password);
+  storeRefreshToken(data?.refresh);
+  const authHeader = data?.token ? buildBearerAuth(data.token) : buildBasicAuth(email, password);
   return { ...data, authHeader };
 }
 
@@ -43,15 +96,28 @@ export async function signup(email: string, password: string, username: string)
     throw new Error(err?.detail || err?.error || 'Signup failed');
   }
   const data = await res.json();
-  const authHeader = buildBasicAuth(email, password);
+  storeRefreshToken(data?.refresh);
+  const authHeader = data?.token ? buildBearerAuth(data.token) : buildBasicAuth(email, password);
   return { ...data, authHeader };
 }
 
+export async function logout(authHeader: string) {
+  // Revokes the access token and, when we have it, the refresh token too.
+  const refresh = localStorage.getItem(REFRESH_KEY);
+  storeRefreshToken(null);
+  if (!authHeader.startsWith('Bearer ')) return;
+  await fetch(`${API_BASE}/api/auth/logout`, {
+    method: 'POST',
+    headers: jsonHeaders(authHeader),
+    body: JSON.stringify(refresh ? { refresh } : {}),
+  }).catch(() => undefined);
+}
+
 export async function fetchFeatures(authHeader: string) {
-  const res = await fetch(`${API_BASE}/api/features/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/features/`, (auth) => ({
     method: 'GET',
-    headers: jsonHeaders(authHeader),
-  });
+    headers: jsonHeaders(auth),
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.detail || err?.error || 'Unable to fetch features');
@@ -60,10 +126,10 @@ export async function fetchFeatures(authHeader: string) {
 }
 
 export async function fetchProfile(authHeader: string) {
-  const res = await fetch(`${API_BASE}/api/profile/dashboard`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/profile/dashboard`, (auth) => ({
     method: 'GET',
-    headers: jsonHeaders(authHeader),
-  });
+    headers: jsonHeaders(auth),
+  }));
   if (!res.ok) {
     throw new Error('Unable to load profile');
   }
@@ -72,11 +138,11 @@ export async function fetchProfile(authHeader: string) {
 
 export async function updateProfile(authHeader: string, data: FormData | Record<string, any>) {
   const isFormData = data instanceof FormData;
-  const res = await fetch(`${API_BASE}/api/profile/dashboard`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/profile/dashboard`, (auth) => ({
     method: 'PATCH',
-    headers: isFormData ? (authHeader ? { Authorization: authHeader } : undefined) : jsonHeaders(authHeader),
+    headers: isFormData ? (auth ? { Authorization: auth } : undefined) : jsonHeaders(auth),
     body: isFormData ? data : JSON.stringify(data),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.detail || 'Unable to update profile');
@@ -85,11 +151,11 @@ export async function updateProfile(authHeader: string, data: FormData | Record<
 }
 
 export async function createKeywordCluster(authHeader: string, payload: { intent: string; terms?: string; locale?: string }) {
-  const res = await fetch(`${API_BASE}/api/seo/keywords/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/seo/keywords/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create keyword cluster');
@@ -98,11 +164,11 @@ export async function createKeywordCluster(authHeader: string, payload: { intent
 }
 
 export async function createDirectory(authHeader: string, payload: { name: string; url: string; status?: string }) {
-  const res = await fetch(`${API_BASE}/api/seo/directories/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/seo/directories/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create directory');
@@ -111,11 +177,11 @@ export async function createDirectory(authHeader: string, payload: { name: strin
 }
 
 export async function translateTextApi(authHeader: string, payload: { text: string; target_lang?: string }) {
-  const res = await fetch(`${API_BASE}/api/translate/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/translate/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to translate text');
@@ -124,11 +190,11 @@ export async function translateTextApi(authHeader: string, payload: { text: stri
 }
 
 export async function createSeoSite(authHeader: string, payload: { domain: string; default_locale?: string }) {
-  const res = await fetch(`${API_BASE}/api/analytics/sites/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/analytics/sites/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create site');
@@ -137,11 +203,11 @@ export async function createSeoSite(authHeader: string, payload: { domain: strin
 }
 
 export async function createContentItem(authHeader: string, payload: { url: string; type?: string; locale?: string }) {
-  const res = await fetch(`${API_BASE}/api/seo/content/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/seo/content/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create content item');
@@ -150,11 +216,11 @@ export async function createContentItem(authHeader: string, payload: { url: stri
 }
 
 export async function createFaq(authHeader: string, payload: { question: string; answer: string }) {
-  const res = await fetch(`${API_BASE}/api/seo/faqs/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/seo/faqs/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create FAQ');
@@ -163,11 +229,11 @@ export async function createFaq(authHeader: string, payload: { question: string;
 }
 
 export async function createBacklink(authHeader: string, payload: { domain?: string; source_url?: string; target_url?: string }) {
-  const res = await fetch(`${API_BASE}/api/seo/backlinks/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/seo/backlinks/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create backlink');
@@ -176,11 +242,11 @@ export async function createBacklink(authHeader: string, payload: { domain?: str
 }
 
 export async function createSocialPost(authHeader: string, payload: { content: string; platform?: string }) {
-  const res = await fetch(`${API_BASE}/api/social/posts/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/social/posts/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create social post');
@@ -189,11 +255,11 @@ export async function createSocialPost(authHeader: string, payload: { content: s
 }
 
 export async function createEmailList(authHeader: string, payload: { name: string; lawful_basis?: string }) {
-  const res = await fetch(`${API_BASE}/api/email/lists/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/email/lists/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create email list');
@@ -202,11 +268,11 @@ export async function createEmailList(authHeader: string, payload: { name: strin
 }
 
 export async function createEmailTemplate(authHeader: string, payload: { name: string; subject: string }) {
-  const res = await fetch(`${API_BASE}/api/email/templates/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/email/templates/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create email template');
@@ -215,11 +281,11 @@ export async function createEmailTemplate(authHeader: string, payload: { name: s
 }
 
 export async function createEmailFlow(authHeader: string, payload: { name: string; description?: string }) {
-  const res = await fetch(`${API_BASE}/api/email/flows/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/email/flows/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create email flow');
@@ -228,11 +294,11 @@ export async function createEmailFlow(authHeader: string, payload: { name: strin
 }
 
 export async function createEmailContact(authHeader: string, payload: { email: string; name?: string }) {
-  const res = await fetch(`${API_BASE}/api/email/contacts/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/email/contacts/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create contact');
@@ -241,11 +307,11 @@ export async function createEmailContact(authHeader: string, payload: { email: s
 }
 
 export async function createAsoApp(authHeader: string, payload: { name: string; platform?: string }) {
-  const res = await fetch(`${API_BASE}/api/aso/apps/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/aso/apps/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create ASO app');
@@ -254,11 +320,11 @@ export async function createAsoApp(authHeader: string, payload: { name: string;
 }
 
 export async function createMarketplaceProduct(authHeader: string, payload: { title: string; price?: number; category?: string }) {
-  const res = await fetch(`${API_BASE}/api/marketplace/products/`, {
+  const res = await authFetch(authHeader, `${API_BASE}/api/marketplace/products/`, (auth) => ({
     method: 'POST',
-    headers: jsonHeaders(authHeader),
+    headers: jsonHeaders(auth),
     body: JSON.stringify(payload),
-  });
+  }));
   if (!res.ok) {
     const err = await res.json().catch(() => ({}));
     throw new Error(err?.error || 'Unable to create product');